@@ -6,6 +6,9 @@ import json
 import subprocess as sp
 import os
 
+from source_overlay import SourceOverlay
+from build_outcome_cache import BuildOutcomeCache
+
 # Current working directory
 script_path = Path(__file__).resolve()
 test_mutants_dir = script_path.parent
@@ -134,66 +137,55 @@ def test_mutants(configs, core_working_dir, test_suite, tc_dir, mutants_list):
                 my_env[key] = f"{path_str}:{my_env[key]}"
             # print(path_str)
 
+    # build and configure script the mutants are built with
+    build_sh = core_working_dir / configs[build_sh_wd_key] / build_script
+    configure_sh = core_working_dir / configs[config_sh_wd_key] / configure_no_cov_script
+
+    # restores target files left overlaid by an interrupted run
+    source_overlay = SourceOverlay(core_working_dir)
+
+    # mutants known not to compile on this machine (any core, any stage)
+    build_outcome_cache = BuildOutcomeCache(configs['subject_name'], build_sh, configure_sh)
+
     for target_file, mutant in mutants_list:
-        
-        # 1. Make patch file
-        patch_file = make_patch_file(target_file, mutant, core_working_dir)
+        mutant_code = mutant.read_bytes()
 
-        # 2. Apply patch
-        apply_patch(target_file, mutant, patch_file, core_working_dir, False)
+        # 0. Skip the mutant if it is known not to compile
+        if build_outcome_cache.known_failure(target_file, mutant_code):
+            print('Known not to build on {}'.format(mutant.name))
+            continue
+
+        # 1. Write the mutant over the target file
+        source_overlay.apply(target_file, mutant_code)
 
-        # 3. Build the subject, if build fails, skip the mutant
-        res = execute_build_script(configs[build_sh_wd_key], core_working_dir)
+        # 2. Build the subject, if build fails, skip the mutant
+        res, build_output = execute_build_script(configs[build_sh_wd_key], core_working_dir)
         if res != 0:
             print('Failed to build on {}'.format(mutant.name))
-            apply_patch(target_file, mutant, patch_file, core_working_dir, True)
+            build_outcome_cache.record_failure(target_file, mutant_code, res, build_output, mutant.name)
+            source_overlay.restore(target_file)
             continue
 
-        # 4. run the test suite
+        # 3. run the test suite
         passing_tcs, failing_tcs = run_test_suite(test_suite, tc_dir)
         if passing_tcs == [-1] and failing_tcs == [-1]:
             print('Crash detected on {}'.format(mutant.name))
-            apply_patch(target_file, mutant, patch_file, core_working_dir, True)
+            source_overlay.restore(target_file)
             continue
 
-        # 5. Don't save the mutant if all test cases pass
+        # 4. Don't save the mutant if all test cases pass
         if len(failing_tcs) == 0:
             print(f"Mutant {mutant.name} is not killed")
-            apply_patch(target_file, mutant, patch_file, core_working_dir, True)
+            source_overlay.restore(target_file)
             continue
 
-        # 6. Save the mutant if any test case fails
+        # 5. Save the mutant if any test case fails
         save_buggy_mutant(target_file, mutant, passing_tcs, failing_tcs, core_working_dir)
 
-        # X. Apply patch reverse
-        apply_patch(target_file, mutant, patch_file, core_working_dir, True)
+        # X. Restore the target file
+        source_overlay.restore(target_file)
 
-
-def make_patch_file(target_file, mutant, core_working_dir):
-    patch_file = core_working_dir / f"mutant.patch"
-
-    target_file = core_working_dir / target_file
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['diff', target_file.__str__(), mutant.__str__()]
-    sp.run(cmd, stdout=patch_file.open('w'))
-    
-    return patch_file
-
-def apply_patch(target_file, mutant, patch_file, core_working_dir, revert=False):
-    target_file = core_working_dir / target_file
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['patch']
-    if revert:
-        cmd.append('-R')
-    cmd.extend(['-i', patch_file.__str__(), target_file.__str__()])
-
-    res = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
-    if res.returncode != 0:
-        raise Exception(f'Failed to apply patch to {target_file.name} with mutant {mutant.name}')
-    
-    print(f'Applied patch to {target_file.name} with mutant {mutant.name} : revert={revert}')
+    print(f"Skipped {build_outcome_cache.hit_cnt} mutants known not to compile")
 
 
 def run_test_suite(test_suite, tc_dir):
@@ -261,7 +253,8 @@ def execute_build_script(build_sh_wd, core_working_dir):
     cmd = ['bash', build_script]
     res = sp.run(cmd, cwd=build_sh_wd, stdout=sp.PIPE, stderr=sp.PIPE)
     
-    return res.returncode
+    # the output tells compile errors from transient failures
+    return res.returncode, (res.stdout + res.stderr).decode(errors='replace')
 
 
 
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess as sp
+
+# Mutants that do not compile, shared by every core and stage of a machine.
+#
+# A mutant of a target file is the same bytes in stage 01 (01-3 tests the
+# mutants of the original program) and stage 04 (01-4 and 04-5 test the
+# mutants of each buggy version, which are the original mutants for every
+# target file the bug is not in), and the same across the buggy versions
+# whose bug is in another file. Whether it compiles only depends on the
+# content of the mutated file and on how it is compiled, so a failure is
+# recorded under
+#   sha256(subject, target file path, sha256(content),
+#          sha256(build script), sha256(configure script), compiler command)
+# and the mutant is skipped without building it again. Every stage builds
+# the mutants with configure_no_cov_script.sh, which sets the compiler and
+# its flags (ex. CC='clang-13'); the compiler command is those variables
+# (or the environment's) with the first line of `$CC --version`, so an
+# upgraded toolchain misses the cache as well.
+#
+# Only deterministic compile errors are kept: the build exited normally
+# (not killed by a signal), the compiler reported an error and nothing in
+# the output points to the machine (out of memory, disk full, ...). A
+# mutant that builds has to be built anyway to run the test cases on it.
+#
+# Entries are one small json file each, written atomically, so the cores
+# of a machine share the cache without locking:
+#   <cache dir>/<subject>/<key[:2]>/<key>.json
+# The cache dir is ~/.cache/fl_dataset_build_outcomes unless
+# BUILD_OUTCOME_CACHE_DIR is set. Stale entries are forgotten with
+#   build_outcome_cache.py --subject <subject-name> --clear
+
+build_outcome_cache_env = 'BUILD_OUTCOME_CACHE_DIR'
+default_build_outcome_cache_dir = Path.home() / '.cache' / 'fl_dataset_build_outcomes'
+
+compiler_variables = ['CC', 'CXX', 'CFLAGS', 'CXXFLAGS', 'CPPFLAGS', 'LDFLAGS']
+
+# build output of failures that depend on the machine, not on the mutant
+transient_build_errors = [
+    'No space left on device',
+    'Cannot allocate memory',
+    'out of memory',
+    'Resource temporarily unavailable',
+    'Killed',
+    'Segmentation fault',
+    'Too many open files',
+    'Interrupt',
+]
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def compiler_command(configure_sh):
+    # compiler variables set by the configure script, else by the environment
+    script = Path(configure_sh).read_text(errors='replace')
+    command = {}
+    for var in compiler_variables:
+        match = re.search(rf"\b{var}=(['\"]?)(.*?)\1(?:\s|$)", script)
+        if match is not None:
+            command[var] = match.group(2)
+        elif var in os.environ:
+            command[var] = os.environ[var]
+
+    cc = command.get('CC', 'cc').split()
+    version = 'unknown'
+    try:
+        res = sp.run(cc[:1] + ['--version'], stdout=sp.PIPE, stderr=sp.DEVNULL, timeout=30)
+        if res.returncode == 0 and res.stdout.strip():
+            version = res.stdout.decode(errors='replace').splitlines()[0]
+    except (OSError, IndexError, sp.TimeoutExpired):
+        pass
+    command['version'] = version
+    return command
+
+def is_compile_error(returncode, build_output):
+    # exit codes of 128 and above are signals (timeout, OOM killer, ...)
+    if returncode <= 0 or returncode >= 128:
+        return False
+    if any(error in build_output for error in transient_build_errors):
+        return False
+    # a diagnostic of the compiler, not only make's "Error 1"
+    return 'error:' in build_output
+
+
+class BuildOutcomeCache:
+    def __init__(self, subject_name, build_sh, configure_sh, cache_dir=None):
+        self.subject_name = subject_name
+        self.cache_dir = subject_cache_dir(subject_name, cache_dir)
+        self.build_script_hash = content_hash(Path(build_sh).read_bytes())
+        self.configure_script_hash = content_hash(Path(configure_sh).read_bytes())
+        self.compiler_command = json.dumps(compiler_command(configure_sh), sort_keys=True)
+        self.hit_cnt = 0
+
+    def key(self, target_file_path, code):
+        sha = hashlib.sha256()
+        for part in [
+            self.subject_name, str(target_file_path), content_hash(code),
+            self.build_script_hash, self.configure_script_hash, self.compiler_command
+        ]:
+            sha.update(part.encode())
+            sha.update(b'\0')
+        return sha.hexdigest()
+
+    def entry_file(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def known_failure(self, target_file_path, code):
+        if self.entry_file(self.key(target_file_path, code)).exists():
+            self.hit_cnt += 1
+            return True
+        return False
+
+    def record_failure(self, target_file_path, code, returncode, build_output, mutant_name):
+        # returns False when the failure may be transient and is not recorded
+        if not is_compile_error(returncode, build_output):
+            return False
+
+        entry_file = self.entry_file(self.key(target_file_path, code))
+        entry_file.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_file = entry_file.parent / f".{entry_file.name}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                'target_file': str(target_file_path),
+                'mutant': mutant_name,
+                'returncode': returncode,
+                'compiler_command': json.loads(self.compiler_command),
+            }, f)
+        os.replace(tmp_file, entry_file)
+        return True
+
+    def clear(self):
+        return clear_build_outcomes(self.cache_dir)
+
+
+def subject_cache_dir(subject_name, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.environ.get(build_outcome_cache_env, default_build_outcome_cache_dir)
+    return Path(cache_dir) / subject_name
+
+def count_build_outcomes(subject_dir):
+    if not subject_dir.exists():
+        return 0
+    return len(list(subject_dir.glob('*/*.json')))
+
+def clear_build_outcomes(subject_dir):
+    entry_cnt = count_build_outcomes(subject_dir)
+    if subject_dir.exists():
+        shutil.rmtree(subject_dir)
+    return entry_cnt
+
+
+def main():
+    parser = make_parser()
+    args = parser.parse_args()
+
+    subject_dir = subject_cache_dir(args.subject, args.cache_dir)
+    if args.clear:
+        entry_cnt = clear_build_outcomes(subject_dir)
+        print(f"Forgot {entry_cnt} mutants known not to compile for {args.subject}")
+    else:
+        print(f"{count_build_outcomes(subject_dir)} mutants known not to compile for {args.subject} in {subject_dir}")
+
+def make_parser():
+    parser = argparse.ArgumentParser(description="Show or clear the mutants known not to compile")
+    parser.add_argument("--subject", type=str, help="Subject name", required=True)
+    parser.add_argument("--cache-dir", type=str, default=None, help=f"Cache directory (default: ${build_outcome_cache_env} or {default_build_outcome_cache_dir})")
+    parser.add_argument("--clear", action="store_true", help="Forget every recorded failure of the subject")
+    return parser
+
+if __name__ == "__main__":
+    main()
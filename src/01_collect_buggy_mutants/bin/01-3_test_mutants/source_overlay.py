@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import json
+import os
+import time
+
+# Swaps the content of target files (buggy version, mutant) without
+# diff/patch.
+#
+# The first time a target file is overlaid its pristine bytes are kept in
+# memory and in <core>/source_overlay/pristine/, and the file is recorded in
+# <core>/source_overlay/journal.json. Restoring writes the pristine bytes back
+# and drops the file from the journal. A worker killed in the middle of a
+# version leaves the journal behind, so the next SourceOverlay created on the
+# same core restores the tree before anything else is done.
+#
+# Every write goes to a temporary file that is renamed over the target file,
+# so the target file is never half written. The new mtime is always later
+# than the one it replaces: objects built from an overlay are older than the
+# restored file, so make rebuilds them (keeping the pristine mtime would let
+# make link the stale mutant object).
+
+source_overlay_dir_name = 'source_overlay'
+journal_file_name = 'journal.json'
+
+
+def atomic_write(dest_file, content):
+    dest_file = Path(dest_file)
+    tmp_file = dest_file.parent / f".{dest_file.name}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if dest_file.exists():
+        dest_stat = dest_file.stat()
+        os.chmod(tmp_file, dest_stat.st_mode)
+        mtime_ns = max(time.time_ns(), dest_stat.st_mtime_ns + 1)
+        os.utime(tmp_file, ns=(mtime_ns, mtime_ns))
+    os.replace(tmp_file, dest_file)
+
+
+class SourceOverlay:
+    def __init__(self, core_working_dir):
+        self.core_working_dir = Path(core_working_dir)
+        self.overlay_dir = self.core_working_dir / source_overlay_dir_name
+        self.pristine_dir = self.overlay_dir / 'pristine'
+        self.journal_file = self.overlay_dir / journal_file_name
+
+        # target file (relative to core_working_dir) -> pristine bytes
+        self.pristine = {}
+
+        self.recover()
+
+    # --- journal
+    def read_journal(self):
+        if not self.journal_file.exists():
+            return {}
+        with open(self.journal_file, 'r') as f:
+            return json.load(f)
+
+    def write_journal(self, journal):
+        if len(journal) == 0:
+            if self.journal_file.exists():
+                os.remove(self.journal_file)
+            return
+        self.overlay_dir.mkdir(exist_ok=True, parents=True)
+        atomic_write(self.journal_file, json.dumps(journal).encode())
+
+    def pristine_copy(self, target_file_path):
+        return self.pristine_dir / target_file_path.replace('/', '-')
+
+    def recover(self):
+        # restore files left overlaid by an interrupted worker
+        journal = self.read_journal()
+        for target_file_path in list(journal.keys()):
+            pristine_copy = self.pristine_copy(target_file_path)
+            assert pristine_copy.exists(), f"Pristine copy {pristine_copy} of {target_file_path} does not exist"
+            self.pristine[target_file_path] = pristine_copy.read_bytes()
+            self.restore(target_file_path)
+            print(f"Restored {target_file_path} left overlaid by an interrupted run")
+
+    # --- overlay
+    def target_file(self, target_file_path):
+        target_file = self.core_working_dir / target_file_path
+        assert target_file.exists(), f"Target file {target_file} does not exist"
+        return target_file
+
+    def apply(self, target_file_path, content):
+        # write content over the target file, keeping its pristine bytes
+        target_file_path = str(target_file_path)
+        target_file = self.target_file(target_file_path)
+
+        if target_file_path not in self.pristine:
+            pristine = target_file.read_bytes()
+            self.pristine_dir.mkdir(exist_ok=True, parents=True)
+            atomic_write(self.pristine_copy(target_file_path), pristine)
+
+            journal = self.read_journal()
+            journal[target_file_path] = self.pristine_copy(target_file_path).name
+            self.write_journal(journal)
+            self.pristine[target_file_path] = pristine
+
+        self.write(target_file, content)
+
+    def apply_file(self, target_file_path, source_file):
+        self.apply(target_file_path, Path(source_file).read_bytes())
+
+    def restore(self, target_file_path):
+        target_file_path = str(target_file_path)
+        if target_file_path not in self.pristine:
+            return
+        target_file = self.target_file(target_file_path)
+        self.write(target_file, self.pristine[target_file_path])
+
+        journal = self.read_journal()
+        journal.pop(target_file_path, None)
+        self.write_journal(journal)
+
+        pristine_copy = self.pristine_copy(target_file_path)
+        if pristine_copy.exists():
+            os.remove(pristine_copy)
+        del self.pristine[target_file_path]
+
+    def restore_all(self):
+        for target_file_path in list(self.pristine.keys()):
+            self.restore(target_file_path)
+
+    def write(self, target_file, content):
+        # nothing to rebuild when the content is already there
+        if target_file.read_bytes() == content:
+            return
+        atomic_write(target_file, content)
@@ -5,6 +5,9 @@ import argparse
 import json
 import subprocess as sp
 import os
+import time
+
+from source_overlay import SourceOverlay
 
 # Current working directory
 script_path = Path(__file__).resolve()
@@ -55,10 +58,10 @@ crash_codes = [
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.worker, args.version)
+    start_process(args.subject, args.worker, args.version, args.full_coverage_check)
 
 
-def start_process(subject_name, worker_name, version_name):
+def start_process(subject_name, worker_name, version_name, full_coverage_check=False):
     subject_working_dir = select_usable_buggy_versions / f"{subject_name}-working_directory"
     assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
 
@@ -96,7 +99,8 @@ def start_process(subject_name, worker_name, version_name):
     test_buggy_version(
         configs, core_working_dir, version_name, 
         target_code_file_path, buggy_code_file, 
-        buggy_lineno, failing_tc_list, version_dir
+        buggy_lineno, failing_tc_list, version_dir,
+        full_coverage_check
     )
 
 def get_bug_info(version_dir):
@@ -148,7 +152,8 @@ def get_failing_suite(version_dir):
 def test_buggy_version(
         configs, core_working_dir, version_name, 
         target_code_file_path, buggy_code_file, 
-        buggy_lineno, failing_tc_list, version_dir):
+        buggy_lineno, failing_tc_list, version_dir,
+        full_coverage_check=False):
     global my_env
 
     # --- prepare needed directories
@@ -205,11 +210,11 @@ def test_buggy_version(
             # print(path_str)
 
     # --- test the buggy version
-    # 1. Make patch file
-    patch_file = make_patch_file(target_code_file_path, buggy_code_file, core_working_dir)
+    # 1. Restore target files left overlaid by an interrupted run
+    source_overlay = SourceOverlay(core_working_dir)
 
-    # 2. Apply patch
-    apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, False)
+    # 2. Write the buggy version over the target file
+    source_overlay.apply_file(target_code_file_path, buggy_code_file)
 
     # THIS STEP IS NEEDED OR ELSE COVERAGE IS NOT MEASURED PROPERLY... (I THINK)
     # remove_all_gcda_gcno(subject_dir)
@@ -218,46 +223,82 @@ def test_buggy_version(
     res = execute_build_script(configs[build_sh_wd_key], core_working_dir)
     if res != 0:
         print('Failed to build on {}'.format(version_name))
-        apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
+        source_overlay.restore(target_code_file_path)
         exit(1)
 
     # 4. run the test suite
+    # the gcno files of the buggy file are located once,
+    # each failing tc then only reads the gcda of the buggy file
+    target_gcno_files = []
+    if not full_coverage_check:
+        target_gcno_files = find_target_gcno_files(subject_dir, target_code_file_path)
+        print(f"Target gcno files: {[gcno.name for gcno in target_gcno_files]}")
+
+    usable = True
+    check_timing = []
     for tc_name in failing_tc_list:
 
         # 4-1. remove past coverage
         remove_all_gcda(subject_dir)
 
         # 4-2. run the test case
+        start_time = time.time()
         res = run_tc(tc_name, tc_dir)
+        run_time = time.time() - start_time
         if res == 0:
             print(f"Testcase {tc_name} passed print myenv")
-            apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
-            exit(1)
-        
-        # 4-3. remove untargeted files for coverage
-        remove_untargeted_files_for_coverage(target_gcno_gcda, subject_dir)
+            check_timing.append([tc_name, run_time, 0, 'none', 'passed'])
+            usable = False
+            break
+
+        # 4-3. Check if the buggy line is covered
+        # fast path: llvm-cov gcov on the gcda of the buggy file only
+        start_time = time.time()
+        check_method = 'fast'
+        buggy_line_cov = -2
+        if len(target_gcno_files) > 0:
+            buggy_line_cov = check_buggy_line_coverage_fast(target_gcno_files, target_code_file_path, buggy_lineno)
+
+        # fall back to gcovr json export of all target files
+        if buggy_line_cov == -2:
+            check_method = 'gcovr'
+            if len(target_gcno_files) > 0:
+                # the fast path does not work for this subject, don't retry it
+                print(f"Fast coverage check failed on {tc_name}, using gcovr for the remaining test cases")
+                target_gcno_files = []
+
+            # 4-3-1. remove untargeted files for coverage
+            remove_untargeted_files_for_coverage(target_gcno_gcda, subject_dir)
 
-        # 4-4. generate coverage json
-        raw_cov = generate_coverage_json(
-            gcovr, version_cov_dir, tc_name,
-            filtered_files, subject_dir
-        )
+            # 4-3-2. generate coverage json
+            raw_cov = generate_coverage_json(
+                gcovr, version_cov_dir, tc_name,
+                filtered_files, subject_dir
+            )
+
+            buggy_line_cov = check_buggy_line_coverage(raw_cov, target_code_file_path, buggy_lineno)
+        check_time = time.time() - start_time
+        check_timing.append([tc_name, run_time, check_time, check_method, buggy_line_cov])
 
-        # 4-5. Check if the buggy line is covered
-        buggy_line_cov = check_buggy_line_coverage(raw_cov, target_code_file_path, buggy_lineno)
         if buggy_line_cov == 1:
             print(f"Buggy line {buggy_lineno} is not covered by {tc_name}")
-            apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
-            exit(1)
+            usable = False
+            break
         if buggy_line_cov == -2:
             print(f"Failed to check coverage for {tc_name}")
-            apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
-            exit(1)
+            usable = False
+            break
         
-        print(f"Testcase {tc_name} executed buggy line {buggy_lineno}")
+        print(f"Testcase {tc_name} executed buggy line {buggy_lineno} ({check_method}: {check_time:.3f}s)")
     
-    # 5. Apply patch reverse
-    apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
+    write_check_timing(version_cov_dir, check_timing)
+
+    if not usable:
+        source_overlay.restore(target_code_file_path)
+        exit(1)
+    
+    # 5. Restore the target file
+    source_overlay.restore(target_code_file_path)
 
     # 6. Save the buggy version
     save_buggy_version(version_dir, core_working_dir)
@@ -275,6 +316,93 @@ def save_buggy_version(version_dir, core_working_dir):
 
     print(f"Saved buggy version {version_dir.name}")
 
+def write_check_timing(version_cov_dir, check_timing):
+    timing_csv = version_cov_dir / 'buggy_line_check_time.csv'
+    with open(timing_csv, 'w') as f:
+        f.write('tc_name,run_time,check_time,check_method,result\n')
+        for row in check_timing:
+            f.write(','.join([str(x) for x in row]) + '\n')
+
+    total_check_time = sum([row[2] for row in check_timing])
+    print(f"Buggy line check time: {total_check_time:.3f}s for {len(check_timing)} test cases")
+
+def find_target_gcno_files(subject_dir, target_code_file_path):
+    # the object of a target file is <stem>.gcno or, built by libtool,
+    # <target>-<stem>.gcno (ex. libxml2_la-parser.gcno, not HTMLparser.gcno)
+    stem = Path(target_code_file_path).stem
+    return sorted(
+        gcno_file for gcno_file in subject_dir.rglob('*.gcno')
+        if gcno_file.name == f"{stem}.gcno" or gcno_file.name.endswith(f"-{stem}.gcno")
+    )
+
+def check_buggy_line_coverage_fast(target_gcno_files, target_code_file, buggy_lineno):
+    # returns 0 if covered, 1 if not covered, -2 if it could not be decided
+    # (-2 makes the caller fall back to gcovr)
+    target_file = target_code_file.split('/')[-1]
+    buggy_lineno = int(buggy_lineno)
+
+    executed_objects = 0
+    found_target = False
+    for gcno_file in target_gcno_files:
+        gcda_file = gcno_file.with_suffix('.gcda')
+        if not gcda_file.exists():
+            # the object was not executed by the tc
+            continue
+        executed_objects += 1
+
+        cmd = ['llvm-cov', 'gcov', '--stdout', '--object-file', gcda_file.name, target_file]
+        res = sp.run(cmd, cwd=gcda_file.parent, stdout=sp.PIPE, stderr=sp.PIPE)
+        if res.returncode != 0:
+            return -2
+
+        count = get_line_count_from_gcov(res.stdout.decode('utf-8', errors='ignore'), target_file, buggy_lineno)
+        if count is None:
+            continue
+        found_target = True
+
+        print(f"Line: {buggy_lineno}, count: {count}")
+        if count > 0:
+            return 0
+
+    # no gcda at all: the buggy file was not executed
+    if executed_objects == 0:
+        return 1
+    if not found_target:
+        return -2
+    return 1
+
+def get_line_count_from_gcov(gcov_output, target_file, buggy_lineno):
+    # gcov text format: "<count>:<lineno>:<source>", one "Source:" header per file
+    # count is '-' for non executable lines, '#####' or '=====' for unexecuted lines
+    # returns None if the target file is not in the output
+    # or its lines are missing (ex. llvm-cov could not open the source)
+    in_target = False
+    target_found = False
+    target_has_lines = False
+    for line in gcov_output.splitlines():
+        parts = line.split(':', 2)
+        if len(parts) < 3:
+            continue
+        count_str, lineno_str, text = parts[0].strip(), parts[1].strip(), parts[2]
+
+        if lineno_str == '0' and text.startswith('Source:'):
+            source = text[len('Source:'):].strip()
+            in_target = source.split('/')[-1] == target_file
+            target_found = target_found or in_target
+            continue
+        if not in_target or not lineno_str.isdigit() or int(lineno_str) == 0:
+            continue
+        target_has_lines = True
+        if int(lineno_str) != buggy_lineno:
+            continue
+
+        count_str = count_str.rstrip('*')
+        if count_str.isdigit():
+            return int(count_str)
+        return 0
+
+    return 0 if target_found and target_has_lines else None
+
 def check_buggy_line_coverage(raw_cov, target_code_file, buggy_lineno):
     with open(raw_cov, 'r') as f:
         cov_data = json.load(f)
@@ -358,34 +486,6 @@ def run_tc(tc_script, tc_dir):
     return res.returncode
 
 
-def make_patch_file(target_code_file_path, buggy_code_file, core_working_dir):
-    patch_file = core_working_dir / f"mutant.patch"
-
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['diff', target_file.__str__(), buggy_code_file.__str__()]
-    sp.run(cmd, stdout=patch_file.open('w'))
-    
-    return patch_file
-
-def apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, revert=False):
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['patch']
-    if revert:
-        cmd.append('-R')
-    cmd.extend(['-i', patch_file.__str__(), target_file.__str__()])
-
-    res = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
-    if res.returncode != 0:
-        raise Exception(f'Failed to apply patch to {target_file.name} with mutant {buggy_code_file.name}')
-    
-    print(f'Applied patch to {target_file.name} with mutant {buggy_code_file.name} : revert={revert}')
-
-
-
 def execute_build_script(build_sh_wd, core_working_dir):
     global build_script
 
@@ -425,6 +525,7 @@ def make_parser():
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--worker', type=str, help='Worker name (e.g., <machine-name>/<core-id>)', required=True)
     parser.add_argument('--version', type=str, help='Version name', required=True)
+    parser.add_argument('--full-coverage-check', action='store_true', help='Check buggy line coverage with a full gcovr json export instead of reading the buggy file gcda only')
     return parser
 
 if __name__ == "__main__":
@@ -5,6 +5,8 @@ import argparse
 import json
 import subprocess as sp
 
+from analysis_cache import AnalysisCache
+
 # Current working directory
 script_path = Path(__file__).resolve()
 analyze_buggy_versions = script_path.parent
@@ -43,10 +45,10 @@ excluded_txt = 'excluded_tcs.txt'
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.versions_set_name, args.output_csv)
+    start_process(args.subject, args.versions_set_name, args.output_csv, args.no_cache)
 
 
-def start_process(subject_name, versions_set_name, output_csv):
+def start_process(subject_name, versions_set_name, output_csv, no_cache=False):
     global configure_json_file
 
     subject_working_dir = select_usable_buggy_versions_dir / f"{subject_name}-working_directory"
@@ -56,10 +58,12 @@ def start_process(subject_name, versions_set_name, output_csv):
     configs = read_configs(subject_name, subject_working_dir)
 
     # 2. read test suite and generate summary of statistics
-    analyze_test_suite(configs, subject_working_dir, versions_set_name, output_csv)
+    analysis_cache = AnalysisCache.of_working_dir(subject_working_dir, enabled=not no_cache)
+    analyze_test_suite(configs, subject_working_dir, versions_set_name, output_csv, analysis_cache)
+    print(analysis_cache.summary())
 
 
-def analyze_test_suite(configs, subject_working_dir, versions_set_name, output_csv):
+def analyze_test_suite(configs, subject_working_dir, versions_set_name, output_csv, analysis_cache):
     usable_buggy_versions_dir = subject_working_dir / versions_set_name
     assert usable_buggy_versions_dir.exists(), f"Usable buggy versions directory {usable_buggy_versions_dir} does not exist"
 
@@ -104,22 +108,17 @@ def analyze_test_suite(configs, subject_working_dir, versions_set_name, output_c
             assert failing_tcs.exists(), f"Failing test cases file {failing_tcs} does not exist"
             assert passing_tcs.exists(), f"Passing test cases file {passing_tcs} does not exist"
 
-            # get excluded test cases
-            excluded_failing_tcs = testsuite_dir / excluded_failing_txt
-            excluded_passing_tcs = testsuite_dir / excluded_passing_txt
-            # excluded_tcs = testsuite_dir / excluded_txt
-
-            # get excluded test cases
-            excluded_failing_tcs_list = get_test_cases(excluded_failing_tcs)
-            excluded_passing_tcs_list = get_test_cases(excluded_passing_tcs)
-            # excludeded_tcs_list = get_test_cases(excluded_tcs)
+            # get test cases and excluded test cases (parsed once, then from the analysis cache)
+            testsuite = analysis_cache.load(buggy_version, get_testsuite, [f'testsuite_info/{tc_file}' for tc_file in testsuite_txts])
+            excluded_failing_tcs_list = testsuite[excluded_failing_txt]
+            excluded_passing_tcs_list = testsuite[excluded_passing_txt]
+            # excludeded_tcs_list = get_test_cases(testsuite_dir / excluded_txt)
             
             # assert that excluded failing_tcs and excluded passsings_tcs == excluded tcs
             # assert len(excludeded_tcs_list) == len(excluded_failing_tcs_list) + len(excluded_passing_tcs_list), f"Excluded test cases are not equal to the sum of excluded failing and excluded passing test cases"
 
-            # get test cases
-            failing_tcs_list = get_test_cases(failing_tcs)
-            passing_tcs_list = get_test_cases(passing_tcs)
+            failing_tcs_list = testsuite[failing_txt]
+            passing_tcs_list = testsuite[passing_txt]
 
             total_testsuite.update(failing_tcs_list)
             total_testsuite.update(passing_tcs_list)
@@ -216,6 +215,12 @@ def get_test_cases(test_case_file):
     return test_cases
 
 
+testsuite_txts = [failing_txt, passing_txt, excluded_failing_txt, excluded_passing_txt]
+
+def get_testsuite(buggy_version):
+    # {file name: test cases} of the test suite files of a buggy version
+    testsuite_dir = buggy_version / 'testsuite_info'
+    return {tc_file: get_test_cases(testsuite_dir / tc_file) for tc_file in testsuite_txts}
 
 
 def get_usable_buggy_versions(usable_buggy_versions_dir):
@@ -254,6 +259,7 @@ def make_parser():
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--versions-set-name', type=str, help='Name of buggy versions set to analyze', required=True)
     parser.add_argument('--output-csv', type=str, help='Output csv file to save statistics', required=True)
+    parser.add_argument('--no-cache', action='store_true', help='Parse the test suite of every buggy version again instead of using the analysis cache')
     return parser
     
 
@@ -7,6 +7,8 @@ import subprocess as sp
 import random
 from copy import deepcopy
 
+from testsuite_reduction import TestSuiteBitsets, reduce_testsuite, write_reduction_report
+
 # Current working directory
 script_path = Path(__file__).resolve()
 analyze_buggy_versions = script_path.parent
@@ -38,15 +40,19 @@ copy_real_world_buggy_versions = 'copy_real_world_buggy_versions'
 failing_txt = 'failing_tcs.txt'
 passing_txt = 'passing_tcs.txt'
 excluded_txt = 'excluded_tcs.txt'
+reduction_report_csv = 'reduced_test_suite_report.csv'
 
 
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.versions_set_name, args.testsuite_size)
+    start_process(
+        args.subject, args.versions_set_name, args.testsuite_size, args.method,
+        args.min_failing, args.coverage_set_name, args.coverage_versions, args.seed
+    )
 
 
-def start_process(subject_name, versions_set_name, testsuite_size):
+def start_process(subject_name, versions_set_name, testsuite_size, method='random', min_failing=1, coverage_set_name=None, coverage_versions=None, seed=None):
     global configure_json_file
 
     subject_working_dir = select_usable_buggy_versions_dir / f"{subject_name}-working_directory"
@@ -56,10 +62,14 @@ def start_process(subject_name, versions_set_name, testsuite_size):
     configs = read_configs(subject_name, subject_working_dir)
 
     # 2. read test suite and generate summary of statistics
-    analyze_and_reduce(configs, subject_working_dir, versions_set_name, testsuite_size)
+    reduction = {
+        'method': method, 'min_failing': min_failing, 'coverage_set_name': coverage_set_name,
+        'coverage_versions': coverage_versions, 'seed': seed,
+    }
+    analyze_and_reduce(configs, subject_working_dir, versions_set_name, testsuite_size, reduction)
 
 
-def analyze_and_reduce(configs, subject_working_dir, versions_set_name, testsuite_size):
+def analyze_and_reduce(configs, subject_working_dir, versions_set_name, testsuite_size, reduction):
     usable_buggy_versions_dir = subject_working_dir / versions_set_name
     assert usable_buggy_versions_dir.exists(), f"Usable buggy versions directory {usable_buggy_versions_dir} does not exist"
 
@@ -71,7 +81,7 @@ def analyze_and_reduce(configs, subject_working_dir, versions_set_name, testsuit
     passing_set = set()
 
     keep_set = set()
-
+    version_testsuites = {}
 
     total_buggy_versions = len(buggy_version_list)
 
@@ -100,6 +110,8 @@ def analyze_and_reduce(configs, subject_working_dir, versions_set_name, testsuit
         passing_tcs_list = get_test_cases(passing_tcs)
 
 
+        version_testsuites[buggy_version_name] = (failing_tcs_list, passing_tcs_list)
+
         # make failing test cases set
         failing_set.update(failing_tcs_list)
         passing_set.update(passing_tcs_list)
@@ -123,7 +135,58 @@ def analyze_and_reduce(configs, subject_working_dir, versions_set_name, testsuit
 
     print(f"\n# of keep test cases: {len(keep_set)}")
 
-    select_reduced_testsuite(failing_set, passing_set, keep_set, testsuite_size, subject_working_dir)
+    if reduction['method'] == 'greedy':
+        select_reduced_testsuite_greedy(configs, version_testsuites, keep_set, testsuite_size, subject_working_dir, reduction)
+    else:
+        select_reduced_testsuite(failing_set, passing_set, keep_set, testsuite_size, subject_working_dir)
+
+
+def select_reduced_testsuite_greedy(configs, version_testsuites, keep_set, testsuite_size, subject_working_dir, reduction):
+    # 1. failing/passing bitsets of the test cases over the buggy versions
+    bitsets = TestSuiteBitsets.from_testsuites(version_testsuites)
+
+    # 2. lines executed by the test cases, from the prerequisites of the subject (03-2)
+    if reduction['coverage_set_name'] is not None:
+        coverage_info_dirs = get_coverage_info_dirs(configs['subject_name'], reduction['coverage_set_name'], reduction['coverage_versions'])
+        for coverage_info_dir in coverage_info_dirs:
+            bitsets.add_coverage(coverage_info_dir)
+        print(f"\n{bitsets.num_lines} lines of the target files executed in {len(coverage_info_dirs)} buggy versions")
+
+    # 3. select test cases
+    reduced_test_suite, steps = reduce_testsuite(bitsets, sorted(keep_set), testsuite_size, reduction['min_failing'], reduction['seed'])
+    reduced_set = set(reduced_test_suite)
+    excluded_tc_list = [tc for tc in bitsets.tcs if tc not in reduced_set]
+
+    # 4. save reduced test suite and excluded test cases
+    save_test_suites(subject_working_dir, reduced_test_suite, excluded_tc_list)
+
+    # 5. report the test cases kept for each buggy version
+    report_file = subject_working_dir / reduction_report_csv
+    summary = write_reduction_report(report_file, bitsets, reduced_test_suite)
+
+    print(f"\n\n>>>>> REDUCED RESULTS <<<<<")
+    print(f"Reduced test suite size: {len(reduced_test_suite)}")
+    for step, tcs in steps.items():
+        print(f"\t{step}: {len(tcs)}")
+    print(f"Excluded test suite size: {len(excluded_tc_list)}")
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    print(f"Report of each buggy version is written to {report_file}")
+
+
+def get_coverage_info_dirs(subject_name, coverage_set_name, coverage_versions):
+    prepare_prerequisites_dir = src_dir / '03_prepare_prerequisites'
+    coverage_set_dir = prepare_prerequisites_dir / f"{subject_name}-working_directory" / coverage_set_name
+    assert coverage_set_dir.exists(), f"Coverage set directory {coverage_set_dir} does not exist"
+
+    coverage_info_dirs = sorted(
+        version_dir / 'coverage_info' for version_dir in coverage_set_dir.iterdir()
+        if (version_dir / 'coverage_info').exists()
+    )
+    if coverage_versions is not None:
+        coverage_info_dirs = coverage_info_dirs[:coverage_versions]
+    assert len(coverage_info_dirs) > 0, f"No coverage_info in {coverage_set_dir}"
+    return coverage_info_dirs
 
 
 def select_reduced_testsuite(failing_set, passing_set, keep_set, testsuite_size, subject_working_dir):
@@ -159,26 +222,31 @@ def select_reduced_testsuite(failing_set, passing_set, keep_set, testsuite_size,
     # 5. get excluded test cases
     excluded_tc_list = failing_test_cases + passing_test_cases
 
-    # 5. save reduced test suite
+    # 4. save reduced test suite and excluded test cases
+    save_test_suites(subject_working_dir, reduced_test_suite, excluded_tc_list)
+
+    print(f"\n\n>>>>> REDUCED RESULTS <<<<<")
+    print(f"Reduced test suite size: {len(reduced_test_suite)}")
+    print(f"\tExcluded Failing test cases: {len(failing_test_cases)}")
+    print(f"\tExcluded passing test cases: {len(passing_test_cases)}")
+    print(f"Excluded test suite size: {len(excluded_tc_list)}")
+
+
+def save_test_suites(subject_working_dir, reduced_test_suite, excluded_tc_list):
+    # save reduced test suite
     reduced_test_suite_file = subject_working_dir / 'reduced_test_suite.txt'
     with open(reduced_test_suite_file, 'w') as f:
         reduced_test_suite = sorted(reduced_test_suite, key=custome_sort)
         content = '\n'.join(reduced_test_suite)
         f.write(content)
     
-    # 6. save excluded test cases
+    # save excluded test cases
     excluded_test_suite_file = subject_working_dir / 'excluded_test_suite.txt'
     with open(excluded_test_suite_file, 'w') as f:
         excluded_tc_list = sorted(excluded_tc_list, key=custome_sort)
         content = '\n'.join(excluded_tc_list)
         f.write(content)
 
-    print(f"\n\n>>>>> REDUCED RESULTS <<<<<")
-    print(f"Reduced test suite size: {len(reduced_test_suite)}")
-    print(f"\tExcluded Failing test cases: {len(failing_test_cases)}")
-    print(f"\tExcluded passing test cases: {len(passing_test_cases)}")
-    print(f"Excluded test suite size: {len(excluded_tc_list)}")
-
 
 def custome_sort(tc_script):
     tc_name = tc_script.split('.')[0]
@@ -232,6 +300,11 @@ def make_parser():
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--versions-set-name', type=str, help='Name of buggy versions set to analyze', required=True)
     parser.add_argument('--testsuite-size', type=int, help='Size expected reduced test suite', required=True)
+    parser.add_argument('--method', type=str, choices=['greedy', 'random'], default='random', help='random: random failing then passing test cases, greedy: set cover of the buggy versions then line coverage (testsuite_reduction.py) (default: random)')
+    parser.add_argument('--min-failing', type=int, default=1, help='Failing test cases to keep for each buggy version (greedy, default: 1)')
+    parser.add_argument('--coverage-set-name', type=str, default=None, help='Set of 03_prepare_prerequisites whose coverage_info gives the lines executed by each test case (greedy, ex. prerequisite_data)')
+    parser.add_argument('--coverage-versions', type=int, default=None, help='Number of buggy versions of the coverage set to read (greedy, default: all)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed of the test cases filling the rest of the test suite')
     return parser
     
 
@@ -0,0 +1,244 @@
+#!/usr/bin/python3
+
+import csv
+import heapq
+import random
+
+from executed_lines_index import load_executed_lines_index, popcount
+
+# Test suite reduction over bitsets.
+#
+# Test cases (TCs) are shared by all buggy versions, and every TC gets an
+# integer id. For each TC:
+#   fail_bitset:  bit v set when the TC fails on buggy version v (kills it)
+#   pass_bitset:  bit v set when the TC passes on buggy version v
+#   line_bitset:  bit l set when the TC executes line l of the target files,
+#                 in the coverage of any of the buggy versions given
+#                 (coverage_info/executed_lines_index.json of 03-2, optional)
+# A buggy version stays usable with at least one failing and one passing TC
+# (03_apply_reduced_testsuite.py). The reduced test suite is built by:
+#   1. keep:      TCs that are kept as they are (failing TCs of real world
+#                 buggy versions)
+#   2. failing:   failing TCs covering the buggy versions, until each has
+#                 min_failing failing TCs (or all of its failing TCs)
+#   3. passing:   TCs covering the buggy versions left without a passing TC
+#   4. coverage:  passing TCs executing the most lines not executed by the
+#                 suite yet, until testsuite_size or no line is left
+#   5. fill:      the remaining failing then passing TCs in random order,
+#                 until testsuite_size (as the random reduction)
+# Steps 2 to 4 are greedy: the TC of highest gain is picked first. Gains only
+# decrease as the suite grows, so candidates stay in a heap with their last
+# gain and only the top one is re-evaluated (lazy greedy). Gains are not
+# weighted by run time: 02-3 only measures it for failing TCs
+# (buggy_line_check_time.csv), not for the passing TCs most picks are among.
+
+
+def custome_sort(tc_script):
+    tc_name = tc_script.split('.')[0]
+    return (int(tc_name[2:]))
+
+
+class TestSuiteBitsets:
+    def __init__(self, version_names, tcs):
+        self.version_names = version_names
+        self.tcs = tcs
+        self.tc2id = {tc: idx for idx, tc in enumerate(tcs)}
+        self.fail_bitset = [0] * len(tcs)
+        self.pass_bitset = [0] * len(tcs)
+        self.line_bitset = [0] * len(tcs)
+        self.line2id = {}
+
+    @classmethod
+    def from_testsuites(cls, version_testsuites):
+        # version_testsuites: {version name: (failing tcs, passing tcs)}
+        version_names = list(version_testsuites.keys())
+        tcs = set()
+        for failing_tcs, passing_tcs in version_testsuites.values():
+            tcs.update(failing_tcs)
+            tcs.update(passing_tcs)
+        bitsets = cls(version_names, sorted(tcs, key=custome_sort))
+
+        for version_id, (failing_tcs, passing_tcs) in enumerate(version_testsuites.values()):
+            for tc in failing_tcs:
+                bitsets.fail_bitset[bitsets.tc2id[tc]] |= 1 << version_id
+            for tc in passing_tcs:
+                bitsets.pass_bitset[bitsets.tc2id[tc]] |= 1 << version_id
+        return bitsets
+
+    @property
+    def num_lines(self):
+        return len(self.line2id)
+
+    def add_coverage(self, coverage_info_dir):
+        # lines executed by each TC in an executed lines index; lines of the
+        # same bitmap are executed by the same TCs, so TCs are visited once
+        # per bitmap
+        index = load_executed_lines_index(coverage_info_dir)
+        bitmap_lines = {}
+        for key, bitmap_id in zip(index.lines, index.line_bitmap):
+            if key not in self.line2id:
+                self.line2id[key] = len(self.line2id)
+            bitmap_lines[bitmap_id] = bitmap_lines.get(bitmap_id, 0) | (1 << self.line2id[key])
+
+        for bitmap_id, lines_bitset in bitmap_lines.items():
+            for tc in index.bitmap_tcs(index.bitmap(bitmap_id)):
+                if tc in self.tc2id:
+                    self.line_bitset[self.tc2id[tc]] |= lines_bitset
+
+    def tcs_bitset(self, tc_ids, bitsets):
+        bitset = 0
+        for tc_id in tc_ids:
+            bitset |= bitsets[tc_id]
+        return bitset
+
+
+def bitset_ids(bitset):
+    # positions of the set bits
+    bits = bin(bitset)[:1:-1]
+    return [idx for idx, bit in enumerate(bits) if bit == '1']
+
+
+def greedy_pick(candidates, gain, limit, pick):
+    # picks candidates (tc ids) by gain until limit picks or no gain
+    # is left, calling pick(tc_id) after each
+    heap = [(-gain(tc_id), tc_id) for tc_id in candidates]
+    heapq.heapify(heap)
+    picked = []
+    while len(heap) > 0 and len(picked) < limit:
+        neg_gain, tc_id = heapq.heappop(heap)
+        tc_gain = gain(tc_id)
+        if len(heap) > 0 and tc_gain < -heap[0][0]:
+            # the last gain of another candidate may be higher
+            heapq.heappush(heap, (-tc_gain, tc_id))
+            continue
+        if tc_gain <= 0:
+            break
+        picked.append(tc_id)
+        pick(tc_id)
+    return picked
+
+
+def reduce_testsuite(bitsets, keep_tcs, testsuite_size, min_failing=1, seed=None):
+    # returns (reduced TCs, {step: TCs picked at the step})
+    num_versions = len(bitsets.version_names)
+    selected = [bitsets.tc2id[tc] for tc in keep_tcs]
+    selected_set = set(selected)
+    steps = {'keep': list(selected)}
+
+    failing_ids = [tc_id for tc_id in range(len(bitsets.tcs)) if bitsets.fail_bitset[tc_id] != 0]
+    passing_ids = [tc_id for tc_id in range(len(bitsets.tcs)) if bitsets.fail_bitset[tc_id] == 0]
+
+    def select(tc_id):
+        selected.append(tc_id)
+        selected_set.add(tc_id)
+
+    # 2. failing TCs: every version min_failing times (or as many as it has)
+    num_failing = [0] * num_versions
+    failing_cnt = [0] * num_versions
+    for tc_id in failing_ids:
+        for version_id in bitset_ids(bitsets.fail_bitset[tc_id]):
+            failing_cnt[version_id] += 1
+            if tc_id in selected_set:
+                num_failing[version_id] += 1
+    need = [0]
+
+    def update_need():
+        need[0] = 0
+        for version_id in range(num_versions):
+            if num_failing[version_id] < min(min_failing, failing_cnt[version_id]):
+                need[0] |= 1 << version_id
+
+    def pick_failing(tc_id):
+        select(tc_id)
+        for version_id in bitset_ids(bitsets.fail_bitset[tc_id]):
+            num_failing[version_id] += 1
+        update_need()
+
+    update_need()
+    steps['failing'] = greedy_pick(
+        [tc_id for tc_id in failing_ids if tc_id not in selected_set],
+        lambda tc_id: popcount(bitsets.fail_bitset[tc_id] & need[0]),
+        len(bitsets.tcs), pick_failing
+    )
+
+    # 3. passing TCs: every version with a passing TC
+    without_passing = [0]
+    has_passing = bitsets.tcs_bitset(range(len(bitsets.tcs)), bitsets.pass_bitset)
+    without_passing[0] = has_passing & ~bitsets.tcs_bitset(selected, bitsets.pass_bitset)
+
+    def pick_passing(tc_id):
+        select(tc_id)
+        without_passing[0] &= ~bitsets.pass_bitset[tc_id]
+
+    steps['passing'] = greedy_pick(
+        [tc_id for tc_id in range(len(bitsets.tcs)) if tc_id not in selected_set],
+        lambda tc_id: popcount(bitsets.pass_bitset[tc_id] & without_passing[0]),
+        len(bitsets.tcs), pick_passing
+    )
+
+    if len(selected) > testsuite_size:
+        print(f"{len(selected)} TCs are needed to keep every buggy version usable, more than the test suite size {testsuite_size}")
+
+    # 4. passing TCs by line coverage gain
+    covered = [bitsets.tcs_bitset(selected, bitsets.line_bitset)]
+
+    def pick_coverage(tc_id):
+        select(tc_id)
+        covered[0] |= bitsets.line_bitset[tc_id]
+
+    steps['coverage'] = greedy_pick(
+        [tc_id for tc_id in passing_ids if tc_id not in selected_set],
+        lambda tc_id: popcount(bitsets.line_bitset[tc_id] & ~covered[0]),
+        max(testsuite_size - len(selected), 0), pick_coverage
+    )
+
+    # 5. fill with random TCs, failing first
+    rng = random.Random(seed)
+    remaining_failing = [tc_id for tc_id in failing_ids if tc_id not in selected_set]
+    remaining_passing = [tc_id for tc_id in passing_ids if tc_id not in selected_set]
+    rng.shuffle(remaining_failing)
+    rng.shuffle(remaining_passing)
+    steps['fill'] = []
+    for tc_id in remaining_failing + remaining_passing:
+        if len(selected) >= testsuite_size:
+            break
+        select(tc_id)
+        steps['fill'].append(tc_id)
+
+    reduced_tcs = sorted([bitsets.tcs[tc_id] for tc_id in selected], key=custome_sort)
+    return reduced_tcs, {step: [bitsets.tcs[tc_id] for tc_id in tc_ids] for step, tc_ids in steps.items()}
+
+
+def write_reduction_report(report_file, bitsets, reduced_tcs):
+    # per buggy version: TCs kept and whether it stays usable
+    # returns the summary of the reduced test suite
+    reduced_ids = [bitsets.tc2id[tc] for tc in reduced_tcs]
+    all_ids = range(len(bitsets.tcs))
+    num_versions = len(bitsets.version_names)
+
+    # TCs of each version: failing, reduced failing, passing, reduced passing
+    counts = [[0] * 4 for _ in range(num_versions)]
+    for col, tc_bitsets, tc_ids in [(0, bitsets.fail_bitset, all_ids), (1, bitsets.fail_bitset, reduced_ids), (2, bitsets.pass_bitset, all_ids), (3, bitsets.pass_bitset, reduced_ids)]:
+        for tc_id in tc_ids:
+            for version_id in bitset_ids(tc_bitsets[tc_id]):
+                counts[version_id][col] += 1
+
+    usable_cnt = 0
+    with open(report_file, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['buggy_version', '# of failing TCs', '# of reduced failing TCs', '# of passing TCs', '# of reduced passing TCs', 'usable'])
+        for version_id, version_name in enumerate(bitsets.version_names):
+            usable = counts[version_id][1] > 0 and counts[version_id][3] > 0
+            usable_cnt += int(usable)
+            writer.writerow([version_name, *counts[version_id], int(usable)])
+
+    summary = {
+        '# of TCs': len(bitsets.tcs),
+        '# of reduced TCs': len(reduced_tcs),
+        '# of buggy versions': num_versions,
+        '# of usable buggy versions': usable_cnt,
+    }
+    if bitsets.num_lines > 0:
+        summary['# of lines'] = popcount(bitsets.tcs_bitset(all_ids, bitsets.line_bitset))
+        summary['# of lines of reduced TCs'] = popcount(bitsets.tcs_bitset(reduced_ids, bitsets.line_bitset))
+    return summary
@@ -6,6 +6,8 @@ import json
 import subprocess as sp
 import os
 
+from source_overlay import SourceOverlay
+
 # Current working directory
 script_path = Path(__file__).resolve()
 prepare_prerequisites_cmd_dir = script_path.parent
@@ -112,17 +114,17 @@ def extract_line2function(
     # --- prepare needed directories
 
     # --- first patch the code and build
-    # 1. Make patch file
-    patch_file = make_patch_file(target_code_file_path, buggy_code_file, core_working_dir)
+    # 1. Restore target files left overlaid by an interrupted run
+    source_overlay = SourceOverlay(core_working_dir)
 
-    # 2. Apply patch
-    apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, False)
+    # 2. Write the buggy version over the target file
+    source_overlay.apply_file(target_code_file_path, buggy_code_file)
 
     # 3. Build the subject, if build fails, skip the mutant
     res = execute_build_script(configs[build_sh_wd_key], core_working_dir)
     if res != 0:
         print('Failed to build on {}'.format(version_name))
-        apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
+        source_overlay.restore(target_code_file_path)
         exit(1)
 
     # --- extract line2function data
@@ -164,8 +166,8 @@ def extract_line2function(
         
         print('> Extracted line2function data from {}'.format(pp_file.name))
     
-    # 4. Apply patch reverse
-    apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
+    # 4. Restore the target file
+    source_overlay.restore(target_code_file_path)
 
     # 5. Save the buggy version
     line2function_file = save_line2function(version_dir, perfile_line2function_data)
@@ -183,34 +185,6 @@ def save_line2function(version_dir, perfile_line2function_data):
     return line2function_file
 
 
-def make_patch_file(target_code_file_path, buggy_code_file, core_working_dir):
-    patch_file = core_working_dir / f"buggy_version.patch"
-
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['diff', target_file.__str__(), buggy_code_file.__str__()]
-    sp.run(cmd, stdout=patch_file.open('w'))
-    
-    return patch_file
-
-def apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, revert=False):
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['patch']
-    if revert:
-        cmd.append('-R')
-    cmd.extend(['-i', patch_file.__str__(), target_file.__str__()])
-
-    res = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
-    if res.returncode != 0:
-        raise Exception(f'Failed to apply patch to {target_file.name} with buggy_version {buggy_code_file.name}')
-    
-    print(f'Applied patch to {target_file.name} with buggy_version {buggy_code_file.name} : revert={revert}')
-
-
-
 def execute_build_script(build_sh_wd, core_working_dir):
     global build_script
 
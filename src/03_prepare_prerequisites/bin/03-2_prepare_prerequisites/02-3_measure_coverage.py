@@ -6,6 +6,10 @@ import json
 import subprocess as sp
 import os
 
+from coverage_cache import CoverageCache, coverage_cache_dir_name
+from coverage_vector_store import CoverageVectorStore, coverage_vectors_file, line_id
+from source_overlay import SourceOverlay
+
 # Current working directory
 script_path = Path(__file__).resolve()
 prepare_prerequisites_cmd_dir = script_path.parent
@@ -37,10 +41,10 @@ my_env = os.environ.copy()
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.worker, args.version, args.use_excluded_failing_tcs, args.exclude_ccts)
+    start_process(args.subject, args.worker, args.version, args.use_excluded_failing_tcs, args.exclude_ccts, args.no_coverage_cache)
 
 
-def start_process(subject_name, worker_name, version_name, use_excluded_failing_tcs, exclude_ccts):
+def start_process(subject_name, worker_name, version_name, use_excluded_failing_tcs, exclude_ccts, no_coverage_cache=False):
     subject_working_dir = prepare_prerequisites_dir / f"{subject_name}-working_directory"
     assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
 
@@ -80,12 +84,17 @@ def start_process(subject_name, worker_name, version_name, use_excluded_failing_
     # print(f"Buggy code file: {buggy_code_file.name}")
 
 
-    # 5. conduct run tests on buggy version with failing test cases
+    # 5. coverage cache shared by all cores of this machine
+    coverage_cache = None
+    if not no_coverage_cache:
+        coverage_cache = CoverageCache(subject_working_dir / coverage_cache_dir_name)
+
+    # 6. conduct run tests on buggy version with failing test cases
     measure_coverage(
         configs, core_working_dir, version_name, 
         target_code_file_path, buggy_code_file, 
         buggy_lineno, failing_tc_list, passing_tc_list, version_dir,
-        exclude_ccts
+        exclude_ccts, coverage_cache
     )
 
 def move_excluded_failing_tcs2_failing_tcs(version_dir):
@@ -180,7 +189,7 @@ def measure_coverage(
         configs, core_working_dir, version_name, 
         target_code_file_path, buggy_code_file, 
         buggy_lineno, failing_tc_list, passing_tc_list, version_dir,
-        exclude_ccts):
+        exclude_ccts, coverage_cache=None):
     global my_env
 
     # --- prepare needed directories
@@ -242,70 +251,116 @@ def measure_coverage(
 
 
     # --- test the buggy version
-    # 1. Make patch file
-    patch_file = make_patch_file(target_code_file_path, buggy_code_file, core_working_dir)
+    # 1. Restore target files left overlaid by an interrupted run
+    source_overlay = SourceOverlay(core_working_dir)
 
-    # 2. Apply patch
-    apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, False)
+    # 2. Write the buggy version over the target file
+    source_overlay.apply_file(target_code_file_path, buggy_code_file)
 
     # THIS STEP IS NEEDED OR ELSE COVERAGE IS NOT MEASURED PROPERLY... (I THINK)
     # remove_all_gcda_gcno(subject_dir)
 
-    # 3. Build the subject, if build fails, skip the mutant
-    res = execute_build_script(configs[build_sh_wd_key], core_working_dir)
-    if res != 0:
-        print('Failed to build on {}'.format(version_name))
-        apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
-        exit(1)
+    # 3. look up coverage of each tc in cache
+    # key: hash of target files (patched) + configure and build scripts + tc name + hash of tc script
+    tc_cache_keys = {}
+    tcs_to_run = failing_tc_list + passing_tc_list
+    if coverage_cache is not None:
+        target_file_paths = [core_working_dir / target_file for target_file in configs['target_files']]
+        script_files = [
+            core_working_dir / configs[config_sh_wd_key] / configure_yes_cov_script,
+            core_working_dir / configs[build_sh_wd_key] / build_script
+        ]
+        source_hash = coverage_cache.source_hash(target_file_paths, filtered_files, script_files)
+        for tc_name in failing_tc_list+passing_tc_list:
+            tc_cache_keys[tc_name] = coverage_cache.tc_key(source_hash, tc_name, tc_dir)
+        tcs_to_run = [tc_name for tc_name in tcs_to_run if not coverage_cache.contains(tc_cache_keys[tc_name])]
+        print(f"Coverage cache: {len(tcs_to_run)} test cases to run, {len(tc_cache_keys) - len(tcs_to_run)} cached")
+
+    # 4. Build the subject, if build fails, skip the mutant
+    # (not needed when coverage of every tc is already cached)
+    if len(tcs_to_run) > 0:
+        res = execute_build_script(configs[build_sh_wd_key], core_working_dir)
+        if res != 0:
+            print('Failed to build on {}'.format(version_name))
+            source_overlay.restore(target_code_file_path)
+            exit(1)
     
     cct_list = []
 
-    # 4. run the test suite
-    for tc_name in failing_tc_list+passing_tc_list:
-
-        # 4-1. remove past coverage
-        remove_all_gcda(subject_dir)
+    # coverage of all tcs is kept in one deduplicated store
+    # instead of a gcovr document per tc
+    coverage_store = CoverageVectorStore()
 
-        # 4-2. run the test case
-        res = run_tc(tc_name, tc_dir)
-        # if res == 0:
-        #     print(f"Testcase {tc_name} passed print myenv")
-        #     apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
-        #     exit(1)
-        
-        # 4-3. remove untargeted files for coverage
-        remove_untargeted_files_for_coverage(target_gcno_gcda, subject_dir)
+    # 5. run the test suite
+    for tc_name in failing_tc_list+passing_tc_list:
 
-        # 4-4. generate coverage json
-        raw_cov = generate_coverage_json(
-            gcovr, version_cov_dir, tc_name,
-            filtered_files, subject_dir
-        )
+        # 5-0. reuse cached coverage of tc
+        # tc_cov: (instrumented lines, bitmap of the executed lines), None if not measured
+        tc_cov = None
+        if coverage_cache is not None:
+            tc_cov = coverage_cache.fetch(tc_cache_keys[tc_name])
+        if tc_cov is not None:
+            print(f"Testcase {tc_name} coverage loaded from cache")
+        else:
+            # 5-1. remove past coverage
+            remove_all_gcda(subject_dir)
+
+            # 5-2. run the test case
+            res = run_tc(tc_name, tc_dir)
+            # if res == 0:
+            #     print(f"Testcase {tc_name} passed print myenv")
+            #     source_overlay.restore(target_code_file_path)
+            #     exit(1)
+            
+            # 5-3. remove untargeted files for coverage
+            remove_untargeted_files_for_coverage(target_gcno_gcda, subject_dir)
+
+            # 5-4. generate coverage json
+            raw_cov = generate_coverage_json(
+                gcovr, version_cov_dir, tc_name,
+                filtered_files, subject_dir
+            )
+
+            # 5-5. keep only the executed lines and drop the gcovr document
+            if raw_cov.exists():
+                tc_cov = read_gcovr_coverage(tc_name, raw_cov)
+                os.remove(raw_cov)
+                if coverage_cache is not None:
+                    coverage_cache.store(tc_cache_keys[tc_name], *tc_cov)
 
-        # 4-5. Check if the buggy line is covered & if exclude_cct is True, exclude cct from passing tcs
+        # 5-6. Check if the buggy line is covered & if exclude_cct is True, exclude cct from passing tcs
         if tc_name in failing_tc_list:
-            buggy_line_cov = check_buggy_line_coverage(raw_cov, target_code_file_path, buggy_lineno)
+            buggy_line_cov = check_buggy_line_coverage(tc_cov, target_code_file_path, buggy_lineno)
             if buggy_line_cov == 1:
                 print(f"Buggy line {buggy_lineno} is not covered by {tc_name}")
-                # apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
+                # source_overlay.restore(target_code_file_path)
                 # exit(1)
             if buggy_line_cov == -2:
                 print(f"Failed to check coverage for {tc_name}")
-                # apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
+                # source_overlay.restore(target_code_file_path)
                 # exit(1)
             
             print(f"Testcase {tc_name} executed buggy line {buggy_lineno}")
         elif tc_name in passing_tc_list and exclude_cct == True:
-            buggy_line_cov = check_buggy_line_coverage(raw_cov, target_code_file_path, buggy_lineno)
+            buggy_line_cov = check_buggy_line_coverage(tc_cov, target_code_file_path, buggy_lineno)
             # value of buggy_line_cov is 0 if the buggy line is covered
             # value of buggy_line_cov is 1 if the buggy line is not covered
             if buggy_line_cov == 0:
                 cct_list.append(tc_name)
-                # delete raw_cov file
-                os.remove(raw_cov)
+                continue
+
+        # 5-7. add coverage to the store
+        if tc_cov is not None:
+            add_tc_coverage(coverage_store, tc_name, *tc_cov)
+
+    coverage_store.save(version_cov_dir / coverage_vectors_file)
+    print(f"Coverage store: {len(coverage_store.tc2vector)} test cases, {len(coverage_store.encoded_vectors)} unique coverage vectors")
     
-    # 5. Apply patch reverse
-    apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
+    # 6. Restore the target file
+    source_overlay.restore(target_code_file_path)
+
+    if coverage_cache is not None:
+        print(f"Coverage cache hits: {coverage_cache.hits}, misses: {coverage_cache.misses}")
 
     if len(cct_list) > 0:
         # remove cct test cases from passing test cases
@@ -323,41 +378,52 @@ def measure_coverage(
         f.write(content)
 
 
+def read_gcovr_coverage(tc_name, raw_cov):
+    # (instrumented lines, bitmap of the executed lines) of a gcovr document
+    measured = CoverageVectorStore()
+    measured.add_gcovr_json(tc_name, raw_cov)
+    return measured.lines, measured.tc_vector(tc_name)
+
+def add_tc_coverage(coverage_store, tc_name, lines, bitmap):
+    # the first test case fixes the line order of the store
+    if len(coverage_store.lines) == 0:
+        coverage_store.lines.extend(lines)
+    assert coverage_store.lines == lines, f"Lines of {tc_name} do not match with lines of the store"
+    coverage_store.add_vector(tc_name, bitmap)
+
 # returns 0 if the buggy line is covered
 # returns 1 if the buggy line is not covered
-def check_buggy_line_coverage(raw_cov, target_code_file, buggy_lineno):
-    with open(raw_cov, 'r') as f:
-        cov_data = json.load(f)
+def check_buggy_line_coverage(tc_cov, target_code_file, buggy_lineno):
+    if tc_cov is None:
+        return -2
+    lines, bitmap = tc_cov
 
     target_file = target_code_file.split('/')[-1]
     # target_file = target_file.split('.')[0]
 
-    filename_list = [file['file'] for file in cov_data['files']]
+    filename_list = set([line.rsplit('#', 1)[0] for line in lines])
 
     # WARNING: THE FILENAME MAY BE DIFFERENT ON OTHER SUBJECTS
     if target_file not in filename_list:
         return -2
 
+    buggy_line_id = line_id(target_file, int(buggy_lineno))
+    if buggy_line_id not in lines:
+        return 1
 
-    for file in cov_data['files']:
-        if file['file'] == target_file:
-            lines = file['lines']
-            for line in lines:
-                if line['line_number'] == int(buggy_lineno):
-                    print(f"Line: {line['line_number']}, count: {line['count']}")
-                    if line['count'] > 0:
-                        return 0
-                    else:
-                        return 1
-            return 1
-    return 1
-
-def generate_coverage_json(gcovr, version_cov_dir, tc_id, filtered_files, subject_dir):
+    covered = (bitmap >> lines.index(buggy_line_id)) & 1
+    print(f"Line: {buggy_lineno}, covered: {covered}")
+    return 0 if covered == 1 else 1
 
+def get_coverage_json_path(version_cov_dir, tc_id):
     tc_name = tc_id.split('.')[0]
     file_name = tc_name + '.raw.json'
     file_path = version_cov_dir / file_name
-    file_path = file_path.resolve()
+    return file_path.resolve()
+
+def generate_coverage_json(gcovr, version_cov_dir, tc_id, filtered_files, subject_dir):
+
+    file_path = get_coverage_json_path(version_cov_dir, tc_id)
     cmd = [
         gcovr,
         '--filter', filtered_files,
@@ -408,34 +474,6 @@ def run_tc(tc_script, tc_dir):
     return res.returncode
 
 
-def make_patch_file(target_code_file_path, buggy_code_file, core_working_dir):
-    patch_file = core_working_dir / f"buggy_version.patch"
-
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['diff', target_file.__str__(), buggy_code_file.__str__()]
-    sp.run(cmd, stdout=patch_file.open('w'))
-    
-    return patch_file
-
-def apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, revert=False):
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['patch']
-    if revert:
-        cmd.append('-R')
-    cmd.extend(['-i', patch_file.__str__(), target_file.__str__()])
-
-    res = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
-    if res.returncode != 0:
-        raise Exception(f'Failed to apply patch to {target_file.name} with buggy version {buggy_code_file.name}')
-    
-    print(f'Applied patch to {target_file.name} with buggy version {buggy_code_file.name} : revert={revert}')
-
-
-
 def execute_build_script(build_sh_wd, core_working_dir):
     global build_script
 
@@ -477,6 +515,7 @@ def make_parser():
     parser.add_argument('--version', type=str, help='Version name', required=True)
     parser.add_argument('--use-excluded-failing-tcs', action='store_true', help='Use excluded failing test cases')
     parser.add_argument('--exclude-ccts', action='store_true', help='Exclude cct test cases')
+    parser.add_argument('--no-coverage-cache', action='store_true', help='Do not reuse or store coverage in the coverage cache')
     return parser
 
 if __name__ == "__main__":
@@ -6,6 +6,9 @@ import json
 import subprocess as sp
 import os
 
+from executed_lines_index import ExecutedLinesIndex, executed_lines_index_file
+from coverage_vector_store import CoverageVectorStore, coverage_vectors_file
+
 # Current working directory
 script_path = Path(__file__).resolve()
 prepare_prerequisites_cmd_dir = script_path.parent
@@ -48,10 +51,6 @@ coverage_summary = {
     '#_total_lines': 0,
 }
 
-lines_execed_by_failing_tc = {}
-lines_execed_by_passing_tc = {}
-lines_execed = {}
-
 def main():
     parser = make_parser()
     args = parser.parse_args()
@@ -136,7 +135,7 @@ def postprocess_coverage(
         failing_tc_list, passing_tc_list,
         version_dir, buggy_line_key, line2function_dict
 ):
-    global coverage_summary, lines_execed_by_failing_tc, lines_execed_by_passing_tc
+    global coverage_summary
 
     # make coverage directory
     version_coverage_dir = version_dir / 'coverage_info'
@@ -152,45 +151,36 @@ def postprocess_coverage(
     total_tc_list = sorted(total_tc_list, key=custome_sort)
     print(f"Total test cases: {len(total_tc_list)}")
 
-
-    # make a csv file for coverage where the column is each test case
-    # and the row is each line key (filename#function_name#line_number)
-    # the contents is 0 or 1 (0: not covered, 1: covered)
-    first = True
-    cov_data = {
-        'col_data': [],
-        'row_data': []
-    }
-    for idx, tc_script_name in enumerate(total_tc_list):
-        print(f"Processing {idx+1}/{len(total_tc_list)}: {tc_script_name}")
-
-        tc_name = tc_script_name.split('.')[0]
-        tc_cov_filename = f"{tc_name}.raw.json"
-        tc_cov_file = version_cov_dir / tc_cov_filename
-        assert tc_cov_file.exists(), f"Test case coverage file {tc_cov_file} does not exist"
-
-        tc_cov_json = json.load(tc_cov_file.open())
-
-        if first:
-            first = False
-            add_key_data(cov_data, tc_cov_json, line2function_dict)
-        
-        add_cov_data(
-            cov_data, tc_cov_json, tc_script_name,
-            failing_tc_list, passing_tc_list,
-            line2function_dict, buggy_line_key
-        )
+    # get deduplicated coverage of each test case
+    coverage_store = get_coverage_store(version_cov_dir, total_tc_list)
+    coverage_store = coverage_store.subset(total_tc_list)
+    print(f"Unique coverage vectors: {len(coverage_store.encoded_vectors)} for {len(total_tc_list)} test cases")
+
+    # rename lines of the store to line keys (filename#function_name#line_number)
+    line_keys = make_line_keys(coverage_store, line2function_dict)
+    coverage_summary['#_total_lines'] = len(line_keys)
+    coverage_store = coverage_store.with_lines(line_keys)
+
+    # assert that failing tcs execute buggy line
+    if buggy_line_key in line_keys:
+        buggy_line_pos = line_keys.index(buggy_line_key)
+        for vector_id, tcs in coverage_store.classes(failing_tc_list).items():
+            assert (coverage_store.vector(vector_id) >> buggy_line_pos) & 1 == 1, f"Failing test cases {tcs} do not execute buggy line {buggy_line_key}"
+        print(f"All failing test cases execute buggy line {buggy_line_key}")
+
+    # make index of lines executed by failing and passing tcs
+    executed_lines_index = make_executed_lines_index(coverage_store, failing_tc_list, passing_tc_list)
     
-    coverage_summary['#_lines_executed_by_failing_tcs'] = len(lines_execed_by_failing_tc)
-    coverage_summary['#_lines_executed_by_passing_tcs'] = len(lines_execed_by_passing_tc)
-    coverage_summary['#_total_lines_executed'] = len(lines_execed)
+    coverage_summary['#_lines_executed_by_failing_tcs'] = len(executed_lines_index.lines_executed_by('failing'))
+    coverage_summary['#_lines_executed_by_passing_tcs'] = len(executed_lines_index.lines_executed_by('passing'))
+    coverage_summary['#_total_lines_executed'] = len(executed_lines_index.lines)
     
     # write coverage data to a csv file
     write_postprocessed_coverage(
-        version_coverage_dir, cov_data
+        version_coverage_dir, coverage_store, total_tc_list
     )
-    write_executed_lines(version_coverage_dir, lines_execed_by_failing_tc, 'lines_executed_by_failing_tc.json')
-    write_executed_lines(version_coverage_dir, lines_execed_by_passing_tc, 'lines_executed_by_passing_tc.json')
+    write_coverage_store(version_coverage_dir, coverage_store)
+    write_executed_lines_index(version_coverage_dir, executed_lines_index)
     write_summary(version_dir, coverage_summary)
     write_buggy_line_key(version_dir, buggy_line_key)
 
@@ -210,86 +200,86 @@ def write_summary(version_dir, coverage_summary):
     
     print(f"Coverage summary is saved at {cov_summary_file.name}")
 
-def write_executed_lines(version_coverage_dir, lines_execed_by_tc, filename):
-    lines_execed_by_tc_file = version_coverage_dir / filename
-    with open(lines_execed_by_tc_file, 'w') as f:
-        json.dump(lines_execed_by_tc, f)
+def write_executed_lines_index(version_coverage_dir, executed_lines_index):
+    index_file = version_coverage_dir / executed_lines_index_file
+    executed_lines_index.save(index_file)
     
-    print(f"Executed lines by test cases are saved at {lines_execed_by_tc_file.name}")
+    print(f"Executed lines by test cases are saved at {index_file.name}")
+
+def write_coverage_store(version_coverage_dir, coverage_store):
+    store_file = version_coverage_dir / coverage_vectors_file
+    coverage_store.save(store_file)
+
+    print(f"Coverage vectors are saved at {store_file.name}")
+
+def write_postprocessed_coverage(version_coverage_dir, coverage_store, total_tc_list):
+    # row: line key, col: test case, 1 if covered else 0
+    col_data = ['key'] + [tc_script_name.split('.')[0] for tc_script_name in total_tc_list]
 
-def write_postprocessed_coverage(version_coverage_dir, cov_data):
     cov_csv_file = version_coverage_dir / f"postprocessed_coverage.csv"
     with open(cov_csv_file, 'w') as f:
-        f.write(','.join(cov_data['col_data']) + '\n')
-
-        for row in cov_data['row_data']:
-            f.write(','.join([f"\"{str(x)}\"" for x in row]) + '\n')
+        f.write(','.join(col_data) + '\n')
+
+        # lines of the same block have the same row, format each row once
+        row_strs = {}
+        for key, bitmap in zip(coverage_store.lines, coverage_store.line_tc_bitmaps(total_tc_list)):
+            if bitmap not in row_strs:
+                bits = format(bitmap, f"0{len(total_tc_list)}b")[::-1] if len(total_tc_list) > 0 else ''
+                row_strs[bitmap] = ',"' + '","'.join(bits) + '"' if len(bits) > 0 else ''
+            f.write(f"\"{key}\"" + row_strs[bitmap] + '\n')
     
     print(f"Coverage csv file is saved at {cov_csv_file.name}")
 
 
+def make_executed_lines_index(coverage_store, failing_tc_list, passing_tc_list):
+    # tc ids of the index: failing tcs first, then passing tcs
+    tc_groups = {
+        'failing': failing_tc_list,
+        'passing': passing_tc_list
+    }
+    index_tc_list = failing_tc_list + passing_tc_list
 
-def add_cov_data(
-        cov_data, tc_cov_json, tc_script_name,
-        failing_tc_list, passing_tc_list,
-        line2function_dict, buggy_line_key
-):
-    global coverage_summary, lines_execed_by_failing_tc, lines_execed_by_passing_tc
+    # bitmap over index tc ids of every line, built row-wise from the coverage classes
+    line_bitmaps = dict(zip(coverage_store.lines, coverage_store.line_tc_bitmaps(index_tc_list)))
 
-    tc_name = tc_script_name.split('.')[0]
-    cov_data['col_data'].append(tc_name)
+    return ExecutedLinesIndex.from_bitmaps(tc_groups, line_bitmaps)
 
-    pass_or_fail = False if tc_script_name in failing_tc_list else True
-    if pass_or_fail:
-        assert tc_script_name in passing_tc_list, f"Test case {tc_script_name} is not in passing test cases"
-    
-    cnt = 0
-    for file in tc_cov_json['files']:
-        filename = file['file']
-        for i in range(len(file['lines'])):
-            line = file['lines'][i]
-            lineno = line['line_number']
-            key = make_key(filename, lineno, line2function_dict)
-            assert key == cov_data['row_data'][cnt][0], f"Key {key} does not match with the row data key {cov_data['row_data'][i][0]}"
-
-            covered = 1 if line['count'] > 0 else 0
-            cov_data['row_data'][cnt].append(covered)
-
-            if covered == 1:
-                if key not in lines_execed:
-                    lines_execed[key] = 0
-                lines_execed[key] += 1
-
-                if pass_or_fail:
-                    if key not in lines_execed_by_passing_tc:
-                        lines_execed_by_passing_tc[key] = []
-                    lines_execed_by_passing_tc[key].append(tc_script_name)
-                else:
-                    if key not in lines_execed_by_failing_tc:
-                        lines_execed_by_failing_tc[key] = []
-                    lines_execed_by_failing_tc[key].append(tc_script_name)
-
-            # assert that failing line executes buggy line
-            if not pass_or_fail and key == buggy_line_key:
-                assert covered == 1, f"Failing test case {tc_script_name} does not execute buggy line {buggy_line_key}"
-                print(f"Failing test case {tc_script_name} executes buggy line {buggy_line_key}")
-            
-            cnt += 1
-                    
-
-def add_key_data(cov_data, tc_cov_json, line2function_dict):
-    global coverage_summary
-    cov_data['col_data'].append('key')
-
-    for file in tc_cov_json['files']:
-        filename = file['file']
-        for line in file['lines']:
-            lineno = line['line_number']
-            key = make_key(filename, lineno, line2function_dict)
-            
-            assert [key] not in cov_data['row_data'], f"Key {key} already exists in the row data"
-            cov_data['row_data'].append([key])
-            coverage_summary['#_total_lines'] += 1
+
+def make_line_keys(coverage_store, line2function_dict):
+    line_keys = []
+    key_set = set()
+    for line in coverage_store.lines:
+        filename, lineno = line.rsplit('#', 1)
+        key = make_key(filename, lineno, line2function_dict)
+
+        assert key not in key_set, f"Key {key} already exists in the row data"
+        key_set.add(key)
+        line_keys.append(key)
+    return line_keys
+
+
+def get_coverage_store(version_cov_dir, total_tc_list):
+    store_file = version_cov_dir / coverage_vectors_file
+    if store_file.exists():
+        coverage_store = CoverageVectorStore.load(store_file)
+        missing_tcs = [tc for tc in total_tc_list if tc not in coverage_store.tc2vector]
+        if len(missing_tcs) == 0:
+            return coverage_store
+        print(f"Coverage store misses {len(missing_tcs)} test cases, reading gcovr json files")
+
+    # coverage measured before the store existed: one gcovr json per tc
+    coverage_store = CoverageVectorStore()
+    for idx, tc_script_name in enumerate(total_tc_list):
+        print(f"Processing {idx+1}/{len(total_tc_list)}: {tc_script_name}")
+
+        tc_name = tc_script_name.split('.')[0]
+        tc_cov_filename = f"{tc_name}.raw.json"
+        tc_cov_file = version_cov_dir / tc_cov_filename
+        assert tc_cov_file.exists(), f"Test case coverage file {tc_cov_file} does not exist"
+
+        coverage_store.add_gcovr_json(tc_script_name, tc_cov_file)
+
+    return coverage_store
 
 def make_key(target_code_file_path, buggy_lineno, line2function_dict):
     filename = target_code_file_path.split('/')[-1]
@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import hashlib
+import json
+import os
+
+from executed_lines_index import encode_bitmap, decode_bitmap
+
+# Content-addressed cache of per-TC coverage (executed lines only).
+#
+# A coverage vector only depends on the built code and the test case, so it
+# is stored under a key made of:
+#   - the hash of every target file as it is on disk (buggy patch applied)
+#   - the hash of the configure and build scripts (compiler and flags)
+#   - the gcovr filter used to measure the coverage
+#   - the test case name and the hash of its script
+# Re-running 02-3_measure_coverage.py (--use-excluded-failing-tcs,
+# --exclude-ccts, retest after 04-6) then only executes test cases that are
+# new or whose source changed.
+#
+# An entry keeps only what coverage_vector_store.py needs: the covered-line
+# bitmap (same encoding as executed_lines_index.py) and the hash of the
+# instrumented line list. The line list itself is the same for every test
+# case of a build, so it is stored once under lines/<hash>.json.
+#
+# The cache lives in <subject>-working_directory/coverage_cache/ so it is
+# shared by all cores of a machine. Entries are written to a temporary file
+# and renamed, so concurrent workers never read a half written entry.
+
+coverage_cache_dir_name = 'coverage_cache'
+
+
+def file_hash(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class CoverageCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.lines_memo = {}
+
+    def source_hash(self, target_files, filtered_files, script_files):
+        # script_files: configure and build scripts the coverage build is made with
+        sha = hashlib.sha256()
+        sha.update(filtered_files.encode())
+        for target_file in sorted(target_files, key=lambda x: str(x)):
+            sha.update(str(Path(target_file).name).encode())
+            sha.update(file_hash(target_file).encode())
+        for script_file in script_files:
+            sha.update(str(Path(script_file).name).encode())
+            sha.update(file_hash(script_file).encode())
+        return sha.hexdigest()
+
+    def tc_key(self, source_hash, tc_name, tc_dir):
+        tc_script = Path(tc_dir) / tc_name
+        tc_script_hash = file_hash(tc_script) if tc_script.exists() else 'no-script'
+
+        sha = hashlib.sha256()
+        sha.update(source_hash.encode())
+        sha.update(tc_name.encode())
+        sha.update(tc_script_hash.encode())
+        return sha.hexdigest()
+
+    def entry_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def lines_path(self, lines_hash):
+        return self.cache_dir / 'lines' / f"{lines_hash}.json"
+
+    def contains(self, key):
+        return self.entry_path(key).exists()
+
+    def fetch(self, key):
+        # (lines, bitmap over the line positions) of the cached coverage, None on miss
+        entry = self.entry_path(key)
+        if not entry.exists():
+            self.misses += 1
+            return None
+        with open(entry, 'r') as f:
+            data = json.load(f)
+
+        lines_hash = data['lines']
+        if lines_hash not in self.lines_memo:
+            with open(self.lines_path(lines_hash), 'r') as f:
+                self.lines_memo[lines_hash] = json.load(f)
+        self.hits += 1
+        return self.lines_memo[lines_hash], decode_bitmap(data['vector'])
+
+    def store(self, key, lines, bitmap):
+        lines_data = json.dumps(lines)
+        lines_hash = hashlib.sha256(lines_data.encode()).hexdigest()
+        lines_file = self.lines_path(lines_hash)
+        if not lines_file.exists():
+            write_atomic(lines_file, lines_data)
+
+        data = {'lines': lines_hash, 'vector': encode_bitmap(bitmap)}
+        write_atomic(self.entry_path(key), json.dumps(data))
+
+
+def write_atomic(file_path, content):
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = file_path.parent / f".{file_path.name}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(content)
+    os.replace(tmp_file, file_path)
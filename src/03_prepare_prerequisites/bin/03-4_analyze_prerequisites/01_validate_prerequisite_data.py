@@ -6,6 +6,9 @@ import json
 import subprocess as sp
 import csv
 
+from executed_lines_index import ExecutedLinesIndex, executed_lines_index_file
+from validation_runner import run_validation
+
 # Current working directory
 script_path = Path(__file__).resolve()
 analyze_prerequisites = script_path.parent
@@ -37,14 +40,21 @@ copy_real_world_buggy_versions = 'copy_real_world_buggy_versions'
 failing_txt = 'failing_tcs.txt'
 passing_txt = 'passing_tcs.txt'
 
+# files read to validate a buggy version (validation_runner.py)
+input_files = [
+    'bug_info.csv', 'buggy_line_key.txt', 'coverage_summary.csv',
+    f'testsuite_info/{failing_txt}', 'coverage_info/postprocessed_coverage.csv',
+    f'coverage_info/{executed_lines_index_file}', 'line2function_info/line2function.json',
+]
+
 
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject)
+    start_process(args.subject, args.processes, args.revalidate)
 
 
-def start_process(subject_name):
+def start_process(subject_name, processes=None, revalidate=False):
     global configure_json_file
 
     subject_working_dir = prepare_prerequisites_dir / f"{subject_name}-working_directory"
@@ -53,65 +63,73 @@ def start_process(subject_name):
     # 1. Read configurations
     configs = read_configs(subject_name, subject_working_dir)
 
-    # 2. read test suite and generate summary of statistics
-    prerequisite_data_per_bug = get_buggy_versions(subject_working_dir, "prerequisite_data")
+    # 2. validate the buggy versions changed since the last validation in a process pool
+    report = run_validation(
+        subject_working_dir / "prerequisite_data", validate_prerequisite_data, input_files,
+        [script_path, analyze_prerequisites / 'validation_runner.py'], processes, revalidate
+    )
+    assert report['num_failed'] == 0, f"{report['num_failed']} of {report['num_versions']} bugs failed validation"
 
-    # 3. validate reduced test suite
-    validate_reduced_test_suite(subject_working_dir, prerequisite_data_per_bug)
+    print(f"All {report['num_versions']} bugs have been validated successfully")
 
-def validate_reduced_test_suite(subject_working_dir, prerequisite_data_per_bug):
-    for idx, bug_dir in enumerate(prerequisite_data_per_bug):
-        bug_name = bug_dir.name
-        print(f"Validating {idx+1}/{len(prerequisite_data_per_bug)}: {bug_name}")
 
-        # GET: buggy lineno from bug_info.csv
-        bug_info = bug_dir / 'bug_info.csv'
-        assert bug_info.exists(), f"Bug info file {bug_info} does not exist"
-        target_file, bug_file, bug_lineno = get_bug_info(bug_info)
+def validate_prerequisite_data(bug_dir):
+    bug_name = bug_dir.name
 
-        # VALIDATE: Assert that buggy_line_key.txt exists
-        buggy_line_key_file = bug_dir / 'buggy_line_key.txt'
-        assert buggy_line_key_file.exists(), f"Buggy line key file {buggy_line_key_file} does not exist"
-        buggy_line_key = check_buggy_lineno(buggy_line_key_file, bug_lineno)
+    # GET: buggy lineno from bug_info.csv
+    bug_info = bug_dir / 'bug_info.csv'
+    assert bug_info.exists(), f"Bug info file {bug_info} does not exist"
+    target_file, bug_file, bug_lineno = get_bug_info(bug_info)
 
-        # VALIDATE: Assert that coverage_summary.csv exists
-        coverage_summary = bug_dir / 'coverage_summary.csv'
-        assert coverage_summary.exists(), f"Coverage summary file {coverage_summary} does not exist"
+    # VALIDATE: Assert that buggy_line_key.txt exists
+    buggy_line_key_file = bug_dir / 'buggy_line_key.txt'
+    assert buggy_line_key_file.exists(), f"Buggy line key file {buggy_line_key_file} does not exist"
+    buggy_line_key = check_buggy_lineno(buggy_line_key_file, bug_lineno)
 
-        # GET: failing_tcs.txt and passing_tcs.txt
-        failing_tc_list = get_tcs(bug_dir, failing_txt)
+    # VALIDATE: Assert that coverage_summary.csv exists
+    coverage_summary = bug_dir / 'coverage_summary.csv'
+    assert coverage_summary.exists(), f"Coverage summary file {coverage_summary} does not exist"
 
-        # VALIDATE: Assert that coverage_info/postprocessed_coverage.csv exists
-        postprocessed_coverage = bug_dir / 'coverage_info' / 'postprocessed_coverage.csv'
-        assert postprocessed_coverage.exists(), f"Postprocessed coverage file {postprocessed_coverage} does not exist"
+    # GET: failing_tcs.txt and passing_tcs.txt
+    failing_tc_list = get_tcs(bug_dir, failing_txt)
 
-        # VALIDATE: Assert the failing TCs execute the buggy line in postprocessed_coverage.csv
-        result = check_failing_tcs(postprocessed_coverage, failing_tc_list, buggy_line_key)
+    # VALIDATE: Assert that coverage_info/postprocessed_coverage.csv exists
+    postprocessed_coverage = bug_dir / 'coverage_info' / 'postprocessed_coverage.csv'
+    assert postprocessed_coverage.exists(), f"Postprocessed coverage file {postprocessed_coverage} does not exist"
 
-        # VALIDATE: Assert that coverage_info/lines_executed_by_failing_tc.json exists
-        lines_executed_by_failing_tc = bug_dir / 'coverage_info' / 'lines_executed_by_failing_tc.json'
-        assert lines_executed_by_failing_tc.exists(), f"Lines executed by failing test cases file {lines_executed_by_failing_tc} does not exist"
-        lines_executed_by_failing_tc_dict = json.load(lines_executed_by_failing_tc.open())
-        assert lines_executed_by_failing_tc_dict is not None, f"Lines executed by failing test cases dictionary is empty for {bug_name}"
+    # VALIDATE: Assert the failing TCs execute the buggy line in postprocessed_coverage.csv
+    result = check_failing_tcs(postprocessed_coverage, failing_tc_list, buggy_line_key)
+    assert result, f"Buggy line {buggy_line_key} is not executed by every failing test case in {postprocessed_coverage}"
 
-        # VALIDATE: Assert that line2function_info/line2function.json exists
-        line2function_info = bug_dir / 'line2function_info' / 'line2function.json'
-        assert line2function_info.exists(), f"Line to function mapping file {line2function_info} does not exist"
-    
-    print(f"All {len(prerequisite_data_per_bug)} bugs have been validated successfully")
+    # VALIDATE: Assert that coverage_info/executed_lines_index.json exists
+    executed_lines_index_path = bug_dir / 'coverage_info' / executed_lines_index_file
+    assert executed_lines_index_path.exists(), f"Executed lines index file {executed_lines_index_path} does not exist"
+    executed_lines_index = ExecutedLinesIndex.load(executed_lines_index_path)
+    assert len(executed_lines_index.lines_executed_by('failing')) > 0, f"Lines executed by failing test cases is empty for {bug_name}"
+
+    # VALIDATE: Assert that the buggy line is executed by the failing TCs in the index
+    assert executed_lines_index.is_executed_by(buggy_line_key, 'failing'), f"Buggy line {buggy_line_key} is not executed by failing test cases in the index of {bug_name}"
+
+    # VALIDATE: Assert that line2function_info/line2function.json exists
+    line2function_info = bug_dir / 'line2function_info' / 'line2function.json'
+    assert line2function_info.exists(), f"Line to function mapping file {line2function_info} does not exist"
 
 
 def check_failing_tcs(postprocessed_coverage, failing_tc_list, buggy_line_key):
+    # only reads up to the row of the buggy line
     with open(postprocessed_coverage, 'r') as f:
-        reader = csv.DictReader(f)
+        reader = csv.reader(f)
+        header = next(reader)
+        col2idx = {col: idx for idx, col in enumerate(header)}
 
         for row in reader:
-            if row['key'] == buggy_line_key:
+            if row[0] == buggy_line_key:
                 for failing_tc in failing_tc_list:
                     tc_name = failing_tc.split('.')[0]
-                    if row[tc_name] == '0':
+                    if row[col2idx[tc_name]] == '0':
                         return False
                 return True
+    return False
 
 
 def custome_sort(tc_script):
@@ -201,6 +219,8 @@ def read_configs(subject_name, subject_working_dir):
 def make_parser():
     parser = argparse.ArgumentParser(description='Copy subject to working directory')
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--processes', type=int, default=None, help='Number of processes (default: number of cores)')
+    parser.add_argument('--revalidate', action='store_true', help='Validate every buggy version, ignoring the results of the last validation')
     return parser
     
 
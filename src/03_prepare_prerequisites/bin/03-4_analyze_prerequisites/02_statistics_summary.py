@@ -5,6 +5,8 @@ import argparse
 import json
 import subprocess as sp
 
+from dataset_store import DatasetStore, default_store_dir
+
 # Current working directory
 script_path = Path(__file__).resolve()
 analyze_prerequisites = script_path.parent
@@ -36,14 +38,21 @@ copy_real_world_buggy_versions = 'copy_real_world_buggy_versions'
 failing_txt = 'failing_tcs.txt'
 passing_txt = 'passing_tcs.txt'
 
+# columns of coverage_summary.csv (02-4_postprocess_coverage.py)
+coverage_summary_columns = [
+    '#_failing_tcs', '#_passing_tcs', '#_cc_tcs', '#_excluded_failing_tcs', '#_excluded_passing_tcs',
+    '#_total_utilized_tcs', '#_lines_executed_by_failing_tcs', '#_lines_executed_by_passing_tcs',
+    '#_total_lines_executed', '#_total_lines'
+]
+
 
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject)
+    start_process(args.subject, args.use_dataset)
 
 
-def start_process(subject_name):
+def start_process(subject_name, use_dataset=False):
     global configure_json_file
 
     subject_working_dir = prepare_prerequisites_dir / f"{subject_name}-working_directory"
@@ -55,10 +64,55 @@ def start_process(subject_name):
     # 2. read test suite and generate summary of statistics
     prerequisite_data_per_bug = get_buggy_versions(subject_working_dir, "prerequisite_data")
 
-    # 3. make summary according to coverage_summary.csv
-    make_summary(subject_working_dir, prerequisite_data_per_bug)
+    # 3. read coverage_summary.csv of every buggy version
+    # (from the version directories, or from the dataset store of the set)
+    if use_dataset:
+        coverage_summaries = load_coverage_summaries(subject_working_dir / "prerequisite_data", prerequisite_data_per_bug)
+    else:
+        coverage_summaries = read_coverage_summaries(prerequisite_data_per_bug)
+
+    # 4. make summary according to coverage_summary.csv
+    make_summary(subject_working_dir, coverage_summaries)
+
+
+def read_coverage_summaries(prerequisite_data_per_bug):
+    # [(bug name, values of coverage_summary.csv)]
+    coverage_summaries = []
+    for bug_dir in prerequisite_data_per_bug:
+        # GET: coverage_summary.csv
+        coverage_summary_file = bug_dir / 'coverage_summary.csv'
+        assert coverage_summary_file.exists(), f"Coverage summary file {coverage_summary_file} does not exist"
+
+        with open(coverage_summary_file, 'r') as f:
+            lines = f.readlines()
+            assert len(lines) == 2, f"Coverage summary file {coverage_summary_file} is not in correct format"
+
+            line = lines[1].strip()
+            coverage_summaries.append((bug_dir.name, line.split(',')))
+    return coverage_summaries
+
 
-def make_summary(subject_working_dir, prerequisite_data_per_bug):
+def load_coverage_summaries(set_dir, prerequisite_data_per_bug):
+    # [(bug name, values of coverage_summary.csv)] from the bug_info table of the dataset store
+    store = DatasetStore.open(default_store_dir(set_dir))
+    bug_names = [bug_dir.name for bug_dir in prerequisite_data_per_bug]
+    stored_versions = set(store.versions())
+    missing = [bug_name for bug_name in bug_names if bug_name not in stored_versions]
+    assert len(missing) == 0, f"{len(missing)} buggy versions are not in the dataset store, build it again"
+
+    bug_info = store.bug_info(bug_names)
+    for name in coverage_summary_columns:
+        assert name in bug_info, f"Column {name} is not in the bug_info table of the dataset store"
+
+    version2idx = {version: idx for idx, version in enumerate(bug_info['version'])}
+    coverage_summaries = []
+    for bug_name in bug_names:
+        idx = version2idx[bug_name]
+        coverage_summaries.append((bug_name, [str(bug_info[name][idx]) for name in coverage_summary_columns]))
+    return coverage_summaries
+
+
+def make_summary(subject_working_dir, coverage_summaries):
     num_failing_tcs = []
     num_passing_tcs = []
     num_ccts = []
@@ -83,42 +137,29 @@ def make_summary(subject_working_dir, prerequisite_data_per_bug):
 
     buggy_versions_with_big_lines_executed_by_failing_tcs = []
 
-    for bug_dir in prerequisite_data_per_bug:
-        bug_name = bug_dir.name
-
-        # GET: coverage_summary.csv
-        coverage_summary_file = bug_dir / 'coverage_summary.csv'
-        assert coverage_summary_file.exists(), f"Coverage summary file {coverage_summary_file} does not exist"
-
-        with open(coverage_summary_file, 'r') as f:
-            lines = f.readlines()
-            assert len(lines) == 2, f"Coverage summary file {coverage_summary_file} is not in correct format"
-
-            line = lines[1].strip()
-            info = line.split(',')
-
-            num_failing_tcs.append(int(info[0]))
-            num_passing_tcs.append(int(info[1]))
-            num_ccts.append(int(info[2]))
-            num_excluded_failing_tcs.append(int(info[3]))
-            num_excluded_passing_tcs.append(int(info[4]))
-            # num_excluded_tcs.append(int(info[5]))
-            num_utilized_tcs.append(int(info[5]))
-            num_lines_executed_by_failing_tcs.append(int(info[6]))
-            num_lines_executed_by_passing_tcs.append(int(info[7]))
-            num_total_lines_executed.append(int(info[8]))
-            num_total_lines.append(int(info[9]))
-
-            if int(info[6]) > 6000:
-                buggy_versions_with_big_lines_executed_by_failing_tcs.append(bug_name)
-                
-            coverage = int(info[8]) / int(info[9])
-            all_coverage.append(coverage)
+    for bug_name, info in coverage_summaries:
+        num_failing_tcs.append(int(info[0]))
+        num_passing_tcs.append(int(info[1]))
+        num_ccts.append(int(info[2]))
+        num_excluded_failing_tcs.append(int(info[3]))
+        num_excluded_passing_tcs.append(int(info[4]))
+        # num_excluded_tcs.append(int(info[5]))
+        num_utilized_tcs.append(int(info[5]))
+        num_lines_executed_by_failing_tcs.append(int(info[6]))
+        num_lines_executed_by_passing_tcs.append(int(info[7]))
+        num_total_lines_executed.append(int(info[8]))
+        num_total_lines.append(int(info[9]))
+
+        if int(info[6]) > 6000:
+            buggy_versions_with_big_lines_executed_by_failing_tcs.append(bug_name)
             
-            info.append(coverage)
-            info.insert(0, bug_name)
+        coverage = int(info[8]) / int(info[9])
+        all_coverage.append(coverage)
+        
+        info.append(coverage)
+        info.insert(0, bug_name)
 
-            statics_summary_fp.write(','.join([str(i) for i in info]) + '\n')
+        statics_summary_fp.write(','.join([str(i) for i in info]) + '\n')
 
 
     statics_summary_fp.close()
@@ -201,6 +242,7 @@ def read_configs(subject_name, subject_working_dir):
 def make_parser():
     parser = argparse.ArgumentParser(description='Copy subject to working directory')
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--use-dataset', action='store_true', help='Read coverage_summary.csv of the buggy versions from the dataset store of prerequisite_data (see dataset_store.py)')
     return parser
     
 
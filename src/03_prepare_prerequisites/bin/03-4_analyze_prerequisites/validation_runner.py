@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import hashlib
+import json
+import multiprocessing
+import time
+
+from dataset_store import DatasetStore, default_store_dir, version_signature
+
+# Validation of every buggy version of a gathered set (ex. prerequisite_data/,
+# mbfl_features/, sbfl_features/) in a process pool, re-validating only the
+# versions whose inputs changed since the last run.
+#
+# A validator is a function (version directory) that raises on the first
+# failed check (AssertionError with its message, as the validation scripts
+# do). The inputs of a set are the files, relative to a version directory,
+# that the validator reads.
+#
+# Next to the set:
+#   <set>.validation_manifest.json
+#       'checks':   sha256 of the validation scripts, every version is
+#                   validated again when they change
+#       'versions': {version: {'inputs': {file: [size, mtime_ns, sha256] or null
+#                   when missing}, 'passed': bool, 'message': str}}
+#   <set>.validation_report.json
+#       the result of the last run, with every failed version and its message
+#       (failures of unchanged versions are kept from the manifest)
+#
+# A version is unchanged when the size and mtime of its inputs are those of
+# the manifest. Otherwise its inputs are hashed in the worker, and it is
+# validated again only if their contents changed (a file touched or copied
+# back keeps its result).
+
+
+def validation_manifest_file(set_dir):
+    set_dir = Path(set_dir)
+    return set_dir.parent / f"{set_dir.name}.validation_manifest.json"
+
+
+def validation_report_file(set_dir):
+    set_dir = Path(set_dir)
+    return set_dir.parent / f"{set_dir.name}.validation_report.json"
+
+
+def file_stat(file):
+    if not file.exists():
+        return None
+    stat = file.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def file_hash(file):
+    sha = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def checks_signature(check_files):
+    sha = hashlib.sha256()
+    for file in check_files:
+        sha.update(f"{Path(file).name}:{file_hash(file)}\n".encode())
+    return sha.hexdigest()
+
+
+def input_signature(version_dir, input_files, previous_inputs={}):
+    # {file: [size, mtime_ns, sha256]}, hashing only the files whose size or
+    # mtime is not the one of previous_inputs
+    inputs = {}
+    for name in input_files:
+        stat = file_stat(version_dir / name)
+        previous = previous_inputs.get(name)
+        if stat is None:
+            inputs[name] = None
+        elif previous is not None and previous[:2] == stat:
+            inputs[name] = previous
+        else:
+            inputs[name] = stat + [file_hash(version_dir / name)]
+    return inputs
+
+
+def unchanged_stats(version_dir, input_files, previous_inputs):
+    if set(input_files) != set(previous_inputs.keys()):
+        return False
+    for name in input_files:
+        stat = file_stat(version_dir / name)
+        previous = previous_inputs[name]
+        if (stat is None) != (previous is None):
+            return False
+        if stat is not None and previous[:2] != stat:
+            return False
+    return True
+
+
+def same_contents(inputs, previous_inputs):
+    def contents(values):
+        return {name: None if value is None else value[2] for name, value in values.items()}
+    return contents(inputs) == contents(previous_inputs)
+
+
+def run_validator(job):
+    # (version name, manifest entry, whether the validator was run)
+    validator, version_dir, input_files, previous = job
+    previous_inputs = previous['inputs'] if previous is not None else {}
+    inputs = input_signature(version_dir, input_files, previous_inputs)
+    if previous is not None and same_contents(inputs, previous_inputs):
+        return version_dir.name, {'inputs': inputs, 'passed': previous['passed'], 'message': previous['message']}, False
+
+    try:
+        validator(version_dir)
+        passed, message = True, ''
+    except Exception as e:
+        passed, message = False, f"{type(e).__name__}: {e}"
+    return version_dir.name, {'inputs': inputs, 'passed': passed, 'message': message}, True
+
+
+def dataset_status(set_dir, features_files=[]):
+    # versions of the set missing from or changed since the dataset store of
+    # the set (dataset_store.py), None when the set has no store
+    store_dir = default_store_dir(set_dir)
+    if not store_dir.exists():
+        return None
+    store = DatasetStore.open(store_dir)
+    missing = []
+    stale = []
+    for version_dir in sorted(version_dir for version_dir in Path(set_dir).iterdir() if version_dir.is_dir()):
+        stored = store.manifest['versions'].get(version_dir.name)
+        if stored is None:
+            missing.append(version_dir.name)
+        elif stored['signature'] != version_signature(version_dir, features_files):
+            stale.append(version_dir.name)
+    return {'store': store_dir.name, 'missing': missing, 'stale': stale}
+
+
+def write_json(json_file, data):
+    tmp_file = json_file.parent / f".{json_file.name}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f, indent=2)
+    tmp_file.replace(json_file)
+
+
+def run_validation(set_dir, validator, input_files, check_files, processes=None, revalidate=False, features_files=[]):
+    # validates the versions of set_dir, writes the manifest and the report,
+    # returns the report
+    set_dir = Path(set_dir)
+    assert set_dir.exists(), f"Buggy versions directory {set_dir} does not exist"
+
+    # 1. results of the last run, unless the checks changed
+    manifest_file = validation_manifest_file(set_dir)
+    previous_versions = {}
+    checks = checks_signature(check_files)
+    if manifest_file.exists() and not revalidate:
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+        if manifest['checks'] == checks:
+            previous_versions = manifest['versions']
+        else:
+            print(f"Validation scripts changed since the last run, validating every version")
+
+    # 2. keep the results of the versions whose inputs did not change
+    version_dirs = sorted(version_dir for version_dir in set_dir.iterdir() if version_dir.is_dir())
+    entries = {}
+    jobs = []
+    for version_dir in version_dirs:
+        previous = previous_versions.get(version_dir.name)
+        if previous is not None and unchanged_stats(version_dir, input_files, previous['inputs']):
+            entries[version_dir.name] = previous
+        else:
+            jobs.append((validator, version_dir, input_files, previous))
+    print(f"{len(entries)} of {len(version_dirs)} versions are unchanged since the last validation")
+
+    # 3. validate the others in a process pool
+    start_time = time.time()
+    num_validated = 0
+    if len(jobs) > 0:
+        with multiprocessing.Pool(processes) as pool:
+            for idx, (version_name, entry, validated) in enumerate(pool.imap_unordered(run_validator, jobs)):
+                entries[version_name] = entry
+                num_validated += int(validated)
+                status = 'passed' if entry['passed'] else 'FAILED'
+                print(f"Validated {idx+1}/{len(jobs)}: {version_name} {status}")
+    print(f"Validated {num_validated} versions in {time.time() - start_time:.2f}s")
+
+    write_json(manifest_file, {'checks': checks, 'versions': {name: entries[name] for name in sorted(entries)}})
+
+    # 4. report the failures
+    failures = [
+        {'version': name, 'message': entries[name]['message']}
+        for name in sorted(entries) if not entries[name]['passed']
+    ]
+    report = {
+        'set': set_dir.name,
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'num_versions': len(version_dirs),
+        'num_validated': num_validated,
+        'num_unchanged': len(version_dirs) - num_validated,
+        'num_failed': len(failures),
+        'failures': failures,
+        'dataset': dataset_status(set_dir, features_files),
+    }
+    report_file = validation_report_file(set_dir)
+    write_json(report_file, report)
+
+    for failure in failures:
+        print(f"FAILED {failure['version']}: {failure['message']}")
+    if report['dataset'] is not None and len(report['dataset']['missing']) + len(report['dataset']['stale']) > 0:
+        print(f"{len(report['dataset']['missing'])} versions are missing from and {len(report['dataset']['stale'])} versions changed since {report['dataset']['store']}, build it again")
+    print(f"Report is written to {report_file}")
+    return report
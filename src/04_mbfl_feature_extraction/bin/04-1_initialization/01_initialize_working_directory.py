@@ -90,6 +90,8 @@ def initialize_working_directory(configs, subject_name):
 
     configure_file = new_configure_dir / configure_no_cov_script
     assert configure_file.exists(), 'Configure script does not exist'
+    configure_cov_file = new_configure_dir / configure_yes_cov_script
+    assert configure_cov_file.exists(), 'Configure script with coverage does not exist'
     build_file = new_configure_dir / build_script
     assert build_file.exists(), 'Build script does not exist'
     clean_build_file = new_configure_dir / clean_script
@@ -100,6 +102,12 @@ def initialize_working_directory(configs, subject_name):
     if res != 0:
         raise Exception('Failed to copy configure script to working directory')
     
+    # configure script with coverage, for the delta retest of 04-5
+    cmd = ['cp', configure_cov_file, configure_file_position]
+    res = sp.call(cmd)
+    if res != 0:
+        raise Exception('Failed to copy configure script with coverage to working directory')
+    
     cmd = ['cp', build_file, build_file_position]
     res = sp.call(cmd)
     if res != 0:
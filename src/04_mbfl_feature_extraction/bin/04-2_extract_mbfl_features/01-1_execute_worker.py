@@ -3,6 +3,7 @@
 from pathlib import Path
 import argparse
 import json
+import os
 import subprocess as sp
 
 # Current working directory
@@ -49,10 +50,13 @@ def start_process(subject_name, worker_name):
     # 2. get list assigned buggy versions (is a path to the buggy versions directory)
     assigned_versions_list = get_assigned_buggy_versions(configs, core_working_dir)
 
-    extract_mbfl_features(configs, core_working_dir, worker_name, assigned_versions_list,subject_name)
+    # 3. get the cores of the machine this worker may use for MUSICUP
+    music_jobs = get_worker_core_budget(configs, subject_working_dir, worker_name)
 
+    extract_mbfl_features(configs, core_working_dir, worker_name, assigned_versions_list, subject_name, music_jobs)
 
-def extract_mbfl_features(configs, core_working_dir, worker_name, assigned_versions_list, subject_name):
+
+def extract_mbfl_features(configs, core_working_dir, worker_name, assigned_versions_list, subject_name, music_jobs=1):
 
     # 3. generate mutants
         # 1. Apply buggy version code
@@ -79,7 +83,8 @@ def extract_mbfl_features(configs, core_working_dir, worker_name, assigned_versi
             'python3', generate_mutants,
             '--subject', subject_name,
             '--worker', worker_name,
-            '--version', version_name
+            '--version', version_name,
+            '--music-jobs', str(music_jobs)
         ]
         res = sp.run(cmd)
         if res.returncode != 0:
@@ -121,6 +126,26 @@ def extract_mbfl_features(configs, core_working_dir, worker_name, assigned_versi
         print(f">> Finished working on version: {version_name}\n")
 
 
+def get_worker_core_budget(configs, subject_working_dir, worker_name):
+    # every worker of the machine gets an equal share of its cores
+    # (worker name: <machine-name>/<core-id>, workers per machine from machines.json
+    # or single_machine of configurations.json)
+    machine_name = worker_name.split('/')[0]
+    machine_workers = configs['single_machine']['machine_cores']
+    if configs['use_distributed_machines']:
+        machines_json = subject_working_dir / f"{configs['subject_name']}-configures" / machines_json_file
+        assert machines_json.exists(), f"Machines json file {machines_json} does not exist"
+        with machines_json.open() as f:
+            machines = json.load(f)
+        assert machine_name in machines, f"Machine {machine_name} is not in {machines_json}"
+        machine_workers = machines[machine_name]
+
+    cpu_cnt = os.cpu_count() or 1
+    music_jobs = max(1, cpu_cnt // max(1, machine_workers))
+    print(f"MUSICUP processes per version: {music_jobs} ({cpu_cnt} cores, {machine_workers} workers on {machine_name})")
+    return music_jobs
+
+
 def get_assigned_buggy_versions(configs, core_working_dir):
     assigned_buggy_versions = core_working_dir / 'assigned_buggy_versions'
 
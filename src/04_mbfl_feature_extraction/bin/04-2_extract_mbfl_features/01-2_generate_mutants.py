@@ -5,6 +5,15 @@ import argparse
 import json
 import subprocess as sp
 import os
+import shutil
+import hashlib
+import multiprocessing
+
+from executed_lines_index import load_executed_lines_index
+from mutant_edits import diff_edit, line_span, changes_line_count, rebase_edit
+from mutant_store import MutantStore, load_mutant_store, compact_mutant_dir, compact_version_mutants
+from mutant_db_index import build_mutant_db_index
+from source_overlay import SourceOverlay
 
 # Current working directory
 script_path = Path(__file__).resolve()
@@ -46,10 +55,10 @@ not_using_operators = [
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.worker, args.version)
+    start_process(args.subject, args.worker, args.version, args.no_mutant_rebase, args.full_build, args.music_jobs)
 
 
-def start_process(subject_name, worker_name, version_name):
+def start_process(subject_name, worker_name, version_name, no_mutant_rebase=False, full_build=False, music_jobs=1):
     subject_working_dir = extract_mbfl_features_cmd_dir / f"{subject_name}-working_directory"
     assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
 
@@ -62,6 +71,9 @@ def start_process(subject_name, worker_name, version_name):
     version_dir = assigned_buggy_versions_dir / version_name
     assert version_dir.exists(), f"Version directory {version_dir} does not exist"
 
+    # 0. restore target files left overlaid by an interrupted run
+    source_overlay = SourceOverlay(core_working_dir)
+
 
     # 1. Read configurations
     configs = read_configs(subject_name, subject_working_dir)
@@ -98,20 +110,24 @@ def start_process(subject_name, worker_name, version_name):
     if not version_mutant_zip.exists() and not version_mutant_dir.exists():
         # 7. conduct run tests on buggy version with failing test cases
         generate_mutants(
-            configs, core_working_dir, version_name, 
+            configs, core_working_dir, source_overlay, version_name, 
             target_code_file_path, buggy_code_file, 
-            music, version_dir, lines_executed_by_failing_tc
+            music, version_dir, lines_executed_by_failing_tc,
+            no_mutant_rebase, full_build, music_jobs
         )
     elif version_mutant_zip.exists() and not version_mutant_dir.exists():
-        # 7. unzip the mutants
+        # 7. mutants zipped by an older 01-5, moved to the mutant store
         unzip_mutants(version_mutant_zip, version_mutant_dir)
+        target_file2original = get_target_file2original(configs, core_working_dir, target_code_file_path, buggy_code_file)
+        compact_version_mutants(version_mutant_dir, target_file2original)
+        os.remove(version_mutant_zip)
     elif not version_mutant_zip.exists() and version_mutant_dir.exists():
         print(f"Mutants for {version_name} already generated")
 
 
 def unzip_mutants(version_mutant_zip, version_mutant_dir):
-    cmd = ['unzip', version_mutant_zip]
-    res = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
+    cmd = ['unzip', version_mutant_zip.name]
+    res = sp.run(cmd, cwd=version_mutant_zip.parent, stdout=sp.PIPE, stderr=sp.PIPE)
     if res.returncode != 0:
         raise Exception(f'Failed to unzip mutants for {version_mutant_zip.name}')
     
@@ -119,11 +135,18 @@ def unzip_mutants(version_mutant_zip, version_mutant_dir):
 
     assert version_mutant_dir.exists(), f"Mutants directory {version_mutant_dir} does not exist"
 
-def get_lines_executed_by_failing_tcs(version_dir, target_code_file_path, buggy_lineno, target_files):
-    lines_executed_by_failing_tc_file = version_dir / 'coverage_info/lines_executed_by_failing_tc.json'
-    assert lines_executed_by_failing_tc_file.exists(), f"Lines executed by failing test cases file {lines_executed_by_failing_tc_file} does not exist"
+def get_target_file2original(configs, core_working_dir, target_code_file_path, buggy_code_file):
+    # the mutants of a version are made from the buggy file and the unchanged other target files
+    target_file2original = {}
+    for target_file in configs['target_files']:
+        if target_file == target_code_file_path:
+            target_file2original[target_file] = buggy_code_file.read_bytes()
+        else:
+            target_file2original[target_file] = (core_working_dir / target_file).read_bytes()
+    return target_file2original
 
-    lines_executed_by_failing_tc_json = json.loads(lines_executed_by_failing_tc_file.read_text())
+def get_lines_executed_by_failing_tcs(version_dir, target_code_file_path, buggy_lineno, target_files):
+    executed_lines_index = load_executed_lines_index(version_dir / 'coverage_info')
 
     execed_lines = {}
     for target_file in target_files:
@@ -133,7 +156,7 @@ def get_lines_executed_by_failing_tcs(version_dir, target_code_file_path, buggy_
     # read the file and return the content
     buggy_filename = target_code_file_path.split('/')[-1]
     executed_buggy_line = False
-    for key, tcs in lines_executed_by_failing_tc_json.items():
+    for key in executed_lines_index.lines_executed_by('failing'):
         info = key.split('#')
         filename = info[0].split('/')[-1]
         function_name = info[1]
@@ -173,60 +196,181 @@ def get_buggy_code_file(version_dir, buggy_code_filename):
 
 
 def generate_mutants(
-        configs, core_working_dir, version_name, 
+        configs, core_working_dir, source_overlay, version_name, 
         target_code_file_path, buggy_code_file, 
-        music, version_dir, lines_executed_by_failing_tc):
+        music, version_dir, lines_executed_by_failing_tc,
+        no_mutant_rebase=False, full_build=False, music_jobs=1):
 
     # --- prepare needed directories
     max_mutants = configs['max_mutants']
     worksTodo = intitiate_mutants_dir(core_working_dir, version_name, configs['target_files'])
 
+    # 0. mutants of the original program, generated once per core
+    # (the target files are still pristine here)
+    original_mutants_dir = None
+    if not no_mutant_rebase:
+        original_mutants_dir = prepare_original_mutants(configs, core_working_dir, music, full_build, music_jobs)
+
     # --- start generating mutants
-    # 1. Make patch file
-    patch_file = make_patch_file(target_code_file_path, buggy_code_file, core_working_dir)
+    # 1. Write the buggy version over the target file
+    source_overlay.apply_file(target_code_file_path, buggy_code_file)
+
+    try:
+        # 2. clean Execute configure and Build the subject, if build fails, skip the mutant
+        # compile flags are the same for every version, so once the subject is configured
+        # the cached compile_commands.json is restored instead
+        if not full_build and restore_compile_commands(configs, core_working_dir):
+            print(f"Restored cached compile commands, skipping clean, configure and build")
+        else:
+            res = build_for_compile_commands(configs, core_working_dir)
+            if res != 0:
+                print('Failed to configure and build on {}'.format(version_name))
+                exit(1)
+    
+        # 3. get compile command
+        compile_command = core_working_dir / configs['compile_command_path']
+        assert compile_command.exists(), f"Compile command {compile_command} does not exist"
+
+        # 4. generate mutants, one MUSICUP process per target file
+        # target_file: libxml2/parser.c
+        # key file: HTMLparser.c#htmlnamePush(htmlParserCtxtPtr ctxt, const xmlChar * value)#151
+        jobs = []
+        for target_file, output_dir in worksTodo:
+            filename = target_file.name
+            lines = lines_executed_by_failing_tc[filename]
+            if len(lines) == 0:
+                print(f"No lines executed by failing test cases for {filename}")
+                continue
+            if original_mutants_dir is None:
+                jobs.append((gen_mutants_work, (target_file, output_dir, compile_command, max_mutants, music, lines)))
+            else:
+                jobs.append((rebase_mutants_work, (
+                    target_file, output_dir, original_mutants_dir,
+                    compile_command, max_mutants, music, lines
+                )))
+        run_music_jobs(jobs, music_jobs)
+
+        # 5. keep the mutants as edits of the (buggy) target files
+        # (rebased mutants are already written to the store)
+        for target_file, output_dir in worksTodo:
+            if load_mutant_store(output_dir) is None:
+                compact_mutant_dir(output_dir, target_file.name, target_file.read_bytes())
+
+            # index _mut_db.csv by line and operator for 01-3 (mutant_db_index.py)
+            build_mutant_db_index(output_dir)
+    finally:
+        # 6. Restore the target file, also when the build or MUSICUP fails
+        source_overlay.restore(target_code_file_path)
+
+    # 7. Show statistics
+    show_statistics(worksTodo)
+
+
+def run_music_jobs(jobs, music_jobs):
+    # jobs: [(work function, args)], at most music_jobs processes at a time
+    if music_jobs <= 1 or len(jobs) <= 1:
+        for work, args in jobs:
+            work(*args)
+        return
+
+    running = []
+    failed = []
+    for work, args in jobs:
+        if len(running) >= music_jobs:
+            proc = running.pop(0)
+            proc.join()
+            if proc.exitcode != 0:
+                failed.append(proc.name)
+
+        proc = multiprocessing.Process(target=work, args=args, name=str(args[0]))
+        proc.start()
+        running.append(proc)
+
+    for proc in running:
+        proc.join()
+        if proc.exitcode != 0:
+            failed.append(proc.name)
+
+    if len(failed) > 0:
+        raise Exception(f'Failed to generate mutants for {failed}')
 
-    # 2. Apply patch
-    apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, False)
 
-    # 3. clean Execute configure and Build the subject, if build fails, skip the mutant
+def build_for_compile_commands(configs, core_working_dir):
+    # clean, configure (no coverage) and build the subject with bear,
+    # then keep the resulting compile_commands.json for the next versions
     res = execute_clean_script(configs[build_sh_wd_key], core_working_dir)
-    # if res != 0:
-    #     print('Failed to clean on {}'.format(version_name))
-    #     apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
-    #     exit(1)
 
     res = execute_configure_script(configs[config_sh_wd_key], core_working_dir)
     if res != 0:
-        print('Failed to configure on {}'.format(version_name))
-        apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
-        exit(1)
-    
+        return res
+
     res = execute_build_script(configs[build_sh_wd_key], core_working_dir)
     if res != 0:
-        print('Failed to build on {}'.format(version_name))
-        apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
-        exit(1)
-    
-    # 4. get compile command
+        return res
+
+    save_compile_commands(configs, core_working_dir)
+    return 0
+
+def get_build_state(configs, core_working_dir):
+    # the compile database is valid as long as the scripts producing it are the same
+    config_sh = core_working_dir / configs[config_sh_wd_key] / configure_no_cov_script
+    build_sh = core_working_dir / configs[build_sh_wd_key] / build_script
+    return {
+        'configure_script': hashlib.sha256(config_sh.read_bytes()).hexdigest(),
+        'build_script': hashlib.sha256(build_sh.read_bytes()).hexdigest(),
+        'target_files': configs['target_files'],
+    }
+
+def save_compile_commands(configs, core_working_dir):
     compile_command = core_working_dir / configs['compile_command_path']
-    assert compile_command.exists(), f"Compile command {compile_command} does not exist"
-
-    # 5. generate mutants
-    # target_file: libxml2/parser.c
-    # key file: HTMLparser.c#htmlnamePush(htmlParserCtxtPtr ctxt, const xmlChar * value)#151
-    for target_file, output_dir in worksTodo:
-        filename = target_file.name
-        lines = lines_executed_by_failing_tc[filename]
-        if len(lines) == 0:
-            print(f"No lines executed by failing test cases for {filename}")
-            continue
-        gen_mutants_work(target_file, output_dir, compile_command, max_mutants, music, lines)
-    
-    # 7. Apply patch reverse
-    apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, True)
+    if not compile_command.exists():
+        return
+
+    compile_commands_cache_dir = core_working_dir / 'compile_commands_cache'
+    compile_commands_cache_dir.mkdir(exist_ok=True)
+    shutil.copyfile(compile_command, compile_commands_cache_dir / 'compile_commands.json')
+    with open(compile_commands_cache_dir / 'build_state.json', 'w') as f:
+        json.dump(get_build_state(configs, core_working_dir), f)
+
+def restore_compile_commands(configs, core_working_dir):
+    # returns True if compile_commands.json was restored from the cache.
+    # bear rewrites compile_commands.json with only the files it recompiled
+    # (ex. a single mutant in 01-4), so the full database is kept aside
+    compile_commands_cache_dir = core_working_dir / 'compile_commands_cache'
+    cached_compile_command = compile_commands_cache_dir / 'compile_commands.json'
+    build_state_json = compile_commands_cache_dir / 'build_state.json'
+    if not cached_compile_command.exists() or not build_state_json.exists():
+        return False
+
+    with open(build_state_json, 'r') as f:
+        if json.load(f) != get_build_state(configs, core_working_dir):
+            print('Build scripts changed since the compile commands were cached')
+            return False
+
+    with open(cached_compile_command, 'r') as f:
+        compile_commands = json.load(f)
+
+    # point the entries of the target files at the (overlaid) target files
+    for target_file in configs['target_files']:
+        target_file_path = (core_working_dir / target_file).resolve()
+        found = False
+        for entry in compile_commands:
+            entry_file = Path(entry['file'])
+            if not entry_file.is_absolute():
+                entry_file = Path(entry['directory']) / entry_file
+            if entry_file.name != target_file_path.name:
+                continue
+            if entry_file.resolve() != target_file_path:
+                entry['file'] = str(target_file_path)
+            found = True
+        if not found:
+            print(f"Cached compile commands have no entry for {target_file}")
+            return False
 
-    # 6. Show statistics
-    show_statistics(worksTodo)
+    compile_command = core_working_dir / configs['compile_command_path']
+    with open(compile_command, 'w') as f:
+        json.dump(compile_commands, f, indent=4)
+    return True
 
 
 def show_statistics(worksTodo):
@@ -234,8 +378,8 @@ def show_statistics(worksTodo):
     mutant_cnt_per_file = {}
 
     for target_file, output_dir in worksTodo:
-        mutant_files = list(output_dir.glob('*.c'))
-        mutant_cnt = len(mutant_files)
+        store = load_mutant_store(output_dir)
+        mutant_cnt = len(store) if store is not None else 0
         total_mutant_cnt += mutant_cnt
         mutant_cnt_per_file[target_file] = mutant_cnt
     
@@ -246,10 +390,181 @@ def show_statistics(worksTodo):
 
 
 
+def prepare_original_mutants(configs, core_working_dir, music, full_build=False, music_jobs=1):
+    # MUSICUP over every line of the original target files, done once per core.
+    # Each buggy version differs from the original in one file only, so its
+    # mutants are taken from here and only the ones overlapping the buggy
+    # line are generated again (see rebase_mutants_work)
+    global not_using_operators
+
+    original_mutants_dir = core_working_dir / 'original_mutants'
+    settings_json = original_mutants_dir / 'settings.json'
+
+    settings = {
+        'max_mutants': configs['max_mutants'],
+        'not_using_operators': not_using_operators,
+        'target_files': {}
+    }
+    for target_file in configs['target_files']:
+        target_file_path = core_working_dir / target_file
+        settings['target_files'][target_file] = hashlib.sha256(target_file_path.read_bytes()).hexdigest()
+
+    if settings_json.exists():
+        with open(settings_json, 'r') as f:
+            if json.load(f) == settings:
+                print(f"Using mutants of the original program in {original_mutants_dir.name}")
+                return original_mutants_dir
+        shutil.rmtree(original_mutants_dir)
+
+    # compile_commands.json of the original program
+    compile_command = core_working_dir / configs['compile_command_path']
+    if full_build or not restore_compile_commands(configs, core_working_dir):
+        res = build_for_compile_commands(configs, core_working_dir)
+        if res != 0 or not compile_command.exists():
+            print('Failed to build the original program, generating mutants per version')
+            return None
+
+    jobs = []
+    for target_file in configs['target_files']:
+        target_file_path = core_working_dir / target_file
+        pool_dir = original_mutants_dir / target_file.replace('/', '-')
+        original_code_dir = pool_dir / 'original_code'
+        original_code_dir.mkdir(exist_ok=True, parents=True)
+        shutil.copyfile(target_file_path, original_code_dir / target_file_path.name)
+
+        jobs.append((gen_mutants_work, (target_file_path, pool_dir, compile_command, configs['max_mutants'], music, None)))
+    run_music_jobs(jobs, music_jobs)
+
+    for target_file in configs['target_files']:
+        target_file_path = core_working_dir / target_file
+        pool_dir = original_mutants_dir / target_file.replace('/', '-')
+        compact_mutant_dir(pool_dir, target_file_path.name, target_file_path.read_bytes())
+
+    with open(settings_json, 'w') as f:
+        json.dump(settings, f)
+
+    return original_mutants_dir
+
+
+def read_mut_db(mut_db_csv):
+    # returns header lines and {mutant filename: (start line, db line)}
+    with open(mut_db_csv, 'r') as f:
+        lines = f.readlines()
+
+    header = lines[:2]
+    mutants = {}
+    for line in lines[2:]:
+        info = line.strip().split(',')
+        if len(info) < 3:
+            continue
+        mutants[info[0]] = (info[2], line)
+    return header, mutants
+
+def mutant_id(mutant_filename):
+    # parser.MUT123.c -> 123
+    return int(mutant_filename.split('.')[-2][3:])
+
+def rebase_mutants_work(target_file, output_dir, original_mutants_dir, compile_command, max_mutants, music_cmd, lines):
+    filename = target_file.name
+    stem = filename.split('.')[0]
+    pool_dir = original_mutants_dir / output_dir.name
+    original_code_file = pool_dir / 'original_code' / filename
+    pool_mut_db = pool_dir / f"{stem}_mut_db.csv"
+    if not original_code_file.exists() or not pool_mut_db.exists():
+        print(f"No original mutants for {filename}, generating all of them")
+        gen_mutants_work(target_file, output_dir, compile_command, max_mutants, music_cmd, lines)
+        return
+
+    original = original_code_file.read_bytes()
+    current = target_file.read_bytes()
+    base_edit = diff_edit(original, current)
+
+    # pools made before the mutant store still hold full mutant copies
+    pool_store = load_mutant_store(pool_dir)
+    if pool_store is None:
+        pool_store = compact_mutant_dir(pool_dir, filename, original)
+
+    # a buggy version changing the number of lines would shift every mutant line
+    if current != original and changes_line_count(original, base_edit):
+        print(f"Buggy version of {filename} changes its line count, generating all mutants")
+        gen_mutants_work(target_file, output_dir, compile_command, max_mutants, music_cmd, lines)
+        return
+
+    header, pool_mutants = read_mut_db(pool_mut_db)
+    execed_lines = set(lines)
+
+    # 1. rebase the mutants of executed lines onto the buggy version,
+    # lines with a mutant overlapping the buggy line are generated again
+    regen_lines = set()
+    rebased = {}
+    if current != original:
+        buggy_first_line, buggy_last_line = line_span(original, base_edit)
+        for lineno in range(buggy_first_line, buggy_last_line + 1):
+            if str(lineno) in execed_lines:
+                regen_lines.add(str(lineno))
+
+    for mutant_filename, (lineno, db_line) in pool_mutants.items():
+        if lineno not in execed_lines or lineno in regen_lines:
+            continue
+
+        if mutant_filename not in pool_store:
+            continue
+        edit = pool_store.edit(mutant_filename)
+
+        if current != original:
+            first_line, last_line = line_span(original, edit)
+            rebased_edit = rebase_edit(edit, base_edit)
+            if rebased_edit is None or not (last_line < buggy_first_line or first_line > buggy_last_line):
+                regen_lines.add(lineno)
+                continue
+            edit = rebased_edit
+
+        rebased[mutant_filename] = (lineno, db_line, edit)
+
+    store = MutantStore.create(output_dir, filename, current)
+    mut_db_lines = []
+    for mutant_filename, (lineno, db_line, edit) in rebased.items():
+        if lineno in regen_lines:
+            continue
+        store.add(mutant_filename, edit)
+        mut_db_lines.append(db_line)
+
+    # 2. generate mutants of the overlapping lines on the buggy version,
+    # numbered after the mutants of the original program
+    if len(regen_lines) > 0:
+        regen_dir = output_dir / 'regenerated'
+        regen_dir.mkdir(exist_ok=True)
+        gen_mutants_work(target_file, regen_dir, compile_command, max_mutants, music_cmd, sorted(regen_lines, key=int))
+
+        next_id = max([mutant_id(name) for name in pool_mutants.keys()], default=0) + 1
+        regen_mut_db = regen_dir / f"{stem}_mut_db.csv"
+        if regen_mut_db.exists():
+            _, regen_mutants = read_mut_db(regen_mut_db)
+            for mutant_filename in sorted(regen_mutants.keys(), key=mutant_id):
+                lineno, db_line = regen_mutants[mutant_filename]
+                new_filename = f"{stem}.MUT{next_id}.{filename.split('.')[-1]}"
+                next_id += 1
+
+                regen_mutant_file = regen_dir / mutant_filename
+                if not regen_mutant_file.exists():
+                    continue
+                store.add(new_filename, diff_edit(current, regen_mutant_file.read_bytes()))
+                mut_db_lines.append(new_filename + db_line[len(mutant_filename):])
+        shutil.rmtree(regen_dir)
+    store.save()
+
+    with open(output_dir / f"{stem}_mut_db.csv", 'w') as f:
+        f.writelines(header)
+        for db_line in mut_db_lines:
+            f.write(db_line if db_line.endswith('\n') else db_line + '\n')
+
+    print(f"Rebased {len(mut_db_lines)} mutants for {filename} ({len(regen_lines)} lines generated again)")
+
+
 def gen_mutants_work(target_file, output_dir, compile_command, max_mutants, music_cmd, lines):
+    # lines: line numbers to mutate, None for every line
     global not_using_operators
     unused_ops = ','.join(not_using_operators)
-    execed_lines = ','.join(lines)
 
     cmd = [
         music_cmd,
@@ -258,9 +573,10 @@ def gen_mutants_work(target_file, output_dir, compile_command, max_mutants, musi
         '-ll', str(max_mutants),
         '-l', '2',
         '-d', unused_ops,
-        '-i', execed_lines,
-        '-p', str(compile_command)
     ]
+    if lines is not None:
+        cmd.extend(['-i', ','.join(lines)])
+    cmd.extend(['-p', str(compile_command)])
     print(f'Generating mutants for {target_file.name}...')
     res = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
     if res.returncode != 0:
@@ -290,33 +606,6 @@ def intitiate_mutants_dir(core_working_dir, version_name, target_files):
     
     return target_file_pair
 
-def make_patch_file(target_code_file_path, buggy_code_file, core_working_dir):
-    patch_file = core_working_dir / f"buggy.patch"
-
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['diff', target_file.__str__(), buggy_code_file.__str__()]
-    sp.run(cmd, stdout=patch_file.open('w'))
-    
-    return patch_file
-
-def apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, revert=False):
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['patch']
-    if revert:
-        cmd.append('-R')
-    cmd.extend(['-i', patch_file.__str__(), target_file.__str__()])
-
-    res = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
-    if res.returncode != 0:
-        raise Exception(f'Failed to apply patch to {target_file.name} with buggy_version {buggy_code_file.name}')
-    
-    print(f'Applied patch to {target_file.name} with buggy_version {buggy_code_file.name} : revert={revert}')
-
-
 def execute_clean_script(clean_sh_wd, core_working_dir):
     global clean_script
 
@@ -385,6 +674,9 @@ def make_parser():
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--worker', type=str, help='Worker name (e.g., <machine-name>/<core-id>)', required=True)
     parser.add_argument('--version', type=str, help='Version name', required=True)
+    parser.add_argument('--no-mutant-rebase', action='store_true', help='Generate all mutants of the version with MUSICUP instead of rebasing the mutants of the original program')
+    parser.add_argument('--full-build', action='store_true', help='Clean, configure and build the subject for every version instead of restoring the cached compile commands')
+    parser.add_argument('--music-jobs', type=int, default=1, help='Number of MUSICUP processes run at the same time by this worker, every worker of the machine runs its own (default: 1)')
     return parser
 
 if __name__ == "__main__":
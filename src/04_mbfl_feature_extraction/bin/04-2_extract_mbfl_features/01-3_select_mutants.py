@@ -5,7 +5,9 @@ import argparse
 import json
 import subprocess as sp
 import os
-import random
+
+from executed_lines_index import load_executed_lines_index
+from mutant_db_index import load_mutant_db_index, make_selection_rng
 
 # Current working directory
 script_path = Path(__file__).resolve()
@@ -36,10 +38,10 @@ real_world_buggy_versions = 'real_world_buggy_versions'
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.worker, args.version)
+    start_process(args.subject, args.worker, args.version, args.seed)
 
 
-def start_process(subject_name, worker_name, version_name):
+def start_process(subject_name, worker_name, version_name, seed=0):
     subject_working_dir = extract_mbfl_features_cmd_dir / f"{subject_name}-working_directory"
     assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
 
@@ -78,7 +80,7 @@ def start_process(subject_name, worker_name, version_name):
 
 
     # 7. select mutants from core_working_dir/generated_mutants/<version_name>/<mutant_dir_for_each_target_file>
-    selected_fileline2mutants = select_mutants(configs, core_working_dir, version_name, version_dir, lines_executed_by_failing_tc, subject_name)
+    selected_fileline2mutants = select_mutants(configs, core_working_dir, version_name, version_dir, lines_executed_by_failing_tc, subject_name, seed)
 
     # 8. write selected mutants to a file
     write_selected_mutants(version_dir, selected_fileline2mutants)
@@ -99,7 +101,7 @@ def write_selected_mutants(version_dir, selected_fileline2mutants):
 
 def select_mutants(
         configs, core_working_dir, version_name,
-        version_dir, lines_executed_by_failing_tc, subject_name):
+        version_dir, lines_executed_by_failing_tc, subject_name, seed=0):
     # TODO: add number of failing tcs in each line
     # --- prepare needed directories
     version_mutants_dir = core_working_dir / 'generated_mutants' / version_name
@@ -131,44 +133,20 @@ def select_mutants(
             print(f"Mutants database csv {mut_db_csv.name} does not exist")
             continue
 
-        print(f"Reading mutants from {mut_db_csv.name}")
-        with mut_db_csv.open() as f:
-            lines = f.readlines()
-            mutants = lines[2:]
-            random.shuffle(mutants)
-            print(f"Total mutants: {len(mutants)}")
-            for mutant_line in mutants:
-                mutant_line = mutant_line.strip()
-
-                # 0 Mutant Filename
-                # 1 Mutation Operator
-                # 2 Start Line#
-                # 3 Start Col#
-                # 4 End Line#
-                # 5 End Col#
-                # 6 Target Token
-                # 7 Start Line#
-                # 8 Start Col#
-                # 9 End Line#
-                # 10 End Col#
-                # 11 Mutated Token
-                # 12 Extra Info
-                info = mutant_line.split(',')
-                mutant_filename = info[0]
-                mutant_lineno = info[2]
-
-                # do not select mutants for lines that are not executed by failing test cases
-                if mutant_lineno not in files2mutants[filename]:
-                    print(f"Mutant line {mutant_lineno} is not executed by failing test cases")
-                    continue
-
-                # select mutant
-                if len(files2mutants[filename][mutant_lineno]) < max_mutants:
-                    files2mutants[filename][mutant_lineno].append(mutant_line)
-                    file_tot_mutant_cnt += 1
-                    tot_mutant_cnt += 1
-
-            print(f"Selected mutants for {filename}: {file_tot_mutant_cnt}")
+        # query the mutants of the executed lines from the index of the csv (mutant_db_index.py),
+        # up to max_mutants per line spread over the mutation operators
+        mutant_db_index = load_mutant_db_index(file_mutants_dir, mut_db_csv)
+        print(f"Reading mutants from {mut_db_csv.name} (total mutants: {len(mutant_db_index)})")
+        rng = make_selection_rng(seed, version_name, filename)
+        selected = mutant_db_index.select(lines, max_mutants, rng)
+        mutant_db_index.close()
+
+        for line, mutant_lines in selected.items():
+            files2mutants[filename][line] = mutant_lines
+            file_tot_mutant_cnt += len(mutant_lines)
+            tot_mutant_cnt += len(mutant_lines)
+
+        print(f"Selected mutants for {filename}: {file_tot_mutant_cnt}")
     print(f"Total selected mutants: {tot_mutant_cnt}")
 
     return files2mutants
@@ -176,10 +154,7 @@ def select_mutants(
 
 
 def get_lines_executed_by_failing_tcs(version_dir, target_code_file_path, buggy_lineno, target_files):
-    lines_executed_by_failing_tc_file = version_dir / 'coverage_info/lines_executed_by_failing_tc.json'
-    assert lines_executed_by_failing_tc_file.exists(), f"Lines executed by failing test cases file {lines_executed_by_failing_tc_file} does not exist"
-
-    lines_executed_by_failing_tc_json = json.loads(lines_executed_by_failing_tc_file.read_text())
+    executed_lines_index = load_executed_lines_index(version_dir / 'coverage_info')
 
     execed_lines = {}
     for target_file in target_files:
@@ -189,7 +164,7 @@ def get_lines_executed_by_failing_tcs(version_dir, target_code_file_path, buggy_
     # TODO: save number of failing tcs to be written in 'selected_mutants.csv'
     buggy_filename = target_code_file_path.split('/')[-1]
     executed_buggy_line = False
-    for key, tcs in lines_executed_by_failing_tc_json.items():
+    for key in executed_lines_index.lines_executed_by('failing'):
         info = key.split('#')
         filename = info[0].split('/')[-1]
         function_name = info[1]
@@ -251,6 +226,7 @@ def make_parser():
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--worker', type=str, help='Worker name (e.g., <machine-name>/<core-id>)', required=True)
     parser.add_argument('--version', type=str, help='Version name', required=True)
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random mutant selection (default: 0)')
     return parser
 
 if __name__ == "__main__":
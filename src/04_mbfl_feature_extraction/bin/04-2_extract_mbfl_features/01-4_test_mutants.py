@@ -6,6 +6,11 @@ import json
 import subprocess as sp
 import os
 
+from mutant_store import load_mutant_store
+from source_overlay import SourceOverlay
+from build_outcome_cache import BuildOutcomeCache
+from kill_matrix import KillMatrix, kill_matrix_file
+
 # Current working directory
 script_path = Path(__file__).resolve()
 mbfl_feature_extraction_dir = script_path.parent
@@ -54,6 +59,9 @@ def start_process(subject_name, worker_name, version_name):
     version_dir = assigned_buggy_versions_dir / version_name
     assert version_dir.exists(), f"Version directory {version_dir} does not exist"
 
+    # restore target files left overlaid by an interrupted run
+    source_overlay = SourceOverlay(core_working_dir)
+
     print(f"<<<<<< MBFL on {subject_name} with {worker_name} for {version_name} >>>>>>")
 
     # 1. Read configurations
@@ -94,25 +102,28 @@ def start_process(subject_name, worker_name, version_name):
     result_csv_file = result_csv.open('w')
     result_csv_file.write("target_file,mutant_id,lineno,build_result,p2f,p2p,f2p,f2f\n")
 
+    # the failing test cases of each mutant, to derive the outcome of another split later
+    kill_matrix = KillMatrix.for_testsuite(testsuite)
+
 
     # 6. apply buggy version code
     buggy_code_file = get_buggy_code_file(version_dir, buggy_code_filename)
-    buggy_patch = make_patch_file(target_code_file_path, buggy_code_file, core_working_dir, 'buggy.patch')
-    apply_patch(target_code_file_path, buggy_code_file, buggy_patch, core_working_dir, revert=False)
+    source_overlay.apply_file(target_code_file_path, buggy_code_file)
 
 
     # 7. Conduct mutation testing
     conduct_mutation_testing(
-        configs, core_working_dir, subject_name,
+        configs, core_working_dir, source_overlay, subject_name,
         version_name, selected_mutants, testsuite,
-        result_csv_file
+        result_csv_file, kill_matrix
     )
 
-    # 8. Revert the buggy version code
-    apply_patch(target_code_file_path, buggy_code_file, buggy_patch, core_working_dir, revert=True)
+    # 8. Restore the target files (buggy version and mutated files)
+    source_overlay.restore_all()
 
-    # 9. Close the result csv file
+    # 9. Close the result csv file and save the kill matrix
     result_csv_file.close()
+    kill_matrix.save(version_dir / kill_matrix_file)
 
 def get_buggy_code_file(version_dir, buggy_code_filename):
     buggy_code_file_dir = version_dir / 'buggy_code_file'
@@ -124,9 +135,9 @@ def get_buggy_code_file(version_dir, buggy_code_filename):
     return buggy_code_file
 
 def conduct_mutation_testing(
-    configs, core_working_dir, subject_name,
+    configs, core_working_dir, source_overlay, subject_name,
     version_name, selected_mutants, testsuite,
-    result_csv_file
+    result_csv_file, kill_matrix
 ):
     # --- prepare needs
     global my_env
@@ -146,6 +157,11 @@ def conduct_mutation_testing(
 
     tc_dir = core_working_dir / configs['test_case_directory']
     assert tc_dir.exists(), f"Test case directory {tc_dir} does not exist"
+
+    # mutants known not to compile on this machine (any core, any stage)
+    build_sh = core_working_dir / configs[build_sh_wd_key] / build_script
+    configure_sh = core_working_dir / configs[config_sh_wd_key] / configure_no_cov_script
+    build_outcome_cache = BuildOutcomeCache(subject_name, build_sh, configure_sh)
     
     # --- start testing
     # FOR A TARGET FILE...
@@ -153,6 +169,12 @@ def conduct_mutation_testing(
         target_file_path = get_target_file_path(configs['target_files'], target_file)
         assert target_file_path is not None, f"Target file {target_file} does not exist in target files"
 
+        file_mutants_dir = version_gen_mutants_dir / f"{subject_name}-{target_file}"
+        mutant_store = load_mutant_store(file_mutants_dir)
+
+        # content of the target file while testing no mutant (buggy version applied)
+        target_code = (core_working_dir / target_file_path).read_bytes()
+
         # FOR A LINE OF TARGET FILE...
         for lineno, mutants in lineno_mutants.items():
 
@@ -161,53 +183,73 @@ def conduct_mutation_testing(
                 mutant_id = mutant['mutant_id']
                 mutant_name = mutant['mutant_name']
 
-                mutant_file = version_gen_mutants_dir / f"{subject_name}-{target_file}" / mutant_name
-                assert mutant_file.exists(), f"Mutant file {mutant_file} does not exist"
+                mutant_code = get_mutant_code(mutant_store, file_mutants_dir, mutant_name)
 
                 # print(f"Testing mutant {mutant_id} ({mutant_name}) in {target_file} at line {lineno}")
                 start_test(
-                    configs, core_working_dir, subject_name,
-                    version_name, target_file_path, target_file, mutant_file,
+                    configs, core_working_dir, source_overlay, subject_name,
+                    version_name, target_file_path, target_file, mutant_code, target_code,
                     lineno, mutant_id, mutant_name,
-                    testsuite, result_csv_file, tc_dir
+                    testsuite, result_csv_file, kill_matrix, tc_dir,
+                    build_outcome_cache
                 )
 
+    print(f"Skipped {build_outcome_cache.hit_cnt} mutants known not to compile")
+
+
+def get_mutant_code(mutant_store, file_mutants_dir, mutant_name):
+    # mutants directories generated before the mutant store hold full copies
+    if mutant_store is not None:
+        return mutant_store.materialize(mutant_name)
+
+    mutant_file = file_mutants_dir / mutant_name
+    assert mutant_file.exists(), f"Mutant file {mutant_file} does not exist"
+    return mutant_file.read_bytes()
+
 
 def start_test(
-    configs, core_working_dir, subject_name,
-    version_name, target_file_path, target_file, mutant_file,
+    configs, core_working_dir, source_overlay, subject_name,
+    version_name, target_file_path, target_file, mutant_code, target_code,
     lineno, mutant_id, mutant_name,
-    testsuite, result_csv_file, tc_dir
+    testsuite, result_csv_file, kill_matrix, tc_dir,
+    build_outcome_cache
 ):
     tc_outcome = {'p2f': -1, 'p2p': -1, 'f2p': -1, 'f2f': -1}
     build_result = False
-    # 1. Make patch file of the mutant
-    mutant_patch = make_patch_file(target_file_path, mutant_file, core_working_dir, 'mutant.patch')
+    # 0. Skip the mutant if it is known not to compile
+    if build_outcome_cache.known_failure(target_file_path, mutant_code):
+        print(f"Mutant {mutant_id} ({mutant_name}) is known not to compile")
+        write_results(result_csv_file, target_file, mutant_id, lineno, build_result, tc_outcome)
+        kill_matrix.add_mutant(target_file, mutant_id, lineno, None)
+        return
 
-    # 2. Apply patch to the target file
-    apply_patch(target_file_path, mutant_file, mutant_patch, core_working_dir)
+    # 1. Write the mutant to the target file
+    source_overlay.apply(target_file_path, mutant_code)
 
-    # 3. Build the subject, if build fails, skip the mutant
-    build_res = execute_build_script(configs[build_sh_wd_key], core_working_dir)
+    # 2. Build the subject, if build fails, skip the mutant
+    build_res, build_output = execute_build_script(configs[build_sh_wd_key], core_working_dir)
     if build_res != 0:
         print(f"Failed to build the subject with mutant {mutant_id} ({mutant_name})")
-        apply_patch(target_file_path, mutant_file, mutant_patch, core_working_dir, revert=True)
+        build_outcome_cache.record_failure(target_file_path, mutant_code, build_res, build_output, mutant_name)
+        source_overlay.apply(target_file_path, target_code)
         write_results(result_csv_file, target_file, mutant_id, lineno, build_result, tc_outcome)
+        kill_matrix.add_mutant(target_file, mutant_id, lineno, None)
         return
     
     # --> build is successful
     build_result = True
     tc_outcome = {'p2f': 0, 'p2p': 0, 'f2p': 0, 'f2f': 0}
 
-    # 4. Run the test suite
+    # 3. Run the test suite
     print(f"running test suite for mutant {mutant_id} ({mutant_name})")
-    run_test_suite(testsuite, core_working_dir, mutant_id, tc_outcome, tc_dir)
+    mutant_failing_tcs = run_test_suite(testsuite, core_working_dir, mutant_id, tc_outcome, tc_dir)
 
-    # 5. Apply path to the target file (revert)
-    apply_patch(target_file_path, mutant_file, mutant_patch, core_working_dir, revert=True)
+    # 4. Restore the target file
+    source_overlay.apply(target_file_path, target_code)
     
-    # 6. Write the results to the csv file
+    # 5. Write the results to the csv file
     write_results(result_csv_file, target_file, mutant_id, lineno, build_result, tc_outcome)
+    kill_matrix.add_mutant(target_file, mutant_id, lineno, mutant_failing_tcs)
 
 def run_test_suite(testsuite, core_working_dir, mutant_id, tc_outcome, tc_dir):
     mutant_passing_tcs = []
@@ -236,6 +278,8 @@ def run_test_suite(testsuite, core_working_dir, mutant_id, tc_outcome, tc_dir):
     # print("Failing test cases:")
     # for tc in mutant_failing_tcs:
     #     print(f"{tc}")
+
+    return mutant_failing_tcs
             
 
 def run_tc(tc_script_name, tc_dir):
@@ -362,33 +406,6 @@ def intitiate_mutants_dir(core_working_dir, version_name, target_files):
     
     return target_file_pair
 
-def make_patch_file(target_code_file_path, buggy_code_file, core_working_dir, patchname):
-    patch_file = core_working_dir / patchname
-
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['diff', target_file.__str__(), buggy_code_file.__str__()]
-    sp.run(cmd, stdout=patch_file.open('w'))
-    
-    return patch_file
-
-def apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, revert=False):
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['patch']
-    if revert:
-        cmd.append('-R')
-    cmd.extend(['-i', patch_file.__str__(), target_file.__str__()])
-
-    res = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
-    if res.returncode != 0:
-        raise Exception(f'Failed to apply patch to {target_file.name} with buggy_version {buggy_code_file.name}')
-    
-    print(f'Applied patch to {target_file.name} with buggy_version {buggy_code_file.name} : revert={revert}')
-
-
 def execute_clean_script(clean_sh_wd, core_working_dir):
     global clean_script
 
@@ -430,7 +447,8 @@ def execute_build_script(build_sh_wd, core_working_dir):
 
     print(f"Build script executed: {res.returncode}")
     
-    return res.returncode
+    # the output tells compile errors from transient failures
+    return res.returncode, (res.stdout + res.stderr).decode(errors='replace')
 
 
 
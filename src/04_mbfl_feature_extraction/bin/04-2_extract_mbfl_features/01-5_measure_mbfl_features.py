@@ -8,6 +8,12 @@ import os
 import csv
 import math
 
+from coverage_vector_store import load_coverage_vector_store
+from mutant_store import compact_version_mutants, mutant_edits_json
+from mbfl_feature_engine import MutantOutcomes, read_mutation_testing_results, write_mbfl_features_csv, mbfl_features_file
+from feature_aggregation import write_aggregate_tables
+from kill_matrix import load_kill_matrix
+
 # Current working directory
 script_path = Path(__file__).resolve()
 mbfl_feature_extraction_dir = script_path.parent
@@ -62,229 +68,56 @@ def start_process(subject_name, worker_name, version_name):
     # 2. get lines from postprocessed coverage info
     lines = get_lines_from_postprocessed_coverage(version_dir)
 
-    # 3. get mbfl features of individual lines to mutants
-    perfileline_features, total_p2f, total_f2p = get_perfileline_features(version_dir)
-
-    # 4. get test cases
+    # 3. get test cases
     failing_tc_list = get_tcs(version_dir, 'failing_tcs.txt')
+    passing_tc_list = get_tcs(version_dir, 'passing_tcs.txt')
     total_num_failing_tcs = len(failing_tc_list)
 
+    # 4. get the outcome of each built mutant
+    # (derived from the kill matrix for the current failing/passing split when possible)
+    outcomes = get_mutant_outcomes(version_dir, failing_tc_list, passing_tc_list)
+
     # 5. get max_mutants from configs
     max_mutants = configs['max_mutants']
 
-
-    # 6. measure mbfl feature on each line
-    mbfl_features = measure_mbfl_features(
-        perfileline_features, 
-        total_p2f, total_f2p,
-        total_num_failing_tcs, max_mutants
-    )
-
-
-    # 7. get buggy line key
+    # 6. get buggy line key
     buggy_line_key = get_buggy_line_key(version_dir)
 
-    # 8. process to csv
-    process2csv(version_dir, mbfl_features, lines, buggy_line_key, max_mutants, total_num_failing_tcs)
-
-    # 9. zip the generated_mutant/<version-name> directory as <versoin-name>.zip
-    zip_mutant_dir(core_working_dir, version_name)
-
-
-def zip_mutant_dir(core_working_dir, version_name):
-    mutants_dir = core_working_dir / 'generated_mutants'
-    assert mutants_dir.exists(), f"Mutants directory {mutants_dir} does not exist"
-
-    zip_file = mutants_dir / f"{version_name}.zip"
-    if zip_file.exists():
-        os.remove(zip_file)
-    
-    res = sp.run(['zip', '-r', f'{version_name}.zip', version_name], cwd=mutants_dir, stdout=sp.PIPE, stderr=sp.PIPE)
-    if res.returncode != 0:
-        raise Exception(f"Failed to zip the directory {version_name}")
-    
-    print(f"Zipped the directory {version_name} as {version_name}.zip")
-
-    # remove the directory
-    res = sp.run(['rm', '-rf', version_name], cwd=mutants_dir)
-    if res.returncode != 0:
-        raise Exception(f"Failed to remove the directory {version_name}")
-    
-    print(f"Removed the directory {version_name} from generated_mutants directory")
-
-
-
-
-
-def process2csv(version_dir, mbfl_features, lines, buggy_line_key, max_mutants, total_num_failing_tcs):
-
-    csv_file = version_dir / 'mbfl_features.csv'
-
-    mutant_key_default = {}
-    for i in range(1, max_mutants+1):
-        mutant_key_default[f'm{i}:f2p'] = -1
-        mutant_key_default[f'm{i}:p2f'] = -1
-    
-    default = {
-        '# of totfailed_TCs': total_num_failing_tcs,
-        '# of mutants': max_mutants,
-        '|muse(s)|': 0, 'total_f2p': 0, 'total_p2f': 0,
-        'line_total_f2p': 0, 'line_total_p2f': 0,
-        'muse_1': 0, 'muse_2': 0, 'muse_3': 0, 'muse_4': 0,
-        'muse susp. score': 0.0, 'met susp. score': 0.0, 'bug': 0,
-        **mutant_key_default
-    }
-
-    fieldnames = ['key', '# of totfailed_TCs', '# of mutants'] + list(mutant_key_default.keys()) + [
-        '|muse(s)|', 'total_f2p', 'total_p2f', 'line_total_f2p', 'line_total_p2f',
-        'muse_1', 'muse_2', 'muse_3', 'muse_4', 'muse susp. score', 'met susp. score',
-        'bug'
-    ]
-
-    with open(csv_file, mode='w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for line in lines:
-            line_info = line.strip().split('#')
-            target_file = line_info[0].split('/')[-1]
-            lineno = line_info[-1]
-
-            buggy_stat = 0
-            if line == buggy_line_key:
-                buggy_stat = 1
-            
-            if target_file in mbfl_features and lineno in mbfl_features[target_file]:
-                mbfl_features[target_file][lineno]['bug'] = buggy_stat
-                writer.writerow({
-                    'key': line, **mbfl_features[target_file][lineno]
-                })
-            else:
-                default['bug'] = buggy_stat
-                writer.writerow({'key': line, **default})
-
-
-
-def measure_mbfl_features(
-    perfileline_features, total_p2f, total_f2p,
-    total_num_failing_tcs, max_mutants
-):
-    mbfl_features = {}
-
-    for target_file, lineno_mutants in perfileline_features.items():
-        if target_file not in mbfl_features:
-            mbfl_features[target_file] = {}
-
-        for lineno, mutants in lineno_mutants.items():
-            if lineno not in mbfl_features[target_file]:
-                mbfl_features[target_file][lineno] = {}
-            
-            mbfl_features[target_file][lineno]['# of totfailed_TCs'] = total_num_failing_tcs
-            mbfl_features[target_file][lineno]['# of mutants'] = max_mutants
-            
-            mutant_cnt = 0
-            mutant_key_list = []
-            for mutant in mutants:
-                mutant_id = mutant['mutant_id']
-                p2f = mutant['p2f']
-                p2p = mutant['p2p']
-                f2p = mutant['f2p']
-                f2f = mutant['f2f']
-
-                # ps. perfileline_features does not contain mutants that failed to build
-
-                mutant_cnt += 1
-                p2f_name = f"m{mutant_cnt}:p2f"
-                f2p_name = f"m{mutant_cnt}:f2p"
-                mutant_key_list.append((p2f_name, f2p_name))
-
-                mbfl_features[target_file][lineno][p2f_name] = p2f
-                mbfl_features[target_file][lineno][f2p_name] = f2p
-                # if f2p > 0:
-                #     print(f"Mutant {lineno} {mutant_id} ({p2f}, {p2p}, {f2p}, {f2f})")
-
-            for i in range(0, max_mutants - len(mutants)):
-                mutant_cnt += 1
-                p2f_name = f"m{mutant_cnt}:p2f"
-                f2p_name = f"m{mutant_cnt}:f2p"
-                mutant_key_list.append((p2f_name, f2p_name))
-
-                mbfl_features[target_file][lineno][p2f_name] = -1
-                mbfl_features[target_file][lineno][f2p_name] = -1
-        
-            met_score = measure_metallaxis(mbfl_features[target_file][lineno], mutant_key_list)
-            mbfl_features[target_file][lineno]['met susp. score'] = met_score
-
-            muse_data = measure_muse(mbfl_features[target_file][lineno], total_p2f, total_f2p, mutant_key_list)
-            for key, value in muse_data.items():
-                mbfl_features[target_file][lineno][key] = value
-    
-    # print(json.dumps(mbfl_features, indent=4))
-    
-    return mbfl_features
-
-def measure_muse(features, total_p2f, total_f2p, mutant_key_list):
-    utilized_mutant_cnt = 0
-    line_total_p2f = 0
-    line_total_f2p = 0
-
-    final_muse_score = 0.0
-
-    for p2f_m, f2p_m in mutant_key_list:
-        p2f = features[p2f_m]
-        f2p = features[f2p_m]
-
-        if p2f == -1 or f2p == -1:
-            continue
-
-        utilized_mutant_cnt += 1
-        line_total_p2f += p2f
-        line_total_f2p += f2p
-
-    muse_1 = (1 / ((utilized_mutant_cnt + 1) * (total_f2p + 1)))
-    muse_2 = (1 / ((utilized_mutant_cnt + 1) * (total_p2f + 1)))
-
-    muse_3 = muse_1 * line_total_f2p
-    muse_4 = muse_2 * line_total_p2f
+    # 7. measure mbfl feature on each line and write them to csv
+    # (mbfl_feature_engine.py, all lines at once)
+    line_scores = write_mbfl_features_csv(
+        version_dir / mbfl_features_file, lines, buggy_line_key,
+        outcomes, total_num_failing_tcs, max_mutants
+    )
 
-    final_muse_score = muse_3 - muse_4
+    # 8. aggregate the scores per function and per file (feature_aggregation.py)
+    write_aggregate_tables(version_dir / mbfl_features_file, lines, buggy_line_key, line_scores)
 
-    muse_data = {
-        '|muse(s)|': utilized_mutant_cnt,
-        'total_f2p': total_f2p,
-        'total_p2f': total_p2f,
-        'line_total_f2p': line_total_f2p,
-        'line_total_p2f': line_total_p2f,
-        'muse_1': muse_1,
-        'muse_2': muse_2,
-        'muse_3': muse_3,
-        'muse_4': muse_4,
-        'muse susp. score': final_muse_score
-    }
+    # 9. mutants are kept as edits (mutant_store.py) by 01-2,
+    # full copies left by an older 01-2 are moved to the mutant store
+    store_mutant_dir(configs, core_working_dir, version_dir, version_name)
 
-    return muse_data
 
-def measure_metallaxis(features, mutant_key_list):
-    tot_failing_tcs = features['# of totfailed_TCs']
-    met_score_list = []
+def store_mutant_dir(configs, core_working_dir, version_dir, version_name):
+    version_mutants_dir = core_working_dir / 'generated_mutants' / version_name
+    assert version_mutants_dir.exists(), f"Mutants directory {version_mutants_dir} does not exist"
 
-    for p2f_m, f2p_m in mutant_key_list:
-        p2f = features[p2f_m]
-        f2p = features[f2p_m]
+    # the mutants are made from the buggy file and the unchanged other target files
+    target_code_file_path, buggy_code_filename, buggy_lineno = get_bug_info(version_dir)
+    buggy_code_file = version_dir / 'buggy_code_file' / buggy_code_filename
+    assert buggy_code_file.exists(), f"Buggy code file {buggy_code_file} does not exist"
 
-        if p2f == -1 or f2p == -1:
+    target_file2original = {}
+    for target_file in configs['target_files']:
+        mutants_dir = version_mutants_dir / target_file.replace('/', '-')
+        if (mutants_dir / mutant_edits_json).exists():
             continue
-
-        score = 0.0
-        if f2p + p2f == 0:
-            score = 0.0
+        if target_file == target_code_file_path:
+            target_file2original[target_file] = buggy_code_file.read_bytes()
         else:
-            score = ((f2p) / math.sqrt(tot_failing_tcs * (f2p + p2f)))
-
-        met_score_list.append(score)
+            target_file2original[target_file] = (core_working_dir / target_file).read_bytes()
 
-    final_met_score = max(met_score_list)
-    return final_met_score
+    compact_version_mutants(version_mutants_dir, target_file2original)
 
 
 def get_buggy_line_key(version_dir):
@@ -295,55 +128,28 @@ def get_buggy_line_key(version_dir):
         line = f.readline().strip()
         return line
 
-def get_perfileline_features(version_dir):
+def get_mutant_outcomes(version_dir, failing_tc_list=None, passing_tc_list=None):
+    # the split may have changed since 01-4 (ex. refined test suite),
+    # the kill matrix gives the outcome of each mutant for any split of the tested tcs
+    kill_matrix = load_kill_matrix(version_dir)
+    if kill_matrix is not None and failing_tc_list is not None \
+        and kill_matrix.covers(failing_tc_list) and kill_matrix.covers(passing_tc_list):
+        print(f"Deriving mutant outcomes from the kill matrix")
+        return MutantOutcomes.from_rows(kill_matrix.outcomes(failing_tc_list, passing_tc_list))
+
     mutation_testing_result_file = version_dir / 'mutation_testing_results.csv'
     assert mutation_testing_result_file.exists(), f"Mutation testing result file {mutation_testing_result_file} does not exist"
 
-    perfileline_features = {}
-    total_p2f = 0
-    total_f2p = 0
-
-    with open(mutation_testing_result_file, 'r') as f:
-        lines = f.readlines()
-        for line in lines[1:]:
-            info = line.strip().split(',')
-            target_file = info[0]
-            mutant_id = info[1]
-            lineno = info[2]
-            build_result = info[3]
-
-            if build_result == 'FAIL':
-                continue
-
-            p2f = int(info[4])
-            p2p = int(info[5])
-            f2p = int(info[6])
-            f2f = int(info[7])
-
-            total_p2f += p2f
-            total_f2p += f2p
-
-            if target_file not in perfileline_features:
-                perfileline_features[target_file] = {}
-
-            if lineno not in perfileline_features[target_file]:
-                perfileline_features[target_file][lineno] = []
-            
-            perfileline_features[target_file][lineno].append({
-                'mutant_id': mutant_id,
-                'p2f': p2f,
-                'p2p': p2p,
-                'f2p': f2p,
-                'f2f': f2f
-            })
-    
-    # print(json.dumps(perfileline_features, indent=4))
-    
-    return perfileline_features, total_p2f, total_f2p
+    return read_mutation_testing_results(mutation_testing_result_file)
 
 
 
 def get_lines_from_postprocessed_coverage(version_dir):
+    # the deduplicated coverage store lists the same lines in the same order
+    coverage_store = load_coverage_vector_store(version_dir / 'coverage_info')
+    if coverage_store is not None:
+        return list(coverage_store.lines)
+
     cov_data_csv = version_dir / 'coverage_info/postprocessed_coverage.csv'
     assert cov_data_csv.exists(), f'{cov_data_csv} does not exist'
 
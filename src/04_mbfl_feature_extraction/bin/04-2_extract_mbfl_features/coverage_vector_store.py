@@ -0,0 +1,202 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import json
+
+from executed_lines_index import encode_bitmap, decode_bitmap
+
+# Deduplicated storage of per-TC line coverage.
+#
+# Many test cases cover exactly the same lines (ex. variants of one API
+# test). Instead of one gcovr document per test case, the store keeps:
+#   'lines':     every instrumented line of the target files, in gcovr order
+#                (<filename>#<lineno> while measuring, the line key
+#                <filename>#<function>#<lineno> once postprocessed)
+#   'vectors':   each distinct covered-line set once, as a bitmap over the
+#                line positions (same encoding as executed_lines_index.py)
+#   'tc2vector': test case script name -> vector id
+# Test cases sharing a vector id form an equivalence class: they have the
+# same coverage, so spectra can be computed once per class with the class
+# size as multiplicity.
+
+coverage_vectors_file = 'coverage_vectors.json'
+
+
+def line_id(filename, lineno):
+    return f"{filename}#{lineno}"
+
+def iter_bits(bitmap):
+    # positions of set bits, lowest first
+    # (str.find over the binary string is much faster than shifting big ints)
+    bits = bin(bitmap)[:1:-1]
+    pos = bits.find('1')
+    while pos != -1:
+        yield pos
+        pos = bits.find('1', pos + 1)
+
+
+class CoverageVectorStore:
+    def __init__(self, data=None):
+        if data is None:
+            data = {'lines': [], 'vectors': [], 'tc2vector': {}}
+        self.lines = data['lines']
+        self.encoded_vectors = data['vectors']
+        self.tc2vector = data['tc2vector']
+
+        self.decoded_vectors = {}
+        self.encoded2id = None
+
+    # --- construction
+    @classmethod
+    def load(cls, store_file):
+        with open(store_file, 'r') as f:
+            data = json.load(f)
+        return cls(data)
+
+    def save(self, store_file):
+        data = {
+            'lines': self.lines,
+            'vectors': self.encoded_vectors,
+            'tc2vector': self.tc2vector,
+        }
+        with open(store_file, 'w') as f:
+            json.dump(data, f)
+
+    def add_vector(self, tc_name, bitmap):
+        # the encoded bitmap is canonical, so it is used as the hash key
+        if self.encoded2id is None:
+            self.encoded2id = {encoded: vector_id for vector_id, encoded in enumerate(self.encoded_vectors)}
+
+        encoded = encode_bitmap(bitmap)
+        if encoded not in self.encoded2id:
+            self.encoded2id[encoded] = len(self.encoded_vectors)
+            self.encoded_vectors.append(encoded)
+            self.decoded_vectors[self.encoded2id[encoded]] = bitmap
+
+        self.tc2vector[tc_name] = self.encoded2id[encoded]
+        return self.tc2vector[tc_name]
+
+    def add_gcovr_json(self, tc_name, raw_cov_file):
+        with open(raw_cov_file, 'r') as f:
+            cov_json = json.load(f)
+
+        # the first document fixes the line order,
+        # every other document must list the same lines
+        first = len(self.lines) == 0
+        bitmap = 0
+        pos = 0
+        for file in cov_json['files']:
+            filename = file['file']
+            for line in file['lines']:
+                curr_line_id = line_id(filename, line['line_number'])
+                if first:
+                    self.lines.append(curr_line_id)
+                else:
+                    assert self.lines[pos] == curr_line_id, f"Line {curr_line_id} of {tc_name} does not match with line {self.lines[pos]} of the store"
+
+                if line['count'] > 0:
+                    bitmap |= 1 << pos
+                pos += 1
+
+        assert pos == len(self.lines), f"Coverage of {tc_name} has {pos} lines, the store has {len(self.lines)}"
+        return self.add_vector(tc_name, bitmap)
+
+    # --- access
+    def vector(self, vector_id):
+        if vector_id not in self.decoded_vectors:
+            self.decoded_vectors[vector_id] = decode_bitmap(self.encoded_vectors[vector_id])
+        return self.decoded_vectors[vector_id]
+
+    def tc_vector(self, tc_name):
+        assert tc_name in self.tc2vector, f"Test case {tc_name} is not in the coverage store"
+        return self.vector(self.tc2vector[tc_name])
+
+    def covered_lines(self, tc_name):
+        return [self.lines[pos] for pos in iter_bits(self.tc_vector(tc_name))]
+
+    def covers(self, tc_name, line_pos):
+        return (self.tc_vector(tc_name) >> line_pos) & 1 == 1
+
+    def line_tc_bitmaps(self, tc_list):
+        # bitmap over positions in tc_list of every line position (row-wise view),
+        # built once per class by OR-ing the class bitmap into its covered lines
+        line_bitmaps = [0] * len(self.lines)
+        tc_idx = {tc: idx for idx, tc in enumerate(tc_list)}
+        for vector_id, tcs in self.classes(tc_list).items():
+            class_bitmap = 0
+            for tc in tcs:
+                class_bitmap |= 1 << tc_idx[tc]
+            for pos in iter_bits(self.vector(vector_id)):
+                line_bitmaps[pos] |= class_bitmap
+        return line_bitmaps
+
+    def classes(self, tc_list=None):
+        # {vector_id: [tc, ...]} restricted to tc_list if given
+        if tc_list is None:
+            tc_list = list(self.tc2vector.keys())
+        vector2tcs = {}
+        for tc in tc_list:
+            vector_id = self.tc2vector[tc]
+            if vector_id not in vector2tcs:
+                vector2tcs[vector_id] = []
+            vector2tcs[vector_id].append(tc)
+        return vector2tcs
+
+    def representatives(self, tc_list=None):
+        # one test case per coverage equivalence class
+        return [tcs[0] for tcs in self.classes(tc_list).values()]
+
+    def spectrum(self, failing_tc_list, passing_tc_list):
+        # ep, ef, np, nf of every line position, computed once per class
+        n_lines = len(self.lines)
+        ef = [0] * n_lines
+        ep = [0] * n_lines
+
+        for counts, tc_list in [(ef, failing_tc_list), (ep, passing_tc_list)]:
+            for vector_id, tcs in self.classes(tc_list).items():
+                multiplicity = len(tcs)
+                for pos in iter_bits(self.vector(vector_id)):
+                    counts[pos] += multiplicity
+
+        total_failing = len(failing_tc_list)
+        total_passing = len(passing_tc_list)
+        nf = [total_failing - x for x in ef]
+        np = [total_passing - x for x in ep]
+        return ep, ef, np, nf
+
+    def subset(self, tc_list):
+        # store of the given test cases only, unused vectors dropped
+        old2new = {}
+        vectors = []
+        tc2vector = {}
+        for tc in tc_list:
+            assert tc in self.tc2vector, f"Test case {tc} is not in the coverage store"
+            old_id = self.tc2vector[tc]
+            if old_id not in old2new:
+                old2new[old_id] = len(vectors)
+                vectors.append(self.encoded_vectors[old_id])
+            tc2vector[tc] = old2new[old_id]
+
+        data = {
+            'lines': self.lines,
+            'vectors': vectors,
+            'tc2vector': tc2vector,
+        }
+        return CoverageVectorStore(data)
+
+    def with_lines(self, new_lines):
+        # same vectors, lines renamed (ex. to <file>#<function>#<lineno> keys)
+        assert len(new_lines) == len(self.lines), f"Expected {len(self.lines)} lines, got {len(new_lines)}"
+        data = {
+            'lines': list(new_lines),
+            'vectors': self.encoded_vectors,
+            'tc2vector': self.tc2vector,
+        }
+        return CoverageVectorStore(data)
+
+
+def load_coverage_vector_store(coverage_dir):
+    store_file = Path(coverage_dir) / coverage_vectors_file
+    if not store_file.exists():
+        return None
+    return CoverageVectorStore.load(store_file)
@@ -0,0 +1,269 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import json
+
+# Compact replacement for lines_executed_by_failing_tc.json and
+# lines_executed_by_passing_tc.json.
+#
+# Every test case gets an integer id (its position in 'tcs') and the set of
+# test cases executing a line is stored as a bitmap (bit i <-> tc id i).
+# Lines of the same basic block are executed by exactly the same test cases,
+# so bitmaps are stored once in 'bitmaps' and each line only keeps the id of
+# its bitmap. Each bitmap is encoded as a string, whichever is shorter of:
+#   r:<start>,<length>,<start>,<length>,...   (runs of set bits)
+#   x:<hex>                                   (raw bitmap)
+# Bitmaps are decoded lazily, so loading the index is a single json.load of
+# short strings.
+
+executed_lines_index_file = 'executed_lines_index.json'
+legacy_failing_file = 'lines_executed_by_failing_tc.json'
+legacy_passing_file = 'lines_executed_by_passing_tc.json'
+
+
+def encode_bitmap(bitmap):
+    runs = []
+    pos = 0
+    rest = bitmap
+    while rest:
+        # skip zeros
+        low = rest & -rest
+        skip = low.bit_length() - 1
+        pos += skip
+        rest >>= skip
+        # count ones
+        length = (~rest & (rest + 1)).bit_length() - 1
+        runs.append(pos)
+        runs.append(length)
+        pos += length
+        rest >>= length
+
+    run_str = 'r:' + ','.join(str(x) for x in runs)
+    hex_str = 'x:' + format(bitmap, 'x')
+    return run_str if len(run_str) <= len(hex_str) else hex_str
+
+def decode_bitmap(encoded):
+    kind, data = encoded[:2], encoded[2:]
+    if kind == 'x:':
+        return int(data, 16)
+
+    assert kind == 'r:', f"Unknown bitmap encoding {kind}"
+    bitmap = 0
+    if data == '':
+        return bitmap
+    runs = [int(x) for x in data.split(',')]
+    for i in range(0, len(runs), 2):
+        start, length = runs[i], runs[i+1]
+        bitmap |= ((1 << length) - 1) << start
+    return bitmap
+
+def popcount(bitmap):
+    return bin(bitmap).count('1')
+
+
+class ExecutedLinesIndex:
+    def __init__(self, data):
+        self.tcs = data['tcs']
+        self.lines = data['lines']
+        self.line_bitmap = data['line_bitmap']
+        self.encoded_bitmaps = data['bitmaps']
+        self.encoded_groups = data['groups']
+
+        self.decoded_bitmaps = {}
+        self.tc2id = None
+        self.line2idx = None
+        self.group_lines = {}
+
+    # --- construction
+    @classmethod
+    def build(cls, tc_groups, lines_execed_by_tc):
+        # tc_groups: {'failing': [TC1.sh, ...], 'passing': [...]}
+        # lines_execed_by_tc: {<line-key>: [TC1.sh, TC5.sh, ...]}
+        tc2id = {}
+        for tc_list in tc_groups.values():
+            for tc in tc_list:
+                if tc not in tc2id:
+                    tc2id[tc] = len(tc2id)
+
+        line_bitmaps = {}
+        for key, tc_list in lines_execed_by_tc.items():
+            bitmap = 0
+            for tc in tc_list:
+                assert tc in tc2id, f"Test case {tc} of line {key} is not in any test case group"
+                bitmap |= 1 << tc2id[tc]
+            line_bitmaps[key] = bitmap
+
+        return cls.from_bitmaps(tc_groups, line_bitmaps)
+
+    @classmethod
+    def from_bitmaps(cls, tc_groups, line_bitmaps):
+        # tc ids are given in order of tc_groups (failing first, then passing, ...)
+        # line_bitmaps: {<line-key>: bitmap over tc ids}
+        tcs = []
+        tc2id = {}
+        groups = {}
+        for group, tc_list in tc_groups.items():
+            group_bitmap = 0
+            for tc in tc_list:
+                if tc not in tc2id:
+                    tc2id[tc] = len(tcs)
+                    tcs.append(tc)
+                group_bitmap |= 1 << tc2id[tc]
+            groups[group] = group_bitmap
+
+        lines = []
+        line_bitmap = []
+        bitmaps = []
+        bitmap2id = {}
+        for key, bitmap in line_bitmaps.items():
+            if bitmap == 0:
+                continue
+            if bitmap not in bitmap2id:
+                bitmap2id[bitmap] = len(bitmaps)
+                bitmaps.append(bitmap)
+            lines.append(key)
+            line_bitmap.append(bitmap2id[bitmap])
+
+        data = {
+            'tcs': tcs,
+            'groups': {group: encode_bitmap(bitmap) for group, bitmap in groups.items()},
+            'lines': lines,
+            'line_bitmap': line_bitmap,
+            'bitmaps': [encode_bitmap(bitmap) for bitmap in bitmaps],
+        }
+        return cls(data)
+
+    @classmethod
+    def load(cls, index_file):
+        with open(index_file, 'r') as f:
+            data = json.load(f)
+        return cls(data)
+
+    def save(self, index_file):
+        data = {
+            'tcs': self.tcs,
+            'groups': self.encoded_groups,
+            'lines': self.lines,
+            'line_bitmap': self.line_bitmap,
+            'bitmaps': self.encoded_bitmaps,
+        }
+        with open(index_file, 'w') as f:
+            json.dump(data, f)
+
+    # --- id <-> name conversions
+    def bitmap(self, bitmap_id):
+        if bitmap_id not in self.decoded_bitmaps:
+            self.decoded_bitmaps[bitmap_id] = decode_bitmap(self.encoded_bitmaps[bitmap_id])
+        return self.decoded_bitmaps[bitmap_id]
+
+    def group_bitmap(self, group):
+        if group not in self.encoded_groups:
+            return 0
+        return decode_bitmap(self.encoded_groups[group])
+
+    def tcs_bitmap(self, tc_list):
+        if self.tc2id is None:
+            self.tc2id = {tc: idx for idx, tc in enumerate(self.tcs)}
+        bitmap = 0
+        for tc in tc_list:
+            if tc in self.tc2id:
+                bitmap |= 1 << self.tc2id[tc]
+        return bitmap
+
+    def bitmap_tcs(self, bitmap):
+        bits = bin(bitmap)[:1:-1]
+        return [self.tcs[idx] for idx, bit in enumerate(bits) if bit == '1']
+
+    def line_tc_bitmap(self, line_key):
+        if self.line2idx is None:
+            self.line2idx = {key: idx for idx, key in enumerate(self.lines)}
+        if line_key not in self.line2idx:
+            return 0
+        return self.bitmap(self.line_bitmap[self.line2idx[line_key]])
+
+    # --- queries
+    def groups(self):
+        return list(self.encoded_groups.keys())
+
+    def lines_executed_by(self, group):
+        # lines executed by any test case of the group (ex. 'failing')
+        if group not in self.group_lines:
+            self.group_lines[group] = self.lines_executed_by_bitmap(self.group_bitmap(group))
+        return self.group_lines[group]
+
+    def lines_executed_by_tcs(self, tc_list):
+        # lines executed by any of the given test cases
+        return self.lines_executed_by_bitmap(self.tcs_bitmap(tc_list))
+
+    def lines_executed_by_bitmap(self, tcs_bitmap):
+        # a bitmap is decoded only once no matter how many lines share it
+        hit = {}
+        lines = []
+        for key, bitmap_id in zip(self.lines, self.line_bitmap):
+            if bitmap_id not in hit:
+                hit[bitmap_id] = (self.bitmap(bitmap_id) & tcs_bitmap) != 0
+            if hit[bitmap_id]:
+                lines.append(key)
+        return lines
+
+    def tcs_covering(self, line_key, group=None):
+        # test cases executing the line, optionally restricted to a group
+        bitmap = self.line_tc_bitmap(line_key)
+        if group is not None:
+            bitmap &= self.group_bitmap(group)
+        return self.bitmap_tcs(bitmap)
+
+    def tcs_covering_all(self, line_keys, group=None):
+        # intersection: test cases executing every one of the given lines
+        bitmap = self.group_bitmap(group) if group is not None else (1 << len(self.tcs)) - 1
+        for line_key in line_keys:
+            bitmap &= self.line_tc_bitmap(line_key)
+        return self.bitmap_tcs(bitmap)
+
+    def tcs_covering_any(self, line_keys, group=None):
+        # union: test cases executing at least one of the given lines
+        bitmap = 0
+        for line_key in line_keys:
+            bitmap |= self.line_tc_bitmap(line_key)
+        if group is not None:
+            bitmap &= self.group_bitmap(group)
+        return self.bitmap_tcs(bitmap)
+
+    def count_tcs_covering(self, line_key, group=None):
+        bitmap = self.line_tc_bitmap(line_key)
+        if group is not None:
+            bitmap &= self.group_bitmap(group)
+        return popcount(bitmap)
+
+    def is_executed_by(self, line_key, group):
+        return (self.line_tc_bitmap(line_key) & self.group_bitmap(group)) != 0
+
+
+def load_executed_lines_index(coverage_info_dir):
+    coverage_info_dir = Path(coverage_info_dir)
+
+    index_file = coverage_info_dir / executed_lines_index_file
+    if index_file.exists():
+        return ExecutedLinesIndex.load(index_file)
+
+    # coverage_info written before the index existed
+    failing_file = coverage_info_dir / legacy_failing_file
+    passing_file = coverage_info_dir / legacy_passing_file
+    assert failing_file.exists(), f"Executed lines index {index_file} does not exist"
+
+    lines_execed_by_tc = {}
+    tc_groups = {'failing': [], 'passing': []}
+    for group, legacy_file in [('failing', failing_file), ('passing', passing_file)]:
+        if not legacy_file.exists():
+            continue
+        with open(legacy_file, 'r') as f:
+            legacy = json.load(f)
+        group_tcs = set()
+        for key, tcs in legacy.items():
+            if key not in lines_execed_by_tc:
+                lines_execed_by_tc[key] = []
+            lines_execed_by_tc[key].extend(tcs)
+            group_tcs.update(tcs)
+        tc_groups[group] = sorted(group_tcs)
+
+    return ExecutedLinesIndex.build(tc_groups, lines_execed_by_tc)
@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import json
+
+from executed_lines_index import encode_bitmap, decode_bitmap, popcount
+from mbfl_formulas import measure_mbfl_features
+
+# Per mutant, per test case outcome of mutation testing.
+#
+# mutation_testing_results.csv only keeps p2f, p2p, f2p, f2f of each mutant,
+# which are fixed to the failing/passing split used while testing.
+# kill_matrix.json, written next to it by 01-4, keeps which test cases fail
+# on each mutant:
+#   'tcs':     every executed test case, its position is its id
+#   'groups':  {'failing': bitmap, 'passing': bitmap} split used while testing
+#   'bitmaps': distinct sets of failing test cases (bit i <-> tc id i),
+#              encoded as in executed_lines_index.py
+#   'mutants': [target_file, mutant_id, lineno, bitmap id] in testing order,
+#              bitmap id -1 when the mutant failed to build
+# Most mutants fail on the same few sets of test cases (ex. none), so each
+# set is stored once.
+#
+# With it, the outcome of every mutant (and the MUSE and Metallaxis features
+# of 01-5) is derived for any other failing/passing split of the same test
+# cases without building or running anything.
+
+kill_matrix_file = 'kill_matrix.json'
+
+
+class KillMatrix:
+    def __init__(self, data=None):
+        if data is None:
+            data = {'tcs': [], 'groups': {}, 'bitmaps': [], 'mutants': []}
+        self.tcs = data['tcs']
+        self.encoded_groups = data['groups']
+        self.encoded_bitmaps = data['bitmaps']
+        self.mutants = data['mutants']
+
+        self.decoded_bitmaps = {}
+        self.tc2id = {tc: idx for idx, tc in enumerate(self.tcs)}
+        self.encoded2id = None
+
+    # --- construction
+    @classmethod
+    def for_testsuite(cls, testsuite):
+        # testsuite: {'failing': [TC1.sh, ...], 'passing': [...]}
+        matrix = cls()
+        for group, tc_list in testsuite.items():
+            for tc in tc_list:
+                if tc not in matrix.tc2id:
+                    matrix.tc2id[tc] = len(matrix.tcs)
+                    matrix.tcs.append(tc)
+            matrix.encoded_groups[group] = encode_bitmap(matrix.tcs_bitmap(tc_list))
+        return matrix
+
+    @classmethod
+    def load(cls, matrix_file):
+        with open(matrix_file, 'r') as f:
+            data = json.load(f)
+        return cls(data)
+
+    def save(self, matrix_file):
+        data = {
+            'tcs': self.tcs,
+            'groups': self.encoded_groups,
+            'bitmaps': self.encoded_bitmaps,
+            'mutants': self.mutants,
+        }
+        with open(matrix_file, 'w') as f:
+            json.dump(data, f)
+
+    def add_mutant(self, target_file, mutant_id, lineno, failing_tcs):
+        # failing_tcs: test cases failing on the mutant, None when it failed to build
+        if failing_tcs is None:
+            self.mutants.append([target_file, mutant_id, lineno, -1])
+            return
+
+        if self.encoded2id is None:
+            self.encoded2id = {encoded: bitmap_id for bitmap_id, encoded in enumerate(self.encoded_bitmaps)}
+
+        encoded = encode_bitmap(self.tcs_bitmap(failing_tcs))
+        if encoded not in self.encoded2id:
+            self.encoded2id[encoded] = len(self.encoded_bitmaps)
+            self.encoded_bitmaps.append(encoded)
+        self.mutants.append([target_file, mutant_id, lineno, self.encoded2id[encoded]])
+
+    # --- access
+    def tcs_bitmap(self, tc_list):
+        bitmap = 0
+        for tc in tc_list:
+            assert tc in self.tc2id, f"Test case {tc} was not executed on the mutants"
+            bitmap |= 1 << self.tc2id[tc]
+        return bitmap
+
+    def bitmap(self, bitmap_id):
+        if bitmap_id not in self.decoded_bitmaps:
+            self.decoded_bitmaps[bitmap_id] = decode_bitmap(self.encoded_bitmaps[bitmap_id])
+        return self.decoded_bitmaps[bitmap_id]
+
+    def group_tcs(self, group):
+        bitmap = decode_bitmap(self.encoded_groups[group])
+        return [tc for idx, tc in enumerate(self.tcs) if (bitmap >> idx) & 1]
+
+    def covers(self, tc_list):
+        return all(tc in self.tc2id for tc in tc_list)
+
+    def failing_tcs(self, mutant_idx):
+        # test cases failing on the mutant, None when it failed to build
+        bitmap_id = self.mutants[mutant_idx][3]
+        if bitmap_id == -1:
+            return None
+        bitmap = self.bitmap(bitmap_id)
+        return [tc for idx, tc in enumerate(self.tcs) if (bitmap >> idx) & 1]
+
+    # --- recomputation
+    def outcomes(self, failing_tcs, passing_tcs):
+        # [(target_file, mutant_id, lineno, build_result, p2f, p2p, f2p, f2f)]
+        # as in mutation_testing_results.csv, for the given split
+        failing_bitmap = self.tcs_bitmap(failing_tcs)
+        passing_bitmap = self.tcs_bitmap(passing_tcs)
+        num_failing = popcount(failing_bitmap)
+        num_passing = popcount(passing_bitmap)
+
+        # outcomes are computed once per distinct bitmap
+        bitmap_outcome = {}
+        outcomes = []
+        for target_file, mutant_id, lineno, bitmap_id in self.mutants:
+            if bitmap_id == -1:
+                outcomes.append((target_file, mutant_id, lineno, 'FAIL', -1, -1, -1, -1))
+                continue
+
+            if bitmap_id not in bitmap_outcome:
+                bitmap = self.bitmap(bitmap_id)
+                p2f = popcount(bitmap & passing_bitmap)
+                f2f = popcount(bitmap & failing_bitmap)
+                bitmap_outcome[bitmap_id] = (p2f, num_passing - p2f, num_failing - f2f, f2f)
+            outcomes.append((target_file, mutant_id, lineno, 'PASS', *bitmap_outcome[bitmap_id]))
+        return outcomes
+
+    def perfileline_features(self, failing_tcs, passing_tcs):
+        # per file, per line outcomes as measure_mbfl_features() of mbfl_formulas.py takes them
+        perfileline_features = {}
+        total_p2f = 0
+        total_f2p = 0
+        for target_file, mutant_id, lineno, build_result, p2f, p2p, f2p, f2f in self.outcomes(failing_tcs, passing_tcs):
+            if build_result == 'FAIL':
+                continue
+
+            total_p2f += p2f
+            total_f2p += f2p
+
+            if target_file not in perfileline_features:
+                perfileline_features[target_file] = {}
+            if lineno not in perfileline_features[target_file]:
+                perfileline_features[target_file][lineno] = []
+            perfileline_features[target_file][lineno].append({
+                'mutant_id': mutant_id,
+                'p2f': p2f,
+                'p2p': p2p,
+                'f2p': f2p,
+                'f2f': f2f
+            })
+        return perfileline_features, total_p2f, total_f2p
+
+    def mbfl_features(self, failing_tcs, passing_tcs, max_mutants):
+        # MUSE and Metallaxis features of every mutated line for the given split
+        perfileline_features, total_p2f, total_f2p = self.perfileline_features(failing_tcs, passing_tcs)
+        return measure_mbfl_features(
+            perfileline_features, total_p2f, total_f2p,
+            len(failing_tcs), max_mutants
+        )
+
+
+def load_kill_matrix(version_dir):
+    matrix_file = Path(version_dir) / kill_matrix_file
+    if not matrix_file.exists():
+        return None
+    return KillMatrix.load(matrix_file)
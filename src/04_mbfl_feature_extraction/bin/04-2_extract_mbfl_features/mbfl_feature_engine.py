@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+
+import csv
+
+import numpy as np
+
+# Columnar computation of mbfl_features.csv.
+#
+# measure_mbfl_features() of mbfl_formulas.py walks nested dicts per file and
+# line. Here the outcome of every built mutant is one row of a few arrays,
+# mutants are grouped by line with one stable sort, and the padded
+# m{i}:f2p/m{i}:p2f columns and the MUSE/Metallaxis scores are array
+# operations over all lines at once. The written csv is the same as the one
+# process2csv() of 01-5 used to write.
+#
+# Formulas are registered in line_formulas:
+#   name -> function(outcomes, seg) returning one value per mutated line
+# where outcomes holds the arrays of the built mutants and seg tells which
+# mutated line each mutant belongs to (see LineSegments).
+# Only the columns of mbfl_features.csv are written by default, a formula
+# added here is written as an extra column when its name is given in
+# extra_formulas.
+
+mbfl_features_file = 'mbfl_features.csv'
+
+muse_columns = [
+    '|muse(s)|', 'total_f2p', 'total_p2f', 'line_total_f2p', 'line_total_p2f',
+    'muse_1', 'muse_2', 'muse_3', 'muse_4', 'muse susp. score',
+]
+
+line_formulas = {}
+
+
+def register_formula(name):
+    def register(formula):
+        line_formulas[name] = formula
+        return formula
+    return register
+
+
+class MutantOutcomes:
+    # outcome of each built mutant (mutants that failed to build are dropped)
+    def __init__(self, target_files, linenos, p2f, p2p, f2p, f2f):
+        self.target_files = target_files
+        self.linenos = linenos
+        self.p2f = np.asarray(p2f, dtype=np.int64)
+        self.p2p = np.asarray(p2p, dtype=np.int64)
+        self.f2p = np.asarray(f2p, dtype=np.int64)
+        self.f2f = np.asarray(f2f, dtype=np.int64)
+        self.num_failing_tcs = 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        # rows: (target_file, mutant_id, lineno, build_result, p2f, p2p, f2p, f2f)
+        # as in mutation_testing_results.csv (ex. KillMatrix.outcomes())
+        built = [row for row in rows if row[3] != 'FAIL']
+        return cls(
+            [row[0] for row in built],
+            [row[2] for row in built],
+            [int(row[4]) for row in built],
+            [int(row[5]) for row in built],
+            [int(row[6]) for row in built],
+            [int(row[7]) for row in built],
+        )
+
+    def __len__(self):
+        return len(self.target_files)
+
+    @property
+    def total_p2f(self):
+        return int(self.p2f.sum())
+
+    @property
+    def total_f2p(self):
+        return int(self.f2p.sum())
+
+
+class LineSegments:
+    # mutants grouped by (target_file, lineno), lines in order of first appearance
+    def __init__(self, outcomes):
+        line2id = {}
+        line_ids = np.empty(len(outcomes), dtype=np.int64)
+        for idx, line in enumerate(zip(outcomes.target_files, outcomes.linenos)):
+            if line not in line2id:
+                line2id[line] = len(line2id)
+            line_ids[idx] = line2id[line]
+
+        self.line2id = line2id
+        self.num_lines = len(line2id)
+        self.line_ids = line_ids
+        self.counts = np.bincount(line_ids, minlength=self.num_lines)
+
+        # position of each mutant among the mutants of its line, in testing order
+        self.order = np.argsort(line_ids, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(self.counts)[:-1])).astype(np.int64)
+        self.positions = np.empty(len(outcomes), dtype=np.int64)
+        self.positions[self.order] = np.arange(len(outcomes)) - starts[line_ids[self.order]]
+
+    def sum(self, values):
+        sums = np.zeros(self.num_lines, dtype=np.asarray(values).dtype)
+        np.add.at(sums, self.line_ids, values)
+        return sums
+
+    def max(self, values, initial):
+        maxs = np.full(self.num_lines, initial, dtype=np.float64)
+        np.maximum.at(maxs, self.line_ids, values)
+        return maxs
+
+    def pad(self, values, width, fill=-1):
+        # (lines, width) matrix, row i holds the values of the mutants of line i
+        padded = np.full((self.num_lines, width), fill, dtype=np.int64)
+        padded[self.line_ids, self.positions] = values
+        return padded
+
+
+@register_formula('met susp. score')
+def measure_metallaxis(outcomes, seg):
+    f2p = outcomes.f2p.astype(np.float64)
+    p2f = outcomes.p2f.astype(np.float64)
+    killed = f2p + p2f
+    scores = np.zeros(len(outcomes), dtype=np.float64)
+    nonzero = killed != 0
+    scores[nonzero] = f2p[nonzero] / np.sqrt(outcomes.num_failing_tcs * killed[nonzero])
+    # every mutated line has at least one mutant and scores are >= 0
+    return seg.max(scores, 0.0)
+
+
+def measure_muse(outcomes, seg):
+    total_p2f = outcomes.total_p2f
+    total_f2p = outcomes.total_f2p
+
+    utilized_mutant_cnt = seg.counts
+    line_total_f2p = seg.sum(outcomes.f2p)
+    line_total_p2f = seg.sum(outcomes.p2f)
+
+    muse_1 = 1 / ((utilized_mutant_cnt + 1) * (total_f2p + 1))
+    muse_2 = 1 / ((utilized_mutant_cnt + 1) * (total_p2f + 1))
+    muse_3 = muse_1 * line_total_f2p
+    muse_4 = muse_2 * line_total_p2f
+
+    return {
+        '|muse(s)|': utilized_mutant_cnt,
+        'total_f2p': np.full(seg.num_lines, total_f2p, dtype=np.int64),
+        'total_p2f': np.full(seg.num_lines, total_p2f, dtype=np.int64),
+        'line_total_f2p': line_total_f2p,
+        'line_total_p2f': line_total_p2f,
+        'muse_1': muse_1,
+        'muse_2': muse_2,
+        'muse_3': muse_3,
+        'muse_4': muse_4,
+        'muse susp. score': muse_3 - muse_4,
+    }
+
+
+@register_formula('muse susp. score')
+def measure_muse_score(outcomes, seg):
+    return measure_muse(outcomes, seg)['muse susp. score']
+
+
+def get_fieldnames(max_mutants, extra_formulas=[]):
+    mutant_columns = []
+    for i in range(1, max_mutants+1):
+        mutant_columns += [f'm{i}:f2p', f'm{i}:p2f']
+    return ['key', '# of totfailed_TCs', '# of mutants'] + mutant_columns + \
+        muse_columns + ['met susp. score'] + list(extra_formulas) + ['bug']
+
+
+def compute_mbfl_features(outcomes, num_failing_tcs, max_mutants, extra_formulas=[]):
+    # columns of the mutated lines: (line2id, {column: array or matrix})
+    outcomes.num_failing_tcs = num_failing_tcs
+    seg = LineSegments(outcomes)
+
+    max_line_mutants = int(seg.counts.max()) if seg.num_lines > 0 else 0
+    assert max_line_mutants <= max_mutants, f"A line has {max_line_mutants} mutants, more than max_mutants ({max_mutants})"
+
+    columns = {
+        'f2p': seg.pad(outcomes.f2p, max_mutants),
+        'p2f': seg.pad(outcomes.p2f, max_mutants),
+    }
+    columns.update(measure_muse(outcomes, seg))
+    columns['met susp. score'] = line_formulas['met susp. score'](outcomes, seg)
+    for name in extra_formulas:
+        assert name in line_formulas, f"Unknown formula {name}"
+        assert name not in muse_columns + ['met susp. score'], f"Formula {name} is already a column of {mbfl_features_file}"
+        columns[name] = line_formulas[name](outcomes, seg)
+    return seg.line2id, columns
+
+
+def write_mbfl_features_csv(csv_file, lines, buggy_line_key, outcomes, num_failing_tcs, max_mutants, extra_formulas=[]):
+    # lines: line keys (file#function#lineno) in the order of the coverage
+    # returns the formula scores of every line, as written ({formula: array})
+    line2id, columns = compute_mbfl_features(outcomes, num_failing_tcs, max_mutants, extra_formulas)
+
+    # one row (as python values) per mutated line
+    mutant_cells = np.empty((len(line2id), 2 * max_mutants), dtype=np.int64)
+    mutant_cells[:, 0::2] = columns['f2p']
+    mutant_cells[:, 1::2] = columns['p2f']
+    mutant_cells = mutant_cells.tolist()
+    score_names = muse_columns + ['met susp. score'] + list(extra_formulas)
+    score_cells = list(zip(*[columns[name].tolist() for name in score_names]))
+
+    formulas = ['met susp. score', 'muse susp. score'] + list(extra_formulas)
+    line_ids = np.array([line2id.get(feature_line_of(line), -1) for line in lines], dtype=np.int64)
+    mutated = line_ids >= 0
+    line_scores = {}
+    for formula in formulas:
+        line_scores[formula] = np.zeros(len(lines), dtype=np.float64)
+        line_scores[formula][mutated] = columns[formula][line_ids[mutated]]
+
+    default_cells = [-1] * (2 * max_mutants)
+    default_scores = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0.0, 0.0] + [0.0] * len(extra_formulas)
+
+    with open(csv_file, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(get_fieldnames(max_mutants, extra_formulas))
+
+        for line, line_id in zip(lines, line_ids.tolist()):
+            buggy_stat = 1 if line == buggy_line_key else 0
+
+            if line_id < 0:
+                writer.writerow([line, num_failing_tcs, max_mutants, *default_cells, *default_scores, buggy_stat])
+            else:
+                writer.writerow([line, num_failing_tcs, max_mutants, *mutant_cells[line_id], *score_cells[line_id], buggy_stat])
+
+    return line_scores
+
+
+def feature_line_of(line):
+    # (target_file, lineno) of a line key, as mutants are grouped in LineSegments
+    line_info = line.strip().split('#')
+    return line_info[0].split('/')[-1], line_info[-1]
+
+
+def read_mutation_testing_results(mutation_testing_result_file):
+    with open(mutation_testing_result_file, 'r') as f:
+        reader = csv.reader(f)
+        next(reader)
+        return MutantOutcomes.from_rows([row for row in reader if len(row) >= 8])
+
+
+def read_feature_lines(csv_file):
+    # (line keys, buggy line key) of an existing mbfl_features.csv
+    lines = []
+    buggy_line_key = None
+    with open(csv_file, 'r') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        bug_idx = header.index('bug')
+        for row in reader:
+            lines.append(row[0])
+            if row[bug_idx] == '1':
+                buggy_line_key = row[0]
+    return lines, buggy_line_key
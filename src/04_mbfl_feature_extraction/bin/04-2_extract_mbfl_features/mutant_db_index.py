@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import random
+import sqlite3
+
+# Index of <code_name>_mut_db.csv written by MUSICUP, for selecting mutants.
+#
+# mutant_db.sqlite sits next to the csv in the mutants directory of a target
+# file and holds one row per mutant: (lineno, operator, row), where row is the
+# csv line as MUSICUP wrote it, with an index on (lineno, operator).
+# 01-2 builds it once the mutants are generated; 01-3 only asks for the
+# mutants of the executed lines, so selecting costs as much as the executed
+# lines, not as the whole csv. The size and mtime of the csv it was built from
+# are kept, a stale index (or none, for mutants generated before it) is
+# rebuilt on load.
+
+mutant_db_index_file = 'mutant_db.sqlite'
+
+
+def find_mut_db_csv(mutants_dir):
+    mut_db_csvs = sorted(Path(mutants_dir).glob('*_mut_db.csv'))
+    if len(mut_db_csvs) == 0:
+        return None
+    return mut_db_csvs[0]
+
+
+def csv_signature(mut_db_csv):
+    stat = mut_db_csv.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def build_mutant_db_index(mutants_dir, mut_db_csv=None):
+    mutants_dir = Path(mutants_dir)
+    if mut_db_csv is None:
+        mut_db_csv = find_mut_db_csv(mutants_dir)
+    if mut_db_csv is None or not mut_db_csv.exists():
+        return None
+
+    # built under a temporary name, an interrupted build leaves no index
+    index_file = mutants_dir / mutant_db_index_file
+    tmp_file = mutants_dir / f".{mutant_db_index_file}.tmp"
+    if tmp_file.exists():
+        tmp_file.unlink()
+
+    conn = sqlite3.connect(tmp_file)
+    conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+    conn.execute('CREATE TABLE mutants (lineno INTEGER, operator TEXT, row TEXT)')
+
+    rows = []
+    with open(mut_db_csv, 'r') as f:
+        lines = f.readlines()
+        # 0 Mutant Filename, 1 Mutation Operator, 2 Start Line#, ...
+        for mutant_line in lines[2:]:
+            mutant_line = mutant_line.strip()
+            info = mutant_line.split(',')
+            if len(info) < 3 or not info[2].isdigit():
+                continue
+            rows.append((int(info[2]), info[1], mutant_line))
+
+    conn.executemany('INSERT INTO mutants VALUES (?, ?, ?)', rows)
+    conn.execute('CREATE INDEX mutants_line_operator ON mutants (lineno, operator)')
+    conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+        ('mut_db_csv', mut_db_csv.name),
+        ('signature', csv_signature(mut_db_csv)),
+    ])
+    conn.commit()
+    conn.close()
+
+    tmp_file.replace(index_file)
+    return index_file
+
+
+def load_mutant_db_index(mutants_dir, mut_db_csv=None):
+    # MutantDbIndex of the mutants directory, (re)built when missing or stale,
+    # None when the directory has no _mut_db.csv
+    mutants_dir = Path(mutants_dir)
+    if mut_db_csv is None:
+        mut_db_csv = find_mut_db_csv(mutants_dir)
+    if mut_db_csv is None or not mut_db_csv.exists():
+        return None
+
+    index_file = mutants_dir / mutant_db_index_file
+    if not index_file.exists() or read_signature(index_file) != csv_signature(mut_db_csv):
+        print(f"Indexing {mut_db_csv.name}")
+        build_mutant_db_index(mutants_dir, mut_db_csv)
+    return MutantDbIndex(index_file)
+
+
+def read_signature(index_file):
+    try:
+        conn = sqlite3.connect(index_file)
+        row = conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        conn.close()
+    except sqlite3.DatabaseError:
+        return None
+    return None if row is None else row[0]
+
+
+class MutantDbIndex:
+    def __init__(self, index_file):
+        self.index_file = Path(index_file)
+        self.conn = sqlite3.connect(self.index_file)
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM mutants').fetchone()[0]
+
+    def mutants_on_lines(self, linenos):
+        # {lineno: {operator: [row, ...]}} of the given lines (rows in csv order)
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS wanted_lines (lineno INTEGER PRIMARY KEY)')
+        self.conn.execute('DELETE FROM wanted_lines')
+        self.conn.executemany('INSERT OR IGNORE INTO wanted_lines VALUES (?)', [(int(lineno),) for lineno in linenos])
+
+        line_mutants = {}
+        cursor = self.conn.execute(
+            'SELECT m.lineno, m.operator, m.row FROM wanted_lines w '
+            'JOIN mutants m ON m.lineno = w.lineno ORDER BY m.lineno, m.rowid'
+        )
+        for lineno, operator, row in cursor:
+            lineno = str(lineno)
+            if lineno not in line_mutants:
+                line_mutants[lineno] = {}
+            if operator not in line_mutants[lineno]:
+                line_mutants[lineno][operator] = []
+            line_mutants[lineno][operator].append(row)
+        return line_mutants
+
+    def select(self, linenos, max_mutants, rng):
+        # up to max_mutants mutants per line, spread over the mutation operators:
+        # operators take turns (in a random order), each giving a random one of its mutants
+        selected = {}
+        for lineno, operator_mutants in self.mutants_on_lines(linenos).items():
+            operators = sorted(operator_mutants.keys())
+            rng.shuffle(operators)
+            queues = []
+            for operator in operators:
+                queue = list(operator_mutants[operator])
+                rng.shuffle(queue)
+                queues.append(queue)
+
+            picked = []
+            depth = 0
+            while len(picked) < max_mutants and any(depth < len(queue) for queue in queues):
+                for queue in queues:
+                    if depth < len(queue) and len(picked) < max_mutants:
+                        picked.append(queue[depth])
+                depth += 1
+            selected[lineno] = picked
+        return selected
+
+
+def make_selection_rng(seed, version_name, filename):
+    # same selection for the same seed, version and file, whatever the order of files
+    return random.Random(f"{seed}:{version_name}:{filename}")
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+# A MUSICUP mutant is the target file with one region replaced.
+# Instead of handling full copies, a mutant is reduced to its edit:
+#   (start, end, replacement)
+# meaning original[start:end] is replaced by replacement (byte offsets).
+#
+# The tokens written to _mut_db.csv are cut at the first comma or newline
+# and only describe the first location of multi-location mutants, so the
+# edit is taken from the mutant file itself (common prefix and suffix with
+# the original).
+
+
+def common_prefix_len(a, b):
+    # binary search over slice comparisons (memcmp) instead of a byte loop
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def common_suffix_len(a, b, limit):
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a)-mid:] == b[len(b)-mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def diff_edit(original, mutated):
+    # smallest single edit turning original into mutated
+    prefix = common_prefix_len(original, mutated)
+    limit = min(len(original), len(mutated)) - prefix
+    suffix = common_suffix_len(original, mutated, limit)
+    return (prefix, len(original) - suffix, mutated[prefix:len(mutated) - suffix])
+
+def apply_edit(base, edit):
+    start, end, replacement = edit
+    return base[:start] + replacement + base[end:]
+
+def line_span(base, edit):
+    # first and last line (1-based) of base touched by the edit
+    start, end, replacement = edit
+    first_line = base.count(b'\n', 0, start) + 1
+    last_line = base.count(b'\n', 0, max(start, end - 1)) + 1
+    return first_line, last_line
+
+def changes_line_count(base, edit):
+    start, end, replacement = edit
+    return base.count(b'\n', start, end) != replacement.count(b'\n')
+
+def rebase_edit(edit, base_edit):
+    # move an edit made on original onto original+base_edit,
+    # returns None when both edits touch the same bytes
+    start, end, replacement = edit
+    base_start, base_end, base_replacement = base_edit
+
+    if end <= base_start and start < base_start:
+        return edit
+    if start >= base_end and end > base_end:
+        delta = len(base_replacement) - (base_end - base_start)
+        return (start + delta, end + delta, replacement)
+    return None
@@ -8,6 +8,9 @@ import csv
 import pandas as pd
 import sys
 
+from executed_lines_index import load_executed_lines_index, executed_lines_index_file, legacy_failing_file, legacy_passing_file
+from analysis_cache import AnalysisCache
+
 # Current working directory
 script_path = Path(__file__).resolve()
 mbfl_dataset_dir = script_path.parent
@@ -43,10 +46,10 @@ passing_txt = 'passing_tcs.txt'
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.subset_type, args.new_set_name)
+    start_process(args.subject, args.subset_type, args.new_set_name, args.no_cache)
 
 
-def start_process(subject_name, subset_type, new_set_name):
+def start_process(subject_name, subset_type, new_set_name, no_cache=False):
     global configure_json_file
 
     subject_working_dir = mbfl_feature_extraction_dir / f"{subject_name}-working_directory"
@@ -61,7 +64,9 @@ def start_process(subject_name, subset_type, new_set_name):
     # 3. analyze the change features of mutants on buggy function and returns bad bug version
     # bad bug versions are buggy version in which none of the
     # lines of the buggy function has total_f2p of mutants in the line greater than 0
-    bad_BF, bad_NBF = start_analysis(configs, mbfl_features_per_bug, subset_type)
+    analysis_cache = AnalysisCache.of_working_dir(subject_working_dir, enabled=not no_cache)
+    bad_BF, bad_NBF = start_analysis(configs, mbfl_features_per_bug, subset_type, analysis_cache)
+    print(analysis_cache.summary())
 
     bad_BF = set(bad_BF)
     bad_NBF = set(bad_NBF)
@@ -89,7 +94,7 @@ def start_process(subject_name, subset_type, new_set_name):
 
 
 
-def start_analysis(configs, mbfl_features_per_bug, subset_type):
+def start_analysis(configs, mbfl_features_per_bug, subset_type, analysis_cache):
     max_mutants = configs['max_mutants']
     mutant_keys = get_mutant_keys(max_mutants)
 
@@ -106,43 +111,44 @@ def start_analysis(configs, mbfl_features_per_bug, subset_type):
         assert mbfl_features_csv_file.exists(), f"MBFL features file {mbfl_features_csv_file} does not exist"
 
         # GET: list of failing TCs
-        failing_tcs = get_tcs(bug_dir, 'failing_tcs.txt')
+        failing_tcs = load_tcs(analysis_cache, bug_dir, 'failing_tcs.txt')
 
         # GET: buggy line key
-        buggy_line_key = get_buggy_line_key(bug_dir)
+        buggy_line_key = analysis_cache.load(bug_dir, get_buggy_line_key, ['buggy_line_key.txt'])
 
         # GET: get lines executed by failing TCs
         # key: <target-file>#<function-name>#<line-number> WHICH IS JUST LIKE BUGGY_LINE_KEY
         # value: list of failing TCs [TC1, TC2, ...]
-        lines_executed_by_failing_tcs = get_lines_executed_by_failing_tcs(bug_dir)
+        lines_executed_by_failing_tcs = analysis_cache.load(bug_dir, get_lines_executed_by_failing_tcs, executed_lines_inputs)
 
         # VALIDATE: buggy_line_key exists as line in lines_executed_by_failing_tcs
         assert buggy_line_key in lines_executed_by_failing_tcs, f"Buggy line key {buggy_line_key} does not exist in lines executed by failing TCs"
 
         # GET: mutants data
-        mutants_data = get_mutants_data(bug_dir, buggy_line_key)
+        mutants_data = analysis_cache.load(bug_dir, get_mutants_data, ['mutation_testing_results.csv'], buggy_line_key)
 
         # GET: mbfl_features, suspiciousness scores
+        mbfl_feature_rows = analysis_cache.load(bug_dir, get_mbfl_feature_rows, ['mbfl_features.csv'])
         if subset_type == 'both-BF-NBF':
-            res = analysis_buggy_function_with_f2p_0(bug_name, mbfl_features_csv_file, buggy_line_key, mutant_keys)
+            res = analysis_buggy_function_with_f2p_0(bug_name, mbfl_feature_rows, buggy_line_key, mutant_keys)
 
             if res == 0:
                 print(f"buggy function with f2p=0: {bug_name}")
                 bad_BF.append(bug_name)
             
-            res = analysis_non_buggy_function_with_f2p_above_th(bug_name, mbfl_features_csv_file, buggy_line_key, mutant_keys, len(failing_tcs), 10)
+            res = analysis_non_buggy_function_with_f2p_above_th(bug_name, mbfl_feature_rows, buggy_line_key, mutant_keys, len(failing_tcs), 10)
 
             if res == 0:
                 print(f"non-buggy function with f2p above th: {bug_name}")
                 bad_NBF.append(bug_name)
         elif subset_type == 'BF':
-            res = analysis_buggy_function_with_f2p_0(bug_name, mbfl_features_csv_file, buggy_line_key, mutant_keys)
+            res = analysis_buggy_function_with_f2p_0(bug_name, mbfl_feature_rows, buggy_line_key, mutant_keys)
 
             if res == 0:
                 print(f"buggy function with f2p=0: {bug_name}")
                 bad_BF.append(bug_name)
         elif subset_type == 'NBF':
-            res = analysis_non_buggy_function_with_f2p_above_th(bug_name, mbfl_features_csv_file, buggy_line_key, mutant_keys, len(failing_tcs), 10)
+            res = analysis_non_buggy_function_with_f2p_above_th(bug_name, mbfl_feature_rows, buggy_line_key, mutant_keys, len(failing_tcs), 10)
 
             if res == 0:
                 print(f"non-buggy function with f2p above th: {bug_name}")
@@ -166,6 +172,10 @@ def custome_sort(tc_script):
     tc_filename = tc_script.split('.')[0]
     return int(tc_filename[2:])
 
+def load_tcs(analysis_cache, version_dir, tc_file):
+    # get_tcs through the analysis cache
+    return analysis_cache.load(version_dir, get_tcs, [f'testsuite_info/{tc_file}'], tc_file)
+
 def get_tcs(version_dir, tc_file):
     testsuite_info_dir = version_dir / 'testsuite_info'
     assert testsuite_info_dir.exists(), f"Testsuite info directory {testsuite_info_dir} does not exist"
@@ -186,33 +196,31 @@ def get_tcs(version_dir, tc_file):
     return tcs_list
 
 
-def analysis_non_buggy_function_with_f2p_above_th(bug_name, mbfl_features_csv_file, buggy_line_key, mutant_keys, fail_cnt, threshold):
+def analysis_non_buggy_function_with_f2p_above_th(bug_name, mbfl_feature_rows, buggy_line_key, mutant_keys, fail_cnt, threshold):
     target_buggy_file = buggy_line_key.split('#')[0].split('/')[-1]
     buggy_function_name = buggy_line_key.split('#')[1]
     buggy_lineno = int(buggy_line_key.split('#')[-1])
 
     bad_line = []
 
-    with open(mbfl_features_csv_file, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            key = row['key']
-            current_target_file = key.split('#')[0].split('/')[-1]
-            current_function_name = key.split('#')[1]
-            current_lineno = int(key.split('#')[-1])
+    for row in mbfl_feature_rows:
+        key = row['key']
+        current_target_file = key.split('#')[0].split('/')[-1]
+        current_function_name = key.split('#')[1]
+        current_lineno = int(key.split('#')[-1])
 
-            num_mutants = int(row['|muse(s)|'])
+        num_mutants = int(row['|muse(s)|'])
 
-            if current_target_file != target_buggy_file or \
-                current_function_name != buggy_function_name:
+        if current_target_file != target_buggy_file or \
+            current_function_name != buggy_function_name:
 
-                # mutant list which its mutants have f2p == fail_cnt
-                fully_killed_mutants_list = fully_killed_mutants(row, mutant_keys, 'f2p', fail_cnt)
+            # mutant list which its mutants have f2p == fail_cnt
+            fully_killed_mutants_list = fully_killed_mutants(row, mutant_keys, 'f2p', fail_cnt)
 
-                # if line has no mutants with f2p == fail_cnt
-                # then add the line to bad_line
-                if len(fully_killed_mutants_list) > num_mutants/2:
-                    bad_line.append(row)
+            # if line has no mutants with f2p == fail_cnt
+            # then add the line to bad_line
+            if len(fully_killed_mutants_list) > num_mutants/2:
+                bad_line.append(row)
     
     # if there is no line with f2p == fail_cnt
     # then return 0
@@ -241,27 +249,25 @@ def fully_killed_mutants(row, mutant_keys, f2p_or_p2f, fail_cnt):
     # return 1
 
 
-def analysis_buggy_function_with_f2p_0(bug_name, mbfl_features_csv_file, buggy_line_key, mutant_keys):
+def analysis_buggy_function_with_f2p_0(bug_name, mbfl_feature_rows, buggy_line_key, mutant_keys):
     target_buggy_file = buggy_line_key.split('#')[0].split('/')[-1]
     buggy_function_name = buggy_line_key.split('#')[1]
     buggy_lineno = int(buggy_line_key.split('#')[-1])
 
     good_mutants = []
 
-    with open(mbfl_features_csv_file, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            key = row['key']
-            current_target_file = key.split('#')[0].split('/')[-1]
-            current_function_name = key.split('#')[1]
-            current_lineno = int(key.split('#')[-1])
-
-            if current_target_file == target_buggy_file and \
-                current_function_name == buggy_function_name:
-
-                feature_value = measure_feature_value(row, mutant_keys, 'f2p')
-                if feature_value != 0:
-                    good_mutants.append(row)
+    for row in mbfl_feature_rows:
+        key = row['key']
+        current_target_file = key.split('#')[0].split('/')[-1]
+        current_function_name = key.split('#')[1]
+        current_lineno = int(key.split('#')[-1])
+
+        if current_target_file == target_buggy_file and \
+            current_function_name == buggy_function_name:
+
+            feature_value = measure_feature_value(row, mutant_keys, 'f2p')
+            if feature_value != 0:
+                good_mutants.append(row)
     
     if len(good_mutants) == 0:
         return 0
@@ -272,6 +278,13 @@ def analysis_buggy_function_with_f2p_0(bug_name, mbfl_features_csv_file, buggy_l
 
 
 
+def get_mbfl_feature_rows(bug_dir):
+    mbfl_features_csv_file = bug_dir / 'mbfl_features.csv'
+    with open(mbfl_features_csv_file, 'r') as f:
+        reader = csv.DictReader(f)
+        return list(reader)
+
+
 def measure_feature_value(row, mutant_keys, f2p_or_p2f):
     feature_value = 0
 
@@ -340,13 +353,12 @@ def get_buggy_line_key(bug_dir):
 
     return buggy_line_key
 
-def get_lines_executed_by_failing_tcs(bug_dir):
-    get_lines_executed_by_failing_tcs_file = bug_dir / 'coverage_info/lines_executed_by_failing_tc.json'
-    assert get_lines_executed_by_failing_tcs_file.exists(), f"Lines executed by failing TCs file {get_lines_executed_by_failing_tcs_file} does not exist"
+# inputs of get_lines_executed_by_failing_tcs (the index, or the json files written before it)
+executed_lines_inputs = [f'coverage_info/{name}' for name in [executed_lines_index_file, legacy_failing_file, legacy_passing_file]]
 
-    lines_executed_by_failing_tcs = None
-    with get_lines_executed_by_failing_tcs_file.open() as f:
-        lines_executed_by_failing_tcs = json.load(f)
+def get_lines_executed_by_failing_tcs(bug_dir):
+    executed_lines_index = load_executed_lines_index(bug_dir / 'coverage_info')
+    lines_executed_by_failing_tcs = set(executed_lines_index.lines_executed_by('failing'))
 
     return lines_executed_by_failing_tcs
 
@@ -388,6 +400,7 @@ def make_parser():
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--subset-type', type=str, help='Subset type', required=True, choices=['both-BF-NBF', 'BF', 'NBF'])
     parser.add_argument('--new-set-name', type=str, help='New set name', required=True)
+    parser.add_argument('--no-cache', action='store_true', help='Parse the inputs of every buggy version again instead of using the analysis cache')
     return parser
     
 
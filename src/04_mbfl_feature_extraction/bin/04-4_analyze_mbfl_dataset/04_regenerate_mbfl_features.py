@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import argparse
+import json
+import multiprocessing
+
+from mbfl_feature_engine import MutantOutcomes, read_mutation_testing_results, read_feature_lines, write_mbfl_features_csv, mbfl_features_file
+from kill_matrix import load_kill_matrix
+from feature_aggregation import write_aggregate_tables
+
+# Current working directory
+script_path = Path(__file__).resolve()
+mbfl_dataset_dir = script_path.parent
+bin_dir = mbfl_dataset_dir.parent
+mbfl_feature_extraction_dir = bin_dir.parent
+
+# General directories
+src_dir = mbfl_feature_extraction_dir.parent
+root_dir = src_dir.parent
+
+# files in user_configs_dir
+configure_json_file = 'configurations.json'
+
+# file names
+failing_txt = 'failing_tcs.txt'
+passing_txt = 'passing_tcs.txt'
+
+
+def main():
+    parser = make_parser()
+    args = parser.parse_args()
+    start_process(args.subject, args.mbfl_set_name, args.processes, args.extra_formulas)
+
+
+def start_process(subject_name, mbfl_set_name, processes, extra_formulas):
+    subject_working_dir = mbfl_feature_extraction_dir / f"{subject_name}-working_directory"
+    assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
+
+    # 1. Read configurations
+    configs = read_configs(subject_name, subject_working_dir)
+    max_mutants = configs['max_mutants']
+
+    # 2. get buggy versions of the gathered mbfl set
+    buggy_versions = get_buggy_versions(subject_working_dir, mbfl_set_name)
+    print(f"Regenerating {mbfl_features_file} of {len(buggy_versions)} buggy versions")
+
+    # 3. recompute the mbfl features of every version from its mutant outcomes
+    jobs = [(bug_dir, max_mutants, extra_formulas) for bug_dir in buggy_versions]
+    with multiprocessing.Pool(processes) as pool:
+        for idx, bug_name in enumerate(pool.imap_unordered(regenerate_version, jobs)):
+            print(f"{idx+1}/{len(jobs)}: {bug_name}")
+
+
+def regenerate_version(job):
+    bug_dir, max_mutants, extra_formulas = job
+
+    # GET: lines in the order of the current mbfl_features.csv
+    mbfl_features_csv_file = bug_dir / mbfl_features_file
+    assert mbfl_features_csv_file.exists(), f"MBFL features file {mbfl_features_csv_file} does not exist"
+    lines, buggy_line_key = read_feature_lines(mbfl_features_csv_file)
+
+    buggy_line_key_file = bug_dir / 'buggy_line_key.txt'
+    if buggy_line_key_file.exists():
+        with open(buggy_line_key_file, 'r') as f:
+            buggy_line_key = f.readline().strip()
+
+    # GET: test cases
+    failing_tcs = get_tcs(bug_dir, failing_txt)
+    passing_tcs = get_tcs(bug_dir, passing_txt)
+
+    # GET: outcome of each built mutant for the current failing/passing split
+    kill_matrix = load_kill_matrix(bug_dir)
+    if kill_matrix is not None and kill_matrix.covers(failing_tcs) and kill_matrix.covers(passing_tcs):
+        outcomes = MutantOutcomes.from_rows(kill_matrix.outcomes(failing_tcs, passing_tcs))
+    else:
+        mutation_testing_result_file = bug_dir / 'mutation_testing_results.csv'
+        assert mutation_testing_result_file.exists(), f"Mutation testing result file {mutation_testing_result_file} does not exist"
+        outcomes = read_mutation_testing_results(mutation_testing_result_file)
+
+    line_scores = write_mbfl_features_csv(
+        mbfl_features_csv_file, lines, buggy_line_key,
+        outcomes, len(failing_tcs), max_mutants, extra_formulas
+    )
+    write_aggregate_tables(mbfl_features_csv_file, lines, buggy_line_key, line_scores)
+    return bug_dir.name
+
+
+def custome_sort(tc_script):
+    tc_filename = tc_script.split('.')[0]
+    return int(tc_filename[2:])
+
+def get_tcs(version_dir, tc_file):
+    testsuite_info_dir = version_dir / 'testsuite_info'
+    assert testsuite_info_dir.exists(), f"Testsuite info directory {testsuite_info_dir} does not exist"
+
+    tc_file_txt = testsuite_info_dir / tc_file
+    assert tc_file_txt.exists(), f"Test cases file {tc_file_txt} does not exist"
+
+    tcs_list = []
+    with open(tc_file_txt, 'r') as f:
+        for line in f.readlines():
+            line = line.strip()
+            if line == '':
+                continue
+            tcs_list.append(line)
+
+    return sorted(tcs_list, key=custome_sort)
+
+
+def get_buggy_versions(subject_working_dir, versions_set_name):
+    buggy_versions_dir = subject_working_dir / versions_set_name
+    assert buggy_versions_dir.exists(), f"Buggy versions directory {buggy_versions_dir} does not exist"
+
+    buggy_versions = []
+    for buggy_version in buggy_versions_dir.iterdir():
+        if buggy_version.is_dir():
+            buggy_versions.append(buggy_version)
+
+    return buggy_versions
+
+
+def read_configs(subject_name, subject_working_dir):
+    global configure_json_file
+
+    subject_config_dir = subject_working_dir / f"{subject_name}-configures"
+    assert subject_config_dir.exists(), f"Subject configurations directory {subject_config_dir} does not exist"
+
+    config_json = subject_config_dir / configure_json_file
+    assert config_json.exists(), f"Configurations file {config_json} does not exist"
+
+    configs = None
+    with config_json.open() as f:
+        configs = json.load(f)
+
+    if configs is None:
+        raise Exception('Configurations are not loaded')
+
+    return configs
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Recompute mbfl_features.csv of every buggy version of a gathered mbfl set')
+    parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--mbfl-set-name', type=str, help='MBFL set name', required=True)
+    parser.add_argument('--processes', type=int, default=None, help='Number of processes (default: number of cores)')
+    parser.add_argument('--extra-formulas', type=str, nargs='*', default=[], help='Formulas registered in mbfl_feature_engine.py to add as columns')
+    return parser
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import argparse
+
+from dataset_store import build_dataset, default_store_dir, remove_dataset
+
+# Current working directory
+script_path = Path(__file__).resolve()
+mbfl_dataset_dir = script_path.parent
+bin_dir = mbfl_dataset_dir.parent
+mbfl_feature_extraction_dir = bin_dir.parent
+
+# General directories
+src_dir = mbfl_feature_extraction_dir.parent
+root_dir = src_dir.parent
+
+# file names
+default_features_files = ['mbfl_features.csv']
+
+
+def main():
+    parser = make_parser()
+    args = parser.parse_args()
+    start_process(args.subject, args.mbfl_set_name, args.features, args.format, args.rebuild, args.compact)
+
+
+def start_process(subject_name, mbfl_set_name, features_files, fmt, rebuild, compact):
+    subject_working_dir = mbfl_feature_extraction_dir / f"{subject_name}-working_directory"
+    assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
+
+    set_dir = subject_working_dir / mbfl_set_name
+    store_dir = default_store_dir(set_dir)
+
+    # 1. start from an empty store when rebuilding
+    if rebuild:
+        print(f"Removing {store_dir.name}")
+        remove_dataset(store_dir)
+
+    # 2. add the new and changed buggy versions as a new part
+    store = build_dataset(set_dir, features_files, store_dir, fmt)
+
+    # 3. rewrite the tables as a single part
+    if compact:
+        store.compact()
+        print(f"Compacted {store_dir.name} into a single part")
+
+    print(f"Tables of {store_dir.name} ({store.manifest['format']}): {', '.join(store.tables())}")
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Consolidate the buggy versions of an mbfl set into a columnar dataset store (<mbfl-set-name>.dataset/)')
+    parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--mbfl-set-name', type=str, help='MBFL set name', required=True)
+    parser.add_argument('--features', type=str, nargs='*', default=default_features_files, help='Line-level feature csv files of each buggy version to store (default: mbfl_features.csv)')
+    parser.add_argument('--format', type=str, choices=['parquet', 'csv'], default=None, help='Format of a new store (default: parquet when pyarrow is installed, csv otherwise)')
+    parser.add_argument('--rebuild', action='store_true', help='Remove the store and build it from scratch')
+    parser.add_argument('--compact', action='store_true', help='Rewrite the tables as a single part after building')
+    return parser
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import csv
+import gzip
+import hashlib
+import json
+import shutil
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Consolidated, columnar copy of the per-version files of a gathered set
+# (ex. prerequisite_data/, mbfl_features/, sbfl_features/).
+#
+# The store is a directory next to the set, <set>.dataset/:
+#   manifest.json                       format, tables, and the part holding each version
+#   bug_info/part-<n>.<ext>             a row per version: bug_info.csv, buggy_line_key.txt
+#                                       and the columns of coverage_summary.csv
+#   testsuite/part-<n>.<ext>            a row per (version, group, tc) of testsuite_info/*.txt
+#   <features stem>/part-<n>.<ext>      a row per line of <features stem>.csv
+#                                       (ex. mbfl_features, sbfl_features)
+# where every table has a 'version' column. <ext> is parquet when pyarrow is
+# installed and csv.gz otherwise (the format of a store is fixed when it is
+# created).
+#
+# Building is incremental: a build writes one new part with the versions
+# that are new or whose files changed since they were stored (size and mtime
+# of the files read), and versions no longer in the set are dropped from the
+# manifest. The manifest tells the part of each version; rows of a version in
+# an older part are ignored by the loader. compact() rewrites all tables into
+# a single part.
+
+manifest_file = 'manifest.json'
+bug_info_table = 'bug_info'
+testsuite_table = 'testsuite'
+testsuite_groups = {
+    'failing': 'failing_tcs.txt',
+    'passing': 'passing_tcs.txt',
+    'ccts': 'ccts.txt',
+    'excluded_failing': 'excluded_failing_tcs.txt',
+    'excluded_passing': 'excluded_passing_tcs.txt',
+    'additional_failing': 'additional_failing_tcs.txt',
+}
+
+
+def default_store_dir(set_dir):
+    set_dir = Path(set_dir)
+    return set_dir.parent / f"{set_dir.name}.dataset"
+
+
+def available_format():
+    return 'parquet' if pa is not None else 'csv'
+
+
+class DatasetStore:
+    def __init__(self, store_dir, manifest):
+        self.store_dir = Path(store_dir)
+        self.manifest = manifest
+
+    @classmethod
+    def open(cls, store_dir):
+        store_dir = Path(store_dir)
+        manifest_path = store_dir / manifest_file
+        assert manifest_path.exists(), f"Dataset manifest {manifest_path} does not exist"
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        assert manifest['format'] != 'parquet' or pa is not None, f"{store_dir} is stored as parquet but pyarrow is not installed"
+        return cls(store_dir, manifest)
+
+    @classmethod
+    def create(cls, store_dir, fmt=None):
+        store_dir = Path(store_dir)
+        if (store_dir / manifest_file).exists():
+            return cls.open(store_dir)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            'format': fmt if fmt is not None else available_format(),
+            'num_parts': 0,
+            'tables': [bug_info_table, testsuite_table],
+            'versions': {},
+        }
+        store = cls(store_dir, manifest)
+        store.save_manifest()
+        return store
+
+    def save_manifest(self):
+        tmp_file = self.store_dir / f".{manifest_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        tmp_file.replace(self.store_dir / manifest_file)
+
+    @property
+    def extension(self):
+        return 'parquet' if self.manifest['format'] == 'parquet' else 'csv.gz'
+
+    def versions(self):
+        return sorted(self.manifest['versions'].keys())
+
+    def tables(self):
+        return list(self.manifest['tables'])
+
+    def part_file(self, table, part):
+        return self.store_dir / table / f"part-{part:05d}.{self.extension}"
+
+    # --- writing
+
+    def append(self, version_rows):
+        # version_rows: {version: {'signature': str, 'tables': {table: {column: [values]}}}}
+        # all given versions go to one new part
+        if len(version_rows) == 0:
+            return None
+        part = self.manifest['num_parts']
+
+        tables = []
+        for rows in version_rows.values():
+            for table in rows['tables']:
+                if table not in tables:
+                    tables.append(table)
+
+        for table in tables:
+            table_columns = [rows['tables'][table] for rows in version_rows.values() if table in rows['tables']]
+            columns = merge_columns(table_columns)
+            if len(columns) == 0:
+                continue
+            part_file = self.part_file(table, part)
+            part_file.parent.mkdir(parents=True, exist_ok=True)
+            write_part(part_file, columns, self.manifest['format'])
+            if table not in self.manifest['tables']:
+                self.manifest['tables'].append(table)
+
+        for version, rows in version_rows.items():
+            self.manifest['versions'][version] = {'part': part, 'signature': rows['signature']}
+        self.manifest['num_parts'] = part + 1
+        self.save_manifest()
+        return part
+
+    def remove_versions(self, versions):
+        for version in versions:
+            self.manifest['versions'].pop(version, None)
+        self.save_manifest()
+
+    def compact(self):
+        # rewrite every table as a single part holding the current rows only
+        tables = {table: self.load_table(table) for table in self.manifest['tables']}
+        old_parts = self.manifest['num_parts']
+        part = old_parts
+        for table, columns in tables.items():
+            if len(columns) == 0:
+                continue
+            write_part(self.part_file(table, part), {name: values.tolist() for name, values in columns.items()}, self.manifest['format'])
+
+        for version in self.manifest['versions']:
+            self.manifest['versions'][version]['part'] = part
+        self.manifest['num_parts'] = part + 1
+        self.save_manifest()
+
+        for table in tables:
+            for old_part in range(old_parts):
+                old_file = self.part_file(table, old_part)
+                if old_file.exists():
+                    old_file.unlink()
+
+    # --- loading
+
+    def load_table(self, table, columns=None, versions=None):
+        # {column: array} of the current rows of a table (optionally of some versions)
+        assert table in self.manifest['tables'], f"Table {table} is not in {self.store_dir}"
+        if versions is not None:
+            versions = set(versions)
+
+        loaded = []
+        for part in range(self.manifest['num_parts']):
+            part_file = self.part_file(table, part)
+            part_versions = [
+                version for version, info in self.manifest['versions'].items()
+                if info['part'] == part and (versions is None or version in versions)
+            ]
+            if not part_file.exists() or len(part_versions) == 0:
+                continue
+            part_columns = read_part(part_file, self.manifest['format'], columns)
+            keep = np.isin(part_columns['version'].astype(str), part_versions)
+            if keep.any():
+                loaded.append({name: values[keep] for name, values in part_columns.items()})
+
+        return concatenate_columns(loaded)
+
+    def bug_info(self, versions=None):
+        return self.load_table(bug_info_table, versions=versions)
+
+    def testsuite(self, version, group):
+        columns = self.load_table(testsuite_table, versions=[version])
+        return [tc for tc, tc_group in zip(columns['tc'].tolist(), columns['group'].tolist()) if tc_group == group]
+
+    def features(self, features_name, columns=None, versions=None):
+        if columns is not None:
+            columns = ['version', 'key'] + [col for col in columns if col not in ['version', 'key']]
+        return self.load_table(features_name, columns, versions)
+
+
+def merge_columns(table_columns):
+    # one {column: [values]} of several, missing columns filled with None
+    names = []
+    for columns in table_columns:
+        for name in columns:
+            if name not in names:
+                names.append(name)
+
+    merged = {name: [] for name in names}
+    for columns in table_columns:
+        num_rows = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+        for name in names:
+            merged[name].extend(columns[name] if name in columns else [None] * num_rows)
+    return merged
+
+
+def concatenate_columns(loaded):
+    if len(loaded) == 0:
+        return {}
+    names = []
+    for columns in loaded:
+        for name in columns:
+            if name not in names:
+                names.append(name)
+
+    concatenated = {}
+    for name in names:
+        parts = []
+        for columns in loaded:
+            num_rows = len(columns['version'])
+            parts.append(columns[name] if name in columns else np.full(num_rows, None, dtype=object))
+        if all(part.dtype.kind in 'iuf' for part in parts):
+            concatenated[name] = np.concatenate(parts)
+        else:
+            concatenated[name] = np.concatenate([part.astype(object) for part in parts])
+    return concatenated
+
+
+def typed_column(values):
+    # numpy array of a column read back as text: int, float (empty as NaN), or str
+    try:
+        return np.array(values, dtype=np.int64).reshape(len(values))
+    except (ValueError, OverflowError):
+        pass
+    try:
+        return np.array([np.nan if value == '' else value for value in values], dtype=np.float64).reshape(len(values))
+    except ValueError:
+        return np.array(values, dtype=object).reshape(len(values))
+
+
+def write_part(part_file, columns, fmt):
+    tmp_file = part_file.parent / f".{part_file.name}.tmp"
+    if fmt == 'parquet':
+        pq.write_table(pa.table({name: pa.array(values) for name, values in columns.items()}), tmp_file)
+    else:
+        names = list(columns.keys())
+        with gzip.open(tmp_file, 'wt', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            for row in zip(*[columns[name] for name in names]):
+                writer.writerow(['' if value is None else value for value in row])
+    tmp_file.replace(part_file)
+
+
+def read_part(part_file, fmt, columns=None):
+    if fmt == 'parquet':
+        if columns is not None:
+            columns = ['version'] + [col for col in columns if col != 'version']
+            schema_names = pq.read_schema(part_file).names
+            columns = [col for col in columns if col in schema_names]
+        table = pq.read_table(part_file, columns=columns)
+        return {name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}
+
+    with gzip.open(part_file, 'rt', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    wanted = header if columns is None else ['version'] + [col for col in columns if col != 'version' and col in header]
+    return {name: typed_column([row[header.index(name)] for row in rows]) if name != 'version'
+            else np.array([row[0] for row in rows], dtype=object) for name in wanted}
+
+
+# --- reading the files of a version
+
+def version_files(version_dir, features_files):
+    files = [version_dir / 'bug_info.csv', version_dir / 'buggy_line_key.txt', version_dir / 'coverage_summary.csv']
+    files += [version_dir / 'testsuite_info' / tc_file for tc_file in testsuite_groups.values()]
+    files += [version_dir / features_file for features_file in features_files]
+    return [file for file in files if file.exists()]
+
+
+def version_signature(version_dir, features_files):
+    sha = hashlib.sha256()
+    for file in version_files(version_dir, features_files):
+        stat = file.stat()
+        sha.update(f"{file.relative_to(version_dir)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return sha.hexdigest()
+
+
+def read_version(version_dir, features_files):
+    version = version_dir.name
+    tables = {}
+
+    # bug_info.csv, buggy_line_key.txt, coverage_summary.csv
+    bug_info = {'version': [version]}
+    bug_info_csv = version_dir / 'bug_info.csv'
+    if bug_info_csv.exists():
+        with open(bug_info_csv, 'r') as f:
+            lines = f.readlines()
+            target_code_file, buggy_code_filename, buggy_lineno = lines[1].strip().split(',')
+        bug_info['target_code_file'] = [target_code_file]
+        bug_info['buggy_code_filename'] = [buggy_code_filename]
+        bug_info['buggy_lineno'] = [int(buggy_lineno)]
+    buggy_line_key_file = version_dir / 'buggy_line_key.txt'
+    if buggy_line_key_file.exists():
+        with open(buggy_line_key_file, 'r') as f:
+            bug_info['buggy_line_key'] = [f.readline().strip()]
+    coverage_summary_file = version_dir / 'coverage_summary.csv'
+    if coverage_summary_file.exists():
+        with open(coverage_summary_file, 'r') as f:
+            lines = f.readlines()
+            for name, value in zip(lines[0].strip().split(','), lines[1].strip().split(',')):
+                bug_info[name] = [int(value)]
+    tables[bug_info_table] = bug_info
+
+    # testsuite_info/*.txt
+    testsuite = {'version': [], 'group': [], 'tc': []}
+    for group, tc_file in testsuite_groups.items():
+        tc_file_txt = version_dir / 'testsuite_info' / tc_file
+        if not tc_file_txt.exists():
+            continue
+        with open(tc_file_txt, 'r') as f:
+            for line in f.readlines():
+                line = line.strip()
+                if line == '':
+                    continue
+                testsuite['version'].append(version)
+                testsuite['group'].append(group)
+                testsuite['tc'].append(line)
+    tables[testsuite_table] = testsuite
+
+    # line-level features
+    for features_file in features_files:
+        features_csv_file = version_dir / features_file
+        if not features_csv_file.exists():
+            continue
+        with open(features_csv_file, 'r') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = list(reader)
+        features = {'version': [version] * len(rows)}
+        for idx, name in enumerate(header):
+            values = [row[idx] for row in rows]
+            features[name] = values if name == 'key' else typed_column(values).tolist()
+        tables[Path(features_file).stem] = features
+
+    return tables
+
+
+def build_dataset(set_dir, features_files=[], store_dir=None, fmt=None):
+    # add the new and changed versions of set_dir to its store, returns the store
+    set_dir = Path(set_dir)
+    assert set_dir.exists(), f"Buggy versions directory {set_dir} does not exist"
+    if store_dir is None:
+        store_dir = default_store_dir(set_dir)
+    store = DatasetStore.create(store_dir, fmt)
+
+    version_dirs = sorted(version_dir for version_dir in set_dir.iterdir() if version_dir.is_dir())
+    current = set(version_dir.name for version_dir in version_dirs)
+    removed = [version for version in store.manifest['versions'] if version not in current]
+    if len(removed) > 0:
+        print(f"Dropping {len(removed)} versions that are no longer in {set_dir.name}")
+        store.remove_versions(removed)
+
+    version_rows = {}
+    for version_dir in version_dirs:
+        signature = version_signature(version_dir, features_files)
+        stored = store.manifest['versions'].get(version_dir.name)
+        if stored is not None and stored['signature'] == signature:
+            continue
+        version_rows[version_dir.name] = {'signature': signature, 'tables': read_version(version_dir, features_files)}
+
+    part = store.append(version_rows)
+    if part is None:
+        print(f"{store_dir.name} is up to date ({len(store.manifest['versions'])} versions)")
+    else:
+        print(f"Added {len(version_rows)} versions to {store_dir.name} as part {part} ({len(store.manifest['versions'])} versions)")
+    return store
+
+
+def remove_dataset(store_dir):
+    if Path(store_dir).exists():
+        shutil.rmtree(store_dir)
@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import csv
+
+import numpy as np
+
+# Function- and file-level tables of a line-level feature csv
+# (mbfl_features.csv, sbfl_features.csv).
+#
+# Line keys are <file>#<function>#<lineno>, the function being the one of
+# line2function_info/line2function.json containing the line (02-4 of 03-2
+# makes the keys, lines outside every function are under FUNCTIONNOTFOUND).
+# Lines are grouped by <file>#<function> and by <file>, and each group is one
+# row of <stem>_function_level.csv / <stem>_file_level.csv next to the
+# feature csv:
+#   'key':              <file>#<function> or <file>
+#   '# of lines':       lines of the group in the feature csv (lines executed
+#                       by failing TCs for mbfl, covered lines for sbfl)
+#   '<score> (max)':    highest score of the lines of the group, the score
+#                       of the group when ranking functions or files
+#   '<score> (mean)':   mean score of the lines of the group
+#   'bug':              1 for the group of the buggy line
+# Groups are in order of first appearance in the feature csv.
+
+granularities = ['function', 'file']
+
+
+def group_key(line_key, granularity):
+    info = line_key.split('#')
+    target_file = info[0].split('/')[-1]
+    if granularity == 'function':
+        return f"{target_file}#{info[1]}"
+    return target_file
+
+
+def group_lines(lines, granularity):
+    # (group keys, group id of each line)
+    group2id = {}
+    group_ids = np.empty(len(lines), dtype=np.int64)
+    for idx, line in enumerate(lines):
+        key = group_key(line, granularity)
+        if key not in group2id:
+            group2id[key] = len(group2id)
+        group_ids[idx] = group2id[key]
+    return list(group2id.keys()), group_ids
+
+
+def aggregate_scores(lines, buggy_line_key, scores, granularity):
+    # scores: {score name: value of each line}
+    # returns (group keys, {column: value of each group})
+    groups, group_ids = group_lines(lines, granularity)
+    line_cnts = np.bincount(group_ids, minlength=len(groups))
+
+    columns = {'# of lines': line_cnts}
+    for name, values in scores.items():
+        values = np.asarray(values, dtype=np.float64)
+        maxs = np.full(len(groups), -np.inf)
+        np.maximum.at(maxs, group_ids, values)
+        sums = np.zeros(len(groups), dtype=np.float64)
+        np.add.at(sums, group_ids, values)
+        columns[f'{name} (max)'] = maxs
+        columns[f'{name} (mean)'] = sums / line_cnts
+
+    bug = np.zeros(len(groups), dtype=np.int64)
+    if buggy_line_key is not None:
+        buggy_group = group_key(buggy_line_key, granularity)
+        if buggy_group in groups:
+            bug[groups.index(buggy_group)] = 1
+    columns['bug'] = bug
+    return groups, columns
+
+
+def aggregate_table_file(features_csv_file, granularity):
+    features_csv_file = Path(features_csv_file)
+    return features_csv_file.parent / f"{features_csv_file.stem}_{granularity}_level.csv"
+
+
+def write_aggregate_tables(features_csv_file, lines, buggy_line_key, scores):
+    for granularity in granularities:
+        groups, columns = aggregate_scores(lines, buggy_line_key, scores, granularity)
+        fieldnames = list(columns.keys())
+        values = [columns[name].tolist() for name in fieldnames]
+
+        with open(aggregate_table_file(features_csv_file, granularity), 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(['key'] + fieldnames)
+            for key, *row in zip(groups, *values):
+                writer.writerow([key, *row])
+
+
+def read_feature_scores(features_csv_file, score_names):
+    # (line keys, buggy line key, {score name: value of each line}) of a feature csv
+    with open(features_csv_file, 'r') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+
+    col2idx = {col: idx for idx, col in enumerate(header)}
+    for name in score_names:
+        assert name in col2idx, f"Column {name} is not in {features_csv_file}"
+
+    lines = [row[0] for row in rows]
+    bug_idx = col2idx['bug']
+    buggy_line_key = None
+    for row in rows:
+        if row[bug_idx] == '1':
+            buggy_line_key = row[0]
+
+    scores = {}
+    for name in score_names:
+        idx = col2idx[name]
+        scores[name] = np.array([row[idx] for row in rows], dtype=np.float64).reshape(len(rows))
+    return lines, buggy_line_key, scores
+
+
+def read_aggregate_table(table_file):
+    # (group keys, {column: value of each group})
+    groups = []
+    rows = []
+    with open(table_file, 'r') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        for row in reader:
+            groups.append(row[0])
+            rows.append(row[1:])
+
+    columns = {}
+    for idx, name in enumerate(header[1:]):
+        dtype = np.int64 if name in ['# of lines', 'bug'] else np.float64
+        columns[name] = np.array([row[idx] for row in rows], dtype=dtype).reshape(len(rows))
+    return groups, columns
+
+
+def load_aggregate_table(features_csv_file, granularity, score_names):
+    # the table written next to the feature csv, or aggregated from the feature
+    # csv when there is none, it is older than the csv or misses a score
+    table_file = aggregate_table_file(features_csv_file, granularity)
+    if table_file.exists() and table_file.stat().st_mtime >= Path(features_csv_file).stat().st_mtime:
+        groups, columns = read_aggregate_table(table_file)
+        if all(f'{name} (max)' in columns for name in score_names):
+            return groups, columns
+
+    lines, buggy_line_key, scores = read_feature_scores(features_csv_file, score_names)
+    return aggregate_scores(lines, buggy_line_key, scores, granularity)
@@ -8,6 +8,9 @@ import csv
 import pandas as pd
 import sys
 
+from executed_lines_index import load_executed_lines_index, executed_lines_index_file, legacy_failing_file, legacy_passing_file
+from analysis_cache import AnalysisCache
+
 # Current working directory
 script_path = Path(__file__).resolve()
 mbfl_dataset_dir = script_path.parent
@@ -44,10 +47,10 @@ passing_txt = 'passing_tcs.txt'
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject)
+    start_process(args.subject, args.no_cache)
 
 
-def start_process(subject_name):
+def start_process(subject_name, no_cache=False):
     global configure_json_file
 
     subject_working_dir = mbfl_feature_extraction_dir / f"{subject_name}-working_directory"
@@ -60,7 +63,9 @@ def start_process(subject_name):
     mbfl_features_per_bug = get_buggy_versions(subject_working_dir, "mbfl_features")
 
     # 3. Check whether all failing tcs are in the reduced failing tcs
-    bad_versions = start_analysis(configs, subject_name, mbfl_features_per_bug)
+    analysis_cache = AnalysisCache.of_working_dir(subject_working_dir, enabled=not no_cache)
+    bad_versions = start_analysis(configs, subject_name, mbfl_features_per_bug, analysis_cache)
+    print(analysis_cache.summary())
 
     excluded_len = []
     print(f"Bad versions: {len(bad_versions)}")
@@ -78,7 +83,7 @@ def start_process(subject_name):
 
 
 
-def start_analysis(configs, subject_name, mbfl_features_per_bug):
+def start_analysis(configs, subject_name, mbfl_features_per_bug, analysis_cache):
     bad_version = []
 
     usable_buggy_versions_dir = src_dir / '02_select_usable_buggy_versions' / f"{subject_name}-working_directory" / 'usable_buggy_versions'
@@ -93,13 +98,13 @@ def start_analysis(configs, subject_name, mbfl_features_per_bug):
         assert mbfl_features_csv_file.exists(), f"MBFL features file {mbfl_features_csv_file} does not exist"
 
         # GET: list of failing TCs
-        failing_tcs = get_tcs(bug_dir, 'failing_tcs.txt')
+        failing_tcs = load_tcs(analysis_cache, bug_dir, 'failing_tcs.txt')
 
         # GET: bug_dir from usable_buggy_versions_dir
         og_bug_dir = usable_buggy_versions_dir / bug_name
         assert og_bug_dir.exists(), f"Usable buggy version directory {og_bug_dir} does not exist"
 
-        og_failing_tcs = get_tcs(og_bug_dir, 'failing_tcs.txt')
+        og_failing_tcs = load_tcs(analysis_cache, og_bug_dir, 'failing_tcs.txt')
 
         failing_tcs = set(failing_tcs)
         og_failing_tcs = set(og_failing_tcs)
@@ -125,6 +130,10 @@ def custome_sort(tc_script):
     tc_filename = tc_script.split('.')[0]
     return int(tc_filename[2:])
 
+def load_tcs(analysis_cache, version_dir, tc_file):
+    # get_tcs through the analysis cache
+    return analysis_cache.load(version_dir, get_tcs, [f'testsuite_info/{tc_file}'], tc_file)
+
 def get_tcs(version_dir, tc_file):
     testsuite_info_dir = version_dir / 'testsuite_info'
     assert testsuite_info_dir.exists(), f"Testsuite info directory {testsuite_info_dir} does not exist"
@@ -299,13 +308,12 @@ def get_buggy_line_key(bug_dir):
 
     return buggy_line_key
 
-def get_lines_executed_by_failing_tcs(bug_dir):
-    get_lines_executed_by_failing_tcs_file = bug_dir / 'coverage_info/lines_executed_by_failing_tc.json'
-    assert get_lines_executed_by_failing_tcs_file.exists(), f"Lines executed by failing TCs file {get_lines_executed_by_failing_tcs_file} does not exist"
+# inputs of get_lines_executed_by_failing_tcs (the index, or the json files written before it)
+executed_lines_inputs = [f'coverage_info/{name}' for name in [executed_lines_index_file, legacy_failing_file, legacy_passing_file]]
 
-    lines_executed_by_failing_tcs = None
-    with get_lines_executed_by_failing_tcs_file.open() as f:
-        lines_executed_by_failing_tcs = json.load(f)
+def get_lines_executed_by_failing_tcs(bug_dir):
+    executed_lines_index = load_executed_lines_index(bug_dir / 'coverage_info')
+    lines_executed_by_failing_tcs = set(executed_lines_index.lines_executed_by('failing'))
 
     return lines_executed_by_failing_tcs
 
@@ -345,6 +353,7 @@ def read_configs(subject_name, subject_working_dir):
 def make_parser():
     parser = argparse.ArgumentParser(description='Copy subject to working directory')
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--no-cache', action='store_true', help='Parse the inputs of every buggy version again instead of using the analysis cache')
     return parser
     
 
@@ -34,9 +34,9 @@ configure_json_file = 'configurations.json'
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.worker)
+    start_process(args.subject, args.worker, args.collect, args.patience, args.delta_retest, args.tcs_file, args.retest_versions_file)
 
-def start_process(subject_name, worker_name):
+def start_process(subject_name, worker_name, analyses, patience=None, delta_retest=False, tcs_file=None, retest_versions_file=None):
     subject_working_dir = extract_mbfl_features_cmd_dir / f"{subject_name}-working_directory"
     assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
     
@@ -49,10 +49,18 @@ def start_process(subject_name, worker_name):
     # 2. get list assigned buggy versions (is a path to the buggy versions directory)
     assigned_versions_list = get_assigned_buggy_versions(configs, core_working_dir)
 
-    execte_testing_mutants_for_additional_f2p(configs, core_working_dir, worker_name, assigned_versions_list,subject_name)
+    if delta_retest:
+        # add the failing test cases found by the analyses to the versions,
+        # measuring and testing only what they change
+        if retest_versions_file is not None:
+            assigned_versions_list = filter_retest_versions(subject_working_dir, assigned_versions_list, retest_versions_file)
+        execute_delta_retest(core_working_dir, worker_name, assigned_versions_list, subject_name, tcs_file)
+        return
 
+    execte_testing_mutants_for_additional_f2p(configs, core_working_dir, worker_name, assigned_versions_list,subject_name, analyses, patience)
 
-def execte_testing_mutants_for_additional_f2p(configs, core_working_dir, worker_name, assigned_versions_list, subject_name):
+
+def execte_testing_mutants_for_additional_f2p(configs, core_working_dir, worker_name, assigned_versions_list, subject_name, analyses, patience):
 
     # 3. generate mutants
         # 1. Apply buggy version code
@@ -64,28 +72,67 @@ def execte_testing_mutants_for_additional_f2p(configs, core_working_dir, worker_
     subj_name = configs['subject_name']
     assert subj_name == subject_name, f"Subject name mismatch: {subj_name} != {subject_name}"
 
-    test_mutants_for_additional_f2p_on_buggy_line = refine_testsuite_dir / '01-2_test_mutants_for_additional_f2p_on_buggy_line.py'
-    test_mutants_for_removing_f2p_on_non_buggy_lines = refine_testsuite_dir / '01-3_test_mutants_for_removing_f2p_on_non_buggy_lines.py'
+    # one pass of mutation testing per version serves every requested analysis
+    test_mutants_for_refining_testsuite = refine_testsuite_dir / '01-4_test_mutants_for_refining_testsuite.py'
 
     for target_version in assigned_versions_list:
         version_name = target_version.name
 
         print(f">> Working on version: {version_name}\n")
 
-        # 1. test mutants for additional f2p
+        # 1. test mutants for additional f2p (and the other requested analyses)
         cmd = [
-            'python3', test_mutants_for_additional_f2p_on_buggy_line,
+            'python3', test_mutants_for_refining_testsuite,
             '--subject', subject_name,
             '--worker', worker_name,
-            '--version', version_name
+            '--version', version_name,
+            '--collect', *analyses
         ]
+        if patience is not None:
+            cmd += ['--patience', str(patience)]
         res = sp.run(cmd)
         if res.returncode != 0:
-            raise Exception('Failed to execute test mutants for additional f2p script')
+            raise Exception('Failed to execute test mutants for refining testsuite script')
         
         print(f">> Finished working on version: {version_name}\n")
 
 
+def execute_delta_retest(core_working_dir, worker_name, assigned_versions_list, subject_name, tcs_file):
+    delta_retest_with_additional_tcs = refine_testsuite_dir / '01-5_delta_retest_with_additional_tcs.py'
+
+    for target_version in assigned_versions_list:
+        version_name = target_version.name
+
+        print(f">> Working on version: {version_name}\n")
+
+        cmd = [
+            'python3', delta_retest_with_additional_tcs,
+            '--subject', subject_name,
+            '--worker', worker_name,
+            '--version', version_name
+        ]
+        if tcs_file is not None:
+            cmd += ['--tcs-file', tcs_file]
+        res = sp.run(cmd)
+        if res.returncode != 0:
+            raise Exception('Failed to execute delta retest script')
+
+        print(f">> Finished working on version: {version_name}\n")
+
+
+def filter_retest_versions(subject_working_dir, assigned_versions_list, retest_versions_file):
+    # retest_buggy_versions.txt written by 01_copy_buggy_version.py --delta-retest of 04-6
+    retest_versions_txt = subject_working_dir / retest_versions_file
+    assert retest_versions_txt.exists(), f"Retest versions file {retest_versions_txt} does not exist"
+
+    with open(retest_versions_txt, 'r') as f:
+        retest_versions = set(line.strip() for line in f.readlines())
+
+    assigned_versions_list = [target_version for target_version in assigned_versions_list if target_version.name in retest_versions]
+    print(f"Buggy versions to retest: {len(assigned_versions_list)}")
+    return assigned_versions_list
+
+
 def get_assigned_buggy_versions(configs, core_working_dir):
     assigned_buggy_versions = core_working_dir / 'assigned_buggy_versions'
 
@@ -120,6 +167,15 @@ def make_parser():
     parser = argparse.ArgumentParser(description='Copy subject to working directory')
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--worker', type=str, help='Worker name (e.g., <machine-name>/<core-id>)', required=True)
+    parser.add_argument(
+        '--collect', type=str, nargs='+', default=['additional-f2p'],
+        choices=['additional-f2p', 'removing-f2p'],
+        help='Analyses to run on one pass of mutation testing (default: additional-f2p)'
+    )
+    parser.add_argument('--patience', type=int, default=None, help='Stop after this many built mutants in a row find no new f2p test case (default: test every mutant)')
+    parser.add_argument('--delta-retest', action='store_true', help='Add the failing test cases of --tcs-file to each version instead, measuring and testing only them (01-5_delta_retest_with_additional_tcs.py)')
+    parser.add_argument('--tcs-file', type=str, default=None, help='Test cases to add with --delta-retest, in testsuite_info/ of each version (default: total_additional_tcs.txt)')
+    parser.add_argument('--retest-versions-file', type=str, default=None, help='With --delta-retest, only retest the versions listed in this file of the working directory (ex. retest_buggy_versions.txt)')
     return parser
 
 if __name__ == "__main__":
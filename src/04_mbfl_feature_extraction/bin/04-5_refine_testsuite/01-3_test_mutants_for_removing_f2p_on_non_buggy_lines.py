@@ -6,6 +6,9 @@ import json
 import subprocess as sp
 import os
 
+from mutation_testing_engine import MutationTestingEngine, RemovingF2pCollector, flatten_selected_mutants, make_env
+from source_overlay import SourceOverlay
+
 # Current working directory
 script_path = Path(__file__).resolve()
 mbfl_feature_extraction_dir = script_path.parent
@@ -32,16 +35,14 @@ machines_json_file = 'machines.json'
 configure_json_file = 'configurations.json'
 real_world_buggy_versions = 'real_world_buggy_versions'
 
-my_env = os.environ.copy()
-
 
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.worker, args.version)
+    start_process(args.subject, args.worker, args.version, args.patience, args.per_mutant_results)
 
 
-def start_process(subject_name, worker_name, version_name):
+def start_process(subject_name, worker_name, version_name, patience=None, per_mutant=False):
     subject_working_dir = extract_mbfl_features_cmd_dir / f"{subject_name}-working_directory"
     assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
 
@@ -54,6 +55,9 @@ def start_process(subject_name, worker_name, version_name):
     version_dir = assigned_buggy_versions_dir / version_name
     assert version_dir.exists(), f"Version directory {version_dir} does not exist"
 
+    # restore target files left overlaid by an interrupted run
+    source_overlay = SourceOverlay(core_working_dir)
+
     print(f"<<<<<< MBFL on {subject_name} with {worker_name} for {version_name} >>>>>>")
 
     # 1. Read configurations
@@ -90,141 +94,23 @@ def start_process(subject_name, worker_name, version_name):
 
     # 6. apply buggy version code
     buggy_code_file = get_buggy_code_file(version_dir, buggy_code_filename)
-    buggy_patch = make_patch_file(target_code_file_path, buggy_code_file, core_working_dir, 'buggy.patch')
-    apply_patch(target_code_file_path, buggy_code_file, buggy_patch, core_working_dir, revert=False)
+    source_overlay.apply_file(target_code_file_path, buggy_code_file)
 
 
     # 7. Conduct mutation testing
-    new_f2p_set = conduct_mutation_testing(
-        configs, core_working_dir, subject_name,
-        version_name, selected_mutants, testsuite,
-    )
-
-    # 8. Revert the buggy version code
-    apply_patch(target_code_file_path, buggy_code_file, buggy_patch, core_working_dir, revert=True)
-
-    # # 9. write addition f2p test cases to file in testsuite_info directory
-    addition_failing_tcs_file = version_dir / 'testsuite_info/removing_failing_tcs.txt'
-    with open(addition_failing_tcs_file, 'w') as f:
-        content = '\n'.join(new_f2p_set)
-        f.write(content)
-
-
-def conduct_mutation_testing(
-    configs, core_working_dir, subject_name,
-    version_name, selected_mutants, testsuite,
-):
-    # --- prepare needs
-    global my_env
-    if configs['environment_setting']['needed'] == True:
-        for key, value in configs['environment_setting']['variables'].items():
-            path = core_working_dir / value
-            assert path.exists(), f"Path {path} does not exist"
-            path_str = path.__str__()
-
-            if key not in my_env:
-                my_env[key] = path_str
-            else:
-                my_env[key] = f"{path_str}:{my_env[key]}"
-            # print(path_str)
-    
-    version_gen_mutants_dir = core_working_dir / 'generated_mutants' / version_name
-
-    tc_dir = core_working_dir / configs['test_case_directory']
-    assert tc_dir.exists(), f"Test case directory {tc_dir} does not exist"
-    
-    new_f2p_tcs = set()
-
-    # --- start testing
-    # FOR A TARGET FILE...
-    for target_file, lineno_mutants in selected_mutants.items():
-        target_file_path = get_target_file_path(configs['target_files'], target_file)
-        assert target_file_path is not None, f"Target file {target_file} does not exist in target files"
-
-        # FOR A LINE OF TARGET FILE...
-        for lineno, mutants in lineno_mutants.items():
-
-            # TEST EACH MUTANT
-            for mutant in mutants:
-                mutant_id = mutant['mutant_id']
-                mutant_name = mutant['mutant_name']
-
-                mutant_file = version_gen_mutants_dir / f"{subject_name}-{target_file}" / mutant_name
-                assert mutant_file.exists(), f"Mutant file {mutant_file} does not exist"
-
-                # print(f"Testing mutant {mutant_id} ({mutant_name}) in {target_file} at line {lineno}")
-                measured_f2p_set = start_test(
-                    configs, core_working_dir, subject_name,
-                    version_name, target_file_path, target_file, mutant_file,
-                    lineno, mutant_id, mutant_name,
-                    testsuite, tc_dir
-                )
-
-                new_f2p_tcs = new_f2p_tcs.union(measured_f2p_set)
-    
-    return new_f2p_tcs
-
-
-def start_test(
-    configs, core_working_dir, subject_name,
-    version_name, target_file_path, target_file, mutant_file,
-    lineno, mutant_id, mutant_name,
-    testsuite, tc_dir
-):
-    new_f2p_set = set()
-
-    build_result = False
-    # 1. Make patch file of the mutant
-    mutant_patch = make_patch_file(target_file_path, mutant_file, core_working_dir, 'mutant.patch')
-
-    # 2. Apply patch to the target file
-    apply_patch(target_file_path, mutant_file, mutant_patch, core_working_dir)
-
-    # 3. Build the subject, if build fails, skip the mutant
-    build_res = execute_build_script(configs[build_sh_wd_key], core_working_dir)
-    if build_res != 0:
-        print(f"Failed to build the subject with mutant {mutant_id} ({mutant_name})")
-        apply_patch(target_file_path, mutant_file, mutant_patch, core_working_dir, revert=True)
-        return set()
-    
-    # --> build is successful
-    build_result = True
-
-    # 4. Run the test suite
-    print(f"running test suite for mutant {mutant_id} ({mutant_name})")
-    new_f2p_set = run_test_suite(testsuite, core_working_dir, mutant_id, new_f2p_set, tc_dir)
-
-    # 5. Apply path to the target file (revert)
-    apply_patch(target_file_path, mutant_file, mutant_patch, core_working_dir, revert=True)
-
-    return new_f2p_set
-
-def run_test_suite(testsuite, core_working_dir, mutant_id, new_f2p_set, tc_dir):
-
-    for tc_type in testsuite:
-        # tc_type: 'failing' or 'passing'
-        for tc_script_name in testsuite[tc_type]:
-            res = run_tc(tc_script_name, tc_dir)
-            if res == 0:
-                if tc_type == 'failing':
-                    new_f2p_set.add(tc_script_name)
-    
-    return new_f2p_set
-
+    env = make_env(configs, core_working_dir)
+    engine = MutationTestingEngine(configs, core_working_dir, source_overlay, subject_name, version_name, env)
+    buggy_code_file_name = target_code_file_path.split('/')[-1]
+    collector = RemovingF2pCollector(buggy_code_file_name, buggy_lineno, per_mutant, patience)
+    tc_groups = {collector.groups[0]: testsuite['failing']}
+    mutants = engine.order_by_operator(flatten_selected_mutants(selected_mutants))
+    engine.run(mutants, tc_groups, [collector])
 
-def run_tc(tc_script_name, tc_dir):
-    global my_env
-    
-    cmd = f"./{tc_script_name}"
-    res = sp.run(cmd, shell=True, cwd=tc_dir, env=my_env, stdout=sp.PIPE, stderr=sp.PIPE)
-    return res.returncode
-        
+    # 8. Restore the target files (buggy version and mutated files)
+    source_overlay.restore_all()
 
-def get_target_file_path(target_files, target_file):
-    for file in target_files:
-        if file.split('/')[-1] == target_file:
-            return file
-    return None
+    # 9. write removing f2p test cases to file in testsuite_info directory
+    collector.finish(version_dir)
 
 
 def custome_sort(tc_script):
@@ -318,33 +204,6 @@ def get_buggy_code_file(version_dir, buggy_code_filename):
 
 
 
-def make_patch_file(target_code_file_path, buggy_code_file, core_working_dir, patchname):
-    patch_file = core_working_dir / patchname
-
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['diff', target_file.__str__(), buggy_code_file.__str__()]
-    sp.run(cmd, stdout=patch_file.open('w'))
-    
-    return patch_file
-
-def apply_patch(target_code_file_path, buggy_code_file, patch_file, core_working_dir, revert=False):
-    target_file = core_working_dir / target_code_file_path
-    assert target_file.exists(), f"Target file {target_file} does not exist"
-
-    cmd = ['patch']
-    if revert:
-        cmd.append('-R')
-    cmd.extend(['-i', patch_file.__str__(), target_file.__str__()])
-
-    res = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
-    if res.returncode != 0:
-        raise Exception(f'Failed to apply patch to {target_file.name} with buggy_version {buggy_code_file.name}')
-    
-    print(f'Applied patch to {target_file.name} with buggy_version {buggy_code_file.name} : revert={revert}')
-
-
 def execute_clean_script(clean_sh_wd, core_working_dir):
     global clean_script
 
@@ -374,22 +233,6 @@ def execute_configure_script(config_sh_wd, core_working_dir):
 
     return res.returncode
 
-def execute_build_script(build_sh_wd, core_working_dir):
-    global build_script
-
-    build_sh_wd = core_working_dir / build_sh_wd
-    build_sh = build_sh_wd / build_script
-    assert build_sh.exists(), f"Build script {build_sh} does not exist"
-
-    cmd = ['bash', build_script]
-    res = sp.run(cmd, cwd=build_sh_wd, stdout=sp.PIPE, stderr=sp.PIPE)
-
-    print(f"Build script executed: {res.returncode}")
-    
-    return res.returncode
-
-
-
 def read_configs(subject_name, subject_working_dir):
     global configure_json_file
 
@@ -413,6 +256,8 @@ def make_parser():
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--worker', type=str, help='Worker name (e.g., <machine-name>/<core-id>)', required=True)
     parser.add_argument('--version', type=str, help='Version name', required=True)
+    parser.add_argument('--patience', type=int, default=None, help='Stop after this many built mutants in a row find no new f2p test case (default: test every mutant)')
+    parser.add_argument('--per-mutant-results', action='store_true', help='Run every test case on every mutant and also write the f2p test cases of each mutant')
     return parser
 
 if __name__ == "__main__":
@@ -0,0 +1,268 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import argparse
+import json
+import subprocess as sp
+
+from mutation_testing_engine import MutationTestingEngine, AdditionalF2pCollector, RemovingF2pCollector, flatten_selected_mutants, make_env
+from source_overlay import SourceOverlay
+
+# Current working directory
+script_path = Path(__file__).resolve()
+mbfl_feature_extraction_dir = script_path.parent
+bin_dir = mbfl_feature_extraction_dir.parent
+extract_mbfl_features_cmd_dir = bin_dir.parent
+
+# General directories
+src_dir = extract_mbfl_features_cmd_dir.parent
+root_dir = src_dir.parent
+user_configs_dir = root_dir / 'user_configs'
+subjects_dir = root_dir / 'subjects'
+external_tools_dir = root_dir / 'external_tools'
+
+# keywords in configurations.json
+config_sh_wd_key = 'configure_script_working_directory'
+build_sh_wd_key = 'build_script_working_directory'
+
+# files in user_configs_dir
+configure_no_cov_script = 'configure_no_cov_script.sh'
+configure_yes_cov_script = 'configure_yes_cov_script.sh'
+build_script = 'build_script.sh'
+clean_script = 'clean_script.sh'
+machines_json_file = 'machines.json'
+configure_json_file = 'configurations.json'
+real_world_buggy_versions = 'real_world_buggy_versions'
+
+
+def main():
+    parser = make_parser()
+    args = parser.parse_args()
+    start_process(args.subject, args.worker, args.version, args.collect, args.patience, args.per_mutant_results)
+
+
+def start_process(subject_name, worker_name, version_name, analyses, patience=None, per_mutant=False):
+    subject_working_dir = extract_mbfl_features_cmd_dir / f"{subject_name}-working_directory"
+    assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
+
+    core_working_dir = subject_working_dir / 'workers_extracting_mbfl_features' / worker_name
+    assert core_working_dir.exists(), f"Core working directory {core_working_dir} does not exist"
+
+    assigned_buggy_versions_dir = core_working_dir / 'assigned_buggy_versions'
+    assert assigned_buggy_versions_dir.exists(), f"Assigned buggy versions directory {assigned_buggy_versions_dir} does not exist"
+
+    version_dir = assigned_buggy_versions_dir / version_name
+    assert version_dir.exists(), f"Version directory {version_dir} does not exist"
+
+    # restore target files left overlaid by an interrupted run
+    source_overlay = SourceOverlay(core_working_dir)
+
+    print(f"<<<<<< MBFL on {subject_name} with {worker_name} for {version_name} >>>>>>")
+
+    # 1. Read configurations
+    configs = read_configs(subject_name, subject_working_dir)
+
+    # 2. get bug_info
+    target_code_file_path, buggy_code_filename, buggy_lineno = get_bug_info(version_dir)
+    # print(f"Target code file: {target_code_file_path}")
+    # print(f"Buggy code filename: {buggy_code_filename}")
+    # print(f"Buggy line number: {buggy_lineno}")
+    assert version_name == buggy_code_filename, f"Version name {version_name} does not match with buggy code filename {buggy_code_filename}"
+
+
+    # 3. read the selected mutants
+    # selected_mutants
+    # key: target_filename (ex. parser.c)
+    # value: lineno (dict) -> list of mutants (ex. 123)
+    # list of mutants: mutant_id, mutant_name (ex. mutant_12, parser.MUT123.c)
+    # every selected mutant, each analysis picks the ones it needs
+    selected_mutants = get_selected_mutants(version_dir)
+    for target_file, lineno_mutants in selected_mutants.items():
+        mutant_cnt = 0
+        for lineno, mutants in lineno_mutants.items():
+            mutant_cnt += len(mutants)
+        print(f"Selected mutants for {target_file}: {mutant_cnt}")
+
+    # 4. get passing and failing test cases (ex. TC1.sh, TC2.sh ...)
+    tc_groups = {
+        'failing': get_tcs(version_dir, 'failing_tcs.txt'),
+        'excluded_failing': get_tcs(version_dir, 'excluded_failing_tcs.txt'),
+    }
+    for key, tcs in tc_groups.items():
+        print(f"{key} test cases: {len(tcs)}")
+
+
+    # 6. apply buggy version code
+    buggy_code_file = get_buggy_code_file(version_dir, buggy_code_filename)
+    source_overlay.apply_file(target_code_file_path, buggy_code_file)
+
+
+    # 7. Conduct mutation testing
+    env = make_env(configs, core_working_dir)
+    engine = MutationTestingEngine(configs, core_working_dir, source_overlay, subject_name, version_name, env)
+    buggy_code_file_name = target_code_file_path.split('/')[-1]
+    collectors = make_collectors(analyses, buggy_code_file_name, buggy_lineno, per_mutant, patience)
+    mutants = engine.order_by_operator(flatten_selected_mutants(selected_mutants))
+    engine.run(mutants, tc_groups, collectors)
+
+    # 8. Restore the target files (buggy version and mutated files)
+    source_overlay.restore_all()
+
+    # 9. write the result of each analysis to testsuite_info directory
+    for collector in collectors:
+        collector.finish(version_dir)
+
+
+def make_collectors(analyses, buggy_code_file_name, buggy_lineno, per_mutant, patience):
+    collectors = []
+    for analysis in analyses:
+        if analysis == 'additional-f2p':
+            collectors.append(AdditionalF2pCollector(buggy_code_file_name, buggy_lineno, per_mutant, patience))
+        elif analysis == 'removing-f2p':
+            collectors.append(RemovingF2pCollector(buggy_code_file_name, buggy_lineno, per_mutant, patience))
+        else:
+            raise Exception(f"Unknown analysis {analysis}")
+    return collectors
+
+
+def custome_sort(tc_script):
+    tc_filename = tc_script.split('.')[0]
+    return int(tc_filename[2:])
+    
+def get_tcs(version_dir, tc_file):
+    testsuite_info_dir = version_dir / 'testsuite_info'
+    assert testsuite_info_dir.exists(), f"Testsuite info directory {testsuite_info_dir} does not exist"
+
+    tc_file_txt = testsuite_info_dir / tc_file
+    assert tc_file_txt.exists(), f"Failing test cases file {tc_file_txt} does not exist"
+
+    tcs_list = []
+
+    with open(tc_file_txt, 'r') as f:
+        lines = f.readlines()
+        for line in lines:
+            line = line.strip()
+            tcs_list.append(line)
+        
+    tcs_list = sorted(tcs_list, key=custome_sort)
+
+    return tcs_list
+
+
+def get_selected_mutants(version_dir):
+    get_selected_mutants = version_dir / 'selected_mutants.csv'
+    assert get_selected_mutants.exists(), f"Selected mutants file {get_selected_mutants} does not exist"
+
+    selected_mutants = {}
+    with open(get_selected_mutants, 'r') as f:
+        lines = f.readlines()
+        mutants = lines[2:]
+
+        for mutant_line in mutants:
+            mutant_line = mutant_line.strip()
+            info = mutant_line.split(',')
+
+            target_filename = info[0]
+            mutant_id = info[1]
+            lineno = info[2]
+            mutant_name = info[3]
+
+            if target_filename not in selected_mutants:
+                selected_mutants[target_filename] = {}
+            
+            if lineno not in selected_mutants[target_filename]:
+                selected_mutants[target_filename][lineno] = []
+            
+            selected_mutants[target_filename][lineno].append({
+                'mutant_id': mutant_id,
+                'mutant_name': mutant_name
+            })
+
+    return selected_mutants
+
+
+def get_bug_info(version_dir):
+    bug_info_csv = version_dir / 'bug_info.csv'
+    assert bug_info_csv.exists(), f"Bug info csv file {bug_info_csv} does not exist"
+
+    with open(bug_info_csv, 'r') as f:
+        lines = f.readlines()
+        target_code_file, buggy_code_filename, buggy_lineno = lines[1].strip().split(',')
+        return target_code_file, buggy_code_filename, buggy_lineno
+
+
+def get_buggy_code_file(version_dir, buggy_code_filename):
+    buggy_code_file_dir = version_dir / 'buggy_code_file'
+    assert buggy_code_file_dir.exists(), f"Buggy code file directory {buggy_code_file_dir} does not exist"
+
+    buggy_code_file = buggy_code_file_dir / buggy_code_filename
+    assert buggy_code_file.exists(), f"Buggy code file {buggy_code_file} does not exist"
+
+    return buggy_code_file
+
+
+
+def execute_clean_script(clean_sh_wd, core_working_dir):
+    global clean_script
+
+    clean_sh_wd = core_working_dir / clean_sh_wd
+    clean_sh = clean_sh_wd / clean_script
+    assert clean_sh.exists(), f"Clean script {clean_sh} does not exist"
+
+    cmd = ['bash', clean_sh]
+    res = sp.run(cmd, cwd=clean_sh_wd, stdout=sp.PIPE, stderr=sp.PIPE)
+    
+    print('Executed clean script')
+
+    return res.returncode
+
+
+def execute_configure_script(config_sh_wd, core_working_dir):
+    global configure_no_cov_script
+
+    config_sh_wd = core_working_dir / config_sh_wd
+    config_sh = config_sh_wd / configure_no_cov_script
+    assert config_sh.exists(), f"Configure script {config_sh} does not exist"
+
+    cmd = ['bash', config_sh]
+    res = sp.run(cmd, cwd=config_sh_wd, stdout=sp.PIPE, stderr=sp.PIPE)
+    
+    print('Executed configure script')
+
+    return res.returncode
+
+def read_configs(subject_name, subject_working_dir):
+    global configure_json_file
+
+    subject_config_dir = subject_working_dir / f"{subject_name}-configures"
+    assert subject_config_dir.exists(), f"Subject configurations directory {subject_config_dir} does not exist"
+
+    config_json = subject_config_dir / configure_json_file
+    assert config_json.exists(), f"Configurations file {config_json} does not exist"
+    
+    configs = None
+    with config_json.open() as f:
+        configs = json.load(f)
+    
+    if configs is None:
+        raise Exception('Configurations are not loaded')
+    
+    return configs
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Copy subject to working directory')
+    parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--worker', type=str, help='Worker name (e.g., <machine-name>/<core-id>)', required=True)
+    parser.add_argument('--version', type=str, help='Version name', required=True)
+    parser.add_argument('--patience', type=int, default=None, help='Stop after this many built mutants in a row find no new f2p test case (default: test every mutant)')
+    parser.add_argument('--per-mutant-results', action='store_true', help='Run every test case on every mutant and also write the f2p test cases of each mutant')
+    parser.add_argument(
+        '--collect', type=str, nargs='+', default=['additional-f2p'],
+        choices=['additional-f2p', 'removing-f2p'],
+        help='Analyses to run on one pass of mutation testing (default: additional-f2p)'
+    )
+    return parser
+
+if __name__ == "__main__":
+    main()
+    exit(0)
@@ -0,0 +1,599 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import argparse
+import json
+import subprocess as sp
+import os
+
+from mutation_testing_engine import MutationTestingEngine, KillMatrixDeltaCollector, make_env
+from source_overlay import SourceOverlay
+from coverage_vector_store import CoverageVectorStore, load_coverage_vector_store, coverage_vectors_file
+from executed_lines_index import ExecutedLinesIndex, executed_lines_index_file
+from kill_matrix import load_kill_matrix
+from mutant_db_index import load_mutant_db_index, make_selection_rng
+from mbfl_feature_engine import MutantOutcomes, write_mbfl_features_csv, mbfl_features_file
+from feature_aggregation import write_aggregate_tables
+
+# Delta retest of a buggy version with the failing TCs added by
+# 04_add_total_additional_testsuite.py, instead of replaying it through
+# stages 02 -> 03 -> 04 (04-6_retest_with_refined_testsuite/).
+#
+# The added failing TCs are the TCs of <tcs-file> that are excluded failing
+# TCs of the version. Only they are measured and run:
+#   1. coverage of the added TCs (configure with coverage, gcovr as 02-3 of
+#      03-2), merged into coverage_info/coverage_vectors.json and the
+#      executed lines index
+#   2. mutants of the lines only the added TCs execute are selected from the
+#      generated mutants (as 01-3 of 04-2) and appended to selected_mutants.csv
+#   3. the added TCs run on the mutants of kill_matrix.json, the appended
+#      mutants run every TC (KillMatrixDeltaCollector)
+#   4. failing_tcs.txt, excluded_failing_tcs.txt and coverage_summary.csv are
+#      updated and mbfl_features.csv is measured again (as 01-5 of 04-2)
+# Added TCs not executing the buggy line stay excluded failing TCs (02-4 of
+# 03-2 rejects such failing TCs). The version is left unchanged when no TC
+# is added, so running it again only retests what is left.
+
+# Current working directory
+script_path = Path(__file__).resolve()
+refine_testsuite_dir = script_path.parent
+bin_dir = refine_testsuite_dir.parent
+extract_mbfl_features_cmd_dir = bin_dir.parent
+
+# General directories
+src_dir = extract_mbfl_features_cmd_dir.parent
+root_dir = src_dir.parent
+user_configs_dir = root_dir / 'user_configs'
+subjects_dir = root_dir / 'subjects'
+external_tools_dir = root_dir / 'external_tools'
+
+# keywords in configurations.json
+config_sh_wd_key = 'configure_script_working_directory'
+build_sh_wd_key = 'build_script_working_directory'
+
+# files in user_configs_dir
+configure_no_cov_script = 'configure_no_cov_script.sh'
+configure_yes_cov_script = 'configure_yes_cov_script.sh'
+build_script = 'build_script.sh'
+clean_script = 'clean_script.sh'
+machines_json_file = 'machines.json'
+configure_json_file = 'configurations.json'
+
+# file names
+failing_txt = 'failing_tcs.txt'
+passing_txt = 'passing_tcs.txt'
+excluded_failing_txt = 'excluded_failing_tcs.txt'
+total_additional_txt = 'total_additional_tcs.txt'
+
+
+def main():
+    parser = make_parser()
+    args = parser.parse_args()
+    start_process(args.subject, args.worker, args.version, args.tcs_file, args.seed)
+
+
+def start_process(subject_name, worker_name, version_name, tcs_file=total_additional_txt, seed=0):
+    subject_working_dir = extract_mbfl_features_cmd_dir / f"{subject_name}-working_directory"
+    assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
+
+    core_working_dir = subject_working_dir / 'workers_extracting_mbfl_features' / worker_name
+    assert core_working_dir.exists(), f"Core working directory {core_working_dir} does not exist"
+
+    assigned_buggy_versions_dir = core_working_dir / 'assigned_buggy_versions'
+    assert assigned_buggy_versions_dir.exists(), f"Assigned buggy versions directory {assigned_buggy_versions_dir} does not exist"
+
+    version_dir = assigned_buggy_versions_dir / version_name
+    assert version_dir.exists(), f"Version directory {version_dir} does not exist"
+
+    print(f"<<<<<< Delta retest on {subject_name} with {worker_name} for {version_name} >>>>>>")
+
+    # 1. Read configurations
+    configs = read_configs(subject_name, subject_working_dir)
+
+    # 2. get bug_info
+    target_code_file_path, buggy_code_filename, buggy_lineno = get_bug_info(version_dir)
+    assert version_name == buggy_code_filename, f"Version name {version_name} does not match with buggy code filename {buggy_code_filename}"
+    buggy_line_key = get_buggy_line_key(version_dir)
+
+    # 3. get test cases and the failing test cases to add
+    failing_tc_list = get_tcs(version_dir, failing_txt)
+    passing_tc_list = get_tcs(version_dir, passing_txt)
+    excluded_failing_tc_list = get_tcs(version_dir, excluded_failing_txt)
+    new_failing_tcs = get_new_failing_tcs(version_dir, tcs_file, failing_tc_list, excluded_failing_tc_list)
+    print(f"failing test cases: {len(failing_tc_list)}, passing test cases: {len(passing_tc_list)}, test cases to add: {len(new_failing_tcs)}")
+    if len(new_failing_tcs) == 0:
+        print(f"No failing test case to add from {tcs_file}, {version_name} is left unchanged")
+        return
+
+    # 4. the results to merge into, measured by 03-2 and 04-2
+    version_coverage_dir = version_dir / 'coverage_info'
+    coverage_store = load_coverage_vector_store(version_coverage_dir)
+    assert coverage_store is not None, f"Coverage store {version_coverage_dir / coverage_vectors_file} does not exist, replay {version_name} from 02_select_usable_buggy_versions"
+    kill_matrix = load_kill_matrix(version_dir)
+    assert kill_matrix is not None, f"Kill matrix of {version_name} does not exist, replay {version_name} from 02_select_usable_buggy_versions"
+    assert kill_matrix.covers(failing_tc_list) and kill_matrix.covers(passing_tc_list), f"Kill matrix of {version_name} does not cover its test suite, replay {version_name} from 02_select_usable_buggy_versions"
+    selected_mutants = get_selected_mutants(version_dir)
+
+    # restore target files left overlaid by an interrupted run
+    source_overlay = SourceOverlay(core_working_dir)
+    buggy_code_file = get_buggy_code_file(version_dir, buggy_code_filename)
+    source_overlay.apply_file(target_code_file_path, buggy_code_file)
+    env = make_env(configs, core_working_dir)
+
+    # 5. measure coverage of the added test cases only
+    tcs_to_measure = [tc for tc in new_failing_tcs if tc not in coverage_store.tc2vector]
+    if len(tcs_to_measure) > 0:
+        measure_coverage(configs, subject_working_dir, core_working_dir, source_overlay, version_name, coverage_store, tcs_to_measure, env)
+
+    # 6. added test cases must execute the buggy line
+    assert buggy_line_key in coverage_store.lines, f"Buggy line {buggy_line_key} is not in the coverage of {version_name}"
+    buggy_line_pos = coverage_store.lines.index(buggy_line_key)
+    not_executing = [tc for tc in new_failing_tcs if not coverage_store.covers(tc, buggy_line_pos)]
+    if len(not_executing) > 0:
+        print(f"{len(not_executing)} test cases do not execute buggy line {buggy_line_key}, they stay excluded failing test cases")
+    new_failing_tcs = [tc for tc in new_failing_tcs if tc not in not_executing]
+    if len(new_failing_tcs) == 0:
+        print(f"No failing test case to add, {version_name} is left unchanged")
+        source_overlay.restore_all()
+        return
+
+    failing_tc_list = sorted(failing_tc_list + new_failing_tcs, key=custome_sort)
+    excluded_failing_tc_list = [tc for tc in excluded_failing_tc_list if tc not in new_failing_tcs]
+    total_tc_list = sorted(failing_tc_list + passing_tc_list, key=custome_sort)
+    coverage_store = coverage_store.subset(total_tc_list)
+    executed_lines_index = make_executed_lines_index(coverage_store, failing_tc_list, passing_tc_list)
+
+    # 7. select mutants of the lines newly executed by failing test cases
+    new_mutants = select_new_mutants(configs, core_working_dir, version_name, subject_name, executed_lines_index, selected_mutants, seed)
+    if len(new_mutants) > 0:
+        append_selected_mutants(version_dir, new_mutants)
+    selected_mutants += new_mutants
+
+    # 8. run the added test cases on the tested mutants, every test case on the others
+    testsuite = {
+        'failing': failing_tc_list,
+        'passing': passing_tc_list,
+    }
+    engine = MutationTestingEngine(configs, core_working_dir, source_overlay, subject_name, version_name, env)
+    collector = KillMatrixDeltaCollector(kill_matrix)
+    engine.run(selected_mutants, testsuite, [collector])
+    source_overlay.restore_all()
+
+    # 9. write the merged kill matrix and mutation_testing_results.csv,
+    # then the coverage and the test suite
+    collector.finish(version_dir)
+    write_coverage_info(version_coverage_dir, coverage_store, executed_lines_index, total_tc_list)
+    update_coverage_summary(version_dir, failing_tc_list, excluded_failing_tc_list, executed_lines_index)
+    write_tcs(version_dir, failing_txt, failing_tc_list)
+    write_tcs(version_dir, excluded_failing_txt, excluded_failing_tc_list)
+
+    # 10. measure mbfl features of every line with the merged outcomes (as 01-5 of 04-2)
+    kill_matrix = load_kill_matrix(version_dir)
+    outcomes = MutantOutcomes.from_rows(kill_matrix.outcomes(failing_tc_list, passing_tc_list))
+    lines = list(coverage_store.lines)
+    line_scores = write_mbfl_features_csv(
+        version_dir / mbfl_features_file, lines, buggy_line_key,
+        outcomes, len(failing_tc_list), configs['max_mutants']
+    )
+    write_aggregate_tables(version_dir / mbfl_features_file, lines, buggy_line_key, line_scores)
+    print(f"Added {len(new_failing_tcs)} failing test cases to {version_name}: {len(failing_tc_list)} failing, {len(passing_tc_list)} passing test cases")
+
+
+def get_new_failing_tcs(version_dir, tcs_file, failing_tc_list, excluded_failing_tc_list):
+    # test cases of tcs_file failing on the version that are not used yet
+    tcs_file_txt = version_dir / 'testsuite_info' / tcs_file
+    if not tcs_file_txt.exists():
+        return []
+
+    failing_set = set(failing_tc_list)
+    excluded_failing_set = set(excluded_failing_tc_list)
+    return [
+        tc for tc in get_tcs(version_dir, tcs_file)
+        if tc in excluded_failing_set and tc not in failing_set
+    ]
+
+
+def measure_coverage(configs, subject_working_dir, core_working_dir, source_overlay, version_name, coverage_store, tc_list, env):
+    # gcov executable
+    home_directory = configs['home_directory']
+    gcovr = Path(home_directory) / '.local/bin/gcovr'
+
+    tc_dir = core_working_dir / configs['test_case_directory']
+    assert tc_dir.exists(), f"Test case directory {tc_dir} does not exist"
+
+    subject_dir = core_working_dir / configs['subject_name']
+    assert subject_dir.exists(), f"Subject directory {subject_dir} does not exist"
+
+    version_cov_dir = core_working_dir / 'coverage' / version_name
+    version_cov_dir.mkdir(parents=True, exist_ok=True)
+
+    # prepare filter files for coverage
+    targeted_files = [file.split('/')[-1] for file in configs['target_files']]
+    filtered_files = '|'.join(targeted_files)
+    target_gcno_gcda = []
+    for target_file in targeted_files:
+        filename = target_file.split('.')[0]
+        target_gcno_gcda.append('*'+filename+'.gcno')
+        target_gcno_gcda.append('*'+filename+'.gcda')
+
+    # 1. build the buggy version with coverage
+    copy_configure_script(configs, subject_working_dir, core_working_dir, configure_yes_cov_script)
+    execute_clean_script(configs[build_sh_wd_key], core_working_dir)
+    res = execute_configure_script(configs[config_sh_wd_key], core_working_dir, configure_yes_cov_script)
+    if res == 0:
+        res = execute_build_script(configs[build_sh_wd_key], core_working_dir)
+    if res != 0:
+        print(f"Failed to build {version_name} with coverage")
+        source_overlay.restore_all()
+        exit(1)
+
+    # 2. run each added test case and merge its coverage into the store
+    for tc_name in tc_list:
+        remove_all_gcda(subject_dir)
+        run_tc(tc_name, tc_dir, env)
+        remove_untargeted_files_for_coverage(target_gcno_gcda, subject_dir)
+        raw_cov = generate_coverage_json(gcovr, version_cov_dir, tc_name, filtered_files, subject_dir)
+        assert raw_cov.exists(), f"Coverage of {tc_name} was not generated"
+
+        add_tc_coverage(coverage_store, tc_name, raw_cov)
+        os.remove(raw_cov)
+        print(f"Testcase {tc_name} coverage is measured")
+
+    # 3. configure without coverage again for the mutants
+    execute_clean_script(configs[build_sh_wd_key], core_working_dir)
+    res = execute_configure_script(configs[config_sh_wd_key], core_working_dir, configure_no_cov_script)
+    assert res == 0, f"Failed to configure {version_name} without coverage"
+
+
+def add_tc_coverage(coverage_store, tc_name, raw_cov):
+    # gcovr lists the lines in the order of the store, 02-4 of 03-2 only
+    # renamed them to line keys (<filename>#<function>#<lineno>)
+    measured = CoverageVectorStore()
+    measured.add_gcovr_json(tc_name, raw_cov)
+    assert len(measured.lines) == len(coverage_store.lines), f"Coverage of {tc_name} has {len(measured.lines)} lines, the store has {len(coverage_store.lines)}"
+    for line, key in zip(measured.lines, coverage_store.lines):
+        filename, lineno = line.rsplit('#', 1)
+        info = key.split('#')
+        assert info[0] == filename.split('/')[-1] and info[-1] == lineno, f"Line {line} of {tc_name} does not match with line {key} of the store"
+    coverage_store.add_vector(tc_name, measured.tc_vector(tc_name))
+
+
+def make_executed_lines_index(coverage_store, failing_tc_list, passing_tc_list):
+    # tc ids of the index: failing tcs first, then passing tcs
+    tc_groups = {
+        'failing': failing_tc_list,
+        'passing': passing_tc_list
+    }
+    index_tc_list = failing_tc_list + passing_tc_list
+
+    # bitmap over index tc ids of every line, built row-wise from the coverage classes
+    line_bitmaps = dict(zip(coverage_store.lines, coverage_store.line_tc_bitmaps(index_tc_list)))
+
+    return ExecutedLinesIndex.from_bitmaps(tc_groups, line_bitmaps)
+
+
+def select_new_mutants(configs, core_working_dir, version_name, subject_name, executed_lines_index, selected_mutants, seed):
+    # mutants of the lines executed by failing tcs without selected mutants,
+    # up to max_mutants per line as 01-3 of 04-2 selects them
+    # (lines with no mutant at all are asked again, they give none)
+    version_mutants_dir = core_working_dir / 'generated_mutants' / version_name
+    assert version_mutants_dir.exists(), f"Version mutants directory {version_mutants_dir} does not exist"
+
+    selected_lines = set((mutant['target_file'], mutant['lineno']) for mutant in selected_mutants)
+    file2lines = {}
+    for key in executed_lines_index.lines_executed_by('failing'):
+        info = key.split('#')
+        filename = info[0].split('/')[-1]
+        lineno = info[2]
+        if (filename, lineno) in selected_lines:
+            continue
+        if filename not in file2lines:
+            file2lines[filename] = []
+        file2lines[filename].append(lineno)
+
+    mutant_cnt = max([int(mutant['mutant_id'].split('_')[-1]) for mutant in selected_mutants], default=0)
+    new_mutants = []
+    for target_file in configs['target_files']:
+        filename = target_file.split('/')[-1]
+        if filename not in file2lines:
+            continue
+
+        file_mutants_dir = version_mutants_dir / f"{subject_name}-{filename}"
+        code_name = filename.split('.')[0]
+        mut_db_csv = file_mutants_dir / f"{code_name}_mut_db.csv"
+        if not mut_db_csv.exists():
+            print(f"Mutants database csv {mut_db_csv.name} does not exist")
+            continue
+
+        mutant_db_index = load_mutant_db_index(file_mutants_dir, mut_db_csv)
+        rng = make_selection_rng(seed, version_name, filename)
+        selected = mutant_db_index.select(file2lines[filename], configs['max_mutants'], rng)
+        mutant_db_index.close()
+
+        for lineno, mutant_lines in selected.items():
+            for mutant_line in mutant_lines:
+                mutant_cnt += 1
+                new_mutants.append({
+                    'target_file': filename,
+                    'lineno': lineno,
+                    'mutant_id': f"mutant_{mutant_cnt}",
+                    'mutant_name': mutant_line.split(',')[0],
+                    'row': mutant_line,
+                })
+        print(f"Lines newly executed by failing test cases in {filename}: {len(file2lines[filename])}, selected mutants: {sum(len(mutant_lines) for mutant_lines in selected.values())}")
+
+    return new_mutants
+
+
+def get_selected_mutants(version_dir):
+    # [mutant, ...] in the order of selected_mutants.csv
+    selected_mutants_file = version_dir / 'selected_mutants.csv'
+    assert selected_mutants_file.exists(), f"Selected mutants file {selected_mutants_file} does not exist"
+
+    selected_mutants = []
+    with open(selected_mutants_file, 'r') as f:
+        lines = f.readlines()
+        for mutant_line in lines[2:]:
+            info = mutant_line.strip().split(',')
+            selected_mutants.append({
+                'target_file': info[0],
+                'mutant_id': info[1],
+                'lineno': info[2],
+                'mutant_name': info[3],
+            })
+    return selected_mutants
+
+
+def append_selected_mutants(version_dir, new_mutants):
+    selected_mutants_file = version_dir / 'selected_mutants.csv'
+    with selected_mutants_file.open('a') as f:
+        for mutant in new_mutants:
+            f.write(f"{mutant['target_file']},{mutant['mutant_id']},{mutant['lineno']},{mutant['row']}\n")
+    print(f"{len(new_mutants)} mutants are appended to {selected_mutants_file.name}")
+
+
+def write_coverage_info(version_coverage_dir, coverage_store, executed_lines_index, total_tc_list):
+    coverage_store.save(version_coverage_dir / coverage_vectors_file)
+    executed_lines_index.save(version_coverage_dir / executed_lines_index_file)
+
+    # the coverage csv of 02-4 of 03-2, when it was written
+    cov_csv_file = version_coverage_dir / 'postprocessed_coverage.csv'
+    if cov_csv_file.exists():
+        write_postprocessed_coverage(cov_csv_file, coverage_store, total_tc_list)
+
+    print(f"Coverage of {len(total_tc_list)} test cases is saved in {version_coverage_dir.name}")
+
+
+def write_postprocessed_coverage(cov_csv_file, coverage_store, total_tc_list):
+    # row: line key, col: test case, 1 if covered else 0
+    col_data = ['key'] + [tc_script_name.split('.')[0] for tc_script_name in total_tc_list]
+
+    with open(cov_csv_file, 'w') as f:
+        f.write(','.join(col_data) + '\n')
+
+        # lines of the same block have the same row, format each row once
+        row_strs = {}
+        for key, bitmap in zip(coverage_store.lines, coverage_store.line_tc_bitmaps(total_tc_list)):
+            if bitmap not in row_strs:
+                bits = format(bitmap, f"0{len(total_tc_list)}b")[::-1] if len(total_tc_list) > 0 else ''
+                row_strs[bitmap] = ',"' + '","'.join(bits) + '"' if len(bits) > 0 else ''
+            f.write(f"\"{key}\"" + row_strs[bitmap] + '\n')
+
+
+def update_coverage_summary(version_dir, failing_tc_list, excluded_failing_tc_list, executed_lines_index):
+    cov_summary_file = version_dir / 'coverage_summary.csv'
+    if not cov_summary_file.exists():
+        return
+
+    with open(cov_summary_file, 'r') as f:
+        lines = f.readlines()
+    columns = lines[0].strip().split(',')
+    values = dict(zip(columns, lines[1].strip().split(',')))
+
+    updates = {
+        '#_failing_tcs': len(failing_tc_list),
+        '#_excluded_failing_tcs': len(excluded_failing_tc_list),
+        '#_total_utilized_tcs': len(executed_lines_index.tcs),
+        '#_lines_executed_by_failing_tcs': len(executed_lines_index.lines_executed_by('failing')),
+        '#_lines_executed_by_passing_tcs': len(executed_lines_index.lines_executed_by('passing')),
+        '#_total_lines_executed': len(executed_lines_index.lines),
+    }
+    for key, value in updates.items():
+        if key in values:
+            values[key] = value
+
+    with open(cov_summary_file, 'w') as f:
+        f.write(','.join(columns) + '\n')
+        f.write(','.join([str(values[key]) for key in columns]) + '\n')
+
+
+def write_tcs(version_dir, tc_file, tc_list):
+    tc_file_txt = version_dir / 'testsuite_info' / tc_file
+    with open(tc_file_txt, 'w') as f:
+        content = '\n'.join(tc_list)
+        f.write(content)
+
+
+def get_coverage_json_path(version_cov_dir, tc_id):
+    tc_name = tc_id.split('.')[0]
+    file_name = tc_name + '.raw.json'
+    file_path = version_cov_dir / file_name
+    return file_path.resolve()
+
+def generate_coverage_json(gcovr, version_cov_dir, tc_id, filtered_files, subject_dir):
+    file_path = get_coverage_json_path(version_cov_dir, tc_id)
+    cmd = [
+        gcovr,
+        '--filter', filtered_files,
+        '--gcov-executable', 'llvm-cov gcov',
+        '--json',
+        '-o', file_path
+    ]
+    res = sp.call(cmd, cwd=subject_dir)
+    return file_path
+
+def remove_untargeted_files_for_coverage(target_gcno_gcda, subject_dir):
+    # remove all files that are *.gcno and *.gcda
+    # except <target_files>.gcno <target_files>.gcda files
+    cmd = ['find', '.', '-type', 'f', '(', '-name', '*.gcno', '-o', '-name', '*.gcda', ')']
+    for target_file in target_gcno_gcda:
+        cmd.extend(['!', '-name', target_file])
+    cmd.extend(['-delete'])
+    res = sp.call(cmd, cwd=subject_dir)
+
+def remove_all_gcda(subject_dir):
+    cmd = [
+        'find', '.', '-type',
+        'f', '-name', '*.gcda',
+        '-delete'
+    ]
+    res = sp.call(cmd, cwd=subject_dir)
+
+def run_tc(tc_script, tc_dir, env):
+    cmd = f"./{tc_script}"
+    res = sp.run(cmd, shell=True, cwd=tc_dir, stdout=sp.PIPE, stderr=sp.PIPE, env=env)
+    return res.returncode
+
+
+def custome_sort(tc_script):
+    tc_filename = tc_script.split('.')[0]
+    return int(tc_filename[2:])
+
+def get_tcs(version_dir, tc_file):
+    testsuite_info_dir = version_dir / 'testsuite_info'
+    assert testsuite_info_dir.exists(), f"Testsuite info directory {testsuite_info_dir} does not exist"
+
+    tc_file_txt = testsuite_info_dir / tc_file
+    assert tc_file_txt.exists(), f"Test cases file {tc_file_txt} does not exist"
+
+    tcs_list = []
+
+    with open(tc_file_txt, 'r') as f:
+        lines = f.readlines()
+        for line in lines:
+            line = line.strip()
+            if line == '':
+                continue
+            tcs_list.append(line)
+
+    tcs_list = sorted(tcs_list, key=custome_sort)
+
+    return tcs_list
+
+
+def get_buggy_line_key(version_dir):
+    buggy_line_key_file = version_dir / 'buggy_line_key.txt'
+    assert buggy_line_key_file.exists(), f"Buggy line key file {buggy_line_key_file} does not exist"
+
+    with open(buggy_line_key_file, 'r') as f:
+        line = f.readline().strip()
+        return line
+
+
+def get_bug_info(version_dir):
+    bug_info_csv = version_dir / 'bug_info.csv'
+    assert bug_info_csv.exists(), f"Bug info csv file {bug_info_csv} does not exist"
+
+    with open(bug_info_csv, 'r') as f:
+        lines = f.readlines()
+        target_code_file, buggy_code_filename, buggy_lineno = lines[1].strip().split(',')
+        return target_code_file, buggy_code_filename, buggy_lineno
+
+
+def get_buggy_code_file(version_dir, buggy_code_filename):
+    buggy_code_file_dir = version_dir / 'buggy_code_file'
+    assert buggy_code_file_dir.exists(), f"Buggy code file directory {buggy_code_file_dir} does not exist"
+
+    buggy_code_file = buggy_code_file_dir / buggy_code_filename
+    assert buggy_code_file.exists(), f"Buggy code file {buggy_code_file} does not exist"
+
+    return buggy_code_file
+
+
+def execute_clean_script(clean_sh_wd, core_working_dir):
+    global clean_script
+
+    clean_sh_wd = core_working_dir / clean_sh_wd
+    clean_sh = clean_sh_wd / clean_script
+    assert clean_sh.exists(), f"Clean script {clean_sh} does not exist"
+
+    cmd = ['bash', clean_sh]
+    res = sp.run(cmd, cwd=clean_sh_wd, stdout=sp.PIPE, stderr=sp.PIPE)
+
+    print('Executed clean script')
+
+    return res.returncode
+
+
+def copy_configure_script(configs, subject_working_dir, core_working_dir, configure_script):
+    # workers initialized by 04-1 before it distributed configure_yes_cov_script.sh
+    # only have configure_no_cov_script.sh in the subject repository
+    config_sh = core_working_dir / configs[config_sh_wd_key] / configure_script
+    if config_sh.exists():
+        return
+
+    configure_file = subject_working_dir / f"{configs['subject_name']}-configures" / configure_script
+    assert configure_file.exists(), f"Configure script {configure_file} does not exist"
+
+    cmd = ['cp', configure_file, config_sh]
+    res = sp.call(cmd)
+    if res != 0:
+        raise Exception(f'Failed to copy configure script {configure_script} to {config_sh.parent}')
+
+
+def execute_configure_script(config_sh_wd, core_working_dir, configure_script):
+    config_sh_wd = core_working_dir / config_sh_wd
+    config_sh = config_sh_wd / configure_script
+    assert config_sh.exists(), f"Configure script {config_sh} does not exist"
+
+    cmd = ['bash', config_sh]
+    res = sp.run(cmd, cwd=config_sh_wd, stdout=sp.PIPE, stderr=sp.PIPE)
+
+    print(f'Executed configure script {configure_script}')
+
+    return res.returncode
+
+
+def execute_build_script(build_sh_wd, core_working_dir):
+    build_sh_wd = core_working_dir / build_sh_wd
+    build_sh = build_sh_wd / build_script
+    assert build_sh.exists(), f"Build script {build_sh} does not exist"
+
+    cmd = ['bash', build_script]
+    res = sp.run(cmd, cwd=build_sh_wd, stdout=sp.PIPE, stderr=sp.PIPE)
+
+    print(f"Build script executed: {res.returncode}")
+
+    return res.returncode
+
+
+def read_configs(subject_name, subject_working_dir):
+    global configure_json_file
+
+    subject_config_dir = subject_working_dir / f"{subject_name}-configures"
+    assert subject_config_dir.exists(), f"Subject configurations directory {subject_config_dir} does not exist"
+
+    config_json = subject_config_dir / configure_json_file
+    assert config_json.exists(), f"Configurations file {config_json} does not exist"
+
+    configs = None
+    with config_json.open() as f:
+        configs = json.load(f)
+
+    if configs is None:
+        raise Exception('Configurations are not loaded')
+
+    return configs
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Add failing test cases to a buggy version, measuring and testing only what they change')
+    parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--worker', type=str, help='Worker name (e.g., <machine-name>/<core-id>)', required=True)
+    parser.add_argument('--version', type=str, help='Version name', required=True)
+    parser.add_argument('--tcs-file', type=str, default=total_additional_txt, help=f'Test cases to add, in testsuite_info/ of the version (default: {total_additional_txt})')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random selection of mutants of newly executed lines (default: 0)')
+    return parser
+
+if __name__ == "__main__":
+    main()
+    exit(0)
@@ -37,10 +37,10 @@ real_world_buggy_versions = 'real_world_buggy_versions'
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject)
+    start_process(args.subject, args.delta_retest, args.retest_versions_file)
 
 
-def start_process(subject_name):
+def start_process(subject_name, delta_retest=False, retest_versions_file=None):
     global configure_json_file
 
     subject_working_dir = extract_mbfl_features_cmd_dir / f"{subject_name}-working_directory"
@@ -61,7 +61,7 @@ def start_process(subject_name):
     distribution_machineCore2bugsList = assign_buggy_versions(configs, subject_working_dir, buggy_versions, machine_cores_list)
 
     # 3. make script to execute test mutants on distributed machines
-    refine_testsuite(configs, subject_working_dir, distribution_machineCore2bugsList)
+    refine_testsuite(configs, subject_working_dir, distribution_machineCore2bugsList, delta_retest, retest_versions_file)
 
 
 def get_buggy_versions(subject_name):
@@ -139,7 +139,7 @@ def assign_buggy_versions(configs, subject_working_dir, buggy_versions, machine_
     
     return distribution_machineCore2bugsList
 
-def refine_testsuite(configs, subject_working_dir, distribution_machineCore2bugsList):
+def refine_testsuite(configs, subject_working_dir, distribution_machineCore2bugsList, delta_retest=False, retest_versions_file=None):
     global bin_dir
 
     home_directory = configs['home_directory']
@@ -150,6 +150,13 @@ def refine_testsuite(configs, subject_working_dir, distribution_machineCore2bugs
     mbfl_extraction_cmd_dir = bin_dir / '04-5_refine_testsuite'
     assert mbfl_extraction_cmd_dir.exists(), f"Test mutants directory {mbfl_extraction_cmd_dir} does not exist"
 
+    # delta retest of the versions with the total additional failing tcs (01-5)
+    delta_retest_options = ''
+    if delta_retest:
+        delta_retest_options = ' --delta-retest'
+        if retest_versions_file is not None:
+            delta_retest_options += f" --retest-versions-file {retest_versions_file}"
+
     bash_file = open('02-1_test_for_refining_testsuite.sh', 'w')
     bash_file.write('date\n')
     cnt = 0
@@ -160,8 +167,8 @@ def refine_testsuite(configs, subject_working_dir, distribution_machineCore2bugs
         core_id = machine_core.split(':')[1]
         worker = f"{machine_id}/{core_id}"
 
-        cmd = "ssh {} \"cd {} && ./general_command.py --subject {} --worker {} > refine_testsuite.{} 2>&1\" & \n".format(
-            machine_id, machine_bin_dir, subject_name, worker, machine_core
+        cmd = "ssh {} \"cd {} && ./general_command.py --subject {} --worker {}{} > refine_testsuite.{} 2>&1\" & \n".format(
+            machine_id, machine_bin_dir, subject_name, worker, delta_retest_options, machine_core
         )
         bash_file.write(cmd)
 
@@ -189,6 +196,8 @@ def refine_testsuite(configs, subject_working_dir, distribution_machineCore2bugs
 def make_parser():
     parser = argparse.ArgumentParser(description='Copy subject to working directory')
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--delta-retest', action='store_true', help='Workers add the failing test cases of total_additional_tcs.txt to their versions, measuring and testing only them')
+    parser.add_argument('--retest-versions-file', type=str, default=None, help='With --delta-retest, only retest the versions listed in this file of the working directory')
     return parser
 
 def read_configs(subject_name, subject_working_dir):
@@ -5,8 +5,11 @@ import argparse
 import json
 import subprocess as sp
 import csv
-import pandas as pd
-import sys
+import numpy as np
+
+from executed_lines_index import load_executed_lines_index, executed_lines_index_file, legacy_failing_file, legacy_passing_file
+from ranking_engine import FeatureTable, rank_all
+from analysis_cache import AnalysisCache
 
 # Current working directory
 script_path = Path(__file__).resolve()
@@ -48,10 +51,10 @@ additional_failing_txt = 'additional_failing_tcs.txt'
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.mbfl_set_name, args.rank_summary_file_name)
+    start_process(args.subject, args.mbfl_set_name, args.rank_summary_file_name, args.no_cache)
 
 
-def start_process(subject_name, mbfl_set_name, rank_summary_file_name):
+def start_process(subject_name, mbfl_set_name, rank_summary_file_name, no_cache=False):
     global configure_json_file
 
     subject_working_dir = mbfl_feature_extraction_dir / f"{subject_name}-working_directory"
@@ -64,7 +67,9 @@ def start_process(subject_name, mbfl_set_name, rank_summary_file_name):
     mbfl_features_per_bug = get_buggy_versions(subject_working_dir, mbfl_set_name)
 
     # 3. rank buggy line with mbfl features
-    mbfl_summary = start_analysis(configs, mbfl_features_per_bug)
+    analysis_cache = AnalysisCache.of_working_dir(subject_working_dir, enabled=not no_cache)
+    mbfl_summary = start_analysis(configs, mbfl_features_per_bug, analysis_cache)
+    print(analysis_cache.summary())
 
     # 4. save the summary to a file
     mbfl_feature_summary_file = subject_working_dir / rank_summary_file_name
@@ -75,9 +80,13 @@ def start_process(subject_name, mbfl_set_name, rank_summary_file_name):
             writer.writerow(data)
 
 
-def start_analysis(configs, mbfl_features_per_bug):
-    max_mutants = configs['max_mutants']
-    mutant_keys = get_mutant_keys(max_mutants)
+def start_analysis(configs, mbfl_features_per_bug, analysis_cache):
+    # rank the functions of all buggy versions at once (ranking_engine.py)
+    met_key = 'met susp. score'
+    muse_key = 'muse susp. score'
+    formulas = [met_key, muse_key]
+    feature_table = FeatureTable.load(mbfl_features_per_bug, 'mbfl_features.csv', formulas, granularity='function', cache=analysis_cache)
+    rank_results = rank_all(feature_table, formulas, tie='max')
 
     bugs_list = []
 
@@ -96,40 +105,36 @@ def start_analysis(configs, mbfl_features_per_bug):
         assert mbfl_features_csv_file.exists(), f"MBFL features file {mbfl_features_csv_file} does not exist"
 
         # GET: list of failing TCs
-        failing_tcs = get_tcs(bug_dir, 'failing_tcs.txt')
-        passing_tcs = get_tcs(bug_dir, 'passing_tcs.txt')
-        ccts = get_tcs(bug_dir, 'ccts.txt')
-        excluded_failing_tcs = get_tcs(bug_dir, 'excluded_failing_tcs.txt')
-        excluded_passing_tcs = get_tcs(bug_dir, 'excluded_passing_tcs.txt')
-        # excluded_tcs = get_tcs(bug_dir, 'excluded_tcs.txt')
-        additional_failing_tcs = get_tcs(bug_dir, 'additional_failing_tcs.txt')
+        failing_tcs = load_tcs(analysis_cache, bug_dir, 'failing_tcs.txt')
+        passing_tcs = load_tcs(analysis_cache, bug_dir, 'passing_tcs.txt')
+        ccts = load_tcs(analysis_cache, bug_dir, 'ccts.txt')
+        excluded_failing_tcs = load_tcs(analysis_cache, bug_dir, 'excluded_failing_tcs.txt')
+        excluded_passing_tcs = load_tcs(analysis_cache, bug_dir, 'excluded_passing_tcs.txt')
+        # excluded_tcs = load_tcs(analysis_cache, bug_dir, 'excluded_tcs.txt')
+        additional_failing_tcs = load_tcs(analysis_cache, bug_dir, 'additional_failing_tcs.txt')
 
 
         # GET: buggy line key
-        buggy_line_key = get_buggy_line_key(bug_dir)
+        buggy_line_key = analysis_cache.load(bug_dir, get_buggy_line_key, ['buggy_line_key.txt'])
 
         # GET: get lines executed by failing TCs
         # key: <target-file>#<function-name>#<line-number> WHICH IS JUST LIKE BUGGY_LINE_KEY
         # value: list of failing TCs [TC1, TC2, ...]
-        lines_executed_by_failing_tcs = get_lines_executed_by_failing_tcs(bug_dir)
+        lines_executed_by_failing_tcs = analysis_cache.load(bug_dir, get_lines_executed_by_failing_tcs, executed_lines_inputs)
 
         # VALIDATE: buggy_line_key exists as line in lines_executed_by_failing_tcs
         assert buggy_line_key in lines_executed_by_failing_tcs, f"Buggy line key {buggy_line_key} does not exist in lines executed by failing TCs"
 
         # GET: mutants data
-        mutants_data = get_mutants_data(bug_dir, buggy_line_key)
+        mutants_data = analysis_cache.load(bug_dir, get_mutants_data, ['mutation_testing_results.csv'], buggy_line_key)
 
         # GET: mbfl_features, suspiciousness scores
         # susp_scores_buggy_line = get_susp_scores_buggy_line(mbfl_features_csv_file, buggy_line_key)
 
         # get rank
-        met_key = 'met susp. score'
-        muse_key = 'muse susp. score'
-        formulas = [met_key, muse_key]
         ranks = {}
         for formula in formulas:
-            rank_data = get_rank_at_method_level(mbfl_features_csv_file, buggy_line_key, formula, mutant_keys)
-            ranks[formula] = rank_data
+            ranks[formula] = get_function_rank_data(rank_results[formula], idx)
         
         bug_rank_key = "rank of buggy function (function level)"
         print(f"\tmet rank: {ranks[met_key][bug_rank_key]}")
@@ -195,13 +200,6 @@ def start_analysis(configs, mbfl_features_per_bug):
     return bugs_list
 
 
-def get_mutant_keys(max_mutants):
-    mutant_keys = []
-    for i in range(1, max_mutants+1):
-        mutant_keys.append(f'm{i}:f2p')
-        mutant_keys.append(f'm{i}:p2f')
-    return mutant_keys
-
 def custome_sort(tc_script):
     tc_filename = tc_script.split('.')[0]
     return int(tc_filename[2:])
@@ -226,121 +224,21 @@ def get_tcs(version_dir, tc_file):
 
     return tcs_list
 
-def get_rank_at_method_level(mbfl_features_csv_file, buggy_line_key, formula, mutant_keys):
+def load_tcs(analysis_cache, version_dir, tc_file):
+    # get_tcs through the analysis cache
+    return analysis_cache.load(version_dir, get_tcs, [f'testsuite_info/{tc_file}'], tc_file)
 
-    buggy_target_file = buggy_line_key.split('#')[0].split('/')[-1]
-    buggy_function_name = buggy_line_key.split('#')[1]
-    buggy_lineno = int(buggy_line_key.split('#')[-1])
-
-    mbfl_features_df = pd.read_csv(mbfl_features_csv_file)
-
-    # 1. SET ALL BUGGY LINE OF BUGGY FUNCTION TO 1
-    for index, row in mbfl_features_df.iterrows():
-        key = row['key']
-        target_file = key.split('#')[0].split('/')[-1]
-        function_name = key.split('#')[1]
-        line_num = int(key.split('#')[-1])
-
-        # split key to target_file, function_name, line_num (individual column)
-        mbfl_features_df.at[index, 'target_file'] = target_file
-        mbfl_features_df.at[index, 'function_name'] = function_name
-        mbfl_features_df.at[index, 'line_num'] = line_num
-
-        # check if the row is one of the buggy lines of the buggy function
-        if target_file == buggy_target_file and function_name == buggy_function_name:
-            mbfl_features_df.at[index, 'bug'] = 1
-        else:
-            mbfl_features_df.at[index, 'bug'] = 0
-    
+def get_function_rank_data(rank_result, version_idx):
+    # rank of the buggy function (ties ranked at the upper bound) from the ranks of all versions
+    bug_rank = rank_result.bug_rank[version_idx]
+    assert not np.isnan(bug_rank), f"Buggy function of {rank_result.version_names[version_idx]} is not ranked"
 
-    # 2. DROP THE KEY COLUMN
-    mbfl_features_df = mbfl_features_df.drop(columns=['key'])
-    # mbfl_features_df = mbfl_features_df[[
-    #     'target_file', 'function_name', 'line_num',
-    #     'met_1', 'met_2', 'met_3', 'met_4',
-    #     'muse_a', 'muse_b', 'muse_c',
-    #     'muse_1', 'muse_2', 'muse_3', 'muse_4', 'muse_5', 'muse_6',
-    #     'bug'
-    # ]]
-    mbfl_features_df = mbfl_features_df[[
-        'target_file', 'function_name', 'line_num',
-        '# of totfailed_TCs', '# of mutants'] + mutant_keys + [
-        '|muse(s)|', 'total_f2p', 'total_p2f', 'line_total_f2p', 'line_total_p2f',
-        'muse_1', 'muse_2', 'muse_3', 'muse_4',
-        'muse susp. score', 'met susp. score', 'bug'
-
-    ]]
-
-
-
-    # 3. GROUP ROWS BY THE SAME FUNCTION NAME AND
-    # APPLY THE VALUE OF THE LINE WITH THE HIGHEST MUSE_6 SCORE
-    mbfl_features_df = mbfl_features_df.groupby(
-        ['target_file', 'function_name']).apply(
-            lambda x: x.nlargest(1, formula)
-        ).reset_index(drop=True)
-    
-
-    # 4. SORT THE ROWS BY THE FORMULA VALUE
-    mbfl_features_df = mbfl_features_df.sort_values(by=[formula], ascending=False).reset_index(drop=True)
-
-    
-    # 5. ADD A RANK COLUMN TO THE DF
-    # THE RANK IS BASED ON FORMULA VALUE
-    # IF THE RANK IS A TIE, THE RANK IS THE UPPER BOUND OF THE TIERS
-    mbfl_features_df['rank'] = mbfl_features_df[formula].rank(method='max', ascending=False).astype(int)
-    # mbfl_features_df.to_csv('ranked-function-level.csv', index=False)
-
-
-    # 6. GET THE RANK OF THE BUGGY LINE
-    # AND THE MINIMUM RANK OF THE FORMULA
-    # AND THE SCORE
-    func_n = mbfl_features_df.shape[0]
-    total_num_of_func = 0
-    best_rank = sys.maxsize
-    best_score = None
-    bug_rank = -1
-    bug_score = None
-
-    for index, row in mbfl_features_df.iterrows():
-        total_num_of_func += 1
-        curr_rank = row['rank']
-        curr_target_file = row['target_file']
-        curr_function_name = row['function_name']
-        curr_score = row[formula]
-
-        # assign the best rank number
-        if curr_rank < best_rank:
-            best_rank = curr_rank
-            best_score = curr_score
-        
-        if curr_rank == best_rank:
-            assert curr_score == best_score, f"score is not the same"
-
-
-        # assign the rank of the buggy line
-        if curr_target_file == buggy_target_file and \
-            curr_function_name == buggy_function_name:
-            bug_rank = curr_rank
-            bug_score = curr_score
-            assert row['bug'] == 1, f"bug is not 1"
-        
-    assert best_rank != 0, f"min_rank is 0"
-    assert best_rank != sys.maxsize, f"min_rank is sys.maxsize"
-    assert best_score is not None, f"best_score is None"
-
-    assert bug_rank != -1, f"rank_bug is -1"
-    assert bug_score is not None, f"bug_score is None"
-
-    assert func_n == total_num_of_func, f"func_n != total_num_of_func"
-
-    # print(formula, best_rank, best_score, bug_rank, bug_score)
     data = {
-        f'# of functions': total_num_of_func,
-        f'# of functions with same highest score': best_rank,
-        f'score of highest rank': best_score,
-        f'rank of buggy function (function level)': bug_rank,
-        f'score of buggy function': bug_score
+        f'# of functions': int(rank_result.num_rows[version_idx]),
+        f'# of functions with same highest score': int(rank_result.best_rank[version_idx]),
+        f'score of highest rank': rank_result.best_score[version_idx],
+        f'rank of buggy function (function level)': int(bug_rank),
+        f'score of buggy function': rank_result.bug_score[version_idx]
     }
     return data
 
@@ -422,13 +320,12 @@ def get_buggy_line_key(bug_dir):
 
     return buggy_line_key
 
-def get_lines_executed_by_failing_tcs(bug_dir):
-    get_lines_executed_by_failing_tcs_file = bug_dir / 'coverage_info/lines_executed_by_failing_tc.json'
-    assert get_lines_executed_by_failing_tcs_file.exists(), f"Lines executed by failing TCs file {get_lines_executed_by_failing_tcs_file} does not exist"
+# inputs of get_lines_executed_by_failing_tcs (the index, or the json files written before it)
+executed_lines_inputs = [f'coverage_info/{name}' for name in [executed_lines_index_file, legacy_failing_file, legacy_passing_file]]
 
-    lines_executed_by_failing_tcs = None
-    with get_lines_executed_by_failing_tcs_file.open() as f:
-        lines_executed_by_failing_tcs = json.load(f)
+def get_lines_executed_by_failing_tcs(bug_dir):
+    executed_lines_index = load_executed_lines_index(bug_dir / 'coverage_info')
+    lines_executed_by_failing_tcs = set(executed_lines_index.lines_executed_by('failing'))
 
     return lines_executed_by_failing_tcs
 
@@ -470,6 +367,7 @@ def make_parser():
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--mbfl-set-name', type=str, help='MBFL set name', required=True)
     parser.add_argument('--rank-summary-file-name', type=str, help='Rank summary file name', required=True)
+    parser.add_argument('--no-cache', action='store_true', help='Parse the inputs of every buggy version again instead of using the analysis cache')
     return parser
     
 
@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import hashlib
+import inspect
+import os
+import pickle
+
+# Parsed inputs of the analysis scripts, cached on disk per buggy version.
+#
+# The analysis scripts parse the same files of every buggy version on every
+# run (failing_tcs.txt, buggy_line_key.txt, the executed lines index,
+# mutation_testing_results.csv, feature csvs). A loader is a function
+# (version directory, *args) parsing some of these files; its result is
+# pickled under
+#   <cache dir>/<set name>/<version name>/<loader name>-<key>.pkl
+# key being the sha256 of the source files of the loader and of its
+# arguments, so that editing a loader, a helper it calls or calling it with
+# other arguments does not use old entries. The source files are the script
+# or module defining the loader and the helper modules next to it that it
+# refers to (ex. feature_aggregation.py, executed_lines_index.py), followed
+# through their own imports. An entry records the size and mtime of every input file of the
+# loader (relative to the version directory, a missing file included) and
+# is used while they are unchanged; otherwise the files are parsed again
+# and the entry is replaced.
+#
+# The cache dir is <subject>-working_directory/analysis_cache/ of the stage
+# running the analysis. Entries are written to a temporary file and renamed,
+# so concurrent runs never read a half written entry. Removing the
+# directory clears the cache.
+
+analysis_cache_dir_name = 'analysis_cache'
+cache_format = 1
+
+
+def loader_source_files(loader):
+    # file of the loader, then the modules of its directory it refers to,
+    # through the globals of each module found
+    loader_file = Path(inspect.getsourcefile(loader)).resolve()
+    source_dir = loader_file.parent
+    source_files = [loader_file]
+    namespaces = [loader.__globals__]
+    while len(namespaces) > 0:
+        for value in list(namespaces.pop().values()):
+            module = value if inspect.ismodule(value) else inspect.getmodule(value)
+            module_file = getattr(module, '__file__', None)
+            if module_file is None:
+                continue
+            module_file = Path(module_file).resolve()
+            if module_file.parent == source_dir and module_file.suffix == '.py' and module_file not in source_files:
+                source_files.append(module_file)
+                namespaces.append(vars(module))
+    return source_files
+
+
+def file_stat(file):
+    if not file.exists():
+        return None
+    stat = file.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class AnalysisCache:
+    def __init__(self, cache_dir, enabled=True):
+        self.cache_dir = Path(cache_dir)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.loader_hashes = {}
+
+    @classmethod
+    def of_working_dir(cls, subject_working_dir, enabled=True):
+        return cls(Path(subject_working_dir) / analysis_cache_dir_name, enabled)
+
+    def loader_hash(self, loader):
+        if loader not in self.loader_hashes:
+            sha = hashlib.sha256()
+            for source_file in loader_source_files(loader):
+                sha.update(source_file.name.encode())
+                sha.update(source_file.read_bytes())
+            self.loader_hashes[loader] = sha.hexdigest()
+        return self.loader_hashes[loader]
+
+    def entry_path(self, version_dir, loader, args):
+        sha = hashlib.sha256()
+        sha.update(self.loader_hash(loader).encode())
+        sha.update(repr(args).encode())
+        return self.cache_dir / version_dir.parent.name / version_dir.name / f"{loader.__name__}-{sha.hexdigest()[:16]}.pkl"
+
+    def read_entry(self, entry):
+        if not entry.exists():
+            return None
+        try:
+            with open(entry, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception:
+            # written by another version of python or damaged, parse again
+            return None
+        if not isinstance(cached, dict) or cached.get('format') != cache_format:
+            return None
+        return cached
+
+    def write_entry(self, entry, cached):
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = entry.parent / f".{entry.name}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_file.replace(entry)
+
+    def load(self, version_dir, loader, input_files, *args):
+        # loader(version_dir, *args), from the cache while input_files are unchanged
+        if not self.enabled:
+            return loader(version_dir, *args)
+
+        version_dir = Path(version_dir)
+        # stats are taken before parsing, a file changed meanwhile is parsed again next time
+        inputs = {name: file_stat(version_dir / name) for name in input_files}
+        entry = self.entry_path(version_dir, loader, args)
+        cached = self.read_entry(entry)
+        if cached is not None and cached['version_dir'] == str(version_dir.resolve()) and cached['inputs'] == inputs:
+            self.hits += 1
+            return cached['value']
+
+        value = loader(version_dir, *args)
+        self.misses += 1
+        self.write_entry(entry, {
+            'format': cache_format,
+            'version_dir': str(version_dir.resolve()),
+            'inputs': inputs,
+            'value': value,
+        })
+        return value
+
+    def summary(self):
+        if not self.enabled:
+            return "Analysis cache is disabled"
+        return f"Analysis cache: {self.hits} loaded from {self.cache_dir}, {self.misses} parsed"
@@ -8,13 +8,17 @@ execute_worker = '01-1_execute_worker.py'
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.worker)
+    start_process(args.subject, args.worker, args.delta_retest, args.retest_versions_file)
 
 
-def start_process(subject_name, worker_name):
+def start_process(subject_name, worker_name, delta_retest=False, retest_versions_file=None):
 
     # 1. Execute worker
     cmd = ['python3', execute_worker, '--subject', subject_name, '--worker', worker_name]
+    if delta_retest:
+        cmd.append('--delta-retest')
+        if retest_versions_file is not None:
+            cmd += ['--retest-versions-file', retest_versions_file]
     res = sp.run(cmd)
     if res.returncode != 0:
         raise Exception('Failed to execute worker script')
@@ -26,6 +30,8 @@ def make_parser():
     parser = argparse.ArgumentParser(description='Copy subject to working directory')
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--worker', type=str, help='Worker name (e.g., <machine-name>/<core-id>)', required=True)
+    parser.add_argument('--delta-retest', action='store_true', help='Add the failing test cases of total_additional_tcs.txt to each version, measuring and testing only them')
+    parser.add_argument('--retest-versions-file', type=str, default=None, help='With --delta-retest, only retest the versions listed in this file of the working directory')
     return parser
 
 
@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+
+import math
+
+# MUSE and Metallaxis suspiciousness of each line from the outcome of its
+# mutants (p2f, p2p, f2p, f2f), used by kill_matrix.py (which derives the
+# outcomes for another failing/passing split). 01-5_measure_mbfl_features.py
+# computes the same features column-wise with mbfl_feature_engine.py.
+
+
+def measure_mbfl_features(
+    perfileline_features, total_p2f, total_f2p,
+    total_num_failing_tcs, max_mutants
+):
+    mbfl_features = {}
+
+    for target_file, lineno_mutants in perfileline_features.items():
+        if target_file not in mbfl_features:
+            mbfl_features[target_file] = {}
+
+        for lineno, mutants in lineno_mutants.items():
+            if lineno not in mbfl_features[target_file]:
+                mbfl_features[target_file][lineno] = {}
+            
+            mbfl_features[target_file][lineno]['# of totfailed_TCs'] = total_num_failing_tcs
+            mbfl_features[target_file][lineno]['# of mutants'] = max_mutants
+            
+            mutant_cnt = 0
+            mutant_key_list = []
+            for mutant in mutants:
+                mutant_id = mutant['mutant_id']
+                p2f = mutant['p2f']
+                p2p = mutant['p2p']
+                f2p = mutant['f2p']
+                f2f = mutant['f2f']
+
+                # ps. perfileline_features does not contain mutants that failed to build
+
+                mutant_cnt += 1
+                p2f_name = f"m{mutant_cnt}:p2f"
+                f2p_name = f"m{mutant_cnt}:f2p"
+                mutant_key_list.append((p2f_name, f2p_name))
+
+                mbfl_features[target_file][lineno][p2f_name] = p2f
+                mbfl_features[target_file][lineno][f2p_name] = f2p
+                # if f2p > 0:
+                #     print(f"Mutant {lineno} {mutant_id} ({p2f}, {p2p}, {f2p}, {f2f})")
+
+            for i in range(0, max_mutants - len(mutants)):
+                mutant_cnt += 1
+                p2f_name = f"m{mutant_cnt}:p2f"
+                f2p_name = f"m{mutant_cnt}:f2p"
+                mutant_key_list.append((p2f_name, f2p_name))
+
+                mbfl_features[target_file][lineno][p2f_name] = -1
+                mbfl_features[target_file][lineno][f2p_name] = -1
+        
+            met_score = measure_metallaxis(mbfl_features[target_file][lineno], mutant_key_list)
+            mbfl_features[target_file][lineno]['met susp. score'] = met_score
+
+            muse_data = measure_muse(mbfl_features[target_file][lineno], total_p2f, total_f2p, mutant_key_list)
+            for key, value in muse_data.items():
+                mbfl_features[target_file][lineno][key] = value
+    
+    # print(json.dumps(mbfl_features, indent=4))
+    
+    return mbfl_features
+
+def measure_muse(features, total_p2f, total_f2p, mutant_key_list):
+    utilized_mutant_cnt = 0
+    line_total_p2f = 0
+    line_total_f2p = 0
+
+    final_muse_score = 0.0
+
+    for p2f_m, f2p_m in mutant_key_list:
+        p2f = features[p2f_m]
+        f2p = features[f2p_m]
+
+        if p2f == -1 or f2p == -1:
+            continue
+
+        utilized_mutant_cnt += 1
+        line_total_p2f += p2f
+        line_total_f2p += f2p
+
+    muse_1 = (1 / ((utilized_mutant_cnt + 1) * (total_f2p + 1)))
+    muse_2 = (1 / ((utilized_mutant_cnt + 1) * (total_p2f + 1)))
+
+    muse_3 = muse_1 * line_total_f2p
+    muse_4 = muse_2 * line_total_p2f
+
+    final_muse_score = muse_3 - muse_4
+
+    muse_data = {
+        '|muse(s)|': utilized_mutant_cnt,
+        'total_f2p': total_f2p,
+        'total_p2f': total_p2f,
+        'line_total_f2p': line_total_f2p,
+        'line_total_p2f': line_total_p2f,
+        'muse_1': muse_1,
+        'muse_2': muse_2,
+        'muse_3': muse_3,
+        'muse_4': muse_4,
+        'muse susp. score': final_muse_score
+    }
+
+    return muse_data
+
+def measure_metallaxis(features, mutant_key_list):
+    tot_failing_tcs = features['# of totfailed_TCs']
+    met_score_list = []
+
+    for p2f_m, f2p_m in mutant_key_list:
+        p2f = features[p2f_m]
+        f2p = features[f2p_m]
+
+        if p2f == -1 or f2p == -1:
+            continue
+
+        score = 0.0
+        if f2p + p2f == 0:
+            score = 0.0
+        else:
+            score = ((f2p) / math.sqrt(tot_failing_tcs * (f2p + p2f)))
+
+        met_score_list.append(score)
+
+    final_met_score = max(met_score_list)
+    return final_met_score
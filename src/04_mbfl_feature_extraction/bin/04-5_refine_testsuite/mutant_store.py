@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import json
+import os
+
+from mutant_edits import diff_edit, apply_edit
+
+# Mutants of one target file, stored as edits of a single original.
+#
+# MUSICUP writes every mutant as a full copy of the target file. The store
+# keeps, in the mutants directory of the target file
+# (generated_mutants/<version>/<subject>-<file>/):
+#   original_code/<filename>   the file the mutants were made from, once
+#   mutant_edits.bin           replacement bytes of every mutant, back to back
+#   mutant_edits.json          {mutant filename: [start, end, offset, length]}
+# meaning mutant = original[:start] + edits.bin[offset:offset+length] + original[end:]
+# (see mutant_edits.py). _mut_db.csv stays next to them as MUSICUP wrote it.
+#
+# Only the index is read when the store is opened, a mutant is materialized
+# by one seek into mutant_edits.bin, so any mutant can be used without
+# unpacking the others.
+
+original_code_dir_name = 'original_code'
+mutant_edits_bin = 'mutant_edits.bin'
+mutant_edits_json = 'mutant_edits.json'
+
+
+def is_mutant_file(path):
+    # parser.MUT123.c
+    parts = path.name.split('.')
+    return len(parts) >= 3 and parts[-2].startswith('MUT') and parts[-2][3:].isdigit()
+
+
+class MutantStore:
+    def __init__(self, mutants_dir, filename, index):
+        self.mutants_dir = Path(mutants_dir)
+        self.filename = filename
+        self.index = index
+
+        self.original_code = None
+        self.new_edits = []
+
+    # --- construction
+    @classmethod
+    def create(cls, mutants_dir, filename, original_code):
+        mutants_dir = Path(mutants_dir)
+        original_code_dir = mutants_dir / original_code_dir_name
+        original_code_dir.mkdir(exist_ok=True, parents=True)
+        (original_code_dir / filename).write_bytes(original_code)
+
+        store = cls(mutants_dir, filename, {})
+        store.original_code = original_code
+        return store
+
+    @classmethod
+    def load(cls, mutants_dir):
+        mutants_dir = Path(mutants_dir)
+        with open(mutants_dir / mutant_edits_json, 'r') as f:
+            data = json.load(f)
+        return cls(mutants_dir, data['filename'], data['mutants'])
+
+    def add(self, mutant_filename, edit):
+        # edits are kept in memory until save()
+        self.new_edits.append((mutant_filename, edit))
+
+    def add_mutant_file(self, mutant_file):
+        edit = diff_edit(self.original(), Path(mutant_file).read_bytes())
+        self.add(Path(mutant_file).name, edit)
+
+    def save(self):
+        edits_bin = self.mutants_dir / mutant_edits_bin
+        offset = edits_bin.stat().st_size if edits_bin.exists() else 0
+        with open(edits_bin, 'ab') as f:
+            for mutant_filename, (start, end, replacement) in self.new_edits:
+                f.write(replacement)
+                self.index[mutant_filename] = [start, end, offset, len(replacement)]
+                offset += len(replacement)
+        self.new_edits = []
+
+        # the index is written last: a store without it is incomplete
+        data = {'filename': self.filename, 'mutants': self.index}
+        tmp_json = self.mutants_dir / f".{mutant_edits_json}.{os.getpid()}.tmp"
+        with open(tmp_json, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_json, self.mutants_dir / mutant_edits_json)
+
+    # --- access
+    def original(self):
+        if self.original_code is None:
+            self.original_code = (self.mutants_dir / original_code_dir_name / self.filename).read_bytes()
+        return self.original_code
+
+    def names(self):
+        return list(self.index.keys())
+
+    def __contains__(self, mutant_filename):
+        return mutant_filename in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def edit(self, mutant_filename):
+        assert mutant_filename in self.index, f"Mutant {mutant_filename} is not in the mutant store of {self.filename}"
+        start, end, offset, length = self.index[mutant_filename]
+        with open(self.mutants_dir / mutant_edits_bin, 'rb') as f:
+            f.seek(offset)
+            replacement = f.read(length)
+        return (start, end, replacement)
+
+    def materialize(self, mutant_filename):
+        return apply_edit(self.original(), self.edit(mutant_filename))
+
+    def write_mutant(self, mutant_filename, dest_file):
+        Path(dest_file).write_bytes(self.materialize(mutant_filename))
+
+
+def load_mutant_store(mutants_dir):
+    if not (Path(mutants_dir) / mutant_edits_json).exists():
+        return None
+    return MutantStore.load(mutants_dir)
+
+def compact_mutant_dir(mutants_dir, filename, original_code):
+    # full mutant copies of mutants_dir -> mutant store, the copies are removed
+    mutants_dir = Path(mutants_dir)
+    store = load_mutant_store(mutants_dir)
+    if store is None:
+        store = MutantStore.create(mutants_dir, filename, original_code)
+
+    mutant_files = [path for path in mutants_dir.iterdir() if path.is_file() and is_mutant_file(path)]
+    for mutant_file in mutant_files:
+        store.add_mutant_file(mutant_file)
+    store.save()
+
+    for mutant_file in mutant_files:
+        os.remove(mutant_file)
+    return store
+
+def compact_version_mutants(version_mutants_dir, target_file2original):
+    # target_file2original: {target file (ex. libxml2/parser.c): bytes the mutants were made from}
+    for target_file, original_code in target_file2original.items():
+        mutants_dir = Path(version_mutants_dir) / target_file.replace('/', '-')
+        if not mutants_dir.exists():
+            continue
+        store = compact_mutant_dir(mutants_dir, target_file.split('/')[-1], original_code)
+        print(f"Stored {len(store)} mutants of {target_file} as edits")
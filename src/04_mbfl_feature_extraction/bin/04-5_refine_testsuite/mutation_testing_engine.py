@@ -0,0 +1,429 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import subprocess as sp
+import os
+
+from mutant_store import load_mutant_store
+from build_outcome_cache import BuildOutcomeCache
+from kill_matrix import KillMatrix, kill_matrix_file
+
+# Mutation testing shared by the refine-testsuite analyses.
+#
+# Each analysis is a collector: it tells which mutants it needs, which test
+# case groups (ex. 'failing', 'excluded_failing') it needs on them, and
+# derives its output from the outcomes. The engine builds every mutant wanted
+# by at least one collector once and runs the union of the test cases needed
+# by those collectors once, so running several analyses together costs the
+# same builds and test runs as the largest of them.
+#
+# Collectors only asking for a set of test cases (the f2p collectors) stop
+# asking for test cases already found and report done() once nothing new can
+# be found, so mutants nobody needs anymore are neither built nor tested.
+#
+# A mutant is a dict:
+#   {'target_file': 'parser.c', 'lineno': '123',
+#    'mutant_id': 'mutant_12', 'mutant_name': 'parser.MUT123.c'}
+
+
+class Collector:
+    # test case groups needed on the wanted mutants
+    groups = []
+
+    def start(self, tc_groups):
+        pass
+
+    def wants(self, mutant):
+        return True
+
+    def done(self):
+        # True when testing more mutants cannot change the result
+        return False
+
+    def needed_tcs(self, mutant, tc_groups):
+        # {group: [tc, ...]} to run on the mutant
+        return {group: tc_groups[group] for group in self.groups}
+
+    def collect(self, mutant, build_result, tc_passed):
+        # tc_passed: {tc: True if the tc passes on the mutant}, covers needed_tcs()
+        pass
+
+    def finish(self, version_dir):
+        pass
+
+
+class F2pCollector(Collector):
+    # test cases of a failing group that pass on at least one wanted mutant
+    #
+    # Only the union is needed, so a test case already found is not run on
+    # later mutants. per_mutant keeps running every test case of the group on
+    # every mutant and also writes which of them pass on each mutant.
+    # patience: stop after that many built mutants in a row found nothing
+    # new (None: test every wanted mutant).
+    def __init__(self, group, output_file, per_mutant=False, patience=None):
+        self.groups = [group]
+        self.output_file = output_file
+        self.per_mutant = per_mutant
+        self.patience = patience
+        self.group_tcs = []
+        self.group_tc_set = set()
+        self.new_f2p_set = set()
+        self.mutant_f2p = []
+        self.stale_cnt = 0
+
+    def start(self, tc_groups):
+        self.group_tcs = tc_groups[self.groups[0]]
+        self.group_tc_set = set(self.group_tcs)
+
+    def done(self):
+        if self.per_mutant:
+            return False
+        if len(self.new_f2p_set) == len(self.group_tc_set):
+            return True
+        return self.patience is not None and self.stale_cnt >= self.patience
+
+    def needed_tcs(self, mutant, tc_groups):
+        if self.per_mutant:
+            return {self.groups[0]: self.group_tcs}
+        return {self.groups[0]: [tc for tc in self.group_tcs if tc not in self.new_f2p_set]}
+
+    def collect(self, mutant, build_result, tc_passed):
+        if not build_result:
+            return
+        passing = [tc for tc, passed in tc_passed.items() if passed and tc in self.group_tc_set]
+        new_f2p = [tc for tc in passing if tc not in self.new_f2p_set]
+        self.new_f2p_set.update(new_f2p)
+
+        if len(new_f2p) == 0:
+            self.stale_cnt += 1
+        else:
+            self.stale_cnt = 0
+
+        if self.per_mutant:
+            self.mutant_f2p.append((mutant, passing))
+
+    def finish(self, version_dir):
+        output_file = version_dir / 'testsuite_info' / self.output_file
+        with open(output_file, 'w') as f:
+            content = '\n'.join(self.new_f2p_set)
+            f.write(content)
+        print(f"{len(self.new_f2p_set)} test cases written to {self.output_file}")
+
+        if self.per_mutant:
+            # ex. additional_failing_tcs.txt -> additional_failing_tcs_per_mutant.csv
+            per_mutant_file = output_file.parent / f"{output_file.stem}_per_mutant.csv"
+            with open(per_mutant_file, 'w') as f:
+                f.write('target_file,mutant_id,lineno,f2p_tcs\n')
+                for mutant, passing in self.mutant_f2p:
+                    f.write(f"{mutant['target_file']},{mutant['mutant_id']},{mutant['lineno']},{';'.join(passing)}\n")
+            print(f"f2p test cases of {len(self.mutant_f2p)} mutants written to {per_mutant_file.name}")
+
+
+class AdditionalF2pCollector(F2pCollector):
+    # excluded failing tcs passing on a mutant of the buggy line
+    # (01-2_test_mutants_for_additional_f2p_on_buggy_line.py)
+    def __init__(self, buggy_code_file_name, buggy_lineno, per_mutant=False, patience=None):
+        super().__init__('excluded_failing', 'additional_failing_tcs.txt', per_mutant, patience)
+        self.buggy_code_file_name = buggy_code_file_name
+        self.buggy_lineno = buggy_lineno
+
+    def wants(self, mutant):
+        return mutant['target_file'] == self.buggy_code_file_name and mutant['lineno'] == self.buggy_lineno
+
+
+class RemovingF2pCollector(F2pCollector):
+    # failing tcs passing on mutants off the buggy line
+    # (01-3_test_mutants_for_removing_f2p_on_non_buggy_lines.py)
+    def __init__(self, buggy_code_file_name, buggy_lineno, per_mutant=False, patience=None):
+        super().__init__('failing', 'removing_failing_tcs.txt', per_mutant, patience)
+        self.buggy_code_file_name = buggy_code_file_name
+        self.buggy_lineno = buggy_lineno
+
+    def wants(self, mutant):
+        # same filter as get_selected_mutants() of 01-3
+        return not (mutant['target_file'] != self.buggy_code_file_name and mutant['lineno'] == self.buggy_lineno)
+
+
+class KillMatrixDeltaCollector(Collector):
+    # outcomes of test cases added to the test suite, merged into the kill
+    # matrix of 01-4 of 04-2 (01-5_delta_retest_with_additional_tcs.py)
+    #
+    # Mutants already in the kill matrix only run the test cases it does not
+    # have, the others (ex. selected for lines only the added failing test
+    # cases execute) run every test case. Mutants that failed to build stay
+    # failed. tc_groups: {'failing': [...], 'passing': [...]} after adding.
+    def __init__(self, kill_matrix):
+        self.kill_matrix = kill_matrix
+        self.matrix_mutants = {
+            (target_file, mutant_id): idx
+            for idx, (target_file, mutant_id, lineno, bitmap_id) in enumerate(kill_matrix.mutants)
+        }
+        self.testsuite = {}
+        self.new_tcs = []
+        self.new_mutants = []
+        self.mutant_failing = {}
+
+    def start(self, tc_groups):
+        self.testsuite = tc_groups
+        self.new_tcs = [tc for tcs in tc_groups.values() for tc in tcs if tc not in self.kill_matrix.tc2id]
+
+    def wants(self, mutant):
+        key = (mutant['target_file'], mutant['mutant_id'])
+        if key not in self.matrix_mutants:
+            return True
+        return self.kill_matrix.mutants[self.matrix_mutants[key]][3] != -1
+
+    def needed_tcs(self, mutant, tc_groups):
+        if (mutant['target_file'], mutant['mutant_id']) in self.matrix_mutants:
+            return {'new': self.new_tcs}
+        return tc_groups
+
+    def collect(self, mutant, build_result, tc_passed):
+        key = (mutant['target_file'], mutant['mutant_id'])
+        if key not in self.matrix_mutants:
+            self.new_mutants.append(mutant)
+        if not build_result:
+            self.mutant_failing[key] = None
+            return
+        failing = [tc for tc, passed in tc_passed.items() if not passed]
+        if key in self.matrix_mutants:
+            failing = self.kill_matrix.failing_tcs(self.matrix_mutants[key]) + failing
+        self.mutant_failing[key] = failing
+
+    def merged(self):
+        # kill matrix of the whole test suite, mutants of the old one first
+        matrix = KillMatrix.for_testsuite(self.testsuite)
+        for idx, (target_file, mutant_id, lineno, bitmap_id) in enumerate(self.kill_matrix.mutants):
+            key = (target_file, mutant_id)
+            if key in self.mutant_failing:
+                failing = self.mutant_failing[key]
+            elif len(self.new_tcs) == 0 or bitmap_id == -1:
+                failing = self.kill_matrix.failing_tcs(idx)
+            else:
+                raise Exception(f"Mutant {mutant_id} of {target_file} was not tested with the added test cases")
+            matrix.add_mutant(target_file, mutant_id, lineno, failing)
+        for mutant in self.new_mutants:
+            key = (mutant['target_file'], mutant['mutant_id'])
+            matrix.add_mutant(mutant['target_file'], mutant['mutant_id'], mutant['lineno'], self.mutant_failing.get(key))
+        return matrix
+
+    def finish(self, version_dir):
+        matrix = self.merged()
+        matrix.save(version_dir / kill_matrix_file)
+
+        # mutation_testing_results.csv of the new split, as 01-4 of 04-2 writes it
+        result_csv = version_dir / 'mutation_testing_results.csv'
+        with open(result_csv, 'w') as f:
+            f.write("target_file,mutant_id,lineno,build_result,p2f,p2p,f2p,f2f\n")
+            for row in matrix.outcomes(self.testsuite['failing'], self.testsuite['passing']):
+                f.write(','.join(str(x) for x in row) + '\n')
+        print(f"Kill matrix: {len(self.new_tcs)} test cases added, {len(self.new_mutants)} mutants added, {len(matrix.mutants)} mutants in total")
+
+
+class MutationTestingEngine:
+    def __init__(self, configs, core_working_dir, source_overlay, subject_name, version_name, env):
+        self.configs = configs
+        self.core_working_dir = core_working_dir
+        self.source_overlay = source_overlay
+        self.subject_name = subject_name
+        self.version_name = version_name
+        self.env = env
+
+        self.tc_dir = core_working_dir / configs['test_case_directory']
+        assert self.tc_dir.exists(), f"Test case directory {self.tc_dir} does not exist"
+
+        # mutants known not to compile on this machine (any core, any stage)
+        build_sh = core_working_dir / configs['build_script_working_directory'] / 'build_script.sh'
+        configure_sh = core_working_dir / configs['configure_script_working_directory'] / 'configure_no_cov_script.sh'
+        self.build_outcome_cache = BuildOutcomeCache(subject_name, build_sh, configure_sh)
+
+        self.build_cnt = 0
+        self.tc_run_cnt = 0
+
+    def run(self, mutants, tc_groups, collectors):
+        # the buggy version must already be applied to the target files
+        version_gen_mutants_dir = self.core_working_dir / 'generated_mutants' / self.version_name
+
+        for collector in collectors:
+            collector.start(tc_groups)
+
+        stores = {}
+        target_codes = {}
+        skipped_cnt = 0
+        for mutant in mutants:
+            if all(collector.done() for collector in collectors):
+                print("Every collector is done, remaining mutants are not tested")
+                break
+
+            interested = [
+                collector for collector in collectors
+                if not collector.done() and collector.wants(mutant)
+            ]
+            if len(interested) == 0:
+                continue
+
+            # union of the test cases needed by the interested collectors
+            needed = [collector.needed_tcs(mutant, tc_groups) for collector in interested]
+            tc_list = []
+            seen = set()
+            for collector_needed in needed:
+                for tcs in collector_needed.values():
+                    for tc in tcs:
+                        if tc not in seen:
+                            seen.add(tc)
+                            tc_list.append(tc)
+            if len(tc_list) == 0:
+                skipped_cnt += 1
+                continue
+
+            target_file = mutant['target_file']
+            target_file_path = get_target_file_path(self.configs['target_files'], target_file)
+            assert target_file_path is not None, f"Target file {target_file} does not exist in target files"
+
+            if target_file not in stores:
+                file_mutants_dir = version_gen_mutants_dir / f"{self.subject_name}-{target_file}"
+                stores[target_file] = (file_mutants_dir, load_mutant_store(file_mutants_dir))
+                target_codes[target_file] = (self.core_working_dir / target_file_path).read_bytes()
+
+            file_mutants_dir, mutant_store = stores[target_file]
+            mutant_code = get_mutant_code(mutant_store, file_mutants_dir, mutant['mutant_name'])
+
+            build_result, tc_passed = self.test_mutant(
+                target_file_path, mutant_code, target_codes[target_file], mutant, tc_list
+            )
+            for collector in interested:
+                collector.collect(mutant, build_result, tc_passed)
+
+        print(f"Mutation testing: {self.build_cnt} builds, {self.tc_run_cnt} test case runs, {skipped_cnt} mutants with nothing left to run, {self.build_outcome_cache.hit_cnt} mutants known not to compile")
+
+    def order_by_operator(self, mutants):
+        # Mutants of the same operator on a line tend to make the same test
+        # cases pass, so alternate between operators (in the order each first
+        # appears) to find new f2p test cases with fewer mutants.
+        operators = {}
+        for target_file in set(mutant['target_file'] for mutant in mutants):
+            file_mutants_dir = self.core_working_dir / 'generated_mutants' / self.version_name / f"{self.subject_name}-{target_file}"
+            operators[target_file] = get_mutant_operators(file_mutants_dir)
+        return interleave_operators(mutants, operators)
+
+    def test_mutant(self, target_file_path, mutant_code, target_code, mutant, tc_list):
+        # 0. Skip the mutant if it is known not to compile
+        if self.build_outcome_cache.known_failure(target_file_path, mutant_code):
+            print(f"Mutant {mutant['mutant_id']} ({mutant['mutant_name']}) is known not to compile")
+            return False, {}
+
+        # 1. Write the mutant to the target file
+        self.source_overlay.apply(target_file_path, mutant_code)
+
+        # 2. Build the subject, if build fails, skip the mutant
+        self.build_cnt += 1
+        build_res, build_output = execute_build_script(self.configs['build_script_working_directory'], self.core_working_dir)
+        if build_res != 0:
+            print(f"Failed to build the subject with mutant {mutant['mutant_id']} ({mutant['mutant_name']})")
+            self.build_outcome_cache.record_failure(target_file_path, mutant_code, build_res, build_output, mutant['mutant_name'])
+            self.source_overlay.apply(target_file_path, target_code)
+            return False, {}
+
+        # 3. Run each needed test case once
+        print(f"running {len(tc_list)} test cases for mutant {mutant['mutant_id']} ({mutant['mutant_name']})")
+        tc_passed = {}
+        for tc_script_name in tc_list:
+            tc_passed[tc_script_name] = self.run_tc(tc_script_name) == 0
+
+        # 4. Restore the target file
+        self.source_overlay.apply(target_file_path, target_code)
+
+        return True, tc_passed
+
+    def run_tc(self, tc_script_name):
+        self.tc_run_cnt += 1
+        cmd = f"./{tc_script_name}"
+        res = sp.run(cmd, shell=True, cwd=self.tc_dir, env=self.env, stdout=sp.PIPE, stderr=sp.PIPE)
+        return res.returncode
+
+
+def make_env(configs, core_working_dir):
+    env = os.environ.copy()
+    if configs['environment_setting']['needed'] == True:
+        for key, value in configs['environment_setting']['variables'].items():
+            path = core_working_dir / value
+            assert path.exists(), f"Path {path} does not exist"
+            path_str = path.__str__()
+
+            if key not in env:
+                env[key] = path_str
+            else:
+                env[key] = f"{path_str}:{env[key]}"
+    return env
+
+def get_mutant_operators(file_mutants_dir):
+    # {mutant_name: mutation operator} from <code_name>_mut_db.csv written by MUSICUP
+    mutant_operators = {}
+    for mut_db_csv in Path(file_mutants_dir).glob('*_mut_db.csv'):
+        with open(mut_db_csv, 'r') as f:
+            lines = f.readlines()
+            for mutant_line in lines[2:]:
+                info = mutant_line.strip().split(',')
+                if len(info) < 2:
+                    continue
+                mutant_operators[info[0]] = info[1]
+    return mutant_operators
+
+def interleave_operators(mutants, operators):
+    # operators: {target_file: {mutant_name: operator}}, unknown operators form one group
+    operator2mutants = {}
+    for mutant in mutants:
+        operator = operators.get(mutant['target_file'], {}).get(mutant['mutant_name'], '')
+        if operator not in operator2mutants:
+            operator2mutants[operator] = []
+        operator2mutants[operator].append(mutant)
+
+    ordered = []
+    queues = list(operator2mutants.values())
+    for idx in range(max((len(queue) for queue in queues), default=0)):
+        for queue in queues:
+            if idx < len(queue):
+                ordered.append(queue[idx])
+    return ordered
+
+def flatten_selected_mutants(selected_mutants):
+    # {target_file: {lineno: [{mutant_id, mutant_name}]}} -> [mutant, ...]
+    mutants = []
+    for target_file, lineno_mutants in selected_mutants.items():
+        for lineno, file_mutants in lineno_mutants.items():
+            for mutant in file_mutants:
+                mutants.append({
+                    'target_file': target_file,
+                    'lineno': lineno,
+                    'mutant_id': mutant['mutant_id'],
+                    'mutant_name': mutant['mutant_name'],
+                })
+    return mutants
+
+def get_mutant_code(mutant_store, file_mutants_dir, mutant_name):
+    # mutants directories generated before the mutant store hold full copies
+    if mutant_store is not None:
+        return mutant_store.materialize(mutant_name)
+
+    mutant_file = file_mutants_dir / mutant_name
+    assert mutant_file.exists(), f"Mutant file {mutant_file} does not exist"
+    return mutant_file.read_bytes()
+
+def get_target_file_path(target_files, target_file):
+    for file in target_files:
+        if file.split('/')[-1] == target_file:
+            return file
+    return None
+
+def execute_build_script(build_sh_wd, core_working_dir):
+    build_sh_wd = core_working_dir / build_sh_wd
+    build_sh = build_sh_wd / 'build_script.sh'
+    assert build_sh.exists(), f"Build script {build_sh} does not exist"
+
+    cmd = ['bash', 'build_script.sh']
+    res = sp.run(cmd, cwd=build_sh_wd, stdout=sp.PIPE, stderr=sp.PIPE)
+
+    print(f"Build script executed: {res.returncode}")
+
+    # the output tells compile errors from transient failures
+    return res.returncode, (res.stdout + res.stderr).decode(errors='replace')
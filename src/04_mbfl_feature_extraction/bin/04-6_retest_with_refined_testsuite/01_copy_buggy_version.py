@@ -43,15 +43,16 @@ excluded_failing_txt = 'excluded_failing_tcs.txt'
 excluded_passing_txt = 'excluded_passing_tcs.txt'
 excluded_txt = 'excluded_tcs.txt'
 additional_failing_txt = 'additional_failing_tcs.txt'
+retest_buggy_versions_txt = 'retest_buggy_versions.txt'
 
 
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.mbfl_set_name, args.rank_summary_file_name)
+    start_process(args.subject, args.mbfl_set_name, args.rank_summary_file_name, args.delta_retest)
 
 
-def start_process(subject_name, mbfl_set_name, rank_summary_file_name):
+def start_process(subject_name, mbfl_set_name, rank_summary_file_name, delta_retest=False):
     global configure_json_file
 
     subject_working_dir = mbfl_feature_extraction_dir / f"{subject_name}-working_directory"
@@ -66,10 +67,57 @@ def start_process(subject_name, mbfl_set_name, rank_summary_file_name):
     # 1. save buggy versions to copy
     retest_buggy_versions = get_retesting_buggy_versions(subject_working_dir, rank_summary_file_name)
 
-    copy_bug_version202_select_usable_buggy_versions(configs, subject_working_dir, mbfl_set_name, retest_buggy_versions)
+    if delta_retest:
+        # the workers of 04-5 retest the versions with the added tcs only
+        # (01-5_delta_retest_with_additional_tcs.py), nothing is copied to 02
+        write_retest_buggy_versions(configs, subject_working_dir, retest_buggy_versions)
+    else:
+        copy_bug_version202_select_usable_buggy_versions(configs, subject_working_dir, mbfl_set_name, retest_buggy_versions)
 
     print(f"\nRetesting buggy versions: {len(retest_buggy_versions)}")
 
+def write_retest_buggy_versions(configs, subject_working_dir, retest_buggy_versions):
+    global use_distributed_machines
+
+    retest_buggy_versions_file = subject_working_dir / retest_buggy_versions_txt
+    with open(retest_buggy_versions_file, 'w') as f:
+        content = '\n'.join(retest_buggy_versions)
+        f.write(content)
+    print(f"Buggy versions to retest are written to {retest_buggy_versions_file}")
+
+    if configs[use_distributed_machines] == True:
+        distribute_retest_buggy_versions(configs, retest_buggy_versions_file)
+
+    print(f"Run 04-5_refine_testsuite with --delta-retest --retest-versions-file {retest_buggy_versions_txt}")
+
+def distribute_retest_buggy_versions(configs, retest_buggy_versions_file):
+    global machines_json_file
+
+    home_directory = configs['home_directory']
+    subject_name = configs['subject_name']
+    base_dir = f"{home_directory}{subject_name}-mbfl_feature_extraction/"
+    machine_working_dir = base_dir + f'{subject_name}-working_directory/'
+
+    machines_json = retest_buggy_versions_file.parent / f"{subject_name}-configures" / machines_json_file
+    assert machines_json.exists(), f'Machines json file {machines_json} does not exist'
+    with machines_json.open() as f:
+        machines = json.load(f)
+
+    bash_file = open('01-1_distribute_retest_buggy_versions.sh', 'w')
+    bash_file.write('date\n')
+    for machine_id in machines.keys():
+        cmd = 'scp {} {}:{} & \n'.format(retest_buggy_versions_file, machine_id, machine_working_dir)
+        bash_file.write(f"{cmd}")
+
+    bash_file.write('echo scp done, waiting...\n')
+    bash_file.write('date\n')
+    bash_file.write('wait\n')
+    bash_file.write('date\n')
+    bash_file.close()
+
+    cmd = ['chmod', '+x', '01-1_distribute_retest_buggy_versions.sh']
+    res = sp.call(cmd)
+
 def copy_bug_version202_select_usable_buggy_versions(configs, subject_working_dir, mbfl_set_name, retest_buggy_versions):
     global src_dir
     select_usable_buggy_versions_dir = src_dir / '02_select_usable_buggy_versions'
@@ -171,6 +219,7 @@ def make_parser():
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--mbfl-set-name', type=str, help='MBFL set name', required=True)
     parser.add_argument('--rank-summary-file-name', type=str, help='Rank summary file name', required=True)
+    parser.add_argument('--delta-retest', action='store_true', help=f'Write the buggy versions to retest to {retest_buggy_versions_txt} for the delta retest of 04-5 instead of copying them to 02_select_usable_buggy_versions')
     return parser
     
 
@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+# Runs 01-5_delta_retest_with_additional_tcs.py of 04-5 end to end on a
+# worker laid out by 04-1 (01_initialize_working_directory.py and
+# 03_distribute_repo.py), with one added failing test case to measure.
+#
+# The subject "calc" is a bash program in a .c file so nothing needs a
+# compiler: the build script copies it to build/calc.sh and, when configured
+# with coverage, writes build/calc.gcno (its instrumented lines). A test case
+# built with coverage writes the lines it executes to build/calc.gcda, and
+# the gcovr of <home_directory>/.local/bin turns them into a gcovr json.
+
+script_path = Path(__file__).resolve()
+mbfl_feature_extraction_dir = script_path.parent.parent
+bin_dir = mbfl_feature_extraction_dir / 'bin'
+initialization_dir = bin_dir / '04-1_initialization'
+refine_testsuite_dir = bin_dir / '04-5_refine_testsuite'
+
+subject_name = 'calc'
+version_name = 'calc.MUT9.c'
+machine_name = 'local'
+core_id = 'core0'
+
+original_code = """#!/bin/bash
+a=$1
+b=$2
+r=$((a + b))
+if [ $a -gt 100 ]; then
+  r=$((r + 0))
+fi
+echo $r
+"""
+# bug on line 4
+buggy_code = original_code.replace('r=$((a + b))', 'r=$((a * b))')
+instrumented_lines = [2, 3, 4, 5, 6, 8]
+
+# tc: (arguments, expected output, executed lines)
+tcs = {
+    'TC1.sh': ('2 2', '4', [2, 3, 4, 5, 8]),
+    'TC2.sh': ('1 1', '2', [2, 3, 4, 5, 8]),
+    'TC3.sh': ('0 0', '0', [2, 3, 4, 5, 8]),
+    # added failing tc executing line 6, which no failing tc executed
+    'TC4.sh': ('200 1', '201', [2, 3, 4, 5, 6, 8]),
+    # added failing tc not executing the buggy line
+    'TC5.sh': ('3 0', '3', [2, 3, 5, 8]),
+}
+
+# mutants of the buggy version: (mutant name, lineno, operator, mutated line)
+mutants = [
+    ('calc.MUT1.c', 4, 'OAAN', 'r=$((a + b))'),
+    ('calc.MUT2.c', 4, 'OAAN', 'r=$((a - b))'),
+    ('calc.MUT3.c', 2, 'SSDL', 'BROKEN'),
+    ('calc.MUT4.c', 6, 'OAAN', '  r=$((r + 1))'),
+]
+
+
+def load_script(script_file, module_name):
+    spec = importlib.util.spec_from_file_location(module_name, script_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_file(file, content, executable=False):
+    file.parent.mkdir(parents=True, exist_ok=True)
+    file.write_text(content)
+    if executable:
+        os.chmod(file, 0o755)
+
+
+def make_user_configs(root_dir, configs):
+    # user_configs/, subjects/ and external_tools/ as 04-1 reads them
+    config_dir = root_dir / 'user_configs' / subject_name
+    write_file(config_dir / 'configurations.json', json.dumps(configs, indent=4))
+    write_file(config_dir / 'configure_no_cov_script.sh', "echo no > build.cfg\n")
+    write_file(config_dir / 'configure_yes_cov_script.sh', "echo yes > build.cfg\n")
+    write_file(config_dir / 'clean_script.sh', "rm -rf build\n")
+    write_file(config_dir / 'build_script.sh', "\n".join([
+        "mkdir -p build",
+        "grep -q BROKEN src/calc.c && exit 1",
+        "cp src/calc.c build/calc.sh",
+        "if [ \"$(cat build.cfg)\" = \"yes\" ]; then",
+        f"  echo '{' '.join(str(lineno) for lineno in instrumented_lines)}' > build/calc.gcno",
+        "fi",
+        "exit 0",
+    ]) + "\n")
+
+    subject_dir = root_dir / 'subjects' / subject_name
+    write_file(subject_dir / 'src' / 'calc.c', original_code)
+    for tc_name, (arguments, expected, executed) in tcs.items():
+        write_file(subject_dir / 'testcases' / tc_name, "\n".join([
+            "#!/bin/bash",
+            f"[ -f ../build/calc.gcno ] && echo '{' '.join(str(lineno) for lineno in executed)}' > ../build/calc.gcda",
+            f"[ \"$(bash ../build/calc.sh {arguments})\" = \"{expected}\" ]",
+        ]) + "\n", executable=True)
+
+    write_file(root_dir / 'external_tools' / 'MUSICUP' / 'music', '', executable=True)
+
+    # gcovr json of the gcda left by the last test case
+    write_file(Path(configs['home_directory']) / '.local' / 'bin' / 'gcovr', "\n".join([
+        "#!/usr/bin/python3",
+        "import json, sys",
+        "from pathlib import Path",
+        "out = sys.argv[sys.argv.index('-o') + 1]",
+        "gcno = Path('build/calc.gcno')",
+        "gcda = Path('build/calc.gcda')",
+        "instrumented = gcno.read_text().split() if gcno.exists() else []",
+        "executed = gcda.read_text().split() if gcda.exists() else []",
+        "lines = [{'line_number': int(x), 'count': int(x in executed)} for x in instrumented]",
+        "json.dump({'files': [{'file': 'src/calc.c', 'lines': lines}]}, open(out, 'w'))",
+    ]) + "\n", executable=True)
+
+
+def make_version_dir(core_working_dir, kill_matrix_module, store_module):
+    # results of 03-2 and 04-2 for the version, before adding TC4 and TC5
+    version_dir = core_working_dir / 'assigned_buggy_versions' / version_name
+    write_file(version_dir / 'bug_info.csv', f"target_code_file,buggy_code_file,buggy_lineno\ncalc/src/calc.c,{version_name},4\n")
+    write_file(version_dir / 'buggy_code_file' / version_name, buggy_code)
+    write_file(version_dir / 'buggy_line_key.txt', "calc.c#main#4\n")
+    write_file(version_dir / 'testsuite_info' / 'failing_tcs.txt', "TC2.sh")
+    write_file(version_dir / 'testsuite_info' / 'passing_tcs.txt', "TC1.sh\nTC3.sh")
+    write_file(version_dir / 'testsuite_info' / 'excluded_failing_tcs.txt', "TC4.sh\nTC5.sh")
+    write_file(version_dir / 'testsuite_info' / 'total_additional_tcs.txt', "TC4.sh\nTC5.sh")
+
+    store = store_module.CoverageVectorStore()
+    store.lines = [f"calc.c#main#{lineno}" for lineno in instrumented_lines]
+    for tc_name in ['TC1.sh', 'TC2.sh', 'TC3.sh']:
+        executed = tcs[tc_name][2]
+        store.add_vector(tc_name, sum(1 << pos for pos, lineno in enumerate(instrumented_lines) if lineno in executed))
+    (version_dir / 'coverage_info').mkdir()
+    store.save(version_dir / 'coverage_info' / store_module.coverage_vectors_file)
+
+    # mutants of the lines executed by TC2: the fix, a wrong one, one not building
+    kill_matrix = kill_matrix_module.KillMatrix.for_testsuite({'failing': ['TC2.sh'], 'passing': ['TC1.sh', 'TC3.sh']})
+    kill_matrix.add_mutant('calc.c', 'mutant_1', '4', [])
+    kill_matrix.add_mutant('calc.c', 'mutant_2', '4', ['TC1.sh', 'TC2.sh'])
+    kill_matrix.add_mutant('calc.c', 'mutant_3', '2', None)
+    kill_matrix.save(version_dir / kill_matrix_module.kill_matrix_file)
+
+    mut_db_rows = {
+        mutant_name: f"{mutant_name},{operator},{lineno},1,{lineno},2,x,{lineno},1,{lineno},2,y,"
+        for mutant_name, lineno, operator, mutated_line in mutants
+    }
+    with open(version_dir / 'selected_mutants.csv', 'w') as f:
+        f.write(",,,,,Before Mutation,,,,,After Mutation\n")
+        f.write("target filename,mutant_id,lineno,Mutant Filename,Mutation Operator,Start Line#,Start Col#,End Line#,End Col#,Target Token,Start Line#,Start Col#,End Line#,End Col#,Mutated Token,Extra Info\n")
+        for idx, (mutant_name, lineno, operator, mutated_line) in enumerate(mutants[:3]):
+            f.write(f"calc.c,mutant_{idx + 1},{lineno},{mut_db_rows[mutant_name]}\n")
+
+    # generated mutants as full copies, as 01-2 of 04-2 wrote them before the mutant store
+    mutants_dir = core_working_dir / 'generated_mutants' / version_name / f"{subject_name}-calc.c"
+    with open(write_mut_db(mutants_dir), 'a') as f:
+        for mutant_name, lineno, operator, mutated_line in mutants:
+            f.write(mut_db_rows[mutant_name] + "\n")
+    for mutant_name, lineno, operator, mutated_line in mutants:
+        code_lines = buggy_code.split('\n')
+        code_lines[lineno - 1] = mutated_line
+        write_file(mutants_dir / mutant_name, '\n'.join(code_lines))
+
+    return version_dir
+
+
+def write_mut_db(mutants_dir):
+    mut_db_csv = mutants_dir / 'calc_mut_db.csv'
+    write_file(mut_db_csv, ",,,,,Before Mutation,,,,,After Mutation\nMutant Filename,Mutation Operator,Start Line#,Start Col#,End Line#,End Col#,Target Token,Start Line#,Start Col#,End Line#,End Col#,Mutated Token,Extra Info\n")
+    return mut_db_csv
+
+
+@pytest.fixture
+def delta_retest(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(refine_testsuite_dir))
+    monkeypatch.setenv('BUILD_OUTCOME_CACHE_DIR', str(tmp_path / 'build_outcomes'))
+
+    configs = {
+        'home_directory': f"{tmp_path / 'home'}/",
+        'subject_name': subject_name,
+        'configure_script_working_directory': 'calc/',
+        'build_script_working_directory': 'calc/',
+        'test_case_directory': 'calc/testcases/',
+        'use_distributed_machines': False,
+        'max_mutants': 5,
+        'single_machine': {'machine_name': machine_name, 'machine_cores': 1},
+        'target_files': ['calc/src/calc.c'],
+        'environment_setting': {'needed': False, 'variables': {}},
+    }
+    make_user_configs(tmp_path, configs)
+    extract_dir = tmp_path / '04_mbfl_feature_extraction'
+    extract_dir.mkdir()
+
+    # 04-1: working directory, then the subject repository of each core
+    initializer = load_script(initialization_dir / '01_initialize_working_directory.py', 'initialize_working_directory_04_1')
+    monkeypatch.setattr(initializer, 'mbfl_feature_extraction_dir', extract_dir)
+    monkeypatch.setattr(initializer, 'user_configs_dir', tmp_path / 'user_configs')
+    monkeypatch.setattr(initializer, 'subjects_dir', tmp_path / 'subjects')
+    monkeypatch.setattr(initializer, 'external_tools_dir', tmp_path / 'external_tools')
+    initializer.initialize_working_directory(configs, subject_name)
+
+    subject_working_dir = extract_dir / f"{subject_name}-working_directory"
+    core_working_dir = subject_working_dir / 'workers_extracting_mbfl_features' / machine_name / core_id
+    core_working_dir.mkdir(parents=True)
+    repo_distributor = load_script(initialization_dir / '03_distribute_repo.py', 'distribute_repo_04_1')
+    repo_distributor.distribute_subject_repo_single_machine(configs, subject_working_dir, {f"{machine_name}:{core_id}": []})
+
+    delta_retest = load_script(refine_testsuite_dir / '01-5_delta_retest_with_additional_tcs.py', 'delta_retest_04_5')
+    monkeypatch.setattr(delta_retest, 'extract_mbfl_features_cmd_dir', extract_dir)
+    kill_matrix_module = sys.modules['kill_matrix']
+    store_module = sys.modules['coverage_vector_store']
+    version_dir = make_version_dir(core_working_dir, kill_matrix_module, store_module)
+
+    return delta_retest, core_working_dir, version_dir, kill_matrix_module, store_module
+
+
+@pytest.mark.parametrize('distributed_cov_script', [True, False])
+def test_delta_retest_measures_and_tests_added_tc(delta_retest, distributed_cov_script):
+    delta_retest, core_working_dir, version_dir, kill_matrix_module, store_module = delta_retest
+    cov_script = core_working_dir / 'calc' / 'configure_yes_cov_script.sh'
+    assert cov_script.exists()
+    if not distributed_cov_script:
+        # worker initialized before 04-1 distributed the script
+        cov_script.unlink()
+
+    delta_retest.start_process(subject_name, f"{machine_name}/{core_id}", version_name)
+
+    # TC4 executes the buggy line and is added, TC5 does not and stays excluded
+    assert (version_dir / 'testsuite_info' / 'failing_tcs.txt').read_text().split() == ['TC2.sh', 'TC4.sh']
+    assert (version_dir / 'testsuite_info' / 'excluded_failing_tcs.txt').read_text().split() == ['TC5.sh']
+
+    # coverage of TC4 measured with the coverage build
+    store = store_module.load_coverage_vector_store(version_dir / 'coverage_info')
+    assert sorted(store.tc2vector) == ['TC1.sh', 'TC2.sh', 'TC3.sh', 'TC4.sh']
+    assert store.covered_lines('TC4.sh') == [f"calc.c#main#{lineno}" for lineno in tcs['TC4.sh'][2]]
+
+    # line 6 is executed by a failing tc now, its mutant is selected
+    selected = (version_dir / 'selected_mutants.csv').read_text().strip().split('\n')[2:]
+    assert [line.split(',')[1:4] for line in selected][-1] == ['mutant_4', '6', 'calc.MUT4.c']
+
+    # old mutants ran TC4 only, the new one every tc, the one not building stays failed
+    kill_matrix = kill_matrix_module.load_kill_matrix(version_dir)
+    failing = {
+        mutant_id: (None if bitmap_id == -1 else sorted(kill_matrix.failing_tcs(idx)))
+        for idx, (target_file, mutant_id, lineno, bitmap_id) in enumerate(kill_matrix.mutants)
+    }
+    assert failing == {
+        'mutant_1': [],
+        'mutant_2': ['TC1.sh', 'TC2.sh', 'TC4.sh'],
+        'mutant_3': None,
+        'mutant_4': ['TC2.sh'],
+    }
+    assert (version_dir / 'mbfl_features.csv').exists()
+
+    # the subject is left configured without coverage, with its original code
+    assert (core_working_dir / 'calc' / 'build.cfg').read_text().strip() == 'no'
+    assert (core_working_dir / 'calc' / 'src' / 'calc.c').read_text() == original_code
@@ -6,7 +6,9 @@ import json
 import subprocess as sp
 import os
 import csv
-import math
+
+from sbfl_engine import load_coverage_matrix, write_sbfl_features_csv, sbfl_features_file
+from feature_aggregation import write_aggregate_tables
 
 # Current working directory
 script_path = Path(__file__).resolve()
@@ -40,10 +42,10 @@ my_env = os.environ.copy()
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject, args.worker, args.version)
+    start_process(args.subject, args.worker, args.version, args.extra_formulas)
 
 
-def start_process(subject_name, worker_name, version_name):
+def start_process(subject_name, worker_name, version_name, extra_formulas=[]):
     subject_working_dir = extract_sbfl_features_cmd_dir / f"{subject_name}-working_directory"
     assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
 
@@ -67,133 +69,25 @@ def start_process(subject_name, worker_name, version_name):
     # 3. get buggy line key
     buggy_line_key = get_buggy_line_key(version_dir)
 
-    # 4. get lines from postprocessed coverage info
-    # {key, TC1, TC2, ..., TCn}
-    lines = get_lines_from_postprocessed_coverage(version_dir, buggy_line_key, failing_tc_list, passing_tc_list)
-
-    # 5. initialize spectrums per line {key, ep, ef, np, nf}
-    spectrum_per_line = initialize_spectrums_per_line(lines, buggy_line_key, failing_tc_list, passing_tc_list)
-
-    # 5. calculate SBFL suspsiciousness scores based on the spectrum
-    sbfl_per_line = measure_total_sbfl(spectrum_per_line)
-
-    # 6. write SBFL scores to a file
-    write_sbfl_features(version_dir, sbfl_per_line)
+    # 4. get coverage of test cases as a lines x test cases bit matrix
+    coverage_matrix = load_coverage_matrix(version_dir, failing_tc_list + passing_tc_list)
+    print(f"{coverage_matrix.class_cov.shape[1]} coverage classes for {len(failing_tc_list) + len(passing_tc_list)} test cases")
 
+    # VALIDATE: coverage has the buggy line key once
+    assert coverage_matrix.lines.count(buggy_line_key) == 1, f"Buggy line key {buggy_line_key} is not found once in coverage"
 
-def write_sbfl_features(version_dir, spectrum_per_line):
-    sbfl_features_csv = version_dir / 'sbfl_features.csv'
+    # 5. calculate the spectrum {ep, ef, np, nf} of every line
+    ep, ef, np, nf = coverage_matrix.spectrum(failing_tc_list, passing_tc_list)
 
-    with open(sbfl_features_csv, 'w') as f:
-        writer = csv.DictWriter(f, fieldnames=[
-            'key', 'ep', 'ef', 'np', 'nf',
-            'Binary', 'GP13', 'Jaccard', 'Naish1',
-            'Naish2', 'Ochiai', 'Russel+Rao', 'Wong1',
-            'bug'
-        ])
-        writer.writeheader()
+    # 6. calculate SBFL suspsiciousness scores based on the spectrum
+    # and write them to a file (sbfl_engine.py, all lines at once)
+    line_scores = write_sbfl_features_csv(
+        version_dir / sbfl_features_file, coverage_matrix.lines, buggy_line_key,
+        ep, ef, np, nf, extra_formulas
+    )
 
-        for line_info in spectrum_per_line:
-            writer.writerow(line_info)
-
-
-
-def measure_total_sbfl(spectrum_per_line):
-    SBFL_formulas = [
-        'Binary', 'GP13', 'Jaccard', 'Naish1',
-        'Naish2', 'Ochiai', 'Russel+Rao', 'Wong1'
-    ]
-    
-    for line_info in spectrum_per_line:
-        ep = line_info['ep']
-        ef = line_info['ef']
-        np = line_info['np']
-        nf = line_info['nf']
-
-        for formula in SBFL_formulas:
-            sbfl_value = sbfl(ep, ef, np, nf, formula)
-            line_info[formula] = sbfl_value
-    
-    return spectrum_per_line
-
-
-def sbfl(e_p, e_f, n_p, n_f, formula="Ochiai"):
-    if formula == "Jaccard":
-        denominator = e_f + n_f + e_p
-        if denominator == 0:
-            return 0
-        return e_f / denominator
-    elif formula == "Binary":
-        if 0 < n_f:
-            return 0
-        elif n_f == 0:
-            return 1
-    elif formula == "GP13":
-        denominator = 2*e_p + e_f
-        if denominator == 0:
-            return 0
-        return e_f + (e_f / denominator)
-    elif formula == "Naish1":
-        if 0 < n_f:
-            return -1
-        elif 0 == n_f:
-            return n_p
-    elif formula == "Naish2":
-        x = e_p / (e_p + n_p + 1)
-        return e_f - x
-    elif formula == "Ochiai":
-        denominator = math.sqrt((e_f + n_f) * (e_f + e_p))
-        if denominator == 0:
-            return 0
-        return e_f / denominator
-    elif formula == "Russel+Rao":
-        return e_f/(e_p + n_p + e_f + n_f)
-    elif formula == "Wong1":
-        return e_f
-    else:
-        raise Exception(f"Unknown formula: {formula}")
-
-
-def initialize_spectrums_per_line(lines, buggy_line_key, failing_tc_list, passing_tc_list):
-    spectrums_per_line = []
-
-    buggy_line_cnt = 0
-    for line in lines:
-        line_key = line['key']
-
-        bug_stat = 0
-        if line_key == buggy_line_key:
-            assert buggy_line_cnt == 0, f"Multiple buggy lines found: {buggy_line_key}"
-            buggy_line_cnt += 1
-            bug_stat = 1
-        
-        ef, nf = calculate_spectrum(line, failing_tc_list)
-        ep, np = calculate_spectrum(line, passing_tc_list)
-
-        # VALIDATE: sum of executed and not executed test cases should be equal to total number of test cases
-        assert ef + nf == len(failing_tc_list), f"Sum of executed test cases {ef} and not executed test cases {ep} should be equal to total number of failing test cases {len(failing_tc_list)}"
-        assert ep + np == len(passing_tc_list), f"Sum of executed test cases {nf} and not executed test cases {np} should be equal to total number of passing test cases {len(passing_tc_list)}"
-
-        spectrums_per_line.append({
-            'key': line_key,
-            'ep': ep, 'ef': ef, 'np': np, 'nf': nf,
-            'bug': bug_stat
-        })
-
-    return spectrums_per_line
-
-def calculate_spectrum(line, tc_list):
-    executed = 0
-    not_executed = 0
-
-    for tc in tc_list:
-        tc_name = tc.split('.')[0]
-        if line[tc_name] == '1':
-            executed += 1
-        else:
-            not_executed += 1
-    
-    return executed, not_executed
+    # 7. aggregate the scores per function and per file (feature_aggregation.py)
+    write_aggregate_tables(version_dir / sbfl_features_file, coverage_matrix.lines, buggy_line_key, line_scores)
 
 
 def get_buggy_line_key(version_dir):
@@ -205,42 +99,6 @@ def get_buggy_line_key(version_dir):
         return line
 
 
-def get_lines_from_postprocessed_coverage(version_dir, buggy_line_key, failing_tc_list, passing_tc_list):
-    cov_data_csv = version_dir / 'coverage_info/postprocessed_coverage.csv'
-    assert cov_data_csv.exists(), f'{cov_data_csv} does not exist'
-
-    tc_list = failing_tc_list + passing_tc_list
-
-    print(f"version_dir: {version_dir.name}")
-
-    cov_per_line = []
-    check_tc_col = True
-    buggy_line_exists = False
-    with open(cov_data_csv, 'r') as csv_fp:
-        csv_reader = csv.DictReader(csv_fp)
-        # next(csv_reader)
-        for row in csv_reader:
-            line_key = row['key'] # first column is line key
-
-            # VALIDATE: postprocessed coverage data has buggy line key
-            if line_key == buggy_line_key:
-                buggy_line_exists = True
-            
-            cov_per_line.append(row)
-
-            # VALIDATE: postprocessed coverage data has all test cases
-            if check_tc_col:
-                for tc in tc_list:
-                    tc_name = tc.split('.')[0]
-                    if tc_name not in row:
-                        raise Exception(f"Test case {tc_name} is not found in postprocessed coverage data")
-                check_tc_col = False
-    
-    assert buggy_line_exists, f"Buggy line key {buggy_line_key} is not found in postprocessed coverage data"
-    
-    return cov_per_line
-
-
 def custome_sort(tc_script):
     tc_filename = tc_script.split('.')[0]
     return int(tc_filename[2:])
@@ -289,6 +147,7 @@ def make_parser():
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
     parser.add_argument('--worker', type=str, help='Worker name (e.g., <machine-name>/<core-id>)', required=True)
     parser.add_argument('--version', type=str, help='Version name', required=True)
+    parser.add_argument('--extra-formulas', type=str, nargs='*', default=[], help='Formulas registered in sbfl_engine.py to add as columns (ex. Tarantula DStar Op2)')
     return parser
 
 if __name__ == "__main__":
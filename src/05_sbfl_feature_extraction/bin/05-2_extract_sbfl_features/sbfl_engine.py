@@ -0,0 +1,328 @@
+#!/usr/bin/python3
+
+import csv
+import math
+
+import numpy as np
+
+from coverage_vector_store import load_coverage_vector_store
+
+# Columnar computation of sbfl_features.csv.
+#
+# The coverage of a version is held as a numpy matrix:
+#   'class_cov': lines x coverage classes, each distinct covered-line set of
+#                the test cases once (as in coverage_vector_store.py)
+#   'tc_class':  class of each test case
+#   'packed':    lines x test cases, bit-packed along the test cases
+# ef/ep of every line are popcounts of the packed rows and-ed with the
+# packed failing/passing mask, nf/np follow from the number of failing and
+# passing test cases.
+#
+# Formulas are registered in sbfl_formulas:
+#   name -> function(ep, ef, np, nf) over arrays of all lines
+# A formula gives NaN where it is undefined (ex. zero denominator); it is
+# written as 0, as 01-2 always wrote it. The columns of sbfl_features.csv are
+# written by default, other registered formulas (ex. Tarantula, DStar, Op2)
+# are added as columns when their names are given in extra_formulas.
+# All formulas are computed over all lines at once.
+#
+# Many failing/passing partitions of the same test cases (ex. the reduced
+# test suite of 02-5, without ccts, with excluded failing test cases) are
+# measured in one pass: the number of failing/passing test cases of each
+# partition in each coverage class is a classes x K matrix, and ef/ep of all
+# lines for all K partitions are one matrix multiply with class_cov. The
+# formulas then give a lines x K x formulas tensor (see batch_spectrum(),
+# compute_sbfl_tensor() and write_sbfl_batch_npz()).
+
+sbfl_features_file = 'sbfl_features.csv'
+
+default_formulas = [
+    'Binary', 'GP13', 'Jaccard', 'Naish1',
+    'Naish2', 'Ochiai', 'Russel+Rao', 'Wong1'
+]
+
+sbfl_formulas = {}
+
+
+def register_formula(name):
+    def register(formula):
+        sbfl_formulas[name] = formula
+        return formula
+    return register
+
+
+def divide(numerator, denominator):
+    # numerator / denominator, NaN where the denominator is 0
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    result = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+@register_formula('Binary')
+def binary(ep, ef, np_, nf):
+    return np.where(nf > 0, 0, 1)
+
+@register_formula('GP13')
+def gp13(ep, ef, np_, nf):
+    return ef + divide(ef, 2*ep + ef)
+
+@register_formula('Jaccard')
+def jaccard(ep, ef, np_, nf):
+    return divide(ef, ef + nf + ep)
+
+@register_formula('Naish1')
+def naish1(ep, ef, np_, nf):
+    return np.where(nf > 0, -1, np_)
+
+@register_formula('Naish2')
+def naish2(ep, ef, np_, nf):
+    return ef - ep / (ep + np_ + 1)
+
+@register_formula('Ochiai')
+def ochiai(ep, ef, np_, nf):
+    return divide(ef, np.sqrt(((ef + nf) * (ef + ep)).astype(np.float64)))
+
+@register_formula('Russel+Rao')
+def russel_rao(ep, ef, np_, nf):
+    return ef / (ep + np_ + ef + nf)
+
+@register_formula('Wong1')
+def wong1(ep, ef, np_, nf):
+    return ef
+
+@register_formula('Tarantula')
+def tarantula(ep, ef, np_, nf):
+    failed = divide(ef, ef + nf)
+    passed = divide(ep, ep + np_)
+    return divide(failed, failed + np.nan_to_num(passed))
+
+@register_formula('DStar')
+def dstar(ep, ef, np_, nf):
+    # D* with * = 2, lines executed by every failing and no passing test case are the most suspicious
+    numerator = (ef * ef).astype(np.float64)
+    denominator = (ep + nf).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = numerator / denominator
+    scores[(denominator == 0) & (numerator == 0)] = np.nan
+    return scores
+
+# Op2 is the same formula as Naish2
+sbfl_formulas['Op2'] = naish2
+
+
+class CoverageMatrix:
+    def __init__(self, lines, tcs, class_cov, tc_class):
+        self.lines = lines
+        self.tcs = tcs
+        self.tc2idx = {tc: idx for idx, tc in enumerate(tcs)}
+        self.class_cov = class_cov
+        self.tc_class = tc_class
+        self.packed = pack_columns(class_cov, tc_class)
+
+    @classmethod
+    def from_store(cls, coverage_store, tc_list):
+        # only the classes of tc_list are unpacked
+        vector_ids = []
+        vector2class = {}
+        tc_class = np.empty(len(tc_list), dtype=np.int64)
+        for idx, tc in enumerate(tc_list):
+            assert tc in coverage_store.tc2vector, f"Test case {tc} is not found in coverage store"
+            vector_id = coverage_store.tc2vector[tc]
+            if vector_id not in vector2class:
+                vector2class[vector_id] = len(vector_ids)
+                vector_ids.append(vector_id)
+            tc_class[idx] = vector2class[vector_id]
+
+        n_lines = len(coverage_store.lines)
+        class_cov = np.zeros((n_lines, len(vector_ids)), dtype=bool)
+        for class_id, vector_id in enumerate(vector_ids):
+            class_cov[:, class_id] = bitmap_to_bools(coverage_store.vector(vector_id), n_lines)
+        return cls(list(coverage_store.lines), list(tc_list), class_cov, tc_class)
+
+    @classmethod
+    def from_postprocessed_csv(cls, cov_data_csv, tc_list):
+        # {key, TC1, TC2, ..., TCn} with '1' for executed
+        lines = []
+        rows = []
+        with open(cov_data_csv, 'r') as csv_fp:
+            csv_reader = csv.reader(csv_fp)
+            header = next(csv_reader)
+            col2idx = {col: idx for idx, col in enumerate(header)}
+            tc_cols = []
+            for tc in tc_list:
+                tc_name = tc.split('.')[0]
+                if tc_name not in col2idx:
+                    raise Exception(f"Test case {tc_name} is not found in postprocessed coverage data")
+                tc_cols.append(col2idx[tc_name])
+
+            for row in csv_reader:
+                lines.append(row[0])
+                rows.append(np.array([row[col] == '1' for col in tc_cols], dtype=bool))
+
+        covered = np.array(rows, dtype=bool).reshape(len(lines), len(tc_list))
+        class_cov, tc_class = np.unique(covered, axis=1, return_inverse=True)
+        return cls(lines, list(tc_list), class_cov, np.asarray(tc_class).reshape(-1))
+
+    def mask(self, tc_list):
+        bools = np.zeros(len(self.tcs), dtype=bool)
+        for tc in tc_list:
+            assert tc in self.tc2idx, f"Test case {tc} is not in the coverage matrix"
+            bools[self.tc2idx[tc]] = True
+        return np.packbits(bools)
+
+    def executed_counts(self, tc_list):
+        # number of test cases of tc_list executing each line
+        return popcount_rows(self.packed & self.mask(tc_list))
+
+    def spectrum(self, failing_tc_list, passing_tc_list):
+        ef = self.executed_counts(failing_tc_list)
+        ep = self.executed_counts(passing_tc_list)
+        nf = len(failing_tc_list) - ef
+        np_ = len(passing_tc_list) - ep
+        return ep, ef, np_, nf
+
+    def class_counts(self, tc_list):
+        # number of test cases of tc_list in each coverage class
+        idxs = []
+        for tc in tc_list:
+            assert tc in self.tc2idx, f"Test case {tc} is not in the coverage matrix"
+            idxs.append(self.tc2idx[tc])
+        return np.bincount(self.tc_class[idxs], minlength=self.class_cov.shape[1])
+
+    def batch_spectrum(self, partitions):
+        # partitions: [(failing_tc_list, passing_tc_list), ...]
+        # ep, ef, np, nf as lines x K matrices, column k for partitions[k]
+        n_classes = self.class_cov.shape[1]
+        failing_counts = np.zeros((n_classes, len(partitions)), dtype=np.float64)
+        passing_counts = np.zeros((n_classes, len(partitions)), dtype=np.float64)
+        for k, (failing_tc_list, passing_tc_list) in enumerate(partitions):
+            failing_counts[:, k] = self.class_counts(failing_tc_list)
+            passing_counts[:, k] = self.class_counts(passing_tc_list)
+
+        # counts are exact in float64, which goes through BLAS
+        class_cov = self.class_cov.astype(np.float64)
+        ef = np.rint(class_cov @ failing_counts).astype(np.int64)
+        ep = np.rint(class_cov @ passing_counts).astype(np.int64)
+        nf = np.array([len(failing) for failing, _ in partitions], dtype=np.int64) - ef
+        np_ = np.array([len(passing) for _, passing in partitions], dtype=np.int64) - ep
+        return ep, ef, np_, nf
+
+
+def bitmap_to_bools(bitmap, n_bits):
+    # python int bitmap (bit i <-> position i) -> bool array
+    n_bytes = (n_bits + 7) // 8
+    raw = np.frombuffer(bitmap.to_bytes(max(n_bytes, 1), 'little'), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder='little')[:n_bits].astype(bool)
+
+
+def pack_columns(class_cov, tc_class, chunk=1024):
+    # lines x test cases bit matrix, packed along the test cases,
+    # expanded from the classes a chunk of test cases at a time
+    n_lines = class_cov.shape[0]
+    n_tcs = len(tc_class)
+    packed = np.zeros((n_lines, (n_tcs + 7) // 8), dtype=np.uint8)
+    for start in range(0, n_tcs, chunk):
+        end = min(start + chunk, n_tcs)
+        packed[:, start // 8:(end + 7) // 8] = np.packbits(class_cov[:, tc_class[start:end]], axis=1)
+    return packed
+
+
+popcount_table = np.array([bin(x).count('1') for x in range(256)], dtype=np.uint8)
+
+def popcount_rows(packed):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(packed).sum(axis=1, dtype=np.int64)
+    return popcount_table[packed].sum(axis=1, dtype=np.int64)
+
+
+def compute_sbfl_features(ep, ef, np_, nf, formulas):
+    return {formula: sbfl_formulas[formula](ep, ef, np_, nf) for formula in formulas}
+
+
+def compute_sbfl_tensor(ep, ef, np_, nf, formulas):
+    # lines x K x formulas, undefined scores as 0 (as in sbfl_features.csv)
+    tensor = np.empty(ep.shape + (len(formulas),), dtype=np.float64)
+    for idx, formula in enumerate(formulas):
+        assert formula in sbfl_formulas, f"Unknown formula {formula}"
+        tensor[..., idx] = sbfl_formulas[formula](ep, ef, np_, nf)
+    return np.nan_to_num(tensor, nan=0.0)
+
+
+def format_scores(scores):
+    # python values as written to csv: integer formulas as int, undefined as 0
+    if np.issubdtype(scores.dtype, np.integer):
+        return scores.tolist()
+    return [0 if math.isnan(score) else score for score in scores.tolist()]
+
+
+def write_sbfl_features_csv(csv_file, lines, buggy_line_key, ep, ef, np_, nf, extra_formulas=[]):
+    # returns the formula scores of every line, as written ({formula: array})
+    formulas = default_formulas + list(extra_formulas)
+    for formula in extra_formulas:
+        assert formula in sbfl_formulas, f"Unknown formula {formula}"
+        assert formula not in default_formulas, f"Formula {formula} is already a column of {sbfl_features_file}"
+
+    scores = compute_sbfl_features(ep, ef, np_, nf, formulas)
+    columns = [ep.tolist(), ef.tolist(), np_.tolist(), nf.tolist()] + [format_scores(scores[formula]) for formula in formulas]
+
+    with open(csv_file, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['key', 'ep', 'ef', 'np', 'nf'] + formulas + ['bug'])
+        for line_key, *values in zip(lines, *columns):
+            bug_stat = 1 if line_key == buggy_line_key else 0
+            writer.writerow([line_key, *values, bug_stat])
+
+    return {
+        formula: np.nan_to_num(np.asarray(scores[formula], dtype=np.float64), nan=0.0)
+        for formula in formulas
+    }
+
+
+def write_sbfl_batch_npz(npz_file, lines, buggy_line_key, partition_names, ep, ef, np_, nf, formulas):
+    # one columnar file for all partitions:
+    #   lines, partitions, formulas: names along each axis
+    #   ep, ef, np, nf:              lines x K
+    #   scores:                      lines x K x formulas
+    #   bug:                         1 for the buggy line
+    scores = compute_sbfl_tensor(ep, ef, np_, nf, formulas)
+    np.savez_compressed(
+        npz_file,
+        lines=np.array(lines, dtype=str),
+        partitions=np.array(partition_names, dtype=str),
+        formulas=np.array(formulas, dtype=str),
+        ep=ep, ef=ef, np=np_, nf=nf,
+        scores=scores,
+        bug=np.array([1 if line == buggy_line_key else 0 for line in lines], dtype=np.int8),
+    )
+
+
+def read_sbfl_batch_npz(npz_file):
+    # {array name: array} as written by write_sbfl_batch_npz()
+    with np.load(npz_file) as data:
+        return {name: data[name] for name in data.files}
+
+
+def get_coverage_tc_names(version_dir):
+    # names (without extension) of the test cases whose coverage was measured
+    coverage_store = load_coverage_vector_store(version_dir / 'coverage_info')
+    if coverage_store is not None:
+        return set(tc.split('.')[0] for tc in coverage_store.tc2vector)
+
+    cov_data_csv = version_dir / 'coverage_info/postprocessed_coverage.csv'
+    assert cov_data_csv.exists(), f'{cov_data_csv} does not exist'
+    with open(cov_data_csv, 'r') as csv_fp:
+        header = next(csv.reader(csv_fp))
+    return set(header[1:])
+
+
+def load_coverage_matrix(version_dir, tc_list):
+    # from the deduplicated coverage store, or postprocessed_coverage.csv
+    coverage_store = load_coverage_vector_store(version_dir / 'coverage_info')
+    if coverage_store is not None:
+        return CoverageMatrix.from_store(coverage_store, tc_list)
+
+    cov_data_csv = version_dir / 'coverage_info/postprocessed_coverage.csv'
+    assert cov_data_csv.exists(), f'{cov_data_csv} does not exist'
+    return CoverageMatrix.from_postprocessed_csv(cov_data_csv, tc_list)
@@ -6,6 +6,8 @@ import json
 import subprocess as sp
 import csv
 
+from validation_runner import run_validation
+
 # Current working directory
 script_path = Path(__file__).resolve()
 sbfl_dataset_dir = script_path.parent
@@ -37,14 +39,17 @@ copy_real_world_buggy_versions = 'copy_real_world_buggy_versions'
 failing_txt = 'failing_tcs.txt'
 passing_txt = 'passing_tcs.txt'
 
+# files read to validate a buggy version (validation_runner.py)
+input_files = ['sbfl_features.csv']
+
 
 def main():
     parser = make_parser()
     args = parser.parse_args()
-    start_process(args.subject)
+    start_process(args.subject, args.processes, args.revalidate)
 
 
-def start_process(subject_name):
+def start_process(subject_name, processes=None, revalidate=False):
     global configure_json_file
 
     subject_working_dir = sbfl_feature_extraction_dir / f"{subject_name}-working_directory"
@@ -53,23 +58,20 @@ def start_process(subject_name):
     # 1. Read configurations
     configs = read_configs(subject_name, subject_working_dir)
 
-    # 2. read test suite and generate summary of statistics
-    sbfl_features_per_bug = get_buggy_versions(subject_working_dir, "sbfl_features")
+    # 2. VALIDATE: 01 - validate the buggy versions changed since the last validation in a process pool
+    report = run_validation(
+        subject_working_dir / "sbfl_features", validate_01, input_files,
+        [script_path, sbfl_dataset_dir / 'validation_runner.py'], processes, revalidate, ['sbfl_features.csv']
+    )
+    assert report['num_failed'] == 0, f"{report['num_failed']} of {report['num_versions']} bugs failed validation"
 
-    # 3. VALIDATE: 01 - Check sbfl_features.csv files exist
-    validate_01(sbfl_features_per_bug)
+    print(f"All {report['num_versions']} bugs have been validated successfully")
 
 
-def validate_01(sbfl_features_per_bug):
-    for bug_dir in sbfl_features_per_bug:
-        bug_name = bug_dir.name
-        print(f"Validating bug {bug_name}")
-
-        # GET: mbfl_features.csv
-        mbfl_features_csv_file = bug_dir / 'sbfl_features.csv'
-        assert mbfl_features_csv_file.exists(), f"MBFL features file {mbfl_features_csv_file} does not exist"
-    
-    print(f"All {len(sbfl_features_per_bug)} bugs have been validated successfully")
+def validate_01(bug_dir):
+    # GET: mbfl_features.csv
+    mbfl_features_csv_file = bug_dir / 'sbfl_features.csv'
+    assert mbfl_features_csv_file.exists(), f"MBFL features file {mbfl_features_csv_file} does not exist"
 
 
 # def validate_02(mbfl_features_csv_file):
@@ -120,6 +122,8 @@ def read_configs(subject_name, subject_working_dir):
 def make_parser():
     parser = argparse.ArgumentParser(description='Copy subject to working directory')
     parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--processes', type=int, default=None, help='Number of processes (default: number of cores)')
+    parser.add_argument('--revalidate', action='store_true', help='Validate every buggy version, ignoring the results of the last validation')
     return parser
     
 
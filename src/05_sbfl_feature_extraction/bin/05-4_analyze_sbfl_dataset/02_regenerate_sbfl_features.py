@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import argparse
+import multiprocessing
+
+from sbfl_engine import load_coverage_matrix, write_sbfl_features_csv, sbfl_features_file
+from feature_aggregation import write_aggregate_tables
+
+# Current working directory
+script_path = Path(__file__).resolve()
+sbfl_dataset_dir = script_path.parent
+bin_dir = sbfl_dataset_dir.parent
+sbfl_feature_extraction_dir = bin_dir.parent
+
+# General directories
+src_dir = sbfl_feature_extraction_dir.parent
+root_dir = src_dir.parent
+
+# file names
+failing_txt = 'failing_tcs.txt'
+passing_txt = 'passing_tcs.txt'
+
+
+def main():
+    parser = make_parser()
+    args = parser.parse_args()
+    start_process(args.subject, args.sbfl_set_name, args.processes, args.extra_formulas)
+
+
+def start_process(subject_name, sbfl_set_name, processes, extra_formulas):
+    subject_working_dir = sbfl_feature_extraction_dir / f"{subject_name}-working_directory"
+    assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
+
+    # 1. get buggy versions of the gathered sbfl set
+    buggy_versions = get_buggy_versions(subject_working_dir, sbfl_set_name)
+    print(f"Regenerating {sbfl_features_file} of {len(buggy_versions)} buggy versions")
+
+    # 2. recompute the sbfl features of every version from its coverage
+    jobs = [(bug_dir, extra_formulas) for bug_dir in buggy_versions]
+    with multiprocessing.Pool(processes) as pool:
+        for idx, bug_name in enumerate(pool.imap_unordered(regenerate_version, jobs)):
+            print(f"{idx+1}/{len(jobs)}: {bug_name}")
+
+
+def regenerate_version(job):
+    bug_dir, extra_formulas = job
+
+    buggy_line_key_file = bug_dir / 'buggy_line_key.txt'
+    assert buggy_line_key_file.exists(), f"Buggy line key file {buggy_line_key_file} does not exist"
+    with open(buggy_line_key_file, 'r') as f:
+        buggy_line_key = f.readline().strip()
+
+    # GET: test cases
+    failing_tcs = get_tcs(bug_dir, failing_txt)
+    passing_tcs = get_tcs(bug_dir, passing_txt)
+
+    # GET: spectrum of every line for the current failing/passing split
+    coverage = load_coverage_matrix(bug_dir, failing_tcs + passing_tcs)
+    ep, ef, np, nf = coverage.spectrum(failing_tcs, passing_tcs)
+
+    line_scores = write_sbfl_features_csv(
+        bug_dir / sbfl_features_file, coverage.lines, buggy_line_key,
+        ep, ef, np, nf, extra_formulas
+    )
+    write_aggregate_tables(bug_dir / sbfl_features_file, coverage.lines, buggy_line_key, line_scores)
+    return bug_dir.name
+
+
+def custome_sort(tc_script):
+    tc_filename = tc_script.split('.')[0]
+    return int(tc_filename[2:])
+
+def get_tcs(version_dir, tc_file):
+    testsuite_info_dir = version_dir / 'testsuite_info'
+    assert testsuite_info_dir.exists(), f"Testsuite info directory {testsuite_info_dir} does not exist"
+
+    tc_file_txt = testsuite_info_dir / tc_file
+    assert tc_file_txt.exists(), f"Test cases file {tc_file_txt} does not exist"
+
+    tcs_list = []
+    with open(tc_file_txt, 'r') as f:
+        for line in f.readlines():
+            line = line.strip()
+            if line == '':
+                continue
+            tcs_list.append(line)
+
+    return sorted(tcs_list, key=custome_sort)
+
+
+def get_buggy_versions(subject_working_dir, versions_set_name):
+    buggy_versions_dir = subject_working_dir / versions_set_name
+    assert buggy_versions_dir.exists(), f"Buggy versions directory {buggy_versions_dir} does not exist"
+
+    buggy_versions = []
+    for buggy_version in buggy_versions_dir.iterdir():
+        if buggy_version.is_dir():
+            buggy_versions.append(buggy_version)
+
+    return buggy_versions
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Recompute sbfl_features.csv of every buggy version of a gathered sbfl set')
+    parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--sbfl-set-name', type=str, default='sbfl_features', help='SBFL set name (default: sbfl_features)')
+    parser.add_argument('--processes', type=int, default=None, help='Number of processes (default: number of cores)')
+    parser.add_argument('--extra-formulas', type=str, nargs='*', default=[], help='Formulas registered in sbfl_engine.py to add as columns (ex. Tarantula DStar Op2)')
+    return parser
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import argparse
+import multiprocessing
+
+from sbfl_engine import load_coverage_matrix, get_coverage_tc_names, write_sbfl_batch_npz, default_formulas
+
+# Current working directory
+script_path = Path(__file__).resolve()
+sbfl_dataset_dir = script_path.parent
+bin_dir = sbfl_dataset_dir.parent
+sbfl_feature_extraction_dir = bin_dir.parent
+
+# General directories
+src_dir = sbfl_feature_extraction_dir.parent
+root_dir = src_dir.parent
+
+# file names
+failing_txt = 'failing_tcs.txt'
+passing_txt = 'passing_tcs.txt'
+sbfl_features_per_partition_file = 'sbfl_features_per_partition.npz'
+
+# Partitions of the test cases of a buggy version measured in one pass:
+#   full:                     failing_tcs.txt / passing_tcs.txt
+# A partition is left out of a version when it has no failing test case or
+# when a test case of it has no coverage.
+# Only partitions of test cases whose coverage 02-3 of 03-2 keeps differ from
+# full: it measures failing_tcs.txt and passing_tcs.txt only, after the CCTs
+# are removed and the reduced test suite of 02-5 is applied. So there is no
+# partition with the CCTs, the excluded test cases or the unreduced test suite.
+
+
+def main():
+    parser = make_parser()
+    args = parser.parse_args()
+    start_process(args.subject, args.sbfl_set_name, args.processes, args.formulas)
+
+
+def start_process(subject_name, sbfl_set_name, processes, formulas):
+    subject_working_dir = sbfl_feature_extraction_dir / f"{subject_name}-working_directory"
+    assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
+
+    # 1. get buggy versions of the gathered sbfl set
+    buggy_versions = get_buggy_versions(subject_working_dir, sbfl_set_name)
+    print(f"Measuring sbfl features per partition of {len(buggy_versions)} buggy versions")
+
+    # 2. measure all partitions of every version
+    jobs = [(bug_dir, formulas) for bug_dir in buggy_versions]
+    with multiprocessing.Pool(processes) as pool:
+        for idx, (bug_name, partition_names) in enumerate(pool.imap_unordered(measure_version, jobs)):
+            print(f"{idx+1}/{len(jobs)}: {bug_name} ({', '.join(partition_names)})")
+
+
+def measure_version(job):
+    bug_dir, formulas = job
+
+    buggy_line_key_file = bug_dir / 'buggy_line_key.txt'
+    assert buggy_line_key_file.exists(), f"Buggy line key file {buggy_line_key_file} does not exist"
+    with open(buggy_line_key_file, 'r') as f:
+        buggy_line_key = f.readline().strip()
+
+    # GET: partitions whose test cases all have coverage
+    covered_tc_names = get_coverage_tc_names(bug_dir)
+    partitions = {}
+    for name, (failing_tcs, passing_tcs) in get_partitions(bug_dir).items():
+        if len(failing_tcs) == 0:
+            continue
+        if not all(tc.split('.')[0] in covered_tc_names for tc in failing_tcs + passing_tcs):
+            continue
+        partitions[name] = (failing_tcs, passing_tcs)
+    assert 'full' in partitions, f"Test cases of {bug_dir.name} have no coverage"
+
+    # GET: coverage of every test case of the partitions, loaded once
+    tc_list = sorted(set(tc for failing, passing in partitions.values() for tc in failing + passing), key=custome_sort)
+    coverage = load_coverage_matrix(bug_dir, tc_list)
+    ep, ef, np, nf = coverage.batch_spectrum(list(partitions.values()))
+
+    write_sbfl_batch_npz(
+        bug_dir / sbfl_features_per_partition_file, coverage.lines, buggy_line_key,
+        list(partitions.keys()), ep, ef, np, nf, formulas
+    )
+    return bug_dir.name, list(partitions.keys())
+
+
+def get_partitions(bug_dir):
+    failing_tcs = get_tcs(bug_dir, failing_txt)
+    passing_tcs = get_tcs(bug_dir, passing_txt)
+
+    partitions = {'full': (failing_tcs, passing_tcs)}
+
+    return partitions
+
+
+def custome_sort(tc_script):
+    tc_filename = tc_script.split('.')[0]
+    return int(tc_filename[2:])
+
+def get_tcs_from_file(tc_file_txt):
+    assert tc_file_txt.exists(), f"Test cases file {tc_file_txt} does not exist"
+
+    tcs_list = []
+    with open(tc_file_txt, 'r') as f:
+        for line in f.readlines():
+            line = line.strip()
+            if line == '':
+                continue
+            tcs_list.append(line)
+
+    return sorted(tcs_list, key=custome_sort)
+
+def get_tcs(version_dir, tc_file):
+    testsuite_info_dir = version_dir / 'testsuite_info'
+    assert testsuite_info_dir.exists(), f"Testsuite info directory {testsuite_info_dir} does not exist"
+    return get_tcs_from_file(testsuite_info_dir / tc_file)
+
+
+def get_buggy_versions(subject_working_dir, versions_set_name):
+    buggy_versions_dir = subject_working_dir / versions_set_name
+    assert buggy_versions_dir.exists(), f"Buggy versions directory {buggy_versions_dir} does not exist"
+
+    buggy_versions = []
+    for buggy_version in buggy_versions_dir.iterdir():
+        if buggy_version.is_dir():
+            buggy_versions.append(buggy_version)
+
+    return buggy_versions
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description=f'Measure sbfl features of several test suite partitions of every buggy version at once into {sbfl_features_per_partition_file}')
+    parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--sbfl-set-name', type=str, default='sbfl_features', help='SBFL set name (default: sbfl_features)')
+    parser.add_argument('--processes', type=int, default=None, help='Number of processes (default: number of cores)')
+    parser.add_argument('--formulas', type=str, nargs='*', default=default_formulas, help='Formulas registered in sbfl_engine.py (default: columns of sbfl_features.csv)')
+    return parser
+
+
+if __name__ == "__main__":
+    main()
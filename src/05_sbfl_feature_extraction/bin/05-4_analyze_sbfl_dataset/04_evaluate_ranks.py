@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import argparse
+import csv
+import time
+
+from ranking_engine import FeatureTable, RankResult, tie_policies, granularities
+from dataset_store import DatasetStore, default_store_dir
+from sbfl_engine import default_formulas
+
+# Current working directory
+script_path = Path(__file__).resolve()
+sbfl_dataset_dir = script_path.parent
+bin_dir = sbfl_dataset_dir.parent
+sbfl_feature_extraction_dir = bin_dir.parent
+
+# General directories
+src_dir = sbfl_feature_extraction_dir.parent
+root_dir = src_dir.parent
+
+# file names
+sbfl_features_file = 'sbfl_features.csv'
+
+
+def main():
+    parser = make_parser()
+    args = parser.parse_args()
+    start_process(
+        args.subject, args.sbfl_set_name, args.formulas, args.granularity,
+        args.tie, args.acc, args.summary_file_name, args.per_version_file_name,
+        args.use_dataset
+    )
+
+
+def start_process(subject_name, sbfl_set_name, formulas, granularity, tie, acc_ks, summary_file_name, per_version_file_name, use_dataset=False):
+    subject_working_dir = sbfl_feature_extraction_dir / f"{subject_name}-working_directory"
+    assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
+
+    # 1. get buggy versions of the sbfl set
+    buggy_versions = get_buggy_versions(subject_working_dir, sbfl_set_name)
+
+    # 2. load the features of all buggy versions into one table
+    # (from the version directories, or from the dataset store of the set)
+    start_time = time.time()
+    if use_dataset:
+        store = DatasetStore.open(default_store_dir(subject_working_dir / sbfl_set_name))
+        stored_versions = set(store.versions())
+        missing = [bug_dir.name for bug_dir in buggy_versions if bug_dir.name not in stored_versions]
+        assert len(missing) == 0, f"{len(missing)} buggy versions are not in the dataset store, build it again"
+        columns = store.features(Path(sbfl_features_file).stem, ['bug'] + formulas, [bug_dir.name for bug_dir in buggy_versions])
+        feature_table = FeatureTable.from_columns(columns, formulas, granularity)
+    else:
+        feature_table = FeatureTable.load(buggy_versions, sbfl_features_file, formulas, granularity)
+    print(f"Loaded {len(feature_table.keys)} rows ({granularity} level) of {feature_table.num_versions} buggy versions in {time.time() - start_time:.2f}s")
+
+    # 3. rank the rows of every version for every formula
+    start_time = time.time()
+    rank_results = [RankResult(feature_table, formula, tie) for formula in formulas]
+    print(f"Ranked {len(formulas)} formulas in {time.time() - start_time:.2f}s")
+
+    # 4. write acc@k and EXAM of every formula
+    summaries = [rank_result.summary(acc_ks) for rank_result in rank_results]
+    for summary in summaries:
+        print(', '.join(f"{key}: {value}" for key, value in summary.items()))
+
+    summary_file = subject_working_dir / summary_file_name
+    with open(summary_file, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=summaries[0].keys())
+        writer.writeheader()
+        for summary in summaries:
+            writer.writerow(summary)
+    print(f"Summary is written to {summary_file}")
+
+    # 5. write the rank of the buggy row of every version
+    if per_version_file_name is not None:
+        per_version_file = subject_working_dir / per_version_file_name
+        write_per_version_ranks(per_version_file, rank_results)
+        print(f"Ranks per version are written to {per_version_file}")
+
+
+def write_per_version_ranks(per_version_file, rank_results):
+    with open(per_version_file, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['bug_name', 'formula', '# of rows', 'best rank', 'best score', 'bug rank', 'bug score', 'EXAM'])
+        for rank_result in rank_results:
+            exam = rank_result.exam()
+            for idx, bug_name in enumerate(rank_result.version_names):
+                writer.writerow([
+                    bug_name, rank_result.formula, rank_result.num_rows[idx],
+                    rank_result.best_rank[idx], rank_result.best_score[idx],
+                    rank_result.bug_rank[idx], rank_result.bug_score[idx], exam[idx]
+                ])
+
+
+def get_buggy_versions(subject_working_dir, versions_set_name):
+    buggy_versions_dir = subject_working_dir / versions_set_name
+    assert buggy_versions_dir.exists(), f"Buggy versions directory {buggy_versions_dir} does not exist"
+
+    buggy_versions = []
+    for buggy_version in buggy_versions_dir.iterdir():
+        if buggy_version.is_dir():
+            buggy_versions.append(buggy_version)
+
+    return sorted(buggy_versions)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Rank the lines or functions of every buggy version of an sbfl set and measure acc@k and EXAM of each formula')
+    parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--sbfl-set-name', type=str, default='sbfl_features', help='SBFL set name (default: sbfl_features)')
+    parser.add_argument('--formulas', type=str, nargs='+', default=default_formulas, help='Formula columns of sbfl_features.csv to rank by (default: all columns of sbfl_engine.py)')
+    parser.add_argument('--granularity', type=str, choices=granularities, default='function', help='Rank lines (statement) or functions (default: function)')
+    parser.add_argument('--tie', type=str, choices=tie_policies, default='max', help='Rank of tied rows (default: max)')
+    parser.add_argument('--acc', type=int, nargs='+', default=[1, 3, 5, 10], help='k of acc@k (default: 1 3 5 10)')
+    parser.add_argument('--summary-file-name', type=str, default='rank_evaluation.csv', help='File name of acc@k/EXAM of each formula, in the working directory')
+    parser.add_argument('--per-version-file-name', type=str, default=None, help='File name of the rank of every buggy version, in the working directory')
+    parser.add_argument('--use-dataset', action='store_true', help='Load the features from the dataset store of the set (see dataset_store.py)')
+    return parser
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import argparse
+import time
+
+from feature_tensor import FeatureTensorWriter, join_version, read_feature_csv, feature_columns, sbfl_features_file, mbfl_features_file
+
+# Current working directory
+script_path = Path(__file__).resolve()
+sbfl_dataset_dir = script_path.parent
+bin_dir = sbfl_dataset_dir.parent
+sbfl_feature_extraction_dir = bin_dir.parent
+
+# General directories
+src_dir = sbfl_feature_extraction_dir.parent
+root_dir = src_dir.parent
+
+
+def main():
+    parser = make_parser()
+    args = parser.parse_args()
+    start_process(args.subject, args.sbfl_set_name, args.export_dir_name, args.sbfl_columns, args.mbfl_columns)
+
+
+def start_process(subject_name, sbfl_set_name, export_dir_name, sbfl_columns, mbfl_columns):
+    subject_working_dir = sbfl_feature_extraction_dir / f"{subject_name}-working_directory"
+    assert subject_working_dir.exists(), f"Working directory {subject_working_dir} does not exist"
+
+    # 1. get buggy versions of the sbfl set
+    buggy_versions = get_buggy_versions(subject_working_dir, sbfl_set_name)
+    assert len(buggy_versions) > 0, f"No buggy versions in {sbfl_set_name}"
+
+    # 2. columns to export: every numeric column of the first buggy version by default
+    if sbfl_columns is None:
+        sbfl_columns = feature_columns(read_feature_csv(buggy_versions[0] / sbfl_features_file)[0])
+    if mbfl_columns is None:
+        mbfl_columns = feature_columns(read_feature_csv(buggy_versions[0] / mbfl_features_file)[0])
+    columns = [f"sbfl:{name}" for name in sbfl_columns] + [f"mbfl:{name}" for name in mbfl_columns]
+    print(f"Exporting {len(columns)} columns ({len(sbfl_columns)} sbfl, {len(mbfl_columns)} mbfl)")
+
+    # 3. join and write the buggy versions one at a time
+    if export_dir_name is None:
+        export_dir_name = f"{sbfl_set_name}.feature_tensor"
+    export_dir = subject_working_dir / export_dir_name
+    writer = FeatureTensorWriter(export_dir, columns)
+    num_dropped = {'sbfl': 0, 'mbfl': 0}
+    bugs_without_buggy_line = []
+    start_time = time.time()
+    for idx, bug_dir in enumerate(buggy_versions):
+        features, labels, line_ids, dropped = join_version(bug_dir, sbfl_columns, mbfl_columns)
+        writer.add(bug_dir.name, features, labels, line_ids)
+        for side, cnt in dropped.items():
+            num_dropped[side] += cnt
+        if labels.sum() == 0:
+            bugs_without_buggy_line.append(bug_dir.name)
+        if (idx + 1) % 100 == 0:
+            print(f"Exported {idx+1}/{len(buggy_versions)} buggy versions")
+
+    # 4. write the metadata
+    metadata = writer.close({
+        'set': sbfl_set_name,
+        'line_id': f"row of the line in {sbfl_features_file} of its buggy version",
+        'num_sbfl_lines_not_in_mbfl': num_dropped['sbfl'],
+        'num_mbfl_lines_not_in_sbfl': num_dropped['mbfl'],
+        'bugs_without_buggy_line': bugs_without_buggy_line,
+    })
+    print(f"Exported {metadata['num_rows']} lines of {metadata['num_bugs']} buggy versions to {export_dir} in {time.time() - start_time:.2f}s")
+    if num_dropped['sbfl'] > 0:
+        print(f"{num_dropped['sbfl']} lines of {sbfl_features_file} are not in {mbfl_features_file} and were dropped")
+    if num_dropped['mbfl'] > 0:
+        print(f"{num_dropped['mbfl']} lines of {mbfl_features_file} are not in {sbfl_features_file} and were dropped")
+    if len(bugs_without_buggy_line) > 0:
+        print(f"{len(bugs_without_buggy_line)} buggy versions have no buggy line in the export")
+
+
+def get_buggy_versions(subject_working_dir, versions_set_name):
+    buggy_versions_dir = subject_working_dir / versions_set_name
+    assert buggy_versions_dir.exists(), f"Buggy versions directory {buggy_versions_dir} does not exist"
+
+    buggy_versions = []
+    for buggy_version in buggy_versions_dir.iterdir():
+        if buggy_version.is_dir():
+            buggy_versions.append(buggy_version)
+
+    return sorted(buggy_versions)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Join sbfl_features.csv and mbfl_features.csv of every buggy version of an sbfl set on line ids and export them as memory-mapped arrays (see feature_tensor.py)')
+    parser.add_argument('--subject', type=str, help='Subject name', required=True)
+    parser.add_argument('--sbfl-set-name', type=str, default='sbfl_features', help='SBFL set name (default: sbfl_features)')
+    parser.add_argument('--export-dir-name', type=str, default=None, help='Directory of the export in the working directory (default: <sbfl-set-name>.feature_tensor)')
+    parser.add_argument('--sbfl-columns', type=str, nargs='+', default=None, help='Columns of sbfl_features.csv to export (default: all but key and bug)')
+    parser.add_argument('--mbfl-columns', type=str, nargs='+', default=None, help='Columns of mbfl_features.csv to export (default: all but key and bug)')
+    return parser
+
+
+if __name__ == "__main__":
+    main()
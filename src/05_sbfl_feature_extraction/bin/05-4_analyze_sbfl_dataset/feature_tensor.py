@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+import csv
+import json
+
+import numpy as np
+
+# SBFL and MBFL statement features of every buggy version of a set as
+# memory-mapped arrays, so that a training loader slices buggy versions
+# without parsing text.
+#
+# The buggy versions of an sbfl set are copies of those of the mbfl set
+# (05-1), so each has both sbfl_features.csv (a row per covered line) and
+# mbfl_features.csv (a row per line executed by failing TCs). The id of a
+# line is its row in sbfl_features.csv; the rows of mbfl_features.csv are
+# mapped to these ids once, and the two are joined on them. Lines only in
+# one of the files are dropped and counted per side: sbfl lines not executed
+# by failing TCs have no mbfl row, mbfl lines missing from sbfl_features.csv
+# point at a coverage mismatch.
+# Rows of a buggy version are in order of line id.
+#
+# <export dir>/
+#   features.f32    float32 [rows x columns], C order: the sbfl columns then
+#                   the mbfl columns, named 'sbfl:<column>' and 'mbfl:<column>'
+#   labels.u8       uint8 [rows], 1 for the buggy line
+#   bug_ids.i32     int32 [rows], index of the buggy version of each row
+#   line_ids.i32    int32 [rows], line id of each row in its buggy version
+#   offsets.i64     int64 [buggy versions + 1], the rows of buggy version i
+#                   are offsets[i]:offsets[i+1]
+#   metadata.json   columns, buggy versions, and the file, dtype and shape
+#                   of each array
+# The arrays are written a buggy version at a time, and metadata.json last.
+
+sbfl_features_file = 'sbfl_features.csv'
+mbfl_features_file = 'mbfl_features.csv'
+metadata_file = 'metadata.json'
+array_files = {
+    'features': ('features.f32', np.float32),
+    'labels': ('labels.u8', np.uint8),
+    'bug_ids': ('bug_ids.i32', np.int32),
+    'line_ids': ('line_ids.i32', np.int32),
+    'offsets': ('offsets.i64', np.int64),
+}
+
+
+def read_feature_csv(csv_file):
+    assert csv_file.exists(), f"Features file {csv_file} does not exist"
+    with open(csv_file, 'r') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    return header, rows
+
+
+def column_matrix(header, rows, columns):
+    # float64 [rows x columns] of the given columns of a feature csv
+    col2idx = {col: idx for idx, col in enumerate(header)}
+    matrix = np.empty((len(rows), len(columns)), dtype=np.float64)
+    for col_idx, name in enumerate(columns):
+        idx = col2idx[name]
+        matrix[:, col_idx] = np.array([row[idx] for row in rows], dtype=np.float64).reshape(len(rows))
+    return matrix
+
+
+def feature_columns(header):
+    # numeric columns of a feature csv
+    return [name for name in header if name not in ['key', 'bug']]
+
+
+def join_version(version_dir, sbfl_columns, mbfl_columns):
+    # (features [rows x columns], labels, line ids, {'sbfl': # of sbfl lines dropped, 'mbfl': # of mbfl lines dropped})
+    sbfl_header, sbfl_rows = read_feature_csv(version_dir / sbfl_features_file)
+    mbfl_header, mbfl_rows = read_feature_csv(version_dir / mbfl_features_file)
+    for name in sbfl_columns + ['bug']:
+        assert name in sbfl_header, f"Column {name} is not in {version_dir / sbfl_features_file}"
+    for name in mbfl_columns:
+        assert name in mbfl_header, f"Column {name} is not in {version_dir / mbfl_features_file}"
+
+    # line ids: rows of sbfl_features.csv
+    line2id = {row[0]: idx for idx, row in enumerate(sbfl_rows)}
+    assert len(line2id) == len(sbfl_rows), f"Duplicated line keys in {version_dir / sbfl_features_file}"
+    mbfl_line_ids = np.array([line2id.get(row[0], -1) for row in mbfl_rows], dtype=np.int64)
+
+    # rows of mbfl_features.csv with a line id, in order of line id
+    mbfl_idx = np.flatnonzero(mbfl_line_ids >= 0)
+    mbfl_idx = mbfl_idx[np.argsort(mbfl_line_ids[mbfl_idx], kind='stable')]
+    line_ids = mbfl_line_ids[mbfl_idx]
+
+    features = np.empty((len(line_ids), len(sbfl_columns) + len(mbfl_columns)), dtype=np.float32)
+    features[:, :len(sbfl_columns)] = column_matrix(sbfl_header, sbfl_rows, sbfl_columns)[line_ids]
+    features[:, len(sbfl_columns):] = column_matrix(mbfl_header, mbfl_rows, mbfl_columns)[mbfl_idx]
+    labels = column_matrix(sbfl_header, sbfl_rows, ['bug'])[line_ids, 0].astype(np.uint8)
+    dropped = {
+        'sbfl': len(sbfl_rows) - len(line_ids),
+        'mbfl': len(mbfl_rows) - len(line_ids),
+    }
+    return features, labels, line_ids, dropped
+
+
+class FeatureTensorWriter:
+    def __init__(self, export_dir, columns):
+        self.export_dir = Path(export_dir)
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        self.columns = columns
+        self.bugs = []
+        self.offsets = [0]
+        self.files = {
+            name: open(self.export_dir / file_name, 'wb')
+            for name, (file_name, dtype) in array_files.items() if name != 'offsets'
+        }
+
+    def add(self, bug_name, features, labels, line_ids):
+        assert features.shape == (len(labels), len(self.columns)), f"Features of {bug_name} are {features.shape}, not ({len(labels)}, {len(self.columns)})"
+        bug_id = len(self.bugs)
+        arrays = {
+            'features': features,
+            'labels': labels,
+            'bug_ids': np.full(len(labels), bug_id),
+            'line_ids': line_ids,
+        }
+        for name, values in arrays.items():
+            np.ascontiguousarray(values, dtype=array_files[name][1]).tofile(self.files[name])
+        self.bugs.append(bug_name)
+        self.offsets.append(self.offsets[-1] + len(labels))
+
+    def close(self, extra_metadata={}):
+        for f in self.files.values():
+            f.close()
+        offsets = np.array(self.offsets, dtype=array_files['offsets'][1])
+        offsets.tofile(self.export_dir / array_files['offsets'][0])
+
+        num_rows = int(offsets[-1])
+        shapes = {
+            'features': [num_rows, len(self.columns)],
+            'labels': [num_rows],
+            'bug_ids': [num_rows],
+            'line_ids': [num_rows],
+            'offsets': [len(offsets)],
+        }
+        metadata = {
+            'num_rows': num_rows,
+            'num_bugs': len(self.bugs),
+            'columns': self.columns,
+            'bugs': self.bugs,
+            'arrays': {
+                name: {'file': file_name, 'dtype': np.dtype(dtype).name, 'shape': shapes[name]}
+                for name, (file_name, dtype) in array_files.items()
+            },
+        }
+        metadata.update(extra_metadata)
+        with open(self.export_dir / metadata_file, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        return metadata
+
+
+class FeatureTensor:
+    # read-only memory maps of an export
+    def __init__(self, export_dir):
+        self.export_dir = Path(export_dir)
+        metadata_json = self.export_dir / metadata_file
+        assert metadata_json.exists(), f"Metadata file {metadata_json} does not exist"
+        with open(metadata_json, 'r') as f:
+            self.metadata = json.load(f)
+
+        self.columns = self.metadata['columns']
+        self.bugs = self.metadata['bugs']
+        for name, info in self.metadata['arrays'].items():
+            shape = tuple(info['shape'])
+            if shape[0] == 0:
+                values = np.zeros(shape, dtype=info['dtype'])
+            else:
+                values = np.memmap(self.export_dir / info['file'], dtype=info['dtype'], mode='r', shape=shape)
+            setattr(self, name, values)
+
+    def rows_of(self, bug_id):
+        return slice(int(self.offsets[bug_id]), int(self.offsets[bug_id + 1]))
+
+    def bug(self, bug_id):
+        # (features, labels, line ids) of a buggy version
+        rows = self.rows_of(bug_id)
+        return self.features[rows], self.labels[rows], self.line_ids[rows]
@@ -0,0 +1,246 @@
+#!/usr/bin/python3
+
+from pathlib import Path
+
+import numpy as np
+
+from feature_aggregation import read_feature_scores, load_aggregate_table, aggregate_scores, aggregate_table_file
+
+# Ranks of the lines (statement level) or functions (function level) of
+# many buggy versions at once.
+#
+# The features of all buggy versions are one columnar table: a row per line
+# of the feature csv, or per function of <stem>_function_level.csv (the
+# score of a function being the highest score of its lines), with the
+# version of each row, whether it is the buggy line/function and one score
+# column per formula. For each formula the rows are sorted once by
+# (version, score descending); a tie group is a run of equal scores within a
+# version, and the rank of a row under each tie policy follows from the
+# position of its tie group:
+#   'max':      last position of the tie group (the rank 02_rank_mbfl.py reports)
+#   'min':      first position of the tie group
+#   'average':  mean of the first and last positions
+#   'dense':    number of distinct scores down to it
+# Positions and ranks start at 1 within each version. Scores equal up to
+# rounding (relative difference within tie_rtol, ex. the same MUSE score
+# summed in another order) are tied.
+#
+# Metrics over the buggy versions, from the rank of the buggy row:
+#   acc@k:  number of versions whose buggy row is ranked k or better
+#   EXAM:   rank of the buggy row / number of rows of its version
+
+tie_policies = ['max', 'min', 'average', 'dense']
+granularities = ['statement', 'function']
+tie_rtol = 1e-12
+
+
+class FeatureTable:
+    def __init__(self, version_names, version_ids, keys, is_bug, scores):
+        self.version_names = version_names
+        self.version_ids = version_ids
+        self.keys = keys
+        self.is_bug = is_bug
+        self.scores = scores
+
+    @classmethod
+    def load(cls, version_dirs, features_file, formulas, granularity='statement', cache=None):
+        # cache: an analysis cache (analysis_cache.py) keeping the parsed rows of each version
+        assert granularity in granularities, f"Unknown granularity {granularity}"
+
+        version_names = []
+        version_ids = []
+        keys = []
+        is_bug = []
+        scores = {formula: [] for formula in formulas}
+        for version_id, version_dir in enumerate(version_dirs):
+            features_csv_file = Path(version_dir) / features_file
+            assert features_csv_file.exists(), f"Features file {features_csv_file} does not exist"
+
+            if cache is None:
+                row_keys, row_bugs, row_scores = read_version_rows(version_dir, features_file, formulas, granularity)
+            else:
+                input_files = [features_file]
+                if granularity != 'statement':
+                    input_files.append(aggregate_table_file(features_file, granularity).name)
+                row_keys, row_bugs, row_scores = cache.load(version_dir, read_version_rows, input_files, features_file, formulas, granularity)
+
+            version_names.append(Path(version_dir).name)
+            version_ids.append(np.full(len(row_keys), version_id, dtype=np.int64))
+            keys.extend(row_keys)
+            is_bug.append(row_bugs)
+            for formula in formulas:
+                scores[formula].append(row_scores[formula])
+
+        return cls(
+            version_names,
+            concatenate(version_ids, np.int64),
+            keys,
+            concatenate(is_bug, bool),
+            {formula: concatenate(values, np.float64) for formula, values in scores.items()},
+        )
+
+    @classmethod
+    def from_columns(cls, columns, formulas, granularity='statement'):
+        # from the columns of a features table of a dataset store (dataset_store.py):
+        # 'version', 'key', 'bug' and the formulas, rows of a version together
+        assert granularity in granularities, f"Unknown granularity {granularity}"
+        if len(columns) == 0:
+            return cls([], np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=bool), {formula: np.zeros(0) for formula in formulas})
+
+        version_names, version_ids = np.unique(columns['version'].astype(str), return_inverse=True)
+        version_ids = version_ids.reshape(-1).astype(np.int64)
+        order = np.argsort(version_ids, kind='stable')
+        keys = columns['key'][order].tolist()
+        is_bug = columns['bug'][order] == 1
+        scores = {formula: np.asarray(columns[formula], dtype=np.float64)[order] for formula in formulas}
+        version_ids = version_ids[order]
+        table = cls(version_names.tolist(), version_ids, keys, is_bug, scores)
+        if granularity == 'statement':
+            return table
+
+        # functions: highest score of their lines, per version
+        bounds = np.searchsorted(version_ids, np.arange(len(version_names) + 1))
+        function_ids = []
+        function_keys = []
+        function_bugs = []
+        function_scores = {formula: [] for formula in formulas}
+        for version_id in range(len(version_names)):
+            start, end = bounds[version_id], bounds[version_id + 1]
+            lines = keys[start:end]
+            bug_lines = [line for line, bug in zip(lines, is_bug[start:end]) if bug]
+            buggy_line_key = bug_lines[0] if len(bug_lines) > 0 else None
+            groups, aggregated = aggregate_scores(
+                lines, buggy_line_key,
+                {formula: scores[formula][start:end] for formula in formulas}, 'function'
+            )
+            function_ids.append(np.full(len(groups), version_id, dtype=np.int64))
+            function_keys.extend(groups)
+            function_bugs.append(aggregated['bug'] == 1)
+            for formula in formulas:
+                function_scores[formula].append(aggregated[f'{formula} (max)'])
+
+        return cls(
+            version_names.tolist(),
+            concatenate(function_ids, np.int64),
+            function_keys,
+            concatenate(function_bugs, bool),
+            {formula: concatenate(values, np.float64) for formula, values in function_scores.items()},
+        )
+
+    @property
+    def num_versions(self):
+        return len(self.version_names)
+
+    def rows_per_version(self):
+        return np.bincount(self.version_ids, minlength=self.num_versions)
+
+
+def read_version_rows(version_dir, features_file, formulas, granularity):
+    # (row keys, whether each row is the buggy one, {formula: score of each row})
+    features_csv_file = Path(version_dir) / features_file
+    if granularity == 'statement':
+        row_keys, buggy_line_key, row_scores = read_feature_scores(features_csv_file, formulas)
+        row_bugs = np.array([key == buggy_line_key for key in row_keys], dtype=bool)
+    else:
+        row_keys, columns = load_aggregate_table(features_csv_file, granularity, formulas)
+        row_scores = {formula: columns[f'{formula} (max)'] for formula in formulas}
+        row_bugs = columns['bug'] == 1
+    return row_keys, row_bugs, row_scores
+
+
+def concatenate(arrays, dtype):
+    if len(arrays) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate(arrays).astype(dtype)
+
+
+def rank_rows(version_ids, scores, tie='max'):
+    # rank of each row within its version, higher scores first
+    assert tie in tie_policies, f"Unknown tie policy {tie}"
+    scores = np.nan_to_num(np.asarray(scores, dtype=np.float64), nan=-np.inf)
+    num_rows = len(scores)
+    if num_rows == 0:
+        return np.zeros(0, dtype=np.float64 if tie == 'average' else np.int64)
+
+    order = np.lexsort((-scores, version_ids))
+    sorted_versions = version_ids[order]
+    sorted_scores = scores[order]
+
+    new_version = np.ones(num_rows, dtype=bool)
+    new_version[1:] = sorted_versions[1:] != sorted_versions[:-1]
+    new_group = new_version.copy()
+    new_group[1:] |= ~np.isclose(sorted_scores[1:], sorted_scores[:-1], rtol=tie_rtol, atol=0.0)
+
+    positions = np.arange(num_rows)
+    version_start = np.maximum.accumulate(np.where(new_version, positions, 0))
+    group_ids = np.cumsum(new_group) - 1
+    group_starts = np.flatnonzero(new_group)
+    group_ends = np.append(group_starts[1:], num_rows) - 1
+
+    if tie == 'max':
+        sorted_ranks = group_ends[group_ids] - version_start + 1
+    elif tie == 'min':
+        sorted_ranks = group_starts[group_ids] - version_start + 1
+    elif tie == 'average':
+        sorted_ranks = (group_starts[group_ids] + group_ends[group_ids]) / 2 - version_start + 1
+    else:
+        sorted_ranks = group_ids - group_ids[version_start] + 1
+
+    ranks = np.empty(num_rows, dtype=sorted_ranks.dtype)
+    ranks[order] = sorted_ranks
+    return ranks
+
+
+class RankResult:
+    # per buggy version (in the order of the feature table):
+    #   num_rows, best_rank, best_score, bug_rank, bug_score
+    # bug_rank/bug_score are NaN for a version without a buggy row
+    def __init__(self, table, formula, tie='max'):
+        self.formula = formula
+        self.tie = tie
+        self.version_names = table.version_names
+
+        num_versions = table.num_versions
+        scores = table.scores[formula]
+        ranks = rank_rows(table.version_ids, scores, tie).astype(np.float64)
+
+        self.num_rows = table.rows_per_version()
+
+        self.best_score = np.full(num_versions, -np.inf)
+        np.maximum.at(self.best_score, table.version_ids, scores)
+        at_best = np.isclose(scores, self.best_score[table.version_ids], rtol=tie_rtol, atol=0.0)
+        self.best_rank = np.full(num_versions, np.inf)
+        np.minimum.at(self.best_rank, table.version_ids[at_best], ranks[at_best])
+
+        # the best ranked buggy row, if there are several
+        self.bug_rank = np.full(num_versions, np.inf)
+        np.minimum.at(self.bug_rank, table.version_ids[table.is_bug], ranks[table.is_bug])
+        self.bug_score = np.full(num_versions, -np.inf)
+        np.maximum.at(self.bug_score, table.version_ids[table.is_bug], scores[table.is_bug])
+
+        for values in [self.best_score, self.best_rank, self.bug_rank, self.bug_score]:
+            values[np.isinf(values)] = np.nan
+
+    def acc_at_k(self, k):
+        return int(np.sum(self.bug_rank <= k))
+
+    def exam(self):
+        # EXAM score of each version
+        return self.bug_rank / self.num_rows
+
+    def summary(self, acc_ks=[1, 3, 5, 10]):
+        ranked = ~np.isnan(self.bug_rank)
+        summary = {
+            'formula': self.formula,
+            '# of versions': len(self.version_names),
+            '# of versions with buggy row': int(ranked.sum()),
+        }
+        for k in acc_ks:
+            summary[f'acc@{k}'] = self.acc_at_k(k)
+        summary['mean EXAM'] = float(np.mean(self.exam()[ranked])) if ranked.any() else float('nan')
+        return summary
+
+
+def rank_all(table, formulas, tie='max'):
+    # {formula: RankResult}
+    return {formula: RankResult(table, formula, tie) for formula in formulas}